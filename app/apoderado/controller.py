@@ -17,6 +17,7 @@ logger = logging.getLogger(__name__)
 from slugify import slugify
 from sqlalchemy import and_, func
 
+from .. import stock
 from ..database import db
 from ..forms import _CHILEAN_PHONE_ERROR, _CHILEAN_PHONE_RE
 from ..model import (
@@ -332,13 +333,25 @@ class ApoderadoController:
     # ------------------------------------------------------------------
 
     def crea_orden(self, payload: list, apoderado_id: Optional[int] = None) -> str:
-        """Create a new Pedido from *payload* and return its codigo."""
+        """Create a new Pedido from *payload* and return its codigo.
+
+        The ordered menus are reserved first (see :mod:`app.stock`); raises
+        :class:`app.stock.SinStock` without creating the Pedido when one of
+        them has run out.
+        """
+        try:
+            reservas = stock.reservar(payload)
+        except stock.SinStock:
+            db.session.commit()  # keep the fuera_stock flag set by the failed reservation
+            raise
         orden = Pedido()
         orden.extra_attrs = payload
         orden.precio_total = Decimal(0)
         if apoderado_id is not None:
             orden.apoderado_id = apoderado_id
         db.session.add(orden)
+        for reserva in reservas:
+            reserva.pedido = orden
         db.session.commit()
         return orden.codigo
 
@@ -471,7 +484,8 @@ class ApoderadoController:
         """Create one OrdenCasino per item×alumno after a Pedido is paid.
 
         Idempotent: skips silently if OrdenCasino rows already exist for this
-        pedido.  Dispatches send_confirmacion_orden_pagado after creating the
+        pedido.  Confirms the Pedido's stock reservations (see :mod:`app.stock`)
+        and dispatches send_confirmacion_orden_pagado after creating the
         orders when the Pedido has an associated Apoderado.
         """
         from datetime import date as _date
@@ -484,6 +498,8 @@ class ApoderadoController:
         if existing:
             return
 
+        stock.confirmar(pedido)
+
         email_items = []
         for item in items:
             fecha_str = item.get("date")
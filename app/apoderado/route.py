@@ -23,9 +23,11 @@ from flask import (
     url_for,
 )
 from flask_security import current_user, login_required, roles_accepted  # type: ignore
+from flask_merchants import ProviderUnavailable
 
+from .. import saldo as saldo_ledger
 from ..database import db
-from ..extensions import limiter
+from ..extensions import flask_merchants, limiter
 from ..model import (
     Apoderado,
     MenuDiario,
@@ -35,12 +37,20 @@ from ..model import (
     EstadoPedido,
     Alumno,
     OrdenCasino,
+    TipoMovimientoSaldo,
 )
+from ..stock import SinStock
 from .controller import ApoderadoController
 
 apoderado_bp = Blueprint("apoderado_cliente", __name__)
 ctrl = ApoderadoController()
 
+# Shown when a payment provider's circuit is open or its bulkhead is full.
+_MENSAJE_PROVEEDOR_NO_DISPONIBLE = (
+    "El medio de pago no está disponible en este momento. "
+    "Puedes pagar presencialmente en la cafetería."
+)
+
 
 # ---------------------------------------------------------------------------
 # Dashboard
@@ -206,6 +216,11 @@ def abono():
         )
         return redirect(url_for("apoderado_cliente.abono_form"))
 
+    # Fail fast while the provider is down or saturated, before the abono is created.
+    if forma_pago in ("cafeteria", "khipu") and not flask_merchants.provider_available(forma_pago):
+        flash(_MENSAJE_PROVEEDOR_NO_DISPONIBLE, "warning")
+        return redirect(url_for("apoderado_cliente.abono_form"))
+
     # For cafeteria payments, generate cafe_XXXXXXXX code as the abono codigo
     # so that merchants_id == transaction_id == abono.codigo
     import random, string
@@ -231,40 +246,49 @@ def abono():
     if forma_pago in ("cafeteria", "khipu"):
         logger.debug("route.py: abono processing %s payment for abono codigo=%s", forma_pago, nuevo_abono.codigo)
 
-        payment = Payment.create(
-            amount=nuevo_abono.monto,
-            currency="CLP",
-            provider=forma_pago,
-            success_url=url_for(
-                "apoderado_cliente.abono_detalle",
-                codigo=nuevo_abono.codigo,
-                _external=True,
-            ),
-            cancel_url=(
-                url_for("apoderado_cliente.index", _external=True)
-                if forma_pago == "cafeteria"
-                else url_for(
+        try:
+            payment = Payment.create(
+                amount=nuevo_abono.monto,
+                currency="CLP",
+                provider=forma_pago,
+                success_url=url_for(
                     "apoderado_cliente.abono_detalle",
                     codigo=nuevo_abono.codigo,
                     _external=True,
-                )
-            ),
-            email=nuevo_abono.apoderado.usuario.email,
-            merchants_id=nuevo_abono.codigo,
-            extra_args=(
-                {"codigo": nuevo_abono.codigo}
-                if forma_pago == "cafeteria"
-                else {"body": f"Abono: {nuevo_abono.codigo}"}
-                if forma_pago == "khipu"
-                else None
-            ),
-            request_context={
-                "abono_codigo": nuevo_abono.codigo,
-                "monto": str(nuevo_abono.monto),
-                "apoderado_id": str(nuevo_abono.apoderado.id),
-                "forma_pago": forma_pago,
-            },
-        )
+                ),
+                cancel_url=(
+                    url_for("apoderado_cliente.index", _external=True)
+                    if forma_pago == "cafeteria"
+                    else url_for(
+                        "apoderado_cliente.abono_detalle",
+                        codigo=nuevo_abono.codigo,
+                        _external=True,
+                    )
+                ),
+                email=nuevo_abono.apoderado.usuario.email,
+                merchants_id=nuevo_abono.codigo,
+                extra_args=(
+                    {"codigo": nuevo_abono.codigo}
+                    if forma_pago == "cafeteria"
+                    else {"body": f"Abono: {nuevo_abono.codigo}"}
+                    if forma_pago == "khipu"
+                    else None
+                ),
+                request_context={
+                    "abono_codigo": nuevo_abono.codigo,
+                    "monto": str(nuevo_abono.monto),
+                    "apoderado_id": str(nuevo_abono.apoderado.id),
+                    "forma_pago": forma_pago,
+                },
+            )
+        except ProviderUnavailable:
+            # The circuit opened (or the bulkhead filled) after the check above:
+            # nothing was charged, so drop the abono and offer the cafeteria.
+            merchants_audit.info("abono_descartado: codigo=%s proveedor_no_disponible=%r", nuevo_abono.codigo, forma_pago)
+            db.session.delete(nuevo_abono)
+            db.session.commit()
+            flash(_MENSAJE_PROVEEDOR_NO_DISPONIBLE, "warning")
+            return redirect(url_for("apoderado_cliente.abono_form"))
 
         if forma_pago == "cafeteria":
             from ..tasks import send_notificacion_abono_creado
@@ -491,10 +515,13 @@ def delete_restriccion(id):
 def ordenweb():
     payload = request.get_json(force=True)
     apoderado = ctrl.get_apoderado(current_user)
-    nueva_orden = ctrl.crea_orden(
-        payload=payload["purchases"],
-        apoderado_id=apoderado.id if apoderado else None,
-    )
+    try:
+        nueva_orden = ctrl.crea_orden(
+            payload=payload["purchases"],
+            apoderado_id=apoderado.id if apoderado else None,
+        )
+    except SinStock:
+        return jsonify({"status": "error", "message": "Uno de los menús seleccionados se agotó"}), 409
     return jsonify(
         {
             "status": "OK",
@@ -594,9 +621,13 @@ def pago_orden(orden):
 
             if monto_a_pagar <= 0:
                 if descuento_saldo > 0 and apoderado:
-                    apoderado.saldo_cuenta = (apoderado.saldo_cuenta or 0) - int(
-                        descuento_saldo
-                    )
+                    if not saldo_ledger.debitar(
+                        apoderado, int(descuento_saldo), TipoMovimientoSaldo.PAGO_PEDIDO, pedido=pedido
+                    ):
+                        flash("Saldo insuficiente para aplicar el descuento.", "danger")
+                        return redirect(
+                            url_for("apoderado_cliente.pago_orden", orden=pedido.codigo)
+                        )
                 pedido.precio_total = total
                 pedido.estado = EstadoPedido.PAGADO
                 pedido.pagado = True
@@ -610,11 +641,15 @@ def pago_orden(orden):
             # SaldoProvider: pay the remaining amount entirely from account balance
             if forma_pago == "saldo":
                 saldo_necesario = int(descuento_saldo) + int(monto_a_pagar)
-                if (
-                    not apoderado
-                    or not apoderado.saldo_cuenta
-                    or apoderado.saldo_cuenta < saldo_necesario
-                ):
+                # Deduct slider discount + saldo payment in one conditional UPDATE
+                movimiento = (
+                    saldo_ledger.debitar(
+                        apoderado, saldo_necesario, TipoMovimientoSaldo.PAGO_PEDIDO, pedido=pedido
+                    )
+                    if apoderado
+                    else None
+                )
+                if movimiento is None:
                     flash(
                         "Saldo insuficiente para completar el pago con saldo de cuenta.",
                         "danger",
@@ -623,47 +658,50 @@ def pago_orden(orden):
                         url_for("apoderado_cliente.pago_orden", orden=pedido.codigo)
                     )
 
-                saldo_antes = apoderado.saldo_cuenta
-                nuevo_saldo = saldo_antes - saldo_necesario
-                # Deduct slider discount + saldo payment in one operation
-                apoderado.saldo_cuenta = nuevo_saldo
+                saldo_antes = movimiento.saldo_resultante + saldo_necesario
 
                 # Generate saldo_ codigo for the pedido
                 import random as _rnd, string as _str
                 saldo_codigo = f"saldo_{''.join(_rnd.choices(_str.ascii_uppercase + _str.digits, k=6))}"
                 pedido.codigo = saldo_codigo
 
-                payment = Payment.create(
-                    amount=monto_a_pagar,
-                    currency="CLP",
-                    provider="saldo",
-                    success_url=url_for(
-                        "apoderado_cliente.pago_orden",
-                        orden=pedido.codigo,
-                        _external=True,
-                    ),
-                    cancel_url=url_for(
-                        "apoderado_cliente.pago_orden",
-                        orden=pedido.codigo,
-                        _external=True,
-                    ),
-                    merchants_id=saldo_codigo,
-                    extra_args={
-                        "codigo": saldo_codigo,
-                        "metadata": {
+                try:
+                    payment = Payment.create(
+                        amount=monto_a_pagar,
+                        currency="CLP",
+                        provider="saldo",
+                        success_url=url_for(
+                            "apoderado_cliente.pago_orden",
+                            orden=pedido.codigo,
+                            _external=True,
+                        ),
+                        cancel_url=url_for(
+                            "apoderado_cliente.pago_orden",
+                            orden=pedido.codigo,
+                            _external=True,
+                        ),
+                        merchants_id=saldo_codigo,
+                        extra_args={
+                            "codigo": saldo_codigo,
+                            "metadata": {
+                                "pedido_codigo": pedido.codigo,
+                                "saldo_actual": saldo_antes,
+                            },
+                        },
+                        request_context={
+                            "user_id": str(current_user.id),
+                            "apoderado_id": str(apoderado.id),
+                            "saldo_actual": str(saldo_antes),
                             "pedido_codigo": pedido.codigo,
-                            "saldo_actual": saldo_antes,
+                            "forma_pago": "saldo",
+                            "descuento_saldo": str(descuento_saldo),
                         },
-                    },
-                    request_context={
-                        "user_id": str(current_user.id),
-                        "apoderado_id": str(apoderado.id),
-                        "saldo_actual": str(saldo_antes),
-                        "pedido_codigo": pedido.codigo,
-                        "forma_pago": "saldo",
-                        "descuento_saldo": str(descuento_saldo),
-                    },
-                )
+                    )
+                except ProviderUnavailable:
+                    # Nothing is committed yet: the rollback returns the saldo debited above.
+                    db.session.rollback()
+                    flash(_MENSAJE_PROVEEDOR_NO_DISPONIBLE, "warning")
+                    return redirect(url_for("apoderado_cliente.pago_orden", orden=pedido.codigo))
 
                 pedido.codigo_merchants = payment.merchants_id
                 pedido.precio_total = total
@@ -694,10 +732,18 @@ def pago_orden(orden):
                 )
 
             # External payment providers (cafeteria, khipu, etc.)
+            if not flask_merchants.provider_available(forma_pago):
+                # Down or saturated: offer another method before debiting any saldo.
+                flash(_MENSAJE_PROVEEDOR_NO_DISPONIBLE, "warning")
+                return redirect(url_for("apoderado_cliente.pago_orden", orden=pedido.codigo))
             if descuento_saldo > 0 and apoderado:
-                apoderado.saldo_cuenta = (apoderado.saldo_cuenta or 0) - int(
-                    descuento_saldo
-                )
+                if not saldo_ledger.debitar(
+                    apoderado, int(descuento_saldo), TipoMovimientoSaldo.PAGO_PEDIDO, pedido=pedido
+                ):
+                    flash("Saldo insuficiente para aplicar el descuento.", "danger")
+                    return redirect(
+                        url_for("apoderado_cliente.pago_orden", orden=pedido.codigo)
+                    )
 
             # For cafeteria pedidos, generate cafe_ codigo so merchants_id == transaction_id
             cafe_extra = {}
@@ -713,24 +759,32 @@ def pago_orden(orden):
                 slugs = [item["menu"] for item in resumen if item.get("menu")]
                 khipu_extra = {"body": f"Pedido: {', '.join(slugs)}" if slugs else "Pedido"}
 
-            payment = Payment.create(
-                amount=monto_a_pagar,
-                currency="CLP",
-                provider=forma_pago,
-                success_url=url_for(
-                    "apoderado_cliente.pago_orden", orden=pedido.codigo, _external=True
-                ),
-                cancel_url=url_for(
-                    "apoderado_cliente.pago_orden", orden=pedido.codigo, _external=True
-                ),
-                merchants_id=pedido.codigo if forma_pago == "cafeteria" else None,
-                extra_args=cafe_extra if forma_pago == "cafeteria" else khipu_extra if forma_pago == "khipu" else None,
-                request_context={
-                    "pedido_codigo": pedido.codigo,
-                    "forma_pago": forma_pago,
-                    "descuento_saldo": str(descuento_saldo),
-                },
-            )
+            try:
+                payment = Payment.create(
+                    amount=monto_a_pagar,
+                    currency="CLP",
+                    provider=forma_pago,
+                    success_url=url_for(
+                        "apoderado_cliente.pago_orden", orden=pedido.codigo, _external=True
+                    ),
+                    cancel_url=url_for(
+                        "apoderado_cliente.pago_orden", orden=pedido.codigo, _external=True
+                    ),
+                    merchants_id=pedido.codigo if forma_pago == "cafeteria" else None,
+                    extra_args=cafe_extra if forma_pago == "cafeteria" else khipu_extra if forma_pago == "khipu" else None,
+                    request_context={
+                        "pedido_codigo": pedido.codigo,
+                        "forma_pago": forma_pago,
+                        "descuento_saldo": str(descuento_saldo),
+                    },
+                )
+            except ProviderUnavailable:
+                # The provider became unavailable after the check above.  Nothing
+                # is committed yet, so the rollback returns the saldo discount
+                # debited above (and the cafeteria codigo).
+                db.session.rollback()
+                flash(_MENSAJE_PROVEEDOR_NO_DISPONIBLE, "warning")
+                return redirect(url_for("apoderado_cliente.pago_orden", orden=pedido.codigo))
 
             pedido.codigo_merchants = payment.merchants_id
             pedido.precio_total = total
@@ -12,11 +12,14 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 from .apoderado.route import apoderado_bp
 from .flyers.route import flyers_bp
 from .docs import docs_bp
+from .counters import dashboard_counters
 from .database import db, migrations
 from .extensions import babel, csrf, flask_merchants, limiter
 from .extensions.admin import admin
 from .logging_config import configure_logging
 from .model import *  # noqa: F403
+from .pos.feed import delivery_feed
+from .pos.roster import service_roster
 from .pos.routes import pos_bp
 from .providers.cafeteria import CafeteriaProvider
 from .providers.saldo import SaldoProvider
@@ -91,52 +94,68 @@ def create_app():
             subject=khipu_subject,
             webhook_secret=khipu_webhook_secret,
         ))
-    providers.append(CafeteriaProvider())
+    providers.append(CafeteriaProvider(display_code_exists=Payment.display_code_exists))
     providers.append(SaldoProvider())
 
     # merchants - do not pass admin here; we register a custom PaymentAdminView
     # separately after webhook configuration (see below)
-    flask_merchants.init_app(app=app, db=db, models=[Payment], providers=providers)
+    flask_merchants.init_app(app=app, db=db, models=[Payment], providers=providers, inbox_model=WebhookEntry)
+
+    # Each delivery reaches the handlers as a WebhookContext: the Payment row
+    # is resolved once (ctx.payment) and the linked Abono or Pedido is loaded
+    # at most once by the loader below (ctx.entity).
+    @flask_merchants.webhook_entity_loader
+    def _webhook_entity(ctx):
+        from .model import Abono, Pedido
+
+        pago = ctx.payment
+        if pago is None:
+            return None
+        abono = db.session.execute(
+            db.select(Abono).filter_by(codigo=pago.merchants_id)
+        ).scalar_one_or_none()
+        if abono is not None:
+            return abono
+        return db.session.execute(
+            db.select(Pedido).filter_by(codigo_merchants=pago.merchants_id)
+        ).scalar_one_or_none()
 
     # Register Khipu webhook handler.
     # When Khipu notifies /merchants/webhook/khipu that a payment succeeded,
-    # this handler finds the matching Payment record via transaction_id,
+    # this handler takes the matching Payment record from the context
     # and processes the associated entity:
     #   - Abono: credits apoderado.saldo_cuenta, sends receipt emails.
     #   - Pedido: marks as paid, creates OrdenCasino rows, sends confirmation emails.
     #
-    # Note: by the time this handler fires, views.py has already called
-    # ext.update_state() which sets pago.state = "succeeded" and commits.
-    # We use payment_object being empty as our idempotency guard: the handler
-    # populates it once, and skips on duplicate webhooks.
-    def _khipu_webhook_handler(event) -> None:
+    # Note: handlers run in a webhook inbox worker, after the inbox has
+    # stored the state (pago.state = "succeeded") and committed.
+    # Duplicate deliveries are dropped by the inbox's dedup ledger, and
+    # deliveries for the same payment are processed one at a time, so the
+    # payment_object guard below is checked without racing another worker.
+    # It still catches a second "succeeded" notification that Khipu sends
+    # with a different body.
+    def _khipu_webhook_handler(ctx) -> None:
         import logging as _logging
         _wh_logger = _logging.getLogger(__name__)
         _wh_logger.debug(
             "core.py: _khipu_webhook_handler called with provider=%r state=%r payment_id=%r",
-            event.provider, event.state, event.payment_id,
+            ctx.provider, ctx.state, ctx.payment_id,
         )
         from merchants.models import PaymentState
         from flask_merchants import merchants_audit
-        from .model import Abono, Pedido, EstadoPedido
+        from .model import Abono, Pedido
 
-        if event.provider != "khipu" or event.state != PaymentState.SUCCEEDED:
+        if ctx.provider != "khipu" or ctx.state != PaymentState.SUCCEEDED:
             return
-        if not event.payment_id:
+        if not ctx.payment_id:
             return
 
         # v3.0 webhook body contains both payment_id (Khipu's ID, stored as
         # Payment.transaction_id) and transaction_id (merchant's order ID,
-        # stored as Payment.merchants_id).  Look up by Khipu's payment_id
-        # → our Payment.transaction_id.
-        pago = db.session.execute(
-            db.select(Payment).where(
-                Payment.provider == "khipu",
-                Payment.transaction_id == event.payment_id,
-            )
-        ).scalar_one_or_none()
-
-        if not pago:
+        # stored as Payment.merchants_id).  Khipu's payment_id must match
+        # our Payment.transaction_id.
+        pago = ctx.payment
+        if pago is None or pago.provider != "khipu" or pago.transaction_id != ctx.payment_id:
             return
 
         # Idempotency: if payment_object is already populated, this webhook
@@ -144,28 +163,19 @@ def create_app():
         if pago.payment_object:
             _wh_logger.info(
                 "core.py: duplicate webhook skipped for payment_id=%r (already processed)",
-                event.payment_id,
+                ctx.payment_id,
             )
             return
 
         # Store the full webhook payload for audit/reconciliation
-        pago.payment_object = event.raw
-
-        # Determine whether this payment belongs to an abono or a pedido
-        abono = db.session.execute(
-            db.select(Abono).filter_by(codigo=pago.merchants_id)
-        ).scalar_one_or_none()
+        pago.payment_object = ctx.data
 
-        if abono:
-            _handle_abono_payment(pago, abono, event, merchants_audit)
+        entity = ctx.entity
+        if isinstance(entity, Abono):
+            _handle_abono_payment(pago, entity, ctx, merchants_audit)
             return
-
-        pedido = db.session.execute(
-            db.select(Pedido).filter_by(codigo_merchants=pago.merchants_id)
-        ).scalar_one_or_none()
-
-        if pedido:
-            _handle_pedido_payment(pago, pedido, event, merchants_audit)
+        if isinstance(entity, Pedido):
+            _handle_pedido_payment(pago, entity, ctx, merchants_audit)
             return
 
         # No linked entity found — still commit payment_object so the
@@ -173,16 +183,18 @@ def create_app():
         db.session.commit()
         _wh_logger.warning(
             "core.py: no abono or pedido found for payment merchants_id=%r (khipu payment_id=%r)",
-            pago.merchants_id, event.payment_id,
+            pago.merchants_id, ctx.payment_id,
         )
 
     def _handle_abono_payment(pago, abono, event, merchants_audit) -> None:
         """Process a successful Khipu payment for an abono (deposit).
 
-        State is already "succeeded" (set by ext.update_state in the webhook view).
+        State is already "succeeded" (stored before the handlers run).
         """
-        saldo_actual = abono.apoderado.saldo_cuenta or 0
-        abono.apoderado.saldo_cuenta = saldo_actual + int(abono.monto)
+        from . import saldo as saldo_ledger
+        from .model import TipoMovimientoSaldo
+
+        saldo_ledger.acreditar(abono.apoderado, int(abono.monto), TipoMovimientoSaldo.ABONO, abono=abono)
         db.session.commit()
         merchants_audit.info(
             "abono_aprobado_khipu_webhook: codigo=%s apoderado_id=%s monto=%s nuevo_saldo=%s khipu_payment_id=%s",
@@ -220,7 +232,7 @@ def create_app():
     def _handle_pedido_payment(pago, pedido, event, merchants_audit) -> None:
         """Process a successful Khipu payment for a pedido (order).
 
-        Payment state is already "succeeded" (set by ext.update_state in the webhook view).
+        Payment state is already "succeeded" (stored before the handlers run).
         """
         from datetime import datetime as _dt
         from .model import EstadoPedido
@@ -245,6 +257,38 @@ def create_app():
 
     flask_merchants.add_webhook_handler(_khipu_webhook_handler)
 
+    # A Pedido whose payment failed or was cancelled (Khipu also reports an
+    # expired payment as one of those) gives its reserved menu units back
+    # right away instead of holding them for MENU_RESERVA_MINUTOS.  A later
+    # payment of the same Pedido takes them again in stock.confirmar().
+    def _liberar_stock_pedido(pago) -> None:
+        from flask_merchants import merchants_audit
+        from . import stock
+        from .model import Pedido
+
+        pedido = db.session.execute(
+            db.select(Pedido).filter_by(codigo_merchants=pago.merchants_id)
+        ).scalar_one_or_none()
+        if pedido is None or pedido.pagado:
+            return
+        unidades = stock.liberar(pedido)
+        db.session.commit()
+        if unidades:
+            merchants_audit.info(
+                "pedido_stock_liberado: codigo=%s unidades=%d estado_pago=%s",
+                pedido.codigo,
+                unidades,
+                pago.state,
+            )
+
+    def _webhook_liberar_stock(ctx) -> None:
+        from merchants.models import PaymentState
+
+        if ctx.state in (PaymentState.FAILED, PaymentState.CANCELLED) and ctx.payment is not None:
+            _liberar_stock_pedido(ctx.payment)
+
+    flask_merchants.add_webhook_handler(_webhook_liberar_stock)
+
     # Enable webhook notification emails to admin users.
     # Every incoming webhook triggers an email containing provider, transaction,
     # headers and body so administrators can inspect provider payloads.
@@ -265,9 +309,33 @@ def create_app():
 
     # Register custom payment admin views (using PaymentAdminView with app-specific actions).
     # Replaces the default PaymentModelView that would have been auto-registered via admin=admin.
-    from .extensions.admin import PaymentAdminView
+    from .extensions.admin import PaymentAdminView, WebhookInboxAdminView
     from flask_merchants.contrib.admin import ProvidersView
 
+    # Payments that a provider sync (the admin "Sync from Provider" action or
+    # `flask merchants payments sync`) moves to "succeeded" get the same
+    # post-payment processing as a manual confirmation.  It runs under the
+    # payment lock, so a webhook that already credited it leaves payment_object
+    # set and the sync skips it, as the webhook handler does for duplicates.
+    def _sync_post_payment(result) -> None:
+        if result.new_state != "succeeded" or result.old_state not in ("pending", "processing"):
+            return
+        if result.payment.payment_object:
+            import logging as _logging
+            _logging.getLogger(__name__).info(
+                "core.py: sync post-payment skipped for merchants_id=%r (already processed)",
+                result.payment.merchants_id,
+            )
+            return
+        PaymentAdminView._post_payment_processing(result.payment)
+
+    def _sync_liberar_stock(result) -> None:
+        if result.new_state in ("failed", "cancelled"):
+            _liberar_stock_pedido(result.payment)
+
+    flask_merchants.add_sync_handler(_sync_post_payment)
+    flask_merchants.add_sync_handler(_sync_liberar_stock)
+
     payment_view_name = app.config.get("MERCHANTS_PAYMENT_VIEW_NAME", "Payments")
     provider_view_name = app.config.get("MERCHANTS_PROVIDER_VIEW_NAME", "Providers")
     admin.add_view(
@@ -288,6 +356,16 @@ def create_app():
             category="Merchants",
         )
     )
+    admin.add_view(
+        WebhookInboxAdminView(
+            WebhookEntry,
+            db.session,
+            ext=flask_merchants,
+            name="Webhooks",
+            endpoint="merchants_webhook_inbox",
+            category="Merchants",
+        )
+    )
 
     # Build the providers context once (providers don't change after init).
     # `payment_providers` includes all providers (for pedido payment forms).
@@ -315,6 +393,9 @@ def create_app():
     app.register_blueprint(core_bp)
     app.register_blueprint(apoderado_bp, url_prefix="/apoderado")
     app.register_blueprint(pos_bp, url_prefix="/pos")
+    service_roster.init_app(app)
+    delivery_feed.init_app(app)
+    dashboard_counters.init_app(app)
     app.register_blueprint(staff_bp, url_prefix="/staff")
     app.register_blueprint(docs_bp)
     app.register_blueprint(flyers_bp)
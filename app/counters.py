@@ -0,0 +1,413 @@
+"""DashboardCounters - incrementally maintained dashboard counters.
+
+The POS dashboard and the admin home page used to run several ``COUNT(*)``
+queries (over ``OrdenCasino``, ``Alumno``, ``Abono`` ⋈ ``Payment`` and
+``Pedido``) on every page load.  Those values now live in
+:class:`~app.model.ContadorDashboard` rows and are read in one ``SELECT``.
+
+Changes are collected by the session hooks and written once the transaction
+has committed, in a short transaction of their own, so delivery and order
+transactions never hold a lock on the (shared, per-day) counter rows:
+
+* ORM flushes of ``OrdenCasino``, ``Alumno`` and ``Pedido`` are diffed and
+  applied as ``valor = valor + delta``, so concurrent workers never overwrite
+  each other.
+* ``abonos.pendientes`` depends on a join, so a commit touching ``Abono`` or
+  ``Payment.state`` only invalidates that counter; the next read recounts it.
+* Bulk UPDATE/DELETE statements bypass the flush.  Callers that know their
+  effect adjust the counters explicitly (see :meth:`DashboardCounters.ajustar`)
+  and mark the statement with ``execution_options(contadores_ajustados=True)``;
+  any other bulk statement invalidates the counters of its model only.
+
+A recount runs, on its own connection, when a counter is missing, invalidated
+or older than ``DASHBOARD_RECUENTO_SEGUNDOS`` (default 600).  Deltas applied
+after commit can race with a recount; the periodic recount corrects that drift.
+"""
+
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta
+from itertools import chain
+from typing import Iterable, Optional
+
+from sqlalchemy import bindparam, event, func, insert, inspect, or_, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from .database import db
+from .model import Abono, Alumno, ContadorDashboard, EstadoAlmuerzo, OrdenCasino, Payment, Pedido
+
+logger = logging.getLogger(__name__)
+
+_INFO_KEY = "dashboard_counters"
+_FLUSH_KEY = "dashboard_counters.flush"
+
+ALUMNOS_TOTAL = "alumnos.total"
+ALUMNOS_ACTIVOS = "alumnos.activos"
+ALUMNOS_CON_TAG = "alumnos.activos_con_tag"
+ABONOS_PENDIENTES = "abonos.pendientes"
+
+
+def clave_casino(estado: EstadoAlmuerzo, fecha: date) -> str:
+    """Counter key for OrdenCasino rows in *estado* on *fecha*."""
+    return f"casino.{estado.value}:{fecha.isoformat()}"
+
+
+def clave_pedidos(fecha: date) -> str:
+    """Counter key for Pedido rows created on *fecha*."""
+    return f"pedidos.creados:{fecha.isoformat()}"
+
+
+# ------------------------------------------------------------------
+# Contribution rules: which counters a row adds one to
+# ------------------------------------------------------------------
+
+def _claves_orden(estado, fecha) -> list[str]:
+    if fecha is None or estado not in (EstadoAlmuerzo.PENDIENTE, EstadoAlmuerzo.ENTREGADO):
+        return []
+    return [clave_casino(estado, fecha)]
+
+
+def _claves_alumno(activo, tag) -> list[str]:
+    claves = [ALUMNOS_TOTAL]
+    if activo:
+        claves.append(ALUMNOS_ACTIVOS)
+        if tag is not None:
+            claves.append(ALUMNOS_CON_TAG)
+    return claves
+
+
+def _claves_pedido(created) -> list[str]:
+    return [clave_pedidos(created.date())] if created else []
+
+
+_REGLAS = {
+    OrdenCasino: (("estado", "fecha"), _claves_orden),
+    Alumno: (("activo", "tag"), _claves_alumno),
+    Pedido: (("created",), _claves_pedido),
+}
+
+# Attributes whose change can move a row in or out of ``abonos.pendientes``.
+_ABONOS_ATTRS = {Abono: ("codigo",), Payment: ("state", "merchants_id")}
+
+# Key prefix of the counters each model feeds, for invalidation.
+_PREFIJOS = {
+    OrdenCasino: "casino.",
+    Alumno: "alumnos.",
+    Pedido: "pedidos.",
+    Abono: ABONOS_PENDIENTES,
+    Payment: ABONOS_PENDIENTES,
+}
+
+
+def _valores_previos(obj, attrs) -> Optional[tuple]:
+    """Committed values of *attrs* on *obj*, or ``None`` if they cannot be known."""
+    state = inspect(obj)
+    valores = []
+    for attr in attrs:
+        history = state.attrs[attr].history
+        if history.deleted:
+            valores.append(history.deleted[0])
+        elif history.unchanged:
+            valores.append(history.unchanged[0])
+        elif history.added:
+            # Set without the previous value ever being loaded.
+            return None
+        else:
+            valores.append(getattr(obj, attr))
+    return tuple(valores)
+
+
+def _pendiente(session) -> dict:
+    """Deltas and invalidated key prefixes waiting for *session* to commit."""
+    return session.info.setdefault(_INFO_KEY, {"deltas": Counter(), "invalidar": set()})
+
+
+def _afecta_abonos(obj, siempre: bool) -> bool:
+    attrs = _ABONOS_ATTRS.get(type(obj))
+    if attrs is None:
+        return False
+    if siempre:
+        return True
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
+class DashboardCounters:
+    """Reads and maintains the :class:`~app.model.ContadorDashboard` rows."""
+
+    def __init__(self, recuento_segundos: float = 600.0) -> None:
+        self.recuento_segundos = recuento_segundos
+        self._listening = False
+
+    # ------------------------------------------------------------------
+    # Flask integration
+    # ------------------------------------------------------------------
+
+    def init_app(self, app) -> None:
+        """Read ``DASHBOARD_RECUENTO_SEGUNDOS`` and register the session hooks."""
+        self.recuento_segundos = float(app.config.get("DASHBOARD_RECUENTO_SEGUNDOS", self.recuento_segundos))
+        if not self._listening:
+            event.listen(db.session, "before_flush", self._on_before_flush)
+            event.listen(db.session, "after_flush", self._on_after_flush)
+            event.listen(db.session, "do_orm_execute", self._on_do_orm_execute)
+            event.listen(db.session, "after_commit", self._on_after_commit)
+            event.listen(db.session, "after_soft_rollback", self._on_after_rollback)
+            self._listening = True
+        app.extensions["dashboard_counters"] = self
+
+    def close(self) -> None:
+        """Remove the session hooks."""
+        if self._listening:
+            event.remove(db.session, "before_flush", self._on_before_flush)
+            event.remove(db.session, "after_flush", self._on_after_flush)
+            event.remove(db.session, "do_orm_execute", self._on_do_orm_execute)
+            event.remove(db.session, "after_commit", self._on_after_commit)
+            event.remove(db.session, "after_soft_rollback", self._on_after_rollback)
+            self._listening = False
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def valores(self, fecha: Optional[date] = None) -> dict:
+        """Return the dashboard counters for *fecha* (default today).
+
+        Returns a dict with keys:
+        - ``ordenes_pendientes``: OrdenCasino PENDIENTE on *fecha*
+        - ``ordenes_entregadas``: OrdenCasino ENTREGADO on *fecha*
+        - ``alumnos_total``: every Alumno
+        - ``alumnos_activos``: active Alumno
+        - ``alumnos_con_tag``: active Alumno with a tag assigned
+        - ``abonos_pendientes``: Abono whose Payment is ``processing``
+        - ``pedidos_creados``: Pedido created on *fecha*
+
+        Counters that are missing, invalidated or older than
+        ``recuento_segundos`` are recounted on a separate connection (see
+        :meth:`recontar`); the caller's session is neither flushed nor
+        committed.  Counts directly when :meth:`init_app` has not registered
+        the session hooks.
+        """
+        fecha = fecha or date.today()
+        claves = self._claves(fecha)
+        if not self._listening:
+            # Nothing keeps the rows current without the session hooks.
+            conn = db.session.connection()
+            return {nombre: _contar(conn, clave, fecha) for nombre, clave in claves.items()}
+        with db.session.no_autoflush:
+            filas = db.session.execute(
+                select(ContadorDashboard.clave, ContadorDashboard.valor, ContadorDashboard.recontado).where(
+                    ContadorDashboard.clave.in_(claves.values())
+                )
+            ).all()
+        limite = datetime.now() - timedelta(seconds=self.recuento_segundos)
+        por_clave = {r.clave: r.valor for r in filas if r.recontado is not None and r.recontado >= limite}
+        faltan = set(claves.values()) - por_clave.keys()
+        if faltan:
+            por_clave.update(self._recontar(fecha, faltan))
+        return {nombre: por_clave[clave] for nombre, clave in claves.items()}
+
+    def recontar(self, fecha: Optional[date] = None) -> dict:
+        """Recount every counter for *fecha* from scratch and store the values.
+
+        Counts and writes on a connection of its own, so pending changes of
+        the caller's session are left alone.  Returns the same dict as
+        :meth:`valores`.
+        """
+        fecha = fecha or date.today()
+        claves = self._claves(fecha)
+        contados = self._recontar(fecha, claves.values())
+        return {nombre: contados[clave] for nombre, clave in claves.items()}
+
+    @staticmethod
+    def _recontar(fecha: date, claves: Iterable[str]) -> dict[str, int]:
+        with db.engine.connect() as conn:
+            contados = {clave: _contar(conn, clave, fecha) for clave in claves}
+            try:
+                _guardar(conn, contados)
+                conn.commit()
+            except IntegrityError:
+                # Another worker inserted the same keys first; its values are
+                # as fresh as ours.
+                conn.rollback()
+        return contados
+
+    @staticmethod
+    def _claves(fecha: date) -> dict[str, str]:
+        return {
+            "ordenes_pendientes": clave_casino(EstadoAlmuerzo.PENDIENTE, fecha),
+            "ordenes_entregadas": clave_casino(EstadoAlmuerzo.ENTREGADO, fecha),
+            "alumnos_total": ALUMNOS_TOTAL,
+            "alumnos_activos": ALUMNOS_ACTIVOS,
+            "alumnos_con_tag": ALUMNOS_CON_TAG,
+            "abonos_pendientes": ABONOS_PENDIENTES,
+            "pedidos_creados": clave_pedidos(fecha),
+        }
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def ajustar(self, deltas: dict[str, int]) -> None:
+        """Add *deltas* (``{clave: delta}``) to the counters once the current transaction commits.
+
+        Keys without a row are skipped; they are created by the next recount.
+        """
+        _pendiente(db.session)["deltas"].update(deltas)
+
+    def invalidar(self) -> None:
+        """Force a full recount on the next read, once the current transaction commits."""
+        _pendiente(db.session)["invalidar"].add("")
+
+    # ------------------------------------------------------------------
+    # Session hooks
+    # ------------------------------------------------------------------
+
+    def _on_before_flush(self, session, flush_context, instances) -> None:
+        deltas = Counter()
+        invalidar = set()
+        dirty = []
+        for obj in chain(session.dirty, session.deleted):
+            if _afecta_abonos(obj, siempre=obj in session.deleted):
+                invalidar.add(ABONOS_PENDIENTES)
+            regla = _REGLAS.get(type(obj))
+            if regla is None:
+                continue
+            attrs, claves = regla
+            previos = _valores_previos(obj, attrs)
+            if previos is None:
+                invalidar.add(_PREFIJOS[type(obj)])
+                continue
+            deltas.subtract(claves(*previos))
+            if obj not in session.deleted:
+                dirty.append(obj)
+        if deltas or invalidar:
+            pendiente = _pendiente(session)
+            pendiente["deltas"].update(deltas)
+            pendiente["invalidar"].update(invalidar)
+        session.info[_FLUSH_KEY] = dirty
+
+    def _on_after_flush(self, session, flush_context) -> None:
+        dirty = session.info.pop(_FLUSH_KEY, None)
+        if dirty is None:
+            return
+        deltas = Counter()
+        invalidar = set()
+        # New rows are counted here, once column defaults have been applied.
+        for obj in chain(session.new, dirty):
+            if obj in session.new and _afecta_abonos(obj, siempre=True):
+                invalidar.add(ABONOS_PENDIENTES)
+            regla = _REGLAS.get(type(obj))
+            if regla is not None:
+                attrs, claves = regla
+                deltas.update(claves(*(getattr(obj, a) for a in attrs)))
+        if deltas or invalidar:
+            pendiente = _pendiente(session)
+            pendiente["deltas"].update(deltas)
+            pendiente["invalidar"].update(invalidar)
+
+    def _on_do_orm_execute(self, orm_execute_state) -> None:
+        # Bulk UPDATE/DELETE statements bypass the flush hooks.
+        if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        if orm_execute_state.execution_options.get("contadores_ajustados"):
+            return
+        mapper = orm_execute_state.bind_mapper
+        prefijo = _PREFIJOS.get(mapper.class_) if mapper is not None else None
+        if prefijo is not None:
+            _pendiente(orm_execute_state.session)["invalidar"].add(prefijo)
+
+    def _on_after_commit(self, session) -> None:
+        pendiente = session.info.pop(_INFO_KEY, None)
+        if pendiente is None:
+            return
+        try:
+            with session.get_bind(ContadorDashboard).begin() as conn:
+                _aplicar(conn, pendiente["deltas"])
+                _invalidar(conn, pendiente["invalidar"])
+        except SQLAlchemyError:
+            # The caller's transaction is already committed; the periodic
+            # recount corrects the counters.
+            logger.exception("dashboard_counters: no se pudieron actualizar los contadores")
+
+    def _on_after_rollback(self, session, previous_transaction) -> None:
+        if previous_transaction.parent is None:
+            session.info.pop(_INFO_KEY, None)
+            session.info.pop(_FLUSH_KEY, None)
+
+
+def _aplicar(conn, deltas) -> None:
+    params = [{"b_clave": clave, "b_delta": delta} for clave, delta in deltas.items() if delta]
+    if not params:
+        return
+    tabla = ContadorDashboard.__table__
+    conn.execute(
+        update(tabla).where(tabla.c.clave == bindparam("b_clave")).values(valor=tabla.c.valor + bindparam("b_delta")),
+        params,
+    )
+
+
+def _invalidar(conn, prefijos) -> None:
+    if not prefijos:
+        return
+    tabla = ContadorDashboard.__table__
+    conn.execute(
+        update(tabla)
+        .where(
+            or_(*(tabla.c.clave.startswith(prefijo, autoescape=True) for prefijo in prefijos)),
+            # Already invalidated rows are not rewritten (nor locked).
+            tabla.c.recontado.isnot(None),
+        )
+        .values(recontado=None)
+    )
+
+
+def _guardar(conn, contados: dict[str, int]) -> None:
+    """Store recounted *contados* (``{clave: valor}``), inserting missing keys."""
+    tabla = ContadorDashboard.__table__
+    ahora = datetime.now()
+    existentes = set(conn.execute(select(tabla.c.clave).where(tabla.c.clave.in_(contados))).scalars())
+    filas = [{"b_clave": clave, "b_valor": valor} for clave, valor in contados.items() if clave in existentes]
+    if filas:
+        conn.execute(
+            update(tabla).where(tabla.c.clave == bindparam("b_clave")).values(valor=bindparam("b_valor"), recontado=ahora),
+            filas,
+        )
+    nuevas = [
+        {"clave": clave, "valor": valor, "recontado": ahora} for clave, valor in contados.items() if clave not in existentes
+    ]
+    if nuevas:
+        conn.execute(insert(tabla), nuevas)
+
+
+def _contar(conn, clave: str, fecha: Optional[date]) -> int:
+    """Run the full ``COUNT`` behind *clave* (*fecha* is the day of per-day keys)."""
+    if clave == ALUMNOS_TOTAL:
+        stmt = select(func.count()).select_from(Alumno)
+    elif clave == ALUMNOS_ACTIVOS:
+        stmt = select(func.count()).select_from(Alumno).where(Alumno.activo == True)  # noqa: E712
+    elif clave == ALUMNOS_CON_TAG:
+        stmt = select(func.count()).select_from(Alumno).where(
+            Alumno.activo == True,  # noqa: E712
+            Alumno.tag.isnot(None),
+        )
+    elif clave == ABONOS_PENDIENTES:
+        stmt = (
+            select(func.count(Abono.id))
+            .join(Payment, Payment.merchants_id == Abono.codigo)
+            .where(Payment.state == "processing")
+        )
+    elif clave == clave_pedidos(fecha):
+        stmt = select(func.count()).select_from(Pedido).where(
+            Pedido.created >= fecha,
+            Pedido.created < fecha + timedelta(days=1),
+        )
+    else:
+        estado = next(e for e in EstadoAlmuerzo if clave == clave_casino(e, fecha))
+        stmt = select(func.count()).select_from(OrdenCasino).where(
+            OrdenCasino.fecha == fecha,
+            OrdenCasino.estado == estado,
+        )
+    return conn.execute(stmt).scalar() or 0
+
+
+dashboard_counters = DashboardCounters()
@@ -11,10 +11,14 @@ from flask_admin.contrib.rediscli import RedisCli
 from flask_admin.contrib.sqla import ModelView
 from flask_admin.menu import MenuDivider, MenuLink
 from flask_admin.theme import Bootstrap4Theme
+from flask_merchants.contrib.export import PaymentExportMixin
+from flask_merchants.contrib.sqla import WebhookInboxModelView
 from slugify import slugify
 from flask_security import current_user  # type: ignore
 from . import csrf
+from .. import saldo as saldo_ledger
 from .. import settings
+from .. import stock
 from ..database import db
 from ..extensions import limiter
 from ..model import (
@@ -22,18 +26,23 @@ from ..model import (
     Apoderado,
     EstadoPedido,
     MenuDiario,
+    MenuStockFragmento,
     OpcionMenuDia,
     Payment,
     Pedido,
     Plato,
+    ReservaStock,
     Role,
     Settings,
     TipoCurso,
     User,
     Abono,
+    LecturaPos,
+    MovimientoSaldo,
     OrdenCasino,
     SchoolStaff,
     SchoolStaffPedido,
+    TipoMovimientoSaldo,
 )
 from wtforms import SelectMultipleField
 from flask_admin.form import Select2Widget
@@ -63,43 +72,20 @@ class SaborMirandianoIndexView(AdminIndexView):
 
     @expose("/")
     def index(self):
-        from ..model import Abono, Alumno, Pedido, Payment
-        from datetime import date, timedelta
+        from ..counters import dashboard_counters
 
         if not (current_user.is_active and current_user.is_authenticated and current_user.has_role("admin")):
             return redirect(url_for("security.login", next=request.url))
 
-        today = date.today()
-        tomorrow = today + timedelta(days=1)
-
-        pending_abonos = (
-            db.session.execute(
-                db.select(db.func.count(Abono.id))
-                .join(Payment, Payment.merchants_id == Abono.codigo)
-                .filter(Payment.state == "processing")
-            ).scalar()
-            or 0
-        )
-
-        active_alumnos = db.session.execute(db.select(db.func.count(Alumno.id))).scalar() or 0
-
-        today_pedidos = (
-            db.session.execute(
-                db.select(db.func.count(Pedido.id)).filter(
-                    Pedido.created >= today,
-                    Pedido.created < tomorrow,
-                )
-            ).scalar()
-            or 0
-        )
+        valores = dashboard_counters.valores()
 
         audit_entries = _read_recent_audit_entries()
 
         return self.render(
             "admin/index.html",
-            pending_abonos=pending_abonos,
-            active_alumnos=active_alumnos,
-            today_pedidos=today_pedidos,
+            pending_abonos=valores["abonos_pendientes"],
+            active_alumnos=valores["alumnos_total"],
+            today_pedidos=valores["pedidos_creados"],
             audit_entries=audit_entries,
         )
 
@@ -245,6 +231,8 @@ class MenuDiarioAdminView(SecureModelView):
     )
     def action_vaciar_tabla(self, ids):
         try:
+            db.session.execute(db.delete(ReservaStock))
+            db.session.execute(db.delete(MenuStockFragmento))
             count = db.session.execute(db.delete(MenuDiario)).rowcount
             db.session.commit()
             flash(f"Se eliminaron {count} menú(s) diario(s) y todas sus opciones.")
@@ -252,6 +240,34 @@ class MenuDiarioAdminView(SecureModelView):
             db.session.rollback()
             flash(f"Error al vaciar tabla: {exc}", "error")
 
+    @action(
+        "fragmentar_stock",
+        "Fragmentar Stock",
+        "¿Repartir el stock de los menús seleccionados en fragmentos? Hazlo fuera del horario de pedidos.",
+    )
+    def action_fragmentar_stock(self, ids):
+        self._fragmentar(ids, current_app.config.get("MENU_STOCK_FRAGMENTOS", 4))
+
+    @action(
+        "unificar_stock",
+        "Unificar Stock",
+        "¿Volver a un solo contador de stock en los menús seleccionados? Hazlo fuera del horario de pedidos.",
+    )
+    def action_unificar_stock(self, ids):
+        self._fragmentar(ids, 0)
+
+    def _fragmentar(self, ids, fragmentos: int) -> None:
+        """Apply :func:`app.stock.fragmentar` to the selected menus."""
+        try:
+            menus = db.session.execute(db.select(MenuDiario).where(MenuDiario.id.in_(ids))).scalars().all()
+            for menu in menus:
+                stock.fragmentar(menu, fragmentos)
+            db.session.commit()
+            flash(f"Stock de {len(menus)} menú(s) repartido en {fragmentos or 1} contador(es).")
+        except Exception as exc:
+            db.session.rollback()
+            flash(f"Error al fragmentar stock: {exc}", "error")
+
 
 class ApoderadoAdminView(SecureModelView):
 
@@ -272,6 +288,8 @@ class ApoderadoAdminView(SecureModelView):
     )
     def action_vaciar_tabla(self, ids):
         try:
+            db.session.execute(db.delete(MovimientoSaldo))
+            db.session.execute(db.delete(LecturaPos))
             db.session.execute(db.delete(OrdenCasino))
             db.session.execute(db.delete(Alumno))
             db.session.execute(db.delete(Payment))
@@ -339,6 +357,7 @@ class AlumnoAdminView(SecureModelView):
     )
     def action_vaciar_tabla(self, ids):
         try:
+            db.session.execute(db.delete(LecturaPos))
             db.session.execute(db.delete(OrdenCasino))
             count = db.session.execute(db.delete(Alumno)).rowcount
             db.session.commit()
@@ -379,9 +398,11 @@ class AbonoAdminView(SecureModelView):
                 flash(f"Abono {abono.codigo[:8].upper()} no está pendiente de aprobación.", "warning")
                 continue
             pago.state = "succeeded"
-            saldo_actual = abono.apoderado.saldo_cuenta or 0
-            nuevo_saldo = saldo_actual + int(abono.monto)
-            abono.apoderado.saldo_cuenta = nuevo_saldo
+            movimiento = saldo_ledger.acreditar(
+                abono.apoderado, int(abono.monto), TipoMovimientoSaldo.ABONO, abono=abono
+            )
+            nuevo_saldo = movimiento.saldo_resultante
+            saldo_actual = nuevo_saldo - movimiento.monto
             db.session.commit()
             merchants_audit.info(
                 "abono_aprobado: codigo=%s apoderado_id=%s email=%r monto=%s nuevo_saldo=%s",
@@ -774,7 +795,20 @@ class GestorMenuView(BaseView):
         return redirect(url_for("gestor_menu.index"))
 
 
-class PaymentAdminView(SecureModelView):
+class WebhookInboxAdminView(WebhookInboxModelView, SecureModelView):
+    """Webhook inbox (flask_merchants) restricted to admins, with the Retry action."""
+
+    column_labels = {
+        "created_at": "Recibido",
+        "provider": "Proveedor",
+        "status": "Estado proceso",
+        "attempts": "Intentos",
+        "next_attempt_at": "Próximo intento",
+        "last_error": "Último error",
+    }
+
+
+class PaymentAdminView(PaymentExportMixin, SecureModelView):
     """Extended Flask-Admin view for Payment with app-specific post-payment actions.
 
     Extends the base SecureModelView with:
@@ -783,6 +817,8 @@ class PaymentAdminView(SecureModelView):
       transitions to 'succeeded'.
     - New 'Confirmar Pago' action for manually marking payments as succeeded and
       recording the admin action in ``response_payload``.
+    - Streaming CSV / NDJSON export at ``stream/<fmt>/`` for reconciliation with
+      the provider's settlement reports.
     """
 
     column_list = ["merchants_id", "transaction_id", "provider", "amount", "currency", "state", "created_at", "updated_at"]
@@ -794,7 +830,8 @@ class PaymentAdminView(SecureModelView):
         self._ext = ext
         super().__init__(model, session, **kwargs)
 
-    def _post_payment_processing(self, pago: Payment, admin_user: str | None = None, action_name: str | None = None) -> None:
+    @staticmethod
+    def _post_payment_processing(pago: Payment, admin_user: str | None = None, action_name: str | None = None) -> None:
         """Run post-payment business logic after a payment is marked as succeeded.
 
         Handles Abono (credit apoderado saldo), Pedido (create OrdenCasino records),
@@ -833,9 +870,11 @@ class PaymentAdminView(SecureModelView):
         if abono:
             from ..tasks import send_comprobante_abono, send_notificacion_admin_abono, send_copia_notificaciones_abono
 
-            saldo_actual = abono.apoderado.saldo_cuenta or 0
-            nuevo_saldo = saldo_actual + int(abono.monto)
-            abono.apoderado.saldo_cuenta = nuevo_saldo
+            movimiento = saldo_ledger.acreditar(
+                abono.apoderado, int(abono.monto), TipoMovimientoSaldo.ABONO, abono=abono
+            )
+            nuevo_saldo = movimiento.saldo_resultante
+            saldo_actual = nuevo_saldo - movimiento.monto
             # Populate payment_object with to_dict (avoiding recursive loop)
             # plus saldo snapshot before/after credit
             obj = pago.to_dict()
@@ -911,7 +950,7 @@ class PaymentAdminView(SecureModelView):
 
     @action("sync", "Sync from Provider", "¿Sincronizar los pagos seleccionados con el proveedor?")
     def action_sync(self, ids: list) -> None:
-        """Fetch live payment status from the provider.
+        """Fetch live payment status from each payment's provider.
 
         When a payment transitions to 'succeeded', post-payment business logic is
         triggered automatically (OrdenCasino creation, saldo credit, emails).
@@ -921,32 +960,16 @@ class PaymentAdminView(SecureModelView):
             return
 
         try:
-            synced = 0
-            failed = 0
-            processed = 0
-            for pk in ids:
-                record = self.get_one(pk)
-                if record is None:
-                    continue
-                old_state = record.state
-                try:
-                    status = self._ext.client.payments.get(record.transaction_id)
-                    new_state = status.state.value
-                    record.state = new_state
-                    self.session.commit()
-                    synced += 1
-                    # Trigger post-payment logic when payment just completed
-                    if new_state == "succeeded" and old_state in ("pending", "processing"):
-                        self._post_payment_processing(record)
-                        processed += 1
-                except Exception as exc:  # noqa: BLE001
-                    from flask_merchants import merchants_audit
-                    merchants_audit.warning(
-                        "sync_action_error: merchants_id=%r error=%s",
-                        getattr(record, "merchants_id", pk),
-                        exc,
-                    )
-                    failed += 1
+            records = [r for r in (self.get_one(pk) for pk in ids) if r is not None]
+            # Statuses are fetched concurrently from each payment's own
+            # provider; the sync handler registered in core.py runs the
+            # post-payment processing for payments that became 'succeeded'.
+            results = self._ext.sync_payments(records)
+            synced = sum(1 for r in results if r.error is None)
+            failed = len(results) - synced
+            processed = sum(
+                1 for r in results if r.changed and r.new_state == "succeeded" and r.old_state in ("pending", "processing")
+            )
             msg = f"{synced} pago(s) sincronizado(s) con el proveedor."
             if processed:
                 msg += f" {processed} pago(s) procesado(s) como completados."
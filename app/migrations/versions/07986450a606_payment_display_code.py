@@ -0,0 +1,61 @@
+"""merchants_payment.display_code indexed column
+
+Revision ID: 07986450a606
+Revises: bd6618382c0a
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "07986450a606"
+down_revision = "bd6618382c0a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("merchants_payment", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("display_code", sa.String(length=16), nullable=True))
+
+    # Backfill from the JSON payloads.  Codes were drawn with random.choices
+    # and never checked, so a repeated code keeps only its oldest payment.
+    payment = sa.table(
+        "merchants_payment",
+        sa.column("id", sa.Integer),
+        sa.column("display_code", sa.String),
+        sa.column("response_payload", sa.JSON),
+        sa.column("metadata_json", sa.JSON),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(payment.c.id, payment.c.response_payload, payment.c.metadata_json).order_by(payment.c.id)
+    ).all()
+    vistos = set()
+    updates = []
+    for row in rows:
+        code = (row.response_payload or {}).get("display_code") or (row.metadata_json or {}).get("display_code")
+        if not code:
+            continue
+        code = str(code).upper()
+        if code in vistos:
+            continue
+        vistos.add(code)
+        updates.append({"b_id": row.id, "b_code": code})
+    if updates:
+        bind.execute(
+            payment.update().where(payment.c.id == sa.bindparam("b_id")).values(display_code=sa.bindparam("b_code")),
+            updates,
+        )
+
+    with op.batch_alter_table("merchants_payment", schema=None) as batch_op:
+        batch_op.create_unique_constraint(batch_op.f("uq_merchants_payment_display_code"), ["display_code"])
+
+
+def downgrade():
+    with op.batch_alter_table("merchants_payment", schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f("uq_merchants_payment_display_code"), type_="unique")
+        batch_op.drop_column("display_code")
@@ -0,0 +1,62 @@
+"""merchants webhook inbox
+
+Revision ID: 1ad438823b2e
+Revises: ec45d16a1541
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "1ad438823b2e"
+down_revision = "ec45d16a1541"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "merchants_webhook_inbox",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("provider", sa.String(length=64), nullable=False),
+        sa.Column("dedup_key", sa.String(length=255), nullable=False),
+        sa.Column("event_id", sa.String(length=255), nullable=True),
+        sa.Column("event_type", sa.String(length=128), nullable=True),
+        sa.Column("payment_id", sa.String(length=128), nullable=True),
+        sa.Column("state", sa.String(length=32), nullable=True),
+        sa.Column("event", sa.JSON(), server_default=sa.text("'{}'"), nullable=False),
+        sa.Column("headers", sa.JSON(), server_default=sa.text("'{}'"), nullable=False),
+        sa.Column("body", sa.Text(), nullable=False),
+        sa.Column("status", sa.String(length=16), server_default="received", nullable=False),
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("handlers_done", sa.JSON(), server_default=sa.text("'[]'"), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("processed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=sa.text("(CURRENT_TIMESTAMP)"), nullable=False
+        ),
+        sa.Column(
+            "updated_at", sa.DateTime(timezone=True), server_default=sa.text("(CURRENT_TIMESTAMP)"), nullable=False
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_merchants_webhook_inbox")),
+        sa.UniqueConstraint("dedup_key", name=op.f("uq_merchants_webhook_inbox_dedup_key")),
+    )
+    with op.batch_alter_table("merchants_webhook_inbox", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_merchants_webhook_inbox_next_attempt_at"), ["next_attempt_at"], unique=False)
+        batch_op.create_index(batch_op.f("ix_merchants_webhook_inbox_payment_id"), ["payment_id"], unique=False)
+        batch_op.create_index(batch_op.f("ix_merchants_webhook_inbox_provider"), ["provider"], unique=False)
+        batch_op.create_index(batch_op.f("ix_merchants_webhook_inbox_status"), ["status"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("merchants_webhook_inbox", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_merchants_webhook_inbox_status"))
+        batch_op.drop_index(batch_op.f("ix_merchants_webhook_inbox_provider"))
+        batch_op.drop_index(batch_op.f("ix_merchants_webhook_inbox_payment_id"))
+        batch_op.drop_index(batch_op.f("ix_merchants_webhook_inbox_next_attempt_at"))
+
+    op.drop_table("merchants_webhook_inbox")
@@ -0,0 +1,28 @@
+"""merchants_payment (created_at, id) index
+
+Revision ID: 6655f11135c9
+Revises: 1ad438823b2e
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "6655f11135c9"
+down_revision = "1ad438823b2e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Serves the keyset pages of FlaskMerchants.iter_sessions() without a
+    # full scan and sort of the payments table.
+    with op.batch_alter_table("merchants_payment", schema=None) as batch_op:
+        batch_op.create_index("ix_merchants_payment_created_id", ["created_at", "id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("merchants_payment", schema=None) as batch_op:
+        batch_op.drop_index("ix_merchants_payment_created_id")
@@ -0,0 +1,95 @@
+"""casino_movimiento_saldo ledger
+
+Revision ID: 890c61a9f45b
+Revises: 07986450a606
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "890c61a9f45b"
+down_revision = "07986450a606"
+branch_labels = None
+depends_on = None
+
+tipo_movimiento = sa.Enum("APERTURA", "ABONO", "CANJE", "PAGO_PEDIDO", name="tipomovimientosaldo")
+
+
+def upgrade():
+    movimiento = op.create_table(
+        "casino_movimiento_saldo",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("apoderado_id", sa.Integer(), nullable=False),
+        sa.Column("tipo", tipo_movimiento, nullable=False),
+        sa.Column("monto", sa.Integer(), nullable=False),
+        sa.Column("saldo_resultante", sa.Integer(), nullable=False),
+        sa.Column("descripcion", sa.String(length=255), nullable=True),
+        sa.Column("abono_id", sa.Integer(), nullable=True),
+        sa.Column("pedido_id", sa.Integer(), nullable=True),
+        sa.Column("orden_id", sa.Integer(), nullable=True),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("updated", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["apoderado_id"],
+            ["casino_apoderado.id"],
+            name=op.f("fk_casino_movimiento_saldo_apoderado_id_casino_apoderado"),
+        ),
+        sa.ForeignKeyConstraint(
+            ["abono_id"],
+            ["casino_abono.id"],
+            name=op.f("fk_casino_movimiento_saldo_abono_id_casino_abono"),
+            ondelete="SET NULL",
+        ),
+        sa.ForeignKeyConstraint(
+            ["pedido_id"],
+            ["casino_pedido.id"],
+            name=op.f("fk_casino_movimiento_saldo_pedido_id_casino_pedido"),
+            ondelete="SET NULL",
+        ),
+        sa.ForeignKeyConstraint(
+            ["orden_id"],
+            ["casino_orden_casino.id"],
+            name=op.f("fk_casino_movimiento_saldo_orden_id_casino_orden_casino"),
+            ondelete="SET NULL",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_casino_movimiento_saldo")),
+    )
+    with op.batch_alter_table("casino_movimiento_saldo", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_casino_movimiento_saldo_apoderado_id"), ["apoderado_id"], unique=False)
+
+    # Opening entry per account so the ledger sums to the current balance.
+    apoderado = sa.table("casino_apoderado", sa.column("id", sa.Integer), sa.column("saldo_cuenta", sa.Integer))
+    saldos = op.get_bind().execute(
+        sa.select(apoderado.c.id, apoderado.c.saldo_cuenta).where(apoderado.c.saldo_cuenta != 0)
+    ).all()
+    ahora = datetime.now()
+    if saldos:
+        op.bulk_insert(
+            movimiento,
+            [
+                {
+                    "apoderado_id": apoderado_id,
+                    "tipo": "APERTURA",
+                    "monto": saldo,
+                    "saldo_resultante": saldo,
+                    "descripcion": "Saldo previo al libro de movimientos",
+                    "created": ahora,
+                    "updated": ahora,
+                }
+                for apoderado_id, saldo in saldos
+            ],
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("casino_movimiento_saldo", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_casino_movimiento_saldo_apoderado_id"))
+
+    op.drop_table("casino_movimiento_saldo")
+    tipo_movimiento.drop(op.get_bind(), checkfirst=True)
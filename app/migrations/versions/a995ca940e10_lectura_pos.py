@@ -0,0 +1,54 @@
+"""casino_lectura_pos scan journal
+
+Revision ID: a995ca940e10
+Revises: 5bfc4fdbefb4
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a995ca940e10"
+down_revision = "5bfc4fdbefb4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "casino_lectura_pos",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("scan_id", sa.String(length=64), nullable=False),
+        sa.Column("lector", sa.String(length=64), nullable=True),
+        sa.Column("serial", sa.String(length=255), nullable=True),
+        sa.Column("alumno_id", sa.Integer(), nullable=True),
+        sa.Column("orden_id", sa.Integer(), nullable=True),
+        sa.Column("resultado", sa.String(length=32), nullable=False),
+        sa.Column("fecha_lectura", sa.DateTime(), nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("updated", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["alumno_id"],
+            ["alumno.id"],
+            name=op.f("fk_casino_lectura_pos_alumno_id_alumno"),
+        ),
+        sa.ForeignKeyConstraint(
+            ["orden_id"],
+            ["casino_orden_casino.id"],
+            name=op.f("fk_casino_lectura_pos_orden_id_casino_orden_casino"),
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_casino_lectura_pos")),
+        sa.UniqueConstraint("scan_id", name=op.f("uq_casino_lectura_pos_scan_id")),
+    )
+    with op.batch_alter_table("casino_lectura_pos", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_casino_lectura_pos_alumno_id"), ["alumno_id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("casino_lectura_pos", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_casino_lectura_pos_alumno_id"))
+
+    op.drop_table("casino_lectura_pos")
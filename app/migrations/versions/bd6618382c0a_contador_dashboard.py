@@ -0,0 +1,33 @@
+"""store_contador_dashboard incremental dashboard counters
+
+Revision ID: bd6618382c0a
+Revises: a995ca940e10
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "bd6618382c0a"
+down_revision = "a995ca940e10"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "store_contador_dashboard",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("clave", sa.String(length=64), nullable=False),
+        sa.Column("valor", sa.Integer(), nullable=False),
+        sa.Column("recontado", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_store_contador_dashboard")),
+        sa.UniqueConstraint("clave", name=op.f("uq_store_contador_dashboard_clave")),
+    )
+
+
+def downgrade():
+    op.drop_table("store_contador_dashboard")
@@ -0,0 +1,81 @@
+"""menu stock reservations and fragments
+
+Revision ID: ec45d16a1541
+Revises: 890c61a9f45b
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "ec45d16a1541"
+down_revision = "890c61a9f45b"
+branch_labels = None
+depends_on = None
+
+estado_reserva = sa.Enum("RESERVADA", "CONFIRMADA", "LIBERADA", name="estadoreserva")
+
+
+def upgrade():
+    with op.batch_alter_table("casino_menu_dia", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("stock_fragmentos", sa.Integer(), server_default="0", nullable=False))
+
+    op.create_table(
+        "casino_menu_stock_fragmento",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("menu_id", sa.Integer(), nullable=False),
+        sa.Column("fragmento", sa.Integer(), nullable=False),
+        sa.Column("disponible", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["menu_id"],
+            ["casino_menu_dia.id"],
+            name=op.f("fk_casino_menu_stock_fragmento_menu_id_casino_menu_dia"),
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_casino_menu_stock_fragmento")),
+        sa.UniqueConstraint("menu_id", "fragmento", name=op.f("uq_casino_menu_stock_fragmento_menu_id")),
+    )
+
+    op.create_table(
+        "casino_reserva_stock",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("menu_id", sa.Integer(), nullable=False),
+        sa.Column("pedido_id", sa.Integer(), nullable=True),
+        sa.Column("cantidad", sa.Integer(), nullable=False),
+        sa.Column("fragmento", sa.Integer(), nullable=True),
+        sa.Column("estado", estado_reserva, nullable=False),
+        sa.Column("created", sa.DateTime(), nullable=False),
+        sa.Column("updated", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["menu_id"],
+            ["casino_menu_dia.id"],
+            name=op.f("fk_casino_reserva_stock_menu_id_casino_menu_dia"),
+            ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["pedido_id"],
+            ["casino_pedido.id"],
+            name=op.f("fk_casino_reserva_stock_pedido_id_casino_pedido"),
+            ondelete="SET NULL",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_casino_reserva_stock")),
+    )
+    with op.batch_alter_table("casino_reserva_stock", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_casino_reserva_stock_estado"), ["estado"], unique=False)
+        batch_op.create_index(batch_op.f("ix_casino_reserva_stock_pedido_id"), ["pedido_id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("casino_reserva_stock", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_casino_reserva_stock_pedido_id"))
+        batch_op.drop_index(batch_op.f("ix_casino_reserva_stock_estado"))
+
+    op.drop_table("casino_reserva_stock")
+    op.drop_table("casino_menu_stock_fragmento")
+    estado_reserva.drop(op.get_bind(), checkfirst=True)
+
+    with op.batch_alter_table("casino_menu_dia", schema=None) as batch_op:
+        batch_op.drop_column("stock_fragmentos")
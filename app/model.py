@@ -6,13 +6,14 @@ from typing import Any, Optional
 from flask_security.models import fsqla_v3 as fsqla
 from sqlalchemy import JSON
 from sqlalchemy import Date as SaDate
-from sqlalchemy import Enum, ForeignKey, Numeric, String, text
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import Enum, ForeignKey, Index, Numeric, String, UniqueConstraint, text
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 from sqlalchemy_utils.models import Timestamp
 
 import uuid
 from enum import Enum as PyEnum
 
+from flask_merchants.inbox import WebhookInboxMixin
 from flask_merchants.models import PaymentMixin
 
 from .database import db
@@ -56,10 +57,17 @@ class User(db.Model, fsqla.FsUserMixin):
 
 class Payment(db.Model, PaymentMixin):
     __tablename__ = "merchants_payment"
+    # Keyset pagination of FlaskMerchants.iter_sessions() (exports, reports).
+    __table_args__ = (Index("ix_merchants_payment_created_id", "created_at", "id"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     metadata_json: Mapped[dict] = mapped_column(JSON, default=dict, server_default=text("'{}'"))
 
+    # Short code shown to the apoderado and typed by the cashier (cafetería
+    # payments).  Copied from the provider response so the POS can look it up
+    # through the unique index instead of scanning JSON payloads.
+    display_code: Mapped[str | None] = mapped_column(String(16), nullable=True, unique=True)
+
     pedido: Mapped["Pedido | None"] = relationship(
         "Pedido",
         primaryjoin="Payment.merchants_id == foreign(Pedido.codigo_merchants)",
@@ -76,10 +84,32 @@ class Payment(db.Model, PaymentMixin):
         viewonly=True,
     )
 
+    @validates("response_payload")
+    def _copy_display_code(self, key, value):
+        code = (value or {}).get("display_code")
+        if code and not self.display_code:
+            self.display_code = str(code).upper()
+        return value
+
+    @classmethod
+    def display_code_exists(cls, code: str) -> bool:
+        """Return True when *code* is already assigned to a payment."""
+        return db.session.execute(
+            db.select(cls.id).filter_by(display_code=code.upper()).limit(1)
+        ).first() is not None
+
     def __str__(self):
         return f"{self.id}"
 
 
+class WebhookEntry(db.Model, WebhookInboxMixin):
+    """Webhook delivery stored by the flask_merchants inbox before processing."""
+
+    __tablename__ = "merchants_webhook_inbox"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+
 # Casino
 class Abono(db.Model, Timestamp):
     __tablename__ = "casino_abono"
@@ -271,6 +301,7 @@ class MenuDiario(db.Model, Timestamp):
     activo: Mapped[bool] = mapped_column(default=True)
     stock: Mapped[int] = mapped_column(default=1, server_default="1")
     fuera_stock: Mapped[bool] = mapped_column(default=False, nullable=True)
+    stock_fragmentos: Mapped[int] = mapped_column(default=0, server_default="0")
 
     @property
     def entradas(self) -> list["Plato"]:
@@ -398,3 +429,132 @@ class OrdenCasino(db.Model, Timestamp):
 
     def __str__(self):
         return f"OrdenCasino {self.id} - {self.alumno_id} - {self.fecha} - {self.estado.value}"
+
+
+class LecturaPos(db.Model, Timestamp):
+    """Lectura (tap) de un lector POS sincronizada desde su diario local.
+
+    ``scan_id`` lo genera el lector; se guarda una sola vez para que reenviar
+    un lote devuelva el mismo resultado sin volver a entregar ni cobrar.
+    """
+
+    __tablename__ = "casino_lectura_pos"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    scan_id: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)
+    lector: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    serial: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+    alumno_id: Mapped[int | None] = mapped_column(ForeignKey("alumno.id"), nullable=True, index=True)
+    orden_id: Mapped[int | None] = mapped_column(ForeignKey("casino_orden_casino.id"), nullable=True)
+
+    resultado: Mapped[str] = mapped_column(String(32), nullable=False)
+    fecha_lectura: Mapped[datetime] = mapped_column(nullable=False)
+
+    def __str__(self):
+        return f"{self.scan_id} - {self.resultado}"
+
+
+class TipoMovimientoSaldo(PyEnum):
+    APERTURA = "apertura"
+    ABONO = "abono"
+    CANJE = "canje"
+    PAGO_PEDIDO = "pago-pedido"
+
+
+class MovimientoSaldo(db.Model, Timestamp):
+    """Movimiento del libro de saldo de un apoderado (solo se agregan filas).
+
+    ``monto`` es positivo para abonos y negativo para cargos; ``saldo_resultante``
+    es ``Apoderado.saldo_cuenta`` inmediatamente después del movimiento.
+    """
+
+    __tablename__ = "casino_movimiento_saldo"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    apoderado_id: Mapped[int] = mapped_column(ForeignKey("casino_apoderado.id"), index=True)
+    apoderado: Mapped["Apoderado"] = relationship()
+
+    tipo: Mapped[TipoMovimientoSaldo] = mapped_column(Enum(TipoMovimientoSaldo), nullable=False)
+    monto: Mapped[int] = mapped_column(nullable=False)
+    saldo_resultante: Mapped[int] = mapped_column(nullable=False)
+    descripcion: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+    abono_id: Mapped[int | None] = mapped_column(ForeignKey("casino_abono.id", ondelete="SET NULL"), nullable=True)
+    abono: Mapped["Abono | None"] = relationship()
+    pedido_id: Mapped[int | None] = mapped_column(ForeignKey("casino_pedido.id", ondelete="SET NULL"), nullable=True)
+    pedido: Mapped["Pedido | None"] = relationship()
+    orden_id: Mapped[int | None] = mapped_column(
+        ForeignKey("casino_orden_casino.id", ondelete="SET NULL"), nullable=True
+    )
+    orden: Mapped["OrdenCasino | None"] = relationship()
+
+    def __str__(self):
+        return f"{self.apoderado_id} - {self.tipo.value} {self.monto:+d} = {self.saldo_resultante}"
+
+
+class MenuStockFragmento(db.Model):
+    """Fragmento del stock de un menú muy demandado.
+
+    Con ``MenuDiario.stock_fragmentos > 0`` el stock disponible se reparte
+    en varias filas para que reservas simultáneas no compitan por la misma.
+    """
+
+    __tablename__ = "casino_menu_stock_fragmento"
+    __table_args__ = (UniqueConstraint("menu_id", "fragmento"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    menu_id: Mapped[int] = mapped_column(ForeignKey("casino_menu_dia.id", ondelete="CASCADE"))
+    fragmento: Mapped[int] = mapped_column(nullable=False)
+    disponible: Mapped[int] = mapped_column(default=0, nullable=False)
+
+
+class EstadoReserva(PyEnum):
+    RESERVADA = "reservada"
+    CONFIRMADA = "confirmada"
+    LIBERADA = "liberada"
+
+
+class ReservaStock(db.Model, Timestamp):
+    """Unidades de un menú apartadas para un pedido.
+
+    ``fragmento`` indica de qué fragmento se descontó (``None`` si se
+    descontó de ``MenuDiario.stock``) para devolverlas al mismo lugar.
+    """
+
+    __tablename__ = "casino_reserva_stock"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    menu_id: Mapped[int] = mapped_column(ForeignKey("casino_menu_dia.id", ondelete="CASCADE"))
+    menu: Mapped["MenuDiario"] = relationship()
+    pedido_id: Mapped[int | None] = mapped_column(
+        ForeignKey("casino_pedido.id", ondelete="SET NULL"), nullable=True, index=True
+    )
+    pedido: Mapped["Pedido | None"] = relationship()
+    cantidad: Mapped[int] = mapped_column(nullable=False)
+    fragmento: Mapped[int | None] = mapped_column(nullable=True)
+    estado: Mapped[EstadoReserva] = mapped_column(
+        Enum(EstadoReserva), default=EstadoReserva.RESERVADA, nullable=False, index=True
+    )
+
+    def __str__(self):
+        return f"{self.menu_id} x{self.cantidad} ({self.estado.value})"
+
+
+class ContadorDashboard(db.Model):
+    """Contador mantenido incrementalmente para los dashboards.
+
+    ``clave`` identifica la métrica (las diarias llevan la fecha, p.ej.
+    ``casino.pendientes:2025-03-10``).  ``recontado`` es el último recuento
+    completo; ``None`` obliga a recontar en la próxima lectura.
+    """
+
+    __tablename__ = "store_contador_dashboard"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    clave: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)
+    valor: Mapped[int] = mapped_column(default=0, nullable=False)
+    recontado: Mapped[datetime | None] = mapped_column(nullable=True)
+
+    def __str__(self):
+        return f"{self.clave} = {self.valor}"
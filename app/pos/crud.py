@@ -10,11 +10,86 @@ testable.
 from datetime import date, datetime
 from typing import Optional
 
+from sqlalchemy import and_, bindparam, or_
+from sqlalchemy.orm import aliased, contains_eager, joinedload
+
+from ..counters import clave_casino, dashboard_counters
 from ..database import db
-from ..model import Abono, Alumno, EstadoAlmuerzo, EstadoPedido, MenuDiario, OrdenCasino, Payment, Pedido
+from .. import saldo as saldo_ledger
+from .. import stock
+from ..model import (
+    Abono,
+    Alumno,
+    Apoderado,
+    EstadoAlmuerzo,
+    EstadoPedido,
+    MenuDiario,
+    OpcionMenuDia,
+    OrdenCasino,
+    Payment,
+    Pedido,
+    TipoMovimientoSaldo,
+)
+from .feed import delivery_feed
+
+
+def _build_scan_plan_query(criterion):
+    """Return the pre-built canteen scan statement filtered by *criterion*.
+
+    One SELECT resolves the alumno, its apoderado (for the saldo), today's
+    PENDIENTE OrdenCasino, the MenuDiario it points to with its
+    ``opciones`` -> ``plato`` courses eagerly joined, and an EXISTS flag for
+    an ENTREGADO order.  ``fecha`` is a bind parameter so the compiled
+    statement is reused across scans.
+    """
+    pendiente = aliased(OrdenCasino)
+    entregado = (
+        db.select(OrdenCasino.id)
+        .where(
+            OrdenCasino.alumno_id == Alumno.id,
+            OrdenCasino.fecha == bindparam("fecha"),
+            OrdenCasino.estado == EstadoAlmuerzo.ENTREGADO,
+        )
+        .exists()
+        .label("ya_entregado")
+    )
+    return (
+        db.select(Alumno, pendiente, MenuDiario, entregado)
+        .join(Alumno.apoderado)
+        .outerjoin(
+            pendiente,
+            and_(
+                pendiente.alumno_id == Alumno.id,
+                pendiente.fecha == bindparam("fecha"),
+                pendiente.estado == EstadoAlmuerzo.PENDIENTE,
+            ),
+        )
+        .outerjoin(MenuDiario, MenuDiario.slug == pendiente.menu_slug)
+        .options(
+            contains_eager(Alumno.apoderado),
+            joinedload(MenuDiario.opciones).joinedload(OpcionMenuDia.plato),
+        )
+        .where(criterion)
+    )
+
+
+_SCAN_PLAN_BY_TAG = _build_scan_plan_query(Alumno.tag == bindparam("tag"))
+_SCAN_PLAN_BY_ID = _build_scan_plan_query(Alumno.id == bindparam("alumno_id"))
 
 
 class PosController:
+    def __init__(self, roster=None) -> None:
+        """*roster* is an optional :class:`~app.pos.roster.ServiceRoster`.
+
+        When given, the canteen lookups (:meth:`get_alumno_con_orden`,
+        :meth:`get_alumno_con_orden_by_id`, :meth:`get_scan_plan`,
+        :meth:`get_scan_plan_by_id` and
+        :meth:`get_alumnos_con_almuerzo_pendiente`) answer from its warm
+        snapshot and return read-only ``RosterAlumno``/``RosterOrden``
+        objects instead of ORM rows.
+        """
+        self.roster = roster
+
     # ------------------------------------------------------------------
     # Read helpers
     # ------------------------------------------------------------------
@@ -43,6 +118,10 @@ class PosController:
         """Return active Alumno records that have a PENDIENTE OrdenCasino for *fecha* (default: today)."""
         if fecha is None:
             fecha = date.today()
+        if self.roster is not None:
+            pendientes = self.roster.get_pendientes(fecha)
+            if pendientes is not None:
+                return pendientes
         return (
             db.session.execute(
                 db.select(Alumno)
@@ -74,6 +153,10 @@ class PosController:
         """
         if fecha is None:
             fecha = date.today()
+        if self.roster is not None:
+            cached = self.roster.get_by_tag(serial, fecha)
+            if cached is not None:
+                return cached
         alumno = self.get_alumno_by_tag(serial)
         orden = None
         ya_entregado = False
@@ -109,26 +192,33 @@ class PosController:
             .all()
         )
 
-    def get_menus_hoy(self) -> list[MenuDiario]:
-        """Return today's active MenuDiario entries available for sale."""
+    def get_menus_hoy(self, precio_max: Optional[int] = None) -> list[MenuDiario]:
+        """Return today's active MenuDiario entries available for sale.
+
+        When *precio_max* is given only priced menus costing at most that
+        amount are returned (used to list menus redeemable with credit).
+        """
         today = date.today()
         from sqlalchemy import or_
-        return (
-            db.session.execute(
-                db.select(MenuDiario)
-                .where(
-                    MenuDiario.activo == True,  # noqa: E712
-                    MenuDiario.fuera_stock == False,  # noqa: E712
-                    or_(MenuDiario.dia == today, MenuDiario.es_permanente == True),  # noqa: E712
-                )
-                .order_by(MenuDiario.dia)
-            )
-            .scalars()
-            .all()
+        stmt = db.select(MenuDiario).where(
+            MenuDiario.activo == True,  # noqa: E712
+            MenuDiario.fuera_stock == False,  # noqa: E712
+            or_(MenuDiario.dia == today, MenuDiario.es_permanente == True),  # noqa: E712
         )
+        if precio_max is not None:
+            stmt = stmt.where(MenuDiario.precio > 0, MenuDiario.precio <= precio_max)
+        return db.session.execute(stmt.order_by(MenuDiario.dia)).scalars().all()
 
     def buscar_alumnos(self, query: str) -> list[Alumno]:
-        """Search active alumnos by name or course (case-insensitive prefix match)."""
+        """Search active alumnos by name or course (case-insensitive prefix match).
+
+        Served from the roster's accent-insensitive search index when one is
+        attached; the SQL fallback is a plain ``LIKE`` and does not fold accents.
+        """
+        if self.roster is not None:
+            cached = self.roster.buscar(query)
+            if cached is not None:
+                return cached
         q = f"%{query.lower()}%"
         from sqlalchemy import func, or_
         return (
@@ -155,6 +245,10 @@ class PosController:
         """
         if fecha is None:
             fecha = date.today()
+        if self.roster is not None:
+            cached = self.roster.get_by_id(alumno_id, fecha)
+            if cached is not None:
+                return cached
         alumno = db.session.get(Alumno, alumno_id)
         if alumno is None:
             return {"alumno": None, "orden": None, "ya_entregado": False}
@@ -174,11 +268,98 @@ class PosController:
         ).scalar_one_or_none() is not None
         return {"alumno": alumno, "orden": orden, "ya_entregado": ya_entregado}
 
+    def get_scan_plan(self, serial: str, fecha: Optional[date] = None) -> dict:
+        """Resolve everything the canteen reader needs for one tap of *serial*.
+
+        The alumno, apoderado saldo, pending order, its menu courses and the
+        delivered flag come from a single joined SELECT.  A second query for
+        redeemable menus is only issued when the alumno has no order for
+        *fecha* and a positive saldo.
+
+        Returns a dict with keys:
+        - ``alumno``: the Alumno ORM object or ``None`` when tag not found
+        - ``orden``: pending OrdenCasino for *fecha* (defaults to today), or ``None``
+        - ``ya_entregado``: True if the alumno already received a lunch today
+        - ``courses``: ``{"entradas": [...], "fondos": [...], "postres": [...]}``
+          plato names for the pending order's menu (empty when unavailable)
+        - ``saldo``: the apoderado's ``saldo_cuenta`` (``0`` when unset)
+        - ``menus_disponibles``: MenuDiario entries payable with ``saldo``
+
+        With a roster attached, alumno, order, courses and the delivered flag
+        come from its snapshot and only the saldo is read from the database.
+        """
+        if fecha is None:
+            fecha = date.today()
+        if self.roster is not None:
+            cached = self.roster.get_by_tag(serial, fecha)
+            if cached is not None:
+                return self._scan_plan_from_roster(cached)
+        return self._resolve_scan_plan(_SCAN_PLAN_BY_TAG, {"tag": serial.lower()}, fecha)
+
+    def get_scan_plan_by_id(self, alumno_id: int, fecha: Optional[date] = None) -> dict:
+        """Same as :meth:`get_scan_plan` but looks up by alumno primary key."""
+        if fecha is None:
+            fecha = date.today()
+        if self.roster is not None:
+            cached = self.roster.get_by_id(alumno_id, fecha)
+            if cached is not None:
+                return self._scan_plan_from_roster(cached)
+        return self._resolve_scan_plan(_SCAN_PLAN_BY_ID, {"alumno_id": alumno_id}, fecha)
+
+    def _scan_plan_from_roster(self, cached: dict) -> dict:
+        alumno, orden, ya_entregado = cached["alumno"], cached["orden"], cached["ya_entregado"]
+        saldo = db.session.execute(
+            db.select(Apoderado.saldo_cuenta).where(Apoderado.id == alumno.apoderado_id)
+        ).scalar_one_or_none() or 0
+        menus_disponibles = []
+        if orden is None and not ya_entregado and saldo > 0:
+            menus_disponibles = self.get_menus_hoy(precio_max=saldo)
+        return {
+            "alumno": alumno,
+            "orden": orden,
+            "ya_entregado": ya_entregado,
+            "courses": orden.courses if orden is not None else {},
+            "saldo": saldo,
+            "menus_disponibles": menus_disponibles,
+        }
+
+    def _resolve_scan_plan(self, stmt, params: dict, fecha: Optional[date]) -> dict:
+        row = db.session.execute(stmt, {**params, "fecha": fecha}).unique().first()
+        if row is None:
+            return {
+                "alumno": None,
+                "orden": None,
+                "ya_entregado": False,
+                "courses": {},
+                "saldo": 0,
+                "menus_disponibles": [],
+            }
+        alumno, orden, menu, ya_entregado = row
+        courses = {}
+        if menu is not None:
+            courses = {
+                "entradas": [p.nombre for p in menu.entradas],
+                "fondos": [p.nombre for p in menu.fondos],
+                "postres": [p.nombre for p in menu.postres],
+            }
+        saldo = alumno.apoderado.saldo_cuenta or 0
+        menus_disponibles = []
+        if orden is None and not ya_entregado and saldo > 0:
+            menus_disponibles = self.get_menus_hoy(precio_max=saldo)
+        return {
+            "alumno": alumno,
+            "orden": orden,
+            "ya_entregado": bool(ya_entregado),
+            "courses": courses,
+            "saldo": saldo,
+            "menus_disponibles": menus_disponibles,
+        }
+
     def get_abono_by_codigo(self, codigo: str) -> tuple:
         """Return ``(Abono, Payment, display_code)`` for *codigo*.
 
         The lookup first tries an exact match on ``Abono.codigo``, then
-        falls back to matching ``Payment.metadata_json['display_code']``.
+        falls back to the indexed ``Payment.display_code`` column.
         Returns ``(None, None, "")`` when nothing is found.
         """
         abono = db.session.execute(
@@ -187,17 +368,13 @@ class PosController:
         pago: Optional[Payment] = None
 
         if not abono:
-            pagos = db.session.execute(
-                db.select(Payment).where(Payment.response_payload.isnot(None))
-            ).scalars().all()
-            for p in pagos:
-                dc = (p.response_payload or {}).get("display_code") or (p.metadata_json or {}).get("display_code", "")
-                if dc.upper() == codigo.upper():
-                    pago = p
-                    abono = db.session.execute(
-                        db.select(Abono).filter_by(codigo=p.merchants_id)
-                    ).scalar_one_or_none()
-                    break
+            pago = db.session.execute(
+                db.select(Payment).filter_by(display_code=codigo.upper())
+            ).scalar_one_or_none()
+            if pago is not None:
+                abono = db.session.execute(
+                    db.select(Abono).filter_by(codigo=pago.merchants_id)
+                ).scalar_one_or_none()
 
         if abono and pago is None:
             pago = db.session.execute(
@@ -246,6 +423,214 @@ class PosController:
         db.session.commit()
         return orden
 
+    def entregar_almuerzos(self, entregas: list[tuple[int, Optional[datetime]]]) -> list[dict]:
+        """Mark a batch of OrdenCasino as ENTREGADO in one conditional UPDATE.
+
+        *entregas* is a list of ``(orden_id, fecha_entrega)`` pairs as queued
+        by the reader; ``fecha_entrega`` is the client tap time (``None`` or a
+        time in the future falls back to now).  Only rows still PENDIENTE are
+        updated, so replaying a batch never delivers a lunch twice.
+
+        Returns one dict per input pair, in order, with keys ``orden_id`` and
+        ``resultado`` (``"entregado"``, ``"ya_entregado"``, ``"cancelado"`` or
+        ``"no_encontrado"``).  A repeated id is reported as ``"ya_entregado"``
+        after its first occurrence.
+        """
+        from sqlalchemy import case, update
+
+        now = datetime.now()
+        fechas: dict[int, datetime] = {}
+        for orden_id, fecha_entrega in entregas:
+            if orden_id not in fechas:
+                fechas[orden_id] = fecha_entrega if fecha_entrega and fecha_entrega <= now else now
+        if not fechas:
+            return []
+
+        stmt = (
+            update(OrdenCasino)
+            .where(
+                OrdenCasino.id.in_(fechas),
+                OrdenCasino.estado == EstadoAlmuerzo.PENDIENTE,
+            )
+            .values(
+                estado=EstadoAlmuerzo.ENTREGADO,
+                fecha_entrega=case(fechas, value=OrdenCasino.id),
+            )
+            .execution_options(synchronize_session="fetch", contadores_ajustados=True)
+        )
+        if db.engine.dialect.update_returning:
+            filas = db.session.execute(stmt.returning(OrdenCasino.id, OrdenCasino.fecha)).all()
+        else:
+            filas = db.session.execute(
+                db.select(OrdenCasino.id, OrdenCasino.fecha)
+                .where(OrdenCasino.id.in_(fechas), OrdenCasino.estado == EstadoAlmuerzo.PENDIENTE)
+                .with_for_update()
+            ).all()
+            db.session.execute(stmt)
+        entregados = {orden_id for orden_id, _ in filas}
+        deltas: dict[str, int] = {}
+        for _, fecha in filas:
+            for estado, delta in ((EstadoAlmuerzo.PENDIENTE, -1), (EstadoAlmuerzo.ENTREGADO, 1)):
+                clave = clave_casino(estado, fecha)
+                deltas[clave] = deltas.get(clave, 0) + delta
+        dashboard_counters.ajustar(deltas)
+        estados = dict(
+            db.session.execute(
+                db.select(OrdenCasino.id, OrdenCasino.estado).where(
+                    OrdenCasino.id.in_(set(fechas) - entregados)
+                )
+            ).all()
+        )
+        db.session.commit()
+        delivery_feed.publish_ordenes(entregados)
+
+        resultados = []
+        vistos: set[int] = set()
+        for orden_id, _ in entregas:
+            if orden_id in entregados and orden_id not in vistos:
+                resultado = "entregado"
+            elif orden_id in entregados or estados.get(orden_id) == EstadoAlmuerzo.ENTREGADO:
+                resultado = "ya_entregado"
+            elif orden_id in estados:
+                resultado = estados[orden_id].value
+            else:
+                resultado = "no_encontrado"
+            vistos.add(orden_id)
+            resultados.append({"orden_id": orden_id, "resultado": resultado})
+        return resultados
+
+    def sincronizar_lecturas(self, lecturas: list[dict], lector: Optional[str] = None) -> list[dict]:
+        """Reconcile a batch of journaled reader taps in one transaction.
+
+        Each item in *lecturas* is a dict with keys ``scan_id`` (client
+        generated, required), ``ts`` (client tap ``datetime`` or ``None``) and
+        one of ``orden_id``, ``serial`` or ``alumno_id``.  An optional
+        ``menu_slug`` asks for a credit redemption (see
+        :meth:`canjear_con_credito`) when the alumno has no order.
+
+        Every tap is stored as a :class:`~app.model.LecturaPos`; a ``scan_id``
+        already recorded returns its stored outcome untouched, so uploading
+        the same batch twice is harmless.
+
+        Returns one dict per item, in order, with keys ``scan_id``,
+        ``resultado`` (``"entregado"``, ``"canjeado"``, ``"ya_entregado"``,
+        ``"saldo_insuficiente"``, ``"sin_orden"``, ``"cancelado"`` or
+        ``"no_encontrado"``) and ``orden_id``.
+        """
+        from sqlalchemy.exc import IntegrityError
+
+        try:
+            return self._sincronizar_lecturas(lecturas, lector)
+        except IntegrityError:
+            # A concurrent upload of the same scan_ids won the race; retry
+            # so those taps are answered from the stored journal.
+            db.session.rollback()
+            return self._sincronizar_lecturas(lecturas, lector)
+
+    def _sincronizar_lecturas(self, lecturas: list[dict], lector: Optional[str]) -> list[dict]:
+        from ..model import LecturaPos
+
+        now = datetime.now()
+        scan_ids = {item["scan_id"] for item in lecturas}
+        registradas = {
+            lectura.scan_id: lectura
+            for lectura in db.session.execute(
+                db.select(LecturaPos).where(LecturaPos.scan_id.in_(scan_ids))
+            ).scalars()
+        }
+
+        # Preload everything the batch can touch with one query per table.
+        orden_ids = {item["orden_id"] for item in lecturas if item.get("orden_id")}
+        serials = {item["serial"].lower() for item in lecturas if item.get("serial")}
+        alumno_ids = {item["alumno_id"] for item in lecturas if item.get("alumno_id")}
+        alumnos = db.session.execute(
+            db.select(Alumno).where(or_(Alumno.tag.in_(serials), Alumno.id.in_(alumno_ids)))
+        ).scalars().all()
+        por_tag = {a.tag: a for a in alumnos if a.tag}
+        por_id = {a.id: a for a in alumnos}
+        fechas = {(item.get("ts") or now).date() for item in lecturas}
+        ordenes = db.session.execute(
+            db.select(OrdenCasino)
+            .where(
+                or_(
+                    OrdenCasino.id.in_(orden_ids),
+                    and_(OrdenCasino.alumno_id.in_(por_id), OrdenCasino.fecha.in_(fechas)),
+                )
+            )
+            .with_for_update()
+        ).scalars().all()
+        ordenes_por_id = {o.id: o for o in ordenes}
+        ordenes_por_alumno: dict[tuple[int, date], list[OrdenCasino]] = {}
+        for o in ordenes:
+            ordenes_por_alumno.setdefault((o.alumno_id, o.fecha), []).append(o)
+
+        resultados = []
+        for item in lecturas:
+            scan_id = item["scan_id"]
+            registrada = registradas.get(scan_id)
+            if registrada is not None:
+                resultados.append({"scan_id": scan_id, "resultado": registrada.resultado, "orden_id": registrada.orden_id})
+                continue
+
+            ts = item.get("ts") or now
+            ts = min(ts, now)
+            orden = ordenes_por_id.get(item.get("orden_id"))
+            if orden is not None:
+                alumno = orden.alumno
+            elif item.get("serial"):
+                alumno = por_tag.get(item["serial"].lower())
+            else:
+                alumno = por_id.get(item.get("alumno_id"))
+
+            if alumno is None:
+                resultado = "no_encontrado"
+            else:
+                del_dia = ordenes_por_alumno.get((alumno.id, ts.date()), [])
+                if orden is None:
+                    orden = next((o for o in del_dia if o.estado == EstadoAlmuerzo.PENDIENTE), None)
+                if orden is None:
+                    orden = next((o for o in del_dia if o.estado == EstadoAlmuerzo.ENTREGADO), None)
+
+                if orden is not None and orden.estado == EstadoAlmuerzo.PENDIENTE:
+                    orden.estado = EstadoAlmuerzo.ENTREGADO
+                    orden.fecha_entrega = ts
+                    resultado = "entregado"
+                elif orden is not None:
+                    resultado = "ya_entregado" if orden.estado == EstadoAlmuerzo.ENTREGADO else orden.estado.value
+                elif item.get("menu_slug"):
+                    menu = db.session.execute(
+                        db.select(MenuDiario).filter_by(slug=item["menu_slug"])
+                    ).scalar_one_or_none()
+                    orden = (
+                        self._canjear(alumno, menu, ts.date(), fecha_entrega=ts, exigir_stock=False)
+                        if menu
+                        else None
+                    )
+                    if orden is not None:
+                        db.session.flush()
+                        del_dia.append(orden)
+                        ordenes_por_alumno[(alumno.id, ts.date())] = del_dia
+                        resultado = "canjeado"
+                    else:
+                        resultado = "saldo_insuficiente"
+                else:
+                    resultado = "sin_orden"
+
+            lectura = LecturaPos()
+            lectura.scan_id = scan_id
+            lectura.lector = lector
+            lectura.serial = item.get("serial")
+            lectura.alumno_id = alumno.id if alumno else None
+            lectura.orden_id = orden.id if orden else None
+            lectura.resultado = resultado
+            lectura.fecha_lectura = ts
+            db.session.add(lectura)
+            registradas[scan_id] = lectura
+            resultados.append({"scan_id": scan_id, "resultado": resultado, "orden_id": lectura.orden_id})
+
+        db.session.commit()
+        return resultados
+
     def crear_orden_kiosko(self, alumno: Alumno, menu: MenuDiario, fecha: Optional[date] = None) -> OrdenCasino:
         """Create an OrdenCasino for a kiosk (cash) sale, immediately marked ENTREGADO.
 
@@ -254,10 +639,13 @@ class PosController:
         immediately marked as delivered so the child can join the queue.
 
         A Pedido record is created first so that ``pedido_codigo`` always
-        references a real Pedido (required by the data model).
+        references a real Pedido (required by the data model).  Raises
+        :class:`app.stock.SinStock` when stock control is enabled and the
+        menu has run out.
         """
         if fecha is None:
             fecha = date.today()
+        reserva = stock.consumir(menu)
 
         # Create the backing Pedido so pedido_codigo is a real order reference
         pedido = Pedido()
@@ -268,6 +656,8 @@ class PosController:
         pedido.fecha_pago = datetime.now()
         db.session.add(pedido)
         db.session.flush()  # obtain pedido.codigo without committing yet
+        if reserva is not None:
+            reserva.pedido = pedido
 
         orden = OrdenCasino()
         orden.pedido_codigo = pedido.codigo
@@ -290,38 +680,17 @@ class PosController:
         - ``ordenes_entregadas_hoy``: OrdenCasino count with ENTREGADO estado for today
         - ``total_alumnos``: total active Alumno count
         - ``alumnos_con_tag``: active Alumno count that have a tag assigned
-        """
-        from sqlalchemy import func
 
-        today = date.today()
-        ordenes_pendientes = db.session.execute(
-            db.select(func.count()).select_from(OrdenCasino).where(
-                OrdenCasino.fecha == today,
-                OrdenCasino.estado == EstadoAlmuerzo.PENDIENTE,
-            )
-        ).scalar() or 0
-
-        ordenes_entregadas = db.session.execute(
-            db.select(func.count()).select_from(OrdenCasino).where(
-                OrdenCasino.fecha == today,
-                OrdenCasino.estado == EstadoAlmuerzo.ENTREGADO,
-            )
-        ).scalar() or 0
-
-        total_alumnos = db.session.execute(
-            db.select(func.count()).select_from(Alumno).where(Alumno.activo == True)  # noqa: E712
-        ).scalar() or 0
-
-        alumnos_con_tag = db.session.execute(
-            db.select(func.count()).select_from(Alumno).where(
-                Alumno.activo == True,  # noqa: E712
-                Alumno.tag.isnot(None),
-            )
-        ).scalar() or 0
+        Values are read from the incrementally maintained dashboard counters
+        (see :mod:`app.counters`) instead of running a ``COUNT`` per metric.
+        """
+        valores = dashboard_counters.valores()
+        total_alumnos = valores["alumnos_activos"]
+        alumnos_con_tag = valores["alumnos_con_tag"]
 
         return {
-            "ordenes_pendientes_hoy": ordenes_pendientes,
-            "ordenes_entregadas_hoy": ordenes_entregadas,
+            "ordenes_pendientes_hoy": valores["ordenes_pendientes"],
+            "ordenes_entregadas_hoy": valores["ordenes_entregadas"],
             "total_alumnos": total_alumnos,
             "alumnos_con_tag": alumnos_con_tag,
             "porcentaje_cobertura_nfc": int(alumnos_con_tag / total_alumnos * 100) if total_alumnos else 0,
@@ -332,18 +701,46 @@ class PosController:
 
         This is used at the POS Casino when a student has no reservation but
         the apoderado has enough credit to cover the menu price.  The menu
-        price is deducted from ``alumno.apoderado.saldo_cuenta`` and the order
-        is immediately marked as ENTREGADO.
+        price is debited from ``alumno.apoderado.saldo_cuenta`` through the
+        saldo ledger (see :mod:`app.saldo`) and the order is immediately
+        marked as ENTREGADO.
 
         Returns the new OrdenCasino, or ``None`` if there is insufficient
-        credit or the menu has no price.
+        credit or the menu has no price.  Raises :class:`app.stock.SinStock`
+        when stock control is enabled and the menu has run out.
         """
-        if fecha is None:
-            fecha = date.today()
+        orden = self._canjear(alumno, menu, fecha or date.today())
+        if orden is None:
+            return None
+        db.session.commit()
+        return orden
 
+    def _canjear(
+        self,
+        alumno: Alumno,
+        menu: MenuDiario,
+        fecha: date,
+        fecha_entrega: Optional[datetime] = None,
+        exigir_stock: bool = True,
+    ) -> Optional[OrdenCasino]:
+        """Stage a credit redemption in the session without committing.
+
+        Shared by :meth:`canjear_con_credito` and :meth:`sincronizar_lecturas`.
+        Offline readings pass ``exigir_stock=False``: the lunch was already
+        handed out, so running out of stock must not reject the redemption.
+        """
         precio = int(menu.precio or 0)
-        saldo_actual = alumno.apoderado.saldo_cuenta or 0
-        if precio <= 0 or saldo_actual < precio:
+        if precio <= 0:
+            return None
+        try:
+            reserva = stock.consumir(menu)
+        except stock.SinStock:
+            if exigir_stock:
+                raise
+            reserva = None
+        movimiento = saldo_ledger.debitar(alumno.apoderado, precio, TipoMovimientoSaldo.CANJE)
+        if movimiento is None:
+            stock.anular(reserva)
             return None
 
         # Create the backing Pedido so pedido_codigo references a real order
@@ -365,11 +762,13 @@ class PosController:
         orden.menu_precio = menu.precio
         orden.fecha = fecha
         orden.estado = EstadoAlmuerzo.ENTREGADO
-        orden.fecha_entrega = datetime.now()
+        orden.fecha_entrega = fecha_entrega or datetime.now()
         db.session.add(orden)
 
-        alumno.apoderado.saldo_cuenta = saldo_actual - precio
-        db.session.commit()
+        movimiento.pedido = pedido
+        movimiento.orden = orden
+        if reserva is not None:
+            reserva.pedido = pedido
         return orden
 
     def approve_abono(self, abono: Abono, pago: Payment) -> bool:
@@ -384,10 +783,10 @@ class PosController:
         """
         if pago.state != "processing":
             return False
-        saldo_antes = abono.apoderado.saldo_cuenta or 0
-        nuevo_saldo = saldo_antes + int(abono.monto)
         pago.state = "succeeded"
-        abono.apoderado.saldo_cuenta = nuevo_saldo
+        movimiento = saldo_ledger.acreditar(abono.apoderado, int(abono.monto), TipoMovimientoSaldo.ABONO, abono=abono)
+        nuevo_saldo = movimiento.saldo_resultante
+        saldo_antes = nuevo_saldo - movimiento.monto
         # Populate payment_object — exclude payment_object itself to avoid
         # recursive loop, then add saldo snapshot
         obj = pago.to_dict()
@@ -0,0 +1,232 @@
+"""DeliveryFeed - push channel for live lunch deliveries.
+
+Whenever an OrdenCasino turns ENTREGADO an event is published to every
+connected POS/admin screen through a Server-Sent Events stream
+(``/pos/api/entregas/stream``), so screens update incrementally instead of
+re-running the recent-deliveries and dashboard COUNT queries.
+
+Events are detected with SQLAlchemy session hooks (ORM writes) and published
+only after the transaction commits.  Bulk UPDATE statements bypass the flush,
+so :meth:`PosController.entregar_almuerzos` publishes its rows explicitly via
+:meth:`DeliveryFeed.publish_ordenes`.
+
+The broker is in-process by default.  Set ``POS_FEED_REDIS_URL`` to fan
+events out across gunicorn workers through Redis pub/sub; each worker then
+forwards what it receives to its own local subscribers.
+
+A stream holds a worker thread, so it is closed after ``POS_FEED_STREAM_MAX_SECONDS``
+and the browser's ``EventSource`` reconnects.  Events carry an ``id`` and the
+worker keeps its last ``max_queue`` events, so a reconnect that lands on the
+same worker resumes from ``Last-Event-ID`` without losing deliveries.
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Iterator, Optional
+
+from flask_merchants.notify import LocalBackend, RedisBackend
+from sqlalchemy import event, inspect
+
+from ..database import db
+from ..model import EstadoAlmuerzo, OrdenCasino
+
+logger = logging.getLogger(__name__)
+
+_INFO_KEY = "pos_feed"
+
+
+class DeliveryFeed:
+    """In-process broker of delivery events with a pluggable backend."""
+
+    def __init__(self, max_queue: int = 100) -> None:
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._arrived = threading.Condition(self._lock)
+        self._subscribers: set[queue.Queue] = set()
+        # Recent (seq, payload) pairs read by stream(); ids are "<token>-<seq>".
+        self._token = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._recent: deque[tuple[int, dict]] = deque(maxlen=max_queue)
+        self._streams = 0
+        self.backend = LocalBackend(self._dispatch)
+        self._listening = False
+
+    # ------------------------------------------------------------------
+    # Flask integration
+    # ------------------------------------------------------------------
+
+    def init_app(self, app) -> None:
+        """Select the backend from ``POS_FEED_REDIS_URL`` and register session hooks."""
+        url = app.config.get("POS_FEED_REDIS_URL")
+        if url and isinstance(self.backend, LocalBackend):
+            try:
+                self.backend = RedisBackend(self._dispatch, url, channel="sm:pos:entregas")
+            except Exception:  # noqa: BLE001
+                logger.exception("pos_feed: no se pudo conectar a Redis, usando broker local")
+        if not self._listening:
+            event.listen(db.session, "after_flush", self._on_after_flush)
+            event.listen(db.session, "after_commit", self._on_after_commit)
+            event.listen(db.session, "after_soft_rollback", self._on_after_rollback)
+            self._listening = True
+        app.extensions["pos_feed"] = self
+
+    def close(self) -> None:
+        """Remove the session hooks and stop the backend."""
+        if self._listening:
+            event.remove(db.session, "after_flush", self._on_after_flush)
+            event.remove(db.session, "after_commit", self._on_after_commit)
+            event.remove(db.session, "after_soft_rollback", self._on_after_rollback)
+            self._listening = False
+        self.backend.close()
+        self.backend = LocalBackend(self._dispatch)
+
+    # ------------------------------------------------------------------
+    # Publish / subscribe
+    # ------------------------------------------------------------------
+
+    def publish(self, payload: dict) -> None:
+        try:
+            self.backend.publish(payload)
+        except Exception:  # noqa: BLE001
+            # A broken backend must never fail the delivery that triggered it.
+            logger.exception("pos_feed: error publicando orden_id=%s", payload.get("orden_id"))
+
+    def publish_ordenes(self, orden_ids, desde: Optional[str] = EstadoAlmuerzo.PENDIENTE.value) -> None:
+        """Publish events for *orden_ids* after a bulk UPDATE has committed."""
+        if not orden_ids or not self._subscribers_possible():
+            return
+        from sqlalchemy.orm import joinedload
+
+        ordenes = db.session.execute(
+            db.select(OrdenCasino)
+            .where(OrdenCasino.id.in_(list(orden_ids)))
+            .options(joinedload(OrdenCasino.alumno))
+        ).scalars()
+        for orden in ordenes:
+            self.publish(_event_payload(orden, desde))
+
+    def subscribe(self) -> queue.Queue:
+        q: queue.Queue = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def _dispatch(self, payload: dict) -> None:
+        with self._lock:
+            self._seq += 1
+            self._recent.append((self._seq, payload))
+            self._arrived.notify_all()
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(payload)
+            except queue.Full:
+                # Slow consumer: drop its oldest event rather than block.
+                try:
+                    q.get_nowait()
+                    q.put_nowait(payload)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def _subscribers_possible(self) -> bool:
+        # With Redis other workers may have subscribers even if we do not.
+        return bool(self._subscribers or self._streams) or not isinstance(self.backend, LocalBackend)
+
+    def _resume_from(self, last_event_id: Optional[str]) -> int:
+        """Sequence number to resume after; events this worker never sent start from now."""
+        token, _, seq = (last_event_id or "").partition("-")
+        if token == self._token and seq.isdigit() and int(seq) <= self._seq:
+            return int(seq)
+        return self._seq
+
+    def stream(
+        self, heartbeat: float = 15.0, max_seconds: Optional[float] = None, last_event_id: Optional[str] = None
+    ) -> Iterator[str]:
+        """Yield Server-Sent Events for new deliveries.
+
+        Ends when the client disconnects or after *max_seconds*.  With the
+        *last_event_id* of an earlier stream of this worker, the events sent
+        since then (still among the last ``max_queue``) are replayed first.
+        """
+        deadline = time.monotonic() + max_seconds if max_seconds else None
+        with self._lock:
+            self._streams += 1
+            cursor = self._resume_from(last_event_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                wait = heartbeat
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        return
+                with self._lock:
+                    if self._seq == cursor:
+                        self._arrived.wait(wait)
+                    # A slow stream skips what rolled out of the buffer.
+                    pending = [(seq, payload) for seq, payload in self._recent if seq > cursor]
+                if not pending:
+                    yield ": keepalive\n\n"
+                    continue
+                for seq, payload in pending:
+                    cursor = seq
+                    yield f"id: {self._token}-{seq}\nevent: entrega\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            with self._lock:
+                self._streams -= 1
+
+    # ------------------------------------------------------------------
+    # Session hooks
+    # ------------------------------------------------------------------
+
+    def _on_after_flush(self, session, flush_context) -> None:
+        if not self._subscribers_possible():
+            return
+        eventos = []
+        for obj in session.new:
+            if isinstance(obj, OrdenCasino) and obj.estado == EstadoAlmuerzo.ENTREGADO:
+                eventos.append(_event_payload(obj, None))
+        for obj in session.dirty:
+            if not isinstance(obj, OrdenCasino) or obj.estado != EstadoAlmuerzo.ENTREGADO:
+                continue
+            history = inspect(obj).attrs.estado.history
+            if history.deleted and history.deleted[0] != EstadoAlmuerzo.ENTREGADO:
+                eventos.append(_event_payload(obj, history.deleted[0].value))
+        if eventos:
+            session.info.setdefault(_INFO_KEY, []).extend(eventos)
+
+    def _on_after_commit(self, session) -> None:
+        for payload in session.info.pop(_INFO_KEY, []):
+            self.publish(payload)
+
+    def _on_after_rollback(self, session, previous_transaction) -> None:
+        if previous_transaction.parent is None:
+            session.info.pop(_INFO_KEY, None)
+
+
+def _event_payload(orden: OrdenCasino, desde: Optional[str]) -> dict:
+    """Serialise a delivered *orden*; ``desde`` is the previous estado (``None`` if created delivered)."""
+    fecha_entrega: Optional[datetime] = orden.fecha_entrega
+    return {
+        "orden_id": orden.id,
+        "alumno_id": orden.alumno_id,
+        "alumno_nombre": orden.alumno.nombre if orden.alumno else None,
+        "alumno_curso": orden.alumno.curso if orden.alumno else None,
+        "menu": orden.menu_descripcion or orden.menu_slug,
+        "fecha": orden.fecha.isoformat(),
+        "fecha_entrega": fecha_entrega.isoformat() if fecha_entrega else None,
+        "desde": desde,
+    }
+
+
+delivery_feed = DeliveryFeed()
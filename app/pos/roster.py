@@ -0,0 +1,501 @@
+"""ServiceRoster - warm per-process snapshot of a day's canteen service.
+
+During the lunch window every reader tap needs the same handful of facts:
+which alumno owns a tag and whether they have a pending or delivered
+OrdenCasino for the day.  The roster loads those facts once per date and
+answers :class:`~app.pos.crud.PosController` lookups from memory.
+
+Invalidation is driven by SQLAlchemy session events rather than by the
+individual write paths: a committed flush or bulk UPDATE/DELETE that touches
+today's roster (an OrdenCasino of today, any Alumno, MenuDiario or
+OpcionMenuDia row) bumps a generation counter once the transaction has
+committed.  Orders for other dates never bump it.  The writing worker applies
+the change to its own roster incrementally; every other worker notices the new
+generation on its next periodic check and reloads.
+
+The generation lives outside the database so writers never queue on a shared
+row.  It is a Redis key (``INCR`` / ``GET``) when ``POS_ROSTER_REDIS_URL`` or
+``POS_FEED_REDIS_URL`` is set, and an in-process counter otherwise, which only
+keeps a single worker current.
+"""
+
+import logging
+import os
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field, replace
+from datetime import date
+from itertools import chain
+from typing import Optional
+
+from sqlalchemy import event, inspect, or_
+from sqlalchemy.orm import joinedload
+
+from ..database import db
+from ..model import Alumno, EstadoAlmuerzo, MenuDiario, OpcionMenuDia, OrdenCasino
+from .search import AlumnoSearchIndex
+
+logger = logging.getLogger(__name__)
+
+_TRACKED = (OrdenCasino, Alumno, MenuDiario, OpcionMenuDia)
+
+
+class LocalGeneration:
+    """Roster generation counter of this process only."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def get(self) -> int:
+        return self._value
+
+    def incr(self) -> int:
+        with self._lock:
+            self._value += 1
+            return self._value
+
+    def close(self) -> None:
+        pass
+
+
+class RedisGeneration:
+    """Roster generation counter shared by every worker through a Redis *key*."""
+
+    def __init__(self, url: str, key: str = "sm:pos:roster:generacion") -> None:
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._key = key
+
+    def get(self) -> int:
+        return int(self._redis.get(self._key) or 0)
+
+    def incr(self) -> int:
+        return int(self._redis.incr(self._key))
+
+    def close(self) -> None:
+        self._redis.close()
+
+
+@dataclass(frozen=True)
+class RosterAlumno:
+    """Read-only snapshot of the Alumno columns the POS screens display."""
+
+    id: int
+    nombre: str
+    curso: str
+    tag: Optional[str]
+    activo: bool
+    apoderado_id: int
+    restricciones: list = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class RosterOrden:
+    """Read-only snapshot of an OrdenCasino plus its menu's plato names."""
+
+    id: int
+    alumno_id: int
+    menu_slug: str
+    menu_descripcion: Optional[str]
+    fecha: date
+    estado: EstadoAlmuerzo
+    courses: dict = field(default_factory=dict)
+
+
+def _snapshot_alumno(alumno: Alumno) -> RosterAlumno:
+    return RosterAlumno(
+        id=alumno.id,
+        nombre=alumno.nombre,
+        curso=alumno.curso,
+        tag=alumno.tag.lower() if alumno.tag else None,
+        activo=bool(alumno.activo),
+        apoderado_id=alumno.apoderado_id,
+        restricciones=list(alumno.restricciones or []),
+    )
+
+
+def _snapshot_orden(orden: OrdenCasino, courses: dict) -> RosterOrden:
+    return RosterOrden(
+        id=orden.id,
+        alumno_id=orden.alumno_id,
+        menu_slug=orden.menu_slug,
+        menu_descripcion=orden.menu_descripcion,
+        fecha=orden.fecha,
+        estado=orden.estado,
+        courses=courses.get(orden.menu_slug, {}),
+    )
+
+
+class ServiceRoster:
+    """In-memory roster of one service date, keyed by NFC serial and alumno id.
+
+    Lookups return ``None`` when the roster cannot answer (different date,
+    unknown serial); callers then fall back to the database.
+    """
+
+    def __init__(self, check_interval: float = 2.0) -> None:
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._reset()
+        self.hits = 0
+        self.misses = 0
+
+    def _reset(self) -> None:
+        self.fecha: Optional[date] = None
+        self.generation = 0
+        self.loaded_at: Optional[float] = None
+        self._checked_at = 0.0
+        self._stale = False
+        self._alumnos: dict[int, RosterAlumno] = {}
+        self._by_tag: dict[str, int] = {}
+        self._ordenes: dict[int, RosterOrden] = {}
+        self._ordenes_por_alumno: dict[int, set[int]] = {}
+        self._courses: dict[str, dict] = {}
+        self._search = AlumnoSearchIndex()
+
+    # ------------------------------------------------------------------
+    # Flask integration
+    # ------------------------------------------------------------------
+
+    def init_app(self, app) -> None:
+        """Subscribe this roster to the session hooks and select the generation counter.
+
+        The counter is shared through ``POS_ROSTER_REDIS_URL`` (empty reuses
+        ``POS_FEED_REDIS_URL``).
+        """
+        global _generations
+        url = app.config.get("POS_ROSTER_REDIS_URL") or app.config.get("POS_FEED_REDIS_URL")
+        if url and isinstance(_generations, LocalGeneration):
+            try:
+                _generations = RedisGeneration(url)
+            except Exception:  # noqa: BLE001
+                logger.exception("pos_roster: no se pudo conectar a Redis, usando generación local")
+        if isinstance(_generations, LocalGeneration) and _web_concurrency() > 1:
+            logger.error(
+                "pos_roster: %d workers con generación local; un worker no ve los cambios de los "
+                "demás hasta recargar.  Configure POS_ROSTER_REDIS_URL.",
+                _web_concurrency(),
+            )
+        _listen()
+        _rosters.add(self)
+        app.extensions["pos_roster"] = self
+
+    def close(self) -> None:
+        """Unsubscribe from the session hooks and drop the loaded roster."""
+        _rosters.discard(self)
+        with self._lock:
+            self._reset()
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def load(self, fecha: Optional[date] = None) -> None:
+        """(Re)build the roster for *fecha* (default: today) from the database."""
+        if fecha is None:
+            fecha = date.today()
+        with self._lock:
+            generation = self._read_generation()
+            alumnos = db.session.execute(db.select(Alumno)).scalars().all()
+            ordenes = db.session.execute(db.select(OrdenCasino).filter_by(fecha=fecha)).scalars().all()
+            slugs = {o.menu_slug for o in ordenes}
+            menus = (
+                db.session.execute(
+                    db.select(MenuDiario)
+                    .where(or_(MenuDiario.dia == fecha, MenuDiario.slug.in_(slugs)))
+                    .options(joinedload(MenuDiario.opciones).joinedload(OpcionMenuDia.plato))
+                )
+                .unique()
+                .scalars()
+                .all()
+            )
+
+            self._reset()
+            self._courses = {
+                m.slug: {
+                    "entradas": [p.nombre for p in m.entradas],
+                    "fondos": [p.nombre for p in m.fondos],
+                    "postres": [p.nombre for p in m.postres],
+                }
+                for m in menus
+            }
+            for alumno in alumnos:
+                self._put_alumno(_snapshot_alumno(alumno))
+            for orden in ordenes:
+                self._put_orden(_snapshot_orden(orden, self._courses))
+            self.fecha = fecha
+            if generation is not None:
+                self.generation = generation
+            self.loaded_at = time.monotonic()
+            self._checked_at = self.loaded_at
+
+    def warm(self, fecha: Optional[date] = None) -> None:
+        """Load the roster for *fecha* (default: today) only if it is cold or stale."""
+        with self._lock:
+            self._current(fecha or date.today())
+
+    def _current(self, fecha: date) -> bool:
+        """Return True when the roster can answer for *fecha*, loading if needed."""
+        with self._lock:
+            if fecha != date.today() and fecha != self.fecha:
+                return False
+            now = time.monotonic()
+            if self.fecha == fecha and not self._stale and now - self._checked_at < self.check_interval:
+                return True
+            if self.fecha == fecha and not self._stale:
+                self._checked_at = now
+                generation = self._read_generation()
+                if generation is not None and generation == self.generation:
+                    return True
+            self.load(fecha)
+            return True
+
+    def _read_generation(self) -> Optional[int]:
+        """Current shared generation, or ``None`` when it cannot be read (forces reloads)."""
+        try:
+            return _generations.get()
+        except Exception:  # noqa: BLE001
+            logger.exception("pos_roster: no se pudo leer la generación")
+            return None
+
+    def _put_alumno(self, alumno: RosterAlumno) -> None:
+        previous = self._alumnos.get(alumno.id)
+        if previous is not None and previous.tag:
+            self._by_tag.pop(previous.tag, None)
+        self._alumnos[alumno.id] = alumno
+        if alumno.tag:
+            self._by_tag[alumno.tag] = alumno.id
+        if alumno.activo:
+            self._search.put(alumno.id, alumno.nombre, alumno.curso)
+        else:
+            self._search.remove(alumno.id)
+
+    def _put_orden(self, orden: RosterOrden) -> None:
+        self._drop_orden(orden.id)
+        self._ordenes[orden.id] = orden
+        self._ordenes_por_alumno.setdefault(orden.alumno_id, set()).add(orden.id)
+
+    def _drop_orden(self, orden_id: int) -> None:
+        previous = self._ordenes.pop(orden_id, None)
+        if previous is not None:
+            self._ordenes_por_alumno.get(previous.alumno_id, set()).discard(orden_id)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def get_by_tag(self, serial: str, fecha: Optional[date] = None) -> Optional[dict]:
+        """Return ``{"alumno", "orden", "ya_entregado"}`` for *serial*, or ``None``."""
+        if fecha is None:
+            fecha = date.today()
+        with self._lock:
+            if not self._current(fecha):
+                return None
+            alumno_id = self._by_tag.get(serial.lower())
+            return self._result(alumno_id)
+
+    def get_by_id(self, alumno_id: int, fecha: Optional[date] = None) -> Optional[dict]:
+        """Same as :meth:`get_by_tag` but keyed by alumno primary key."""
+        if fecha is None:
+            fecha = date.today()
+        with self._lock:
+            if not self._current(fecha):
+                return None
+            return self._result(alumno_id)
+
+    def get_pendientes(self, fecha: Optional[date] = None) -> Optional[list[RosterAlumno]]:
+        """Return active alumnos with a PENDIENTE order, ordered by course and name."""
+        if fecha is None:
+            fecha = date.today()
+        with self._lock:
+            if not self._current(fecha):
+                return None
+            self.hits += 1
+            ids = {o.alumno_id for o in self._ordenes.values() if o.estado == EstadoAlmuerzo.PENDIENTE}
+            alumnos = [self._alumnos[i] for i in ids if i in self._alumnos and self._alumnos[i].activo]
+            return sorted(alumnos, key=lambda a: (a.curso, a.nombre))
+
+    def buscar(self, query: str, limit: int = 20) -> Optional[list[RosterAlumno]]:
+        """Return active alumnos whose name or course tokens start with *query*'s.
+
+        Matching ignores accents and case; results are ordered by course and
+        name.  Returns ``None`` when the roster cannot answer.
+        """
+        with self._lock:
+            if not self._current(date.today()):
+                return None
+            self.hits += 1
+            return [self._alumnos[i] for i in self._search.search(query, limit)]
+
+    def _result(self, alumno_id: Optional[int]) -> Optional[dict]:
+        alumno = self._alumnos.get(alumno_id) if alumno_id is not None else None
+        if alumno is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        orden = None
+        ya_entregado = False
+        for orden_id in self._ordenes_por_alumno.get(alumno.id, ()):
+            o = self._ordenes[orden_id]
+            if o.estado == EstadoAlmuerzo.PENDIENTE:
+                orden = o
+            elif o.estado == EstadoAlmuerzo.ENTREGADO:
+                ya_entregado = True
+        return {"alumno": alumno, "orden": orden, "ya_entregado": ya_entregado}
+
+    def stats(self) -> dict:
+        """Return roster age, size and hit rate for the POS stats endpoint."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "fecha": self.fecha.isoformat() if self.fecha else None,
+                "generacion": self.generation,
+                "edad_segundos": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else None,
+                "alumnos": len(self._alumnos),
+                "ordenes": len(self._ordenes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def _apply(self, generation: int, changes: list) -> None:
+        """Apply a committed transaction's *changes* to the loaded roster."""
+        with self._lock:
+            if self.fecha is None:
+                return
+            if generation != self.generation + 1:
+                # Another worker committed in between; reload on next lookup.
+                self._stale = True
+                return
+            for kind, pk, snapshot in changes:
+                if kind == "orden":
+                    if snapshot.fecha == self.fecha:
+                        self._put_orden(replace(snapshot, courses=self._courses.get(snapshot.menu_slug, {})))
+                    else:
+                        self._drop_orden(pk)
+                elif kind == "orden_borrada":
+                    self._drop_orden(pk)
+                elif kind == "alumno":
+                    self._put_alumno(snapshot)
+                elif kind == "alumno_borrado":
+                    previous = self._alumnos.pop(pk, None)
+                    if previous is not None and previous.tag:
+                        self._by_tag.pop(previous.tag, None)
+                    self._search.remove(pk)
+                elif kind in ("menus", "recargar"):
+                    self._stale = True
+            self.generation = generation
+
+
+# ----------------------------------------------------------------------
+# Session hooks
+# ----------------------------------------------------------------------
+#
+# Registered once per process and shared by every subscribed roster so the
+# generation is bumped exactly once per transaction.
+
+_INFO_KEY = "pos_roster"
+_rosters: "weakref.WeakSet[ServiceRoster]" = weakref.WeakSet()
+_generations = LocalGeneration()
+_listening = False
+
+
+def _web_concurrency() -> int:
+    try:
+        return int(os.environ.get("WEB_CONCURRENCY", 1))
+    except ValueError:
+        return 1
+
+
+def _listen() -> None:
+    global _listening
+    if _listening:
+        return
+    event.listen(db.session, "before_flush", _on_before_flush)
+    event.listen(db.session, "after_flush", _on_after_flush)
+    event.listen(db.session, "do_orm_execute", _on_do_orm_execute)
+    event.listen(db.session, "after_commit", _on_after_commit)
+    event.listen(db.session, "after_soft_rollback", _on_after_rollback)
+    _listening = True
+
+
+def _pending(session) -> list:
+    """Return the transaction's pending roster changes, creating the list on first use."""
+    return session.info.setdefault(_INFO_KEY, [])
+
+
+def _toca_fecha(orden: OrdenCasino, fecha: date) -> bool:
+    """Whether *orden* is, or was before this flush, on *fecha* (``True`` when unknown)."""
+    state = inspect(orden)
+    if "fecha" not in state.dict:
+        return True
+    return state.dict["fecha"] == fecha or fecha in state.attrs.fecha.history.deleted
+
+
+def _on_before_flush(session, flush_context, instances) -> None:
+    if not _rosters:
+        return
+    if any(isinstance(o, _TRACKED) for o in chain(session.new, session.dirty, session.deleted)):
+        _pending(session)
+
+
+def _on_do_orm_execute(orm_execute_state) -> None:
+    # Bulk UPDATE/DELETE statements bypass the flush; the rows they touched
+    # are unknown here, so the rosters simply reload on next lookup.
+    if not _rosters or not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, _TRACKED):
+        _pending(orm_execute_state.session).append(("recargar", None, None))
+
+
+def _on_after_flush(session, flush_context) -> None:
+    changes = session.info.get(_INFO_KEY)
+    if changes is None:
+        return
+    # Snapshot now: attributes are still loaded here but expire on commit.
+    # Orders of other days are not in any roster and do not bump the generation.
+    hoy = date.today()
+    for obj in chain(session.new, session.dirty):
+        if isinstance(obj, OrdenCasino):
+            if _toca_fecha(obj, hoy):
+                changes.append(("orden", obj.id, _snapshot_orden(obj, {})))
+        elif isinstance(obj, Alumno):
+            changes.append(("alumno", obj.id, _snapshot_alumno(obj)))
+        elif isinstance(obj, (MenuDiario, OpcionMenuDia)):
+            changes.append(("menus", None, None))
+    for obj in session.deleted:
+        if isinstance(obj, OrdenCasino):
+            if _toca_fecha(obj, hoy):
+                changes.append(("orden_borrada", obj.id, None))
+        elif isinstance(obj, Alumno):
+            changes.append(("alumno_borrado", obj.id, None))
+        elif isinstance(obj, (MenuDiario, OpcionMenuDia)):
+            changes.append(("menus", None, None))
+
+
+def _on_after_commit(session) -> None:
+    changes = session.info.pop(_INFO_KEY, None)
+    if not changes:
+        return
+    try:
+        generation = _generations.incr()
+    except Exception:  # noqa: BLE001
+        # Other workers miss this change until their next reload.
+        logger.exception("pos_roster: no se pudo incrementar la generación")
+        for roster in list(_rosters):
+            roster._stale = True
+        return
+    for roster in list(_rosters):
+        roster._apply(generation, changes)
+
+
+def _on_after_rollback(session, previous_transaction) -> None:
+    if previous_transaction.parent is None:
+        session.info.pop(_INFO_KEY, None)
+
+
+service_roster = ServiceRoster()
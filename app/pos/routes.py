@@ -1,17 +1,22 @@
 from datetime import date, datetime
 
-from flask import Blueprint, jsonify, render_template, request, url_for, redirect
+from flask import Blueprint, Response, current_app, jsonify, render_template, request, url_for, redirect
 from flask_security import current_user, login_required, roles_accepted
 
 from ..database import db
 from ..extensions import limiter
 from ..model import EstadoPedido, Pedido, Abono, Payment, Alumno, MenuDiario, Settings
 from .crud import PosController
+from .feed import delivery_feed
+from ..stock import SinStock
+from .roster import service_roster
 
 # from .reader import registra_lectura
 
 pos_bp = Blueprint("pos", __name__)
-ctrl = PosController()
+ctrl = PosController(roster=service_roster)
+
+MAX_ENTREGAS_LOTE = 200
 
 
 @pos_bp.route("/", methods=["GET"])
@@ -41,99 +46,104 @@ def valida_tag(serial: str):
 @roles_accepted("admin", "pos")
 def api_alumno_tag(serial: str):
     """Full canteen scan endpoint: alumno info + today's pending lunch."""
-    result = ctrl.get_alumno_con_orden(serial)
-    alumno = result["alumno"]
+    plan = ctrl.get_scan_plan(serial)
+    alumno = plan["alumno"]
     if not alumno:
         return jsonify({"encontrado": False, "serial": serial}), 404
-
-    orden = result["orden"]
-    orden_data = None
-    if orden:
-        menu_diario = db.session.execute(
-            db.select(MenuDiario).filter_by(slug=orden.menu_slug)
-        ).scalar_one_or_none()
-        courses = {}
-        if menu_diario:
-            courses = {
-                "entradas": [p.nombre for p in menu_diario.entradas],
-                "fondos": [p.nombre for p in menu_diario.fondos],
-                "postres": [p.nombre for p in menu_diario.postres],
-            }
-        orden_data = {
-            "id": orden.id,
-            "menu_descripcion": orden.menu_descripcion,
-            "menu_slug": orden.menu_slug,
-            "entrega_url": url_for("pos.entrega_almuerzo", orden_id=orden.id),
-            "courses": courses,
-        }
-    saldo_apoderado = alumno.apoderado.saldo_cuenta or 0
-    menus_disponibles = []
-    if not orden_data and not result["ya_entregado"] and saldo_apoderado > 0:
-        menus_hoy = ctrl.get_menus_hoy()
-        menus_disponibles = [
-            {"slug": m.slug, "descripcion": m.descripcion, "precio": int(m.precio or 0)}
-            for m in menus_hoy
-            if m.precio and saldo_apoderado >= int(m.precio)
-        ]
-    return jsonify({
-        "encontrado": True,
-        "serial": serial,
-        "alumno": {
-            "id": alumno.id,
-            "nombre": alumno.nombre,
-            "curso": alumno.curso,
-            "restricciones": alumno.restricciones or [],
-        },
-        "saldo_apoderado": saldo_apoderado,
-        "orden": orden_data,
-        "ya_entregado": result["ya_entregado"],
-        "menus_disponibles": menus_disponibles,
-    })
+    return jsonify({"encontrado": True, "serial": serial, **_scan_plan_json(plan)})
 
 
 @pos_bp.route("/api/alumno/<int:alumno_id>", methods=["GET"])
 @roles_accepted("admin", "pos")
 def api_alumno(alumno_id: int):
     """Canteen lookup by alumno ID (for manual entry): info + today's pending lunch."""
-    result = ctrl.get_alumno_con_orden_by_id(alumno_id)
-    alumno = result["alumno"]
-    if not alumno:
+    plan = ctrl.get_scan_plan_by_id(alumno_id)
+    if not plan["alumno"]:
         return jsonify({"encontrado": False, "alumno_id": alumno_id}), 404
+    return jsonify({"encontrado": True, **_scan_plan_json(plan)})
 
-    orden = result["orden"]
-    saldo_apoderado = alumno.apoderado.saldo_cuenta or 0
-    menus_disponibles = []
-    if not orden and not result["ya_entregado"] and saldo_apoderado > 0:
-        menus_hoy = ctrl.get_menus_hoy()
-        menus_disponibles = [
-            {"slug": m.slug, "descripcion": m.descripcion, "precio": int(m.precio or 0)}
-            for m in menus_hoy
-            if m.precio and saldo_apoderado >= int(m.precio)
-        ]
-    return jsonify({
-        "encontrado": True,
+
+def _scan_plan_json(plan: dict) -> dict:
+    """Serialise a :meth:`PosController.get_scan_plan` result for the readers."""
+    alumno = plan["alumno"]
+    orden = plan["orden"]
+    return {
         "alumno": {
             "id": alumno.id,
             "nombre": alumno.nombre,
             "curso": alumno.curso,
             "restricciones": alumno.restricciones or [],
         },
-        "saldo_apoderado": saldo_apoderado,
+        "saldo_apoderado": plan["saldo"],
         "orden": {
             "id": orden.id,
             "menu_descripcion": orden.menu_descripcion,
             "menu_slug": orden.menu_slug,
             "entrega_url": url_for("pos.entrega_almuerzo", orden_id=orden.id),
+            "courses": plan["courses"],
         } if orden else None,
-        "ya_entregado": result["ya_entregado"],
-        "menus_disponibles": menus_disponibles,
+        "ya_entregado": plan["ya_entregado"],
+        "menus_disponibles": [
+            {"slug": m.slug, "descripcion": m.descripcion, "precio": int(m.precio or 0)}
+            for m in plan["menus_disponibles"]
+        ],
+    }
+
+
+@pos_bp.route("/api/alumnos/buscar", methods=["GET"])
+@roles_accepted("admin", "pos")
+@limiter.exempt
+def api_buscar_alumnos():
+    """Kiosk type-ahead: active alumnos matching ``?q=`` by name or course."""
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"alumnos": []})
+    alumnos = ctrl.buscar_alumnos(query)
+    return jsonify({
+        "alumnos": [{"id": a.id, "nombre": a.nombre, "curso": a.curso} for a in alumnos],
     })
 
 
+@pos_bp.route("/api/roster", methods=["GET"])
+@roles_accepted("admin", "pos")
+def api_roster():
+    """Report the service roster's date, generation, age and hit rate."""
+    return jsonify(service_roster.stats())
+
+
+@pos_bp.route("/api/roster/cargar", methods=["POST"])
+@roles_accepted("admin", "pos")
+@limiter.limit("10 per minute")
+def api_roster_cargar():
+    """Preload (or rebuild) the service roster for today."""
+    service_roster.load()
+    return jsonify(service_roster.stats())
+
+
+@pos_bp.route("/api/entregas/stream", methods=["GET"])
+@roles_accepted("admin", "pos")
+@limiter.exempt
+def api_entregas_stream():
+    """Server-Sent Events stream of lunch deliveries (one ``entrega`` event per OrdenCasino).
+
+    Closed after ``POS_FEED_STREAM_MAX_SECONDS``; the browser reconnects and
+    resumes from ``Last-Event-ID``.
+    """
+    return Response(
+        delivery_feed.stream(
+            max_seconds=current_app.config.get("POS_FEED_STREAM_MAX_SECONDS", 300),
+            last_event_id=request.headers.get("Last-Event-ID"),
+        ),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @pos_bp.route("/casino", methods=["GET"])
 @roles_accepted("admin", "pos")
 def casino():
     """POS Casino: NFC/QR tag scanner for lunch delivery."""
+    service_roster.warm()
     recientes = ctrl.get_ordenes_entregadas_hoy()
     alumnos = ctrl.get_alumnos_con_almuerzo_pendiente()
     return render_template("pos/casino.html", recientes=recientes, alumnos=alumnos)
@@ -143,6 +153,7 @@ def casino():
 @roles_accepted("admin", "pos")
 def lector():
     """Standalone kiosk NFC reader: full-screen canteen tag scanner for the mounted phone."""
+    service_roster.warm()
     return render_template("pos/lector.html")
 
 
@@ -208,7 +219,11 @@ def venta_kiosko():
     if not menu:
         return jsonify({"error": "Menú no encontrado"}), 404
 
-    orden = ctrl.crear_orden_kiosko(alumno, menu)
+    try:
+        orden = ctrl.crear_orden_kiosko(alumno, menu)
+    except SinStock:
+        db.session.commit()  # keep the fuera_stock flag set by the failed reservation
+        return jsonify({"error": "Menú sin stock"}), 409
     return jsonify({
         "ok": True,
         "orden_id": orden.id,
@@ -239,6 +254,95 @@ def entrega_almuerzo(orden_id: int):
     })
 
 
+@pos_bp.route("/api/entrega-almuerzos", methods=["POST"])
+@roles_accepted("admin", "pos")
+@limiter.limit("60 per minute")
+def api_entrega_almuerzos():
+    """Deliver a batch of queued reader taps in one transaction.
+
+    Body: ``{"entregas": [{"orden_id": <int>, "ts": <ISO 8601, optional>}, ...]}``
+    Returns JSON with one ``{"orden_id", "resultado"}`` entry per tap.
+    """
+    payload = request.get_json(force=True) or {}
+    entregas = payload.get("entregas")
+    if not isinstance(entregas, list) or not entregas:
+        return jsonify({"error": "entregas es requerido"}), 400
+    if len(entregas) > MAX_ENTREGAS_LOTE:
+        return jsonify({"error": f"Máximo {MAX_ENTREGAS_LOTE} entregas por lote"}), 400
+
+    parsed = []
+    for item in entregas:
+        try:
+            orden_id = int(item["orden_id"])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "orden_id inválido", "entrega": item}), 400
+        parsed.append((orden_id, _parse_client_ts(item.get("ts"))))
+
+    resultados = ctrl.entregar_almuerzos(parsed)
+    return jsonify({
+        "ok": True,
+        "entregados": sum(1 for r in resultados if r["resultado"] == "entregado"),
+        "resultados": resultados,
+    })
+
+
+@pos_bp.route("/api/sync-scans", methods=["POST"])
+@roles_accepted("admin", "pos")
+@limiter.limit("60 per minute")
+def api_sync_scans():
+    """Upload a batch of taps from a reader's local scan journal.
+
+    Body: ``{"lector": <str, optional>, "scans": [{"scan_id": <str>,
+    "ts": <ISO 8601, optional>, "orden_id" | "serial" | "alumno_id": ...,
+    "menu_slug": <str, optional>}, ...]}``
+
+    Returns JSON with one ``{"scan_id", "resultado", "orden_id"}`` entry per
+    scan.  Re-sending a scan_id returns the outcome already recorded.
+    """
+    payload = request.get_json(force=True) or {}
+    scans = payload.get("scans")
+    if not isinstance(scans, list) or not scans:
+        return jsonify({"error": "scans es requerido"}), 400
+    if len(scans) > MAX_ENTREGAS_LOTE:
+        return jsonify({"error": f"Máximo {MAX_ENTREGAS_LOTE} lecturas por lote"}), 400
+
+    lecturas = []
+    for item in scans:
+        if not isinstance(item, dict) or not str(item.get("scan_id") or "").strip():
+            return jsonify({"error": "scan_id es requerido", "scan": item}), 400
+        try:
+            lectura = {
+                "scan_id": str(item["scan_id"]).strip()[:64],
+                "ts": _parse_client_ts(item.get("ts")),
+                "orden_id": int(item["orden_id"]) if item.get("orden_id") else None,
+                "alumno_id": int(item["alumno_id"]) if item.get("alumno_id") else None,
+                "serial": str(item["serial"]) if item.get("serial") else None,
+                "menu_slug": item.get("menu_slug") or None,
+            }
+        except (TypeError, ValueError):
+            return jsonify({"error": "lectura inválida", "scan": item}), 400
+        if not (lectura["orden_id"] or lectura["alumno_id"] or lectura["serial"]):
+            return jsonify({"error": "orden_id, alumno_id o serial es requerido", "scan": item}), 400
+        lecturas.append(lectura)
+
+    lector = str(payload.get("lector") or "")[:64] or None
+    resultados = ctrl.sincronizar_lecturas(lecturas, lector=lector)
+    return jsonify({"ok": True, "resultados": resultados})
+
+
+def _parse_client_ts(value) -> datetime | None:
+    """Parse a reader's ISO 8601 tap time into a naive local datetime."""
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone().replace(tzinfo=None)
+    return ts
+
+
 @pos_bp.route("/api/canjear-credito", methods=["POST"])
 @roles_accepted("admin", "pos")
 @limiter.limit("60 per minute")
@@ -268,7 +372,11 @@ def api_canjear_credito():
     if not menu:
         return jsonify({"error": "Menú no encontrado"}), 404
 
-    orden = ctrl.canjear_con_credito(alumno, menu)
+    try:
+        orden = ctrl.canjear_con_credito(alumno, menu)
+    except SinStock:
+        db.session.commit()  # keep the fuera_stock flag set by the failed reservation
+        return jsonify({"error": "Menú sin stock"}), 409
     if orden is None:
         return jsonify({"error": "Saldo insuficiente para canjear este menú"}), 422
 
@@ -0,0 +1,84 @@
+"""AlumnoSearchIndex - in-memory type-ahead search over alumnos.
+
+Names and courses are normalised (accents stripped, case folded) and split
+into tokens; every prefix of every token points at the alumnos containing
+it.  A query matches an alumno when each of its tokens is a prefix of one of
+the alumno's tokens, so ``"jose gon"`` finds "José González" without a
+``LIKE '%q%'`` table scan.
+
+The index holds no database state of its own: :class:`~app.pos.roster.ServiceRoster`
+feeds it from the same snapshots and change signals it already keeps.
+"""
+
+import heapq
+import re
+import unicodedata
+from typing import Iterable
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def normalizar(texto: str) -> str:
+    """Return *texto* without accents and case folded (``"José"`` → ``"jose"``)."""
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def tokenizar(texto: str) -> list[str]:
+    """Split *texto* into normalised word tokens."""
+    return _TOKEN_RE.findall(normalizar(texto))
+
+
+class AlumnoSearchIndex:
+    """Prefix postings over alumno name and course tokens.
+
+    Results are ranked by ``(curso, nombre)``, matching the kiosk's SQL
+    ordering.  Not thread-safe on its own; the owning roster serialises
+    access with its lock.
+    """
+
+    def __init__(self) -> None:
+        self._postings: dict[str, set[int]] = {}
+        self._prefijos: dict[int, set[str]] = {}
+        self._orden: dict[int, tuple[str, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._orden)
+
+    def put(self, alumno_id: int, nombre: str, curso: str) -> None:
+        """Index (or re-index) *alumno_id* under *nombre* and *curso*."""
+        self.remove(alumno_id)
+        prefijos = {
+            token[:i]
+            for token in tokenizar(nombre) + tokenizar(curso)
+            for i in range(1, len(token) + 1)
+        }
+        for prefijo in prefijos:
+            self._postings.setdefault(prefijo, set()).add(alumno_id)
+        self._prefijos[alumno_id] = prefijos
+        self._orden[alumno_id] = (curso or "", nombre or "")
+
+    def remove(self, alumno_id: int) -> None:
+        """Drop *alumno_id* from the index; unknown ids are ignored."""
+        for prefijo in self._prefijos.pop(alumno_id, ()):
+            ids = self._postings.get(prefijo)
+            if ids is not None:
+                ids.discard(alumno_id)
+                if not ids:
+                    del self._postings[prefijo]
+        self._orden.pop(alumno_id, None)
+
+    def search(self, query: str, limit: int = 20) -> list[int]:
+        """Return up to *limit* alumno ids matching every token of *query*."""
+        tokens = tokenizar(query)
+        if not tokens:
+            return []
+        postings: list[set[int]] = []
+        for token in set(tokens):
+            ids = self._postings.get(token)
+            if not ids:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+        candidatos: Iterable[int] = postings[0].intersection(*postings[1:])
+        return heapq.nsmallest(limit, candidatos, key=self._orden.__getitem__)
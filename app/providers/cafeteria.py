@@ -18,7 +18,7 @@ import logging
 import random
 import string
 from decimal import Decimal
-from typing import Any
+from typing import Any, Callable
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +31,10 @@ def _rand_code(length: int = 8) -> str:
     return "".join(random.choices(string.ascii_uppercase + string.digits, k=length))
 
 
+#: Attempts at drawing an unused display code before giving up.
+DISPLAY_CODE_INTENTOS = 10
+
+
 class CafeteriaProvider(Provider):
     """Proveedor de pago presencial para la cafetería del colegio.
 
@@ -40,6 +44,10 @@ class CafeteriaProvider(Provider):
 
     ``session_id`` (which becomes ``transaction_id`` in the mixin) always
     equals ``merchants_id`` — both use the ``cafe_XXXXXXXX`` format.
+
+    ``display_code_exists`` is an optional callable used to reject display
+    codes already assigned to another payment (the app passes
+    :meth:`app.model.Payment.display_code_exists`, backed by a unique index).
     """
 
     key = "cafeteria"
@@ -49,6 +57,17 @@ class CafeteriaProvider(Provider):
     description = "Pago presencial en efectivo o tarjeta en la cafetería del colegio."
     url = ""
 
+    def __init__(self, display_code_exists: Callable[[str], bool] | None = None) -> None:
+        self.display_code_exists = display_code_exists
+
+    def _new_display_code(self) -> str:
+        """Draw a 6-character display code not yet used by another payment."""
+        for _ in range(DISPLAY_CODE_INTENTOS):
+            code = _rand_code(6)
+            if self.display_code_exists is None or not self.display_code_exists(code):
+                return code
+        raise RuntimeError("No se pudo generar un código de pago único")
+
     def create_checkout(
         self,
         amount: Decimal,
@@ -66,7 +85,7 @@ class CafeteriaProvider(Provider):
         # Falls back to generating cafe_ + 8 random chars.
         session_id = codigo or f"cafe_{_rand_code(8)}"
         # Short display code for screen / QR
-        display_code = _rand_code(6)
+        display_code = self._new_display_code()
         return CheckoutSession(
             session_id=session_id,
             redirect_url=success_url,
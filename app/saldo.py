@@ -0,0 +1,106 @@
+"""Saldo ledger - atomic balance movements for apoderado accounts.
+
+``Apoderado.saldo_cuenta`` is the materialised balance; every change goes
+through :func:`acreditar` or :func:`debitar`, which update it with a single
+``UPDATE ... SET saldo_cuenta = saldo_cuenta ± :monto`` (debits add
+``WHERE saldo_cuenta >= :monto``) and append a
+:class:`~app.model.MovimientoSaldo` row in the same transaction.
+
+Concurrent redemptions and webhooks therefore never lose an update and need
+no read-modify-write round trip: the database serialises the row update and
+a debit that would overdraw the account simply matches no row.
+
+Neither function commits; callers commit together with the rest of their
+unit of work (Pedido, OrdenCasino, Payment state, ...).
+"""
+
+from typing import Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .database import db
+from .model import Apoderado, MovimientoSaldo, TipoMovimientoSaldo
+
+
+def acreditar(
+    apoderado: Apoderado,
+    monto: int,
+    tipo: TipoMovimientoSaldo,
+    **referencias,
+) -> MovimientoSaldo:
+    """Add *monto* to *apoderado*'s balance and record the movement.
+
+    *referencias* are optional ``abono``, ``pedido``, ``orden`` and
+    ``descripcion`` values stored on the :class:`~app.model.MovimientoSaldo`.
+    """
+    nuevo = _mover(apoderado, int(monto), exigir_saldo=False)
+    return _registrar(apoderado, int(monto), nuevo, tipo, referencias)
+
+
+def debitar(
+    apoderado: Apoderado,
+    monto: int,
+    tipo: TipoMovimientoSaldo,
+    **referencias,
+) -> Optional[MovimientoSaldo]:
+    """Subtract *monto* from *apoderado*'s balance if it covers it.
+
+    Returns the recorded movement, or ``None`` when the balance is
+    insufficient (nothing is changed).  References can also be attached to
+    the returned movement afterwards, e.g. once the OrdenCasino exists.
+    """
+    nuevo = _mover(apoderado, -int(monto), exigir_saldo=True)
+    if nuevo is None:
+        return None
+    return _registrar(apoderado, -int(monto), nuevo, tipo, referencias)
+
+
+def historial(apoderado_id: int, limit: int = 50) -> list[MovimientoSaldo]:
+    """Return the latest *limit* movements of an apoderado, newest first."""
+    return (
+        db.session.execute(
+            select(MovimientoSaldo)
+            .filter_by(apoderado_id=apoderado_id)
+            .order_by(MovimientoSaldo.id.desc())
+            .limit(limit)
+        )
+        .scalars()
+        .all()
+    )
+
+
+def _mover(apoderado: Apoderado, delta: int, exigir_saldo: bool) -> Optional[int]:
+    """Apply *delta* in one conditional UPDATE and return the new balance."""
+    tabla = Apoderado.__table__
+    stmt = (
+        update(tabla)
+        .where(tabla.c.id == apoderado.id)
+        .values(saldo_cuenta=func.coalesce(tabla.c.saldo_cuenta, 0) + delta)
+    )
+    if exigir_saldo:
+        stmt = stmt.where(tabla.c.saldo_cuenta >= -delta)
+    if db.engine.dialect.update_returning:
+        nuevo = db.session.execute(stmt.returning(tabla.c.saldo_cuenta)).scalar_one_or_none()
+    else:
+        if db.session.execute(stmt).rowcount == 0:
+            return None
+        # The UPDATE holds the row lock until commit, so this read is ours.
+        nuevo = db.session.execute(select(tabla.c.saldo_cuenta).where(tabla.c.id == apoderado.id)).scalar_one()
+    if nuevo is not None:
+        # Keep the loaded instance in step without flagging a pending change
+        # that would write the balance back at flush time.
+        set_committed_value(apoderado, "saldo_cuenta", nuevo)
+    return nuevo
+
+
+def _registrar(apoderado, monto, saldo_resultante, tipo, referencias) -> MovimientoSaldo:
+    movimiento = MovimientoSaldo(
+        apoderado_id=apoderado.id,
+        tipo=tipo,
+        monto=monto,
+        saldo_resultante=saldo_resultante,
+        **referencias,
+    )
+    db.session.add(movimiento)
+    return movimiento
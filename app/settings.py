@@ -74,6 +74,21 @@ DALEKS_URL = "http://zvn-lin2.local:2525"
 # Override with FLASK_DALEKS_FROM_EMAIL env var in production.
 DALEKS_FROM_EMAIL = "no-reply@sabormirandiano.cl"
 
+# POS live delivery feed (Server-Sent Events).  Empty keeps the broker
+# in-process; set a Redis URL to share events across gunicorn workers
+# (deploy/sm.service does).
+# e.g. export FLASK_POS_FEED_REDIS_URL=redis://localhost:6379/0
+POS_FEED_REDIS_URL = ""
+# Seconds a screen's stream holds a worker thread before it is closed; the
+# browser reconnects and resumes where it left off.
+POS_FEED_STREAM_MAX_SECONDS: int = 300
+# Generation counter that tells every worker's POS roster to reload after
+# another worker changed today's service.  Empty reuses POS_FEED_REDIS_URL;
+# with neither set the counter is per-process and an error is logged at
+# startup when WEB_CONCURRENCY > 1.
+# e.g. export FLASK_POS_ROSTER_REDIS_URL=redis://localhost:6379/0
+POS_ROSTER_REDIS_URL = ""
+
 # Payment provider authentication
 # These can be overridden by environment variables prefixed with FLASK_
 # e.g. export FLASK_KHIPU_API_KEY=your-real-key
@@ -87,6 +102,76 @@ KHIPU_WEBHOOK_SECRET = ""
 # e.g. export FLASK_MERCHANTS_WEBHOOK_BASE_URL=https://pay.example.com
 MERCHANTS_WEBHOOK_BASE_URL = ""
 
+# Redis URL for the checkout session store shared by all workers.  Empty keeps
+# a bounded per-worker store (MERCHANTS_SESSION_STORE_SIZE entries, each kept
+# MERCHANTS_SESSION_STORE_TTL seconds).
+# e.g. export FLASK_MERCHANTS_SESSION_STORE_URL=redis://localhost:6379/1
+MERCHANTS_SESSION_STORE_URL = ""
+
+# Webhook inbox: deliveries are stored in merchants_webhook_inbox and answered
+# immediately; these many threads per worker run the handlers (payment state,
+# abono/pedido processing, emails).  Failed deliveries are retried after
+# MERCHANTS_WEBHOOK_RETRY_BACKOFF seconds, doubled per attempt, and marked
+# dead after MERCHANTS_WEBHOOK_MAX_ATTEMPTS.  Retries pending when a worker
+# restarts are picked up by `flask merchants webhooks retry` (run it from cron).
+MERCHANTS_WEBHOOK_WORKERS: int = 4
+MERCHANTS_WEBHOOK_MAX_ATTEMPTS: int = 5
+MERCHANTS_WEBHOOK_RETRY_BACKOFF: int = 30
+
+# Provider sync ("Sync from Provider" admin action and the
+# `flask merchants payments sync --since <fecha>` sweeper for payments stuck in
+# pending/processing): concurrent provider calls, requests per second per
+# provider, and payments committed per transaction.
+MERCHANTS_SYNC_WORKERS: int = 8
+MERCHANTS_SYNC_RATE_LIMIT: int = 5
+MERCHANTS_SYNC_CHUNK_SIZE: int = 100
+
+# Provider status cache behind /merchants/status/<id>, "Sync from Provider" and
+# the sweeper: seconds a pending/processing status is reused (the success page
+# polls it from every open tab) and seconds a final status is reused.
+# Concurrent lookups of one payment share a single Khipu call.
+MERCHANTS_STATUS_CACHE_TTL: int = 2
+MERCHANTS_STATUS_CACHE_FINAL_TTL: int = 300
+
+# /merchants/status/<id>/wait (long-poll) and /stream (SSE) hold the request
+# until a webhook or state update changes the payment, asking Khipu only after
+# this many seconds without news.  Each waiting browser occupies a worker
+# thread (deploy/ runs gunicorn with gthread workers for this).  A stream is
+# closed after MERCHANTS_STATUS_STREAM_MAX_SECONDS and asks Khipu at most
+# MERCHANTS_STATUS_STREAM_MAX_REFRESHES times.  With more than one gunicorn
+# worker, notifications must go through Redis so a webhook received by one
+# worker wakes browsers waiting on the others; empty reuses
+# MERCHANTS_SESSION_STORE_URL, and with neither set an error is logged at
+# startup when WEB_CONCURRENCY > 1.  deploy/sm.service sets it.
+# e.g. export FLASK_MERCHANTS_STATUS_NOTIFY_URL=redis://localhost:6379/2
+MERCHANTS_STATUS_WAIT_TIMEOUT: int = 25
+MERCHANTS_STATUS_STREAM_MAX_SECONDS: int = 300
+MERCHANTS_STATUS_STREAM_MAX_REFRESHES: int = 5
+MERCHANTS_STATUS_NOTIFY_URL = ""
+
+# Checkout guards (per worker process): at most this many Khipu checkout calls
+# in flight at once, and a circuit breaker that stops calling Khipu for
+# MERCHANTS_BREAKER_OPEN_SECONDS once half of the last calls within a minute
+# failed.  While tripped, the abono and pedido pages offer paying at the
+# cafeteria instead of waiting on Khipu.  Both are per process: with the
+# gthread deploy (WEB_CONCURRENCY=4 workers) Khipu sees up to 4 x 2 = 8
+# concurrent checkouts, and each worker trips its own breaker.  Size the cap as
+# the total you want divided by WEB_CONCURRENCY.
+MERCHANTS_PROVIDER_MAX_CONCURRENT = {"khipu": 2, "*": 0}
+MERCHANTS_BREAKER_FAILURE_RATE: float = 0.5
+MERCHANTS_BREAKER_MIN_CALLS: int = 5
+MERCHANTS_BREAKER_WINDOW: int = 60
+MERCHANTS_BREAKER_OPEN_SECONDS: int = 30
+
+# Provider call timing: every Khipu call is recorded in per-worker histograms
+# served at /merchants/metrics (Prometheus text format) and logged on the
+# "merchants.calls" logger, at WARNING when slower than
+# MERCHANTS_SLOW_CALL_SECONDS.  The scrape needs
+# "Authorization: Bearer <token>"; without a token the endpoint answers 404.
+# e.g. export FLASK_MERCHANTS_METRICS_TOKEN=your-scrape-token
+MERCHANTS_SLOW_CALL_SECONDS: int = 5
+MERCHANTS_METRICS_TOKEN = ""
+
 # UI display labels shown in the payment modal (modal-abono).
 # Keys must match the provider key registered in flask_merchants.
 # Falls back to provider.name / provider.description when a key is absent.
@@ -192,6 +277,32 @@ AUDIT_LOG_BACKUP_COUNT = 30
 # Path shown in the admin dashboard audit panel (must match audit_file above)
 AUDIT_LOG_PATH = f"{BASE_DIR}/logs/audit.log"
 
+# ------------------------------------------------------------------
+# Dashboard counters
+# ------------------------------------------------------------------
+
+# Seconds after which the incrementally maintained dashboard counters are
+# recounted from scratch on the next read, correcting any drift.
+DASHBOARD_RECUENTO_SEGUNDOS: int = 600
+
+# ------------------------------------------------------------------
+# Menu stock
+# ------------------------------------------------------------------
+
+# Enforce MenuDiario.stock: orders reserve units when they are created and
+# menus flip to fuera_stock when they run out.  Off by default because menus
+# created before the stock field was used carry the column default of 1.
+MENU_CONTROL_STOCK: bool = False
+
+# Minutes an unpaid pedido keeps its reserved units before they can be
+# handed to another order.
+MENU_RESERVA_MINUTOS: int = 30
+
+# Fragments used by the "Fragmentar Stock" action of the MenuDiario admin:
+# a hot menu's units are spread over this many rows so concurrent orders do
+# not all update the same one.
+MENU_STOCK_FRAGMENTOS: int = 4
+
 # ------------------------------------------------------------------
 # School staff periodic email scheduler
 # Runs are triggered on the first matching Flask request (no Celery Beat needed).
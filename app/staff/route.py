@@ -10,15 +10,22 @@ from decimal import Decimal, InvalidOperation
 
 from flask import Blueprint, abort, flash, jsonify, redirect, render_template, request, url_for
 from flask_security import current_user, roles_accepted  # type: ignore
+from flask_merchants import ProviderUnavailable
 
 from ..database import db
-from ..extensions import limiter
+from ..extensions import flask_merchants, limiter
 from ..model import MenuDiario, Payment, SchoolStaffPedido, EstadoPedido, SchoolStaff
 from .controller import SchoolStaffController
 
 staff_bp = Blueprint("staff", __name__)
 ctrl = SchoolStaffController()
 
+# Shown when a payment provider's circuit is open or its bulkhead is full.
+_MENSAJE_PROVEEDOR_NO_DISPONIBLE = (
+    "El medio de pago no está disponible en este momento. "
+    "Puedes pagar presencialmente en la cafetería."
+)
+
 
 # ---------------------------------------------------------------------------
 # Dashboard
@@ -154,6 +161,9 @@ def pago_orden(orden):
                 return redirect(url_for("staff.pago_orden", orden=pedido.codigo))
 
             # External payment providers (cafeteria, khipu, etc.)
+            if not flask_merchants.provider_available(forma_pago):
+                flash(_MENSAJE_PROVEEDOR_NO_DISPONIBLE, "warning")
+                return redirect(url_for("staff.pago_orden", orden=pedido.codigo))
             # For cafeteria, generate cafe_ codigo so merchants_id == transaction_id
             cafe_extra = {}
             if forma_pago == "cafeteria":
@@ -162,20 +172,26 @@ def pago_orden(orden):
                 pedido.codigo = cafe_codigo
                 cafe_extra = {"codigo": cafe_codigo}
 
-            payment = Payment.create(
-                amount=total,
-                currency="CLP",
-                provider=forma_pago,
-                success_url=url_for("staff.pago_orden", orden=pedido.codigo, _external=True),
-                cancel_url=url_for("staff.pago_orden", orden=pedido.codigo, _external=True),
-                merchants_id=pedido.codigo if forma_pago == "cafeteria" else None,
-                extra_args=cafe_extra or None,
-                request_context={
-                    "pedido_codigo": pedido.codigo,
-                    "forma_pago": forma_pago,
-                    "staff_id": str(staff.id),
-                },
-            )
+            try:
+                payment = Payment.create(
+                    amount=total,
+                    currency="CLP",
+                    provider=forma_pago,
+                    success_url=url_for("staff.pago_orden", orden=pedido.codigo, _external=True),
+                    cancel_url=url_for("staff.pago_orden", orden=pedido.codigo, _external=True),
+                    merchants_id=pedido.codigo if forma_pago == "cafeteria" else None,
+                    extra_args=cafe_extra or None,
+                    request_context={
+                        "pedido_codigo": pedido.codigo,
+                        "forma_pago": forma_pago,
+                        "staff_id": str(staff.id),
+                    },
+                )
+            except ProviderUnavailable:
+                # Became unavailable after the check above; undo the cafeteria codigo.
+                db.session.rollback()
+                flash(_MENSAJE_PROVEEDOR_NO_DISPONIBLE, "warning")
+                return redirect(url_for("staff.pago_orden", orden=pedido.codigo))
 
             pedido.codigo_merchants = payment.merchants_id
             pedido.precio_total = total
@@ -0,0 +1,354 @@
+"""Menu stock - atomic reservation of MenuDiario units.
+
+Orders take units with a single conditional
+``UPDATE ... SET stock = stock - :n WHERE stock >= :n``, so concurrent
+checkouts never oversell and need no read-modify-write round trip; the
+statement that takes the last unit also sets ``fuera_stock`` so the menu
+drops out of :meth:`~app.pos.crud.PosController.get_menus_hoy`.
+
+Web orders follow reserve / confirm / release semantics:
+
+- :func:`reservar` when the Pedido is created (:class:`~app.model.ReservaStock`
+  rows in state ``RESERVADA``),
+- :func:`confirmar` once it is paid,
+- :func:`liberar` when its payment fails or is cancelled (the webhook and
+  sync handlers in :mod:`app.core`); unpaid reservations older than
+  ``MENU_RESERVA_MINUTOS`` are also released lazily when a menu runs out.
+
+Kiosk sales and credit redemptions are paid on the spot and use
+:func:`consumir`, which records an already confirmed reservation.
+
+Hot menus can be split with :func:`fragmentar` (the "Fragmentar Stock"
+action of the MenuDiario admin) into :class:`~app.model.MenuStockFragmento`
+rows; reservations then decrement a random fragment instead of all
+contending for the ``casino_menu_dia`` row.
+
+Everything is a no-op unless ``MENU_CONTROL_STOCK`` is enabled.  Nothing in
+this module commits; callers commit with the rest of their unit of work.
+"""
+
+import logging
+import random
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from flask import current_app
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .database import db
+from .model import EstadoReserva, MenuDiario, MenuStockFragmento, Pedido, ReservaStock
+
+logger = logging.getLogger(__name__)
+
+
+class SinStock(Exception):
+    """Raised when a menu cannot cover the requested units."""
+
+    def __init__(self, slug: str) -> None:
+        super().__init__(f"Menú sin stock: {slug}")
+        self.slug = slug
+
+
+def activo() -> bool:
+    """Return whether stock control is enabled (``MENU_CONTROL_STOCK``)."""
+    return bool(current_app.config.get("MENU_CONTROL_STOCK", False))
+
+
+# ------------------------------------------------------------------
+# Public API
+# ------------------------------------------------------------------
+
+
+def reservar(items: Iterable[dict], pedido: Optional[Pedido] = None) -> list[ReservaStock]:
+    """Reserve the units ordered in *items* (all or nothing).
+
+    *items* has the ``Pedido.extra_attrs`` shape (``{"slug", "alumnos"}``
+    dicts; one unit per alumno).  Slugs without a MenuDiario (e.g. the
+    virtual rezagados menu) are not stock-controlled.  Raises
+    :class:`SinStock` after returning any units already taken; otherwise
+    the caller may set ``pedido`` on the returned reservations.
+    """
+    if not activo():
+        return []
+    reservas = []
+    # Keep the new rows pending so a failure can simply discard them.
+    with db.session.no_autoflush:
+        try:
+            for menu, cantidad in _menus_pedidos(items):
+                reservas.append(_reservar_menu(menu, cantidad, pedido, EstadoReserva.RESERVADA))
+        except SinStock:
+            for reserva in reservas:
+                _liberar_reserva(reserva)
+            raise
+    return reservas
+
+
+def confirmar(pedido: Pedido) -> None:
+    """Mark *pedido*'s reservations as sold.
+
+    Items whose reservation was released in the meantime (or that were never
+    reserved) take their units now.  The order is already paid, so a menu
+    that has run out is logged as oversold instead of rejecting it.
+    """
+    if not activo():
+        return
+    reservas = _reservas(pedido)
+    cubiertos = Counter()
+    for reserva in reservas:
+        if reserva.estado == EstadoReserva.RESERVADA:
+            _cambiar_estado(reserva, EstadoReserva.RESERVADA, EstadoReserva.CONFIRMADA)
+        if reserva.estado == EstadoReserva.CONFIRMADA:
+            cubiertos[reserva.menu_id] += reserva.cantidad
+
+    for menu, cantidad in _menus_pedidos(pedido.extra_attrs):
+        faltan = cantidad - cubiertos[menu.id]
+        if faltan <= 0:
+            continue
+        try:
+            _reservar_menu(menu, faltan, pedido, EstadoReserva.CONFIRMADA)
+        except SinStock:
+            logger.warning("stock_sobrevendido: pedido=%s menu=%s cantidad=%d", pedido.codigo, menu.slug, faltan)
+
+
+def liberar(pedido: Pedido) -> int:
+    """Release *pedido*'s pending reservations and return the units freed."""
+    if not activo():
+        return 0
+    return sum(
+        reserva.cantidad
+        for reserva in _reservas(pedido)
+        if reserva.estado == EstadoReserva.RESERVADA and _liberar_reserva(reserva)
+    )
+
+
+def liberar_vencidas(minutos: Optional[int] = None) -> int:
+    """Release reservations left unpaid for more than *minutos*.
+
+    Defaults to ``MENU_RESERVA_MINUTOS``.  Returns the units freed.
+    """
+    if minutos is None:
+        minutos = current_app.config.get("MENU_RESERVA_MINUTOS", 30)
+    limite = datetime.now(tz=timezone.utc).replace(tzinfo=None) - timedelta(minutes=minutos)
+    vencidas = (
+        db.session.execute(
+            select(ReservaStock).where(
+                ReservaStock.estado == EstadoReserva.RESERVADA,
+                ReservaStock.created < limite,
+            )
+        )
+        .scalars()
+        .all()
+    )
+    return sum(reserva.cantidad for reserva in vencidas if _liberar_reserva(reserva))
+
+
+def consumir(menu: MenuDiario, cantidad: int = 1, pedido: Optional[Pedido] = None) -> Optional[ReservaStock]:
+    """Take *cantidad* units of *menu* for an order paid on the spot.
+
+    Returns the confirmed reservation (``None`` when stock control is off);
+    the caller may set its ``pedido`` afterwards.  Raises :class:`SinStock`.
+    """
+    if not activo():
+        return None
+    return _reservar_menu(menu, cantidad, pedido, EstadoReserva.CONFIRMADA)
+
+
+def anular(reserva: Optional[ReservaStock]) -> None:
+    """Give back the units of a reservation whose order did not go ahead."""
+    if reserva is not None:
+        _liberar_reserva(reserva)
+
+
+def disponible(menu: MenuDiario) -> int:
+    """Return the units of *menu* still available, across all fragments."""
+    fragmentos = db.session.execute(
+        select(func.coalesce(func.sum(MenuStockFragmento.disponible), 0)).where(
+            MenuStockFragmento.menu_id == menu.id
+        )
+    ).scalar_one()
+    tabla = MenuDiario.__table__
+    stock = db.session.execute(select(tabla.c.stock).where(tabla.c.id == menu.id)).scalar_one()
+    return stock + fragmentos
+
+
+def fragmentar(menu: MenuDiario, fragmentos: int) -> None:
+    """Spread *menu*'s available units over *fragmentos* rows.
+
+    ``0`` folds everything back into ``MenuDiario.stock``.  While fragmented,
+    ``MenuDiario.stock`` only holds units added later (e.g. an admin
+    restock); reservations use it once every fragment is empty.
+    """
+    total = disponible(menu)
+    db.session.execute(db.delete(MenuStockFragmento).filter_by(menu_id=menu.id))
+    base, resto = divmod(total, fragmentos) if fragmentos > 0 else (0, total)
+    if fragmentos > 0:
+        db.session.execute(
+            MenuStockFragmento.__table__.insert(),
+            [
+                {"menu_id": menu.id, "fragmento": i, "disponible": base + (1 if i < resto else 0)}
+                for i in range(fragmentos)
+            ],
+        )
+    menu.stock = resto if fragmentos <= 0 else 0
+    menu.stock_fragmentos = max(fragmentos, 0)
+    menu.fuera_stock = total <= 0
+
+
+# ------------------------------------------------------------------
+# Internals
+# ------------------------------------------------------------------
+
+
+def _menus_pedidos(items) -> list[tuple[MenuDiario, int]]:
+    """Aggregate ``{"slug", "alumnos"}`` items into ``(menu, units)`` pairs."""
+    cantidades = Counter()
+    for item in items or []:
+        slug = item.get("slug")
+        if slug:
+            cantidades[slug] += len(item.get("alumnos") or [])
+    if not cantidades:
+        return []
+    menus = db.session.execute(select(MenuDiario).where(MenuDiario.slug.in_(cantidades))).scalars().all()
+    # Stable order so concurrent orders for the same menus lock rows alike.
+    return [(menu, cantidades[menu.slug]) for menu in sorted(menus, key=lambda m: m.id) if cantidades[menu.slug] > 0]
+
+
+def _reservas(pedido: Pedido) -> list[ReservaStock]:
+    return db.session.execute(select(ReservaStock).filter_by(pedido_id=pedido.id)).scalars().all()
+
+
+def _reservar_menu(menu, cantidad, pedido, estado) -> ReservaStock:
+    fragmento = _tomar(menu, cantidad)
+    if fragmento is False and liberar_vencidas():
+        fragmento = _tomar(menu, cantidad)
+    if fragmento is False:
+        _marcar_agotado(menu)
+        raise SinStock(menu.slug)
+    reserva = ReservaStock(menu_id=menu.id, pedido=pedido, cantidad=cantidad, fragmento=fragmento, estado=estado)
+    db.session.add(reserva)
+    return reserva
+
+
+def _tomar(menu: MenuDiario, cantidad: int):
+    """Take *cantidad* units; return the fragment used, ``None`` or ``False``.
+
+    ``None`` means the units came from ``MenuDiario.stock``; ``False`` that
+    nothing could cover them.
+    """
+    if menu.stock_fragmentos:
+        fragmentos = list(range(menu.stock_fragmentos))
+        inicio = random.randrange(len(fragmentos))
+        for fragmento in fragmentos[inicio:] + fragmentos[:inicio]:
+            restante = _tomar_fragmento(menu, fragmento, cantidad)
+            if restante is not None:
+                if restante == 0 and disponible(menu) == 0:
+                    _set_fuera_stock(menu, True)
+                return fragmento
+    tabla = MenuDiario.__table__
+    stmt = (
+        update(tabla)
+        .where(tabla.c.id == menu.id, tabla.c.stock >= cantidad)
+        # fuera_stock first: MySQL evaluates SET clauses left to right.
+        .ordered_values(
+            (tabla.c.fuera_stock, case((tabla.c.stock <= cantidad, True), else_=tabla.c.fuera_stock)),
+            (tabla.c.stock, tabla.c.stock - cantidad),
+        )
+    )
+    if db.engine.dialect.update_returning:
+        fila = db.session.execute(stmt.returning(tabla.c.stock, tabla.c.fuera_stock)).one_or_none()
+    elif db.session.execute(stmt).rowcount:
+        # The UPDATE holds the row lock until commit, so this read is ours.
+        fila = db.session.execute(select(tabla.c.stock, tabla.c.fuera_stock).where(tabla.c.id == menu.id)).one()
+    else:
+        fila = None
+    if fila is None:
+        return False
+    set_committed_value(menu, "stock", fila.stock)
+    set_committed_value(menu, "fuera_stock", fila.fuera_stock)
+    return None
+
+
+def _tomar_fragmento(menu, fragmento, cantidad) -> Optional[int]:
+    """Decrement one fragment; return its remaining units or ``None``."""
+    tabla = MenuStockFragmento.__table__
+    condicion = (tabla.c.menu_id == menu.id) & (tabla.c.fragmento == fragmento)
+    stmt = (
+        update(tabla)
+        .where(condicion, tabla.c.disponible >= cantidad)
+        .values(disponible=tabla.c.disponible - cantidad)
+    )
+    if db.engine.dialect.update_returning:
+        return db.session.execute(stmt.returning(tabla.c.disponible)).scalar_one_or_none()
+    if db.session.execute(stmt).rowcount == 0:
+        return None
+    return db.session.execute(select(tabla.c.disponible).where(condicion)).scalar_one()
+
+
+def _devolver(menu_id: int, cantidad: int, fragmento: Optional[int]) -> None:
+    if fragmento is not None:
+        tabla = MenuStockFragmento.__table__
+        devuelto = db.session.execute(
+            update(tabla)
+            .where(tabla.c.menu_id == menu_id, tabla.c.fragmento == fragmento)
+            .values(disponible=tabla.c.disponible + cantidad)
+        ).rowcount
+        if devuelto:
+            _set_fuera_stock(db.session.get(MenuDiario, menu_id), False)
+            return
+    # Unfragmented menu, or the fragment is gone after a re-split.
+    tabla = MenuDiario.__table__
+    db.session.execute(
+        update(tabla).where(tabla.c.id == menu_id).values(stock=tabla.c.stock + cantidad, fuera_stock=False)
+    )
+    menu = db.session.get(MenuDiario, menu_id)
+    if menu is not None:
+        db.session.expire(menu, ["stock", "fuera_stock"])
+
+
+def _liberar_reserva(reserva: ReservaStock) -> bool:
+    """Release *reserva* once; return whether this call released it."""
+    if reserva.id is None:
+        # Never flushed: nobody else can see it, so just drop it.
+        if reserva not in db.session:
+            return False
+        db.session.expunge(reserva)
+    elif not _cambiar_estado(reserva, reserva.estado, EstadoReserva.LIBERADA):
+        return False
+    _devolver(reserva.menu_id, reserva.cantidad, reserva.fragmento)
+    return True
+
+
+def _cambiar_estado(reserva: ReservaStock, desde: EstadoReserva, hacia: EstadoReserva) -> bool:
+    """Move *reserva* from *desde* to *hacia* unless another worker got there first."""
+    if desde == hacia:
+        return False
+    tabla = ReservaStock.__table__
+    cambiado = db.session.execute(
+        update(tabla)
+        .where(tabla.c.id == reserva.id, tabla.c.estado == desde)
+        .values(estado=hacia, updated=datetime.now(tz=timezone.utc).replace(tzinfo=None))
+    ).rowcount
+    if cambiado:
+        set_committed_value(reserva, "estado", hacia)
+    else:
+        db.session.expire(reserva, ["estado"])
+    return bool(cambiado)
+
+
+def _marcar_agotado(menu: MenuDiario) -> None:
+    """Flip ``fuera_stock`` when a failed reservation found the menu empty."""
+    if disponible(menu) <= 0:
+        _set_fuera_stock(menu, True)
+
+
+def _set_fuera_stock(menu: Optional[MenuDiario], valor: bool) -> None:
+    if menu is None:
+        return
+    tabla = MenuDiario.__table__
+    # Conditional so the common case does not write to the contended row.
+    db.session.execute(
+        update(tabla).where(tabla.c.id == menu.id, tabla.c.fuera_stock.isnot(valor)).values(fuera_stock=valor)
+    )
+    set_committed_value(menu, "fuera_stock", valor)
@@ -2,20 +2,48 @@
 
 from __future__ import annotations
 
-import json
+import heapq
+import hmac
 import logging
-from typing import Any, Callable
+import os
+import threading
+from datetime import datetime
+from typing import Any, Callable, Iterator
 
 import merchants
+from merchants.cache import StatusCache
+from merchants.instrument import CallEvent, Instrumentation, MetricsRecorder, MetricsRegistry, log_call
 from merchants.providers.dummy import DummyProvider
 
+from flask_merchants.breaker import Bulkhead, CircuitBreaker, ProviderGuard, ProviderUnavailable
+from flask_merchants.context import WebhookContext
+from flask_merchants.inbox import WebhookInbox, dedup_key
+from flask_merchants.locking import payment_lock
+from flask_merchants.notify import LocalBackend, RedisBackend, StatusNotifier
+from flask_merchants.routing import PaymentRouter
+from flask_merchants.store import MemorySessionStore, RedisSessionStore, SessionStore
+from flask_merchants.sync import STUCK_STATES, PaymentSyncEngine, SyncResult
 from flask_merchants.views import create_blueprint
 from flask_merchants.version import __version__
 
-__all__ = ["FlaskMerchants", "merchants_audit"]
+__all__ = ["FlaskMerchants", "ProviderUnavailable", "merchants_audit"]
 
 logger = logging.getLogger(__name__)
 
+#: Columns returned by :meth:`FlaskMerchants.iter_sessions` for every payment.
+SESSION_SUMMARY_FIELDS = (
+    "merchants_id",
+    "transaction_id",
+    "provider",
+    "amount",
+    "currency",
+    "state",
+    "email",
+    "created_at",
+)
+#: JSON columns added by :meth:`FlaskMerchants.iter_sessions` with ``include_payloads=True``.
+SESSION_PAYLOAD_FIELDS = ("extra_args", "request_payload", "response_payload", "payment_object")
+
 # ---------------------------------------------------------------------------
 # Audit logger
 # ---------------------------------------------------------------------------
@@ -39,6 +67,14 @@ def _is_quart_app(app) -> bool:
         return False
 
 
+def _web_concurrency() -> int:
+    """Worker processes the server was told to start (gunicorn's ``WEB_CONCURRENCY``), ``1`` when unset."""
+    try:
+        return int(os.environ.get("WEB_CONCURRENCY", 1))
+    except ValueError:
+        return 1
+
+
 class FlaskMerchants:
     """Flask/Quart extension that wires the *merchants* SDK into an application.
 
@@ -148,9 +184,89 @@ class FlaskMerchants:
         (e.g. ``"https://example.com"``).  Required for
         :meth:`get_webhook_url`.  When empty, that method raises
         ``RuntimeError``.
+    ``MERCHANTS_SESSION_STORE_SIZE`` / ``MERCHANTS_SESSION_STORE_TTL``
+        Maximum entries (default: ``1000``) and age in seconds (default:
+        ``3600``) of the in-process checkout session store.
+    ``MERCHANTS_SESSION_STORE_URL``
+        Redis URL for a session store shared by all workers (default: empty,
+        in-process store).  See :mod:`flask_merchants.store`.
+    ``MERCHANTS_ROUTING_CACHE_SIZE``
+        Number of payment ids kept in the routing index that maps a
+        ``merchants_id`` / ``transaction_id`` to its model class and primary
+        key (default: ``10000``; ``0`` disables it).  See
+        :class:`~flask_merchants.routing.PaymentRouter`.
+    ``MERCHANTS_WEBHOOK_WORKERS``
+        Threads processing webhook inbox entries (default: ``4``; ``0``
+        processes each entry inline).  Only used with an ``inbox_model``.
+    ``MERCHANTS_WEBHOOK_MAX_ATTEMPTS`` / ``MERCHANTS_WEBHOOK_RETRY_BACKOFF``
+        Attempts before an inbox entry is dead-lettered (default: ``5``) and
+        seconds before its first retry, doubled per attempt (default: ``30``).
+    ``MERCHANTS_WEBHOOK_STALE_AFTER``
+        Seconds after which an entry left ``processing`` is retried
+        (default: ``600``).  See :mod:`flask_merchants.inbox`.
+    ``MERCHANTS_SYNC_WORKERS``
+        Concurrent provider calls made by :meth:`sync_payments`
+        (default: ``8``).
+    ``MERCHANTS_SYNC_RATE_LIMIT``
+        Provider requests per second during a sync, per provider; a dict maps
+        provider keys to their own limit (default: ``5``; ``0`` = unlimited).
+    ``MERCHANTS_SYNC_CHUNK_SIZE``
+        Payments written per transaction by a sync (default: ``100``).
+        See :mod:`flask_merchants.sync`.
+    ``MERCHANTS_STATUS_CACHE_TTL`` / ``MERCHANTS_STATUS_CACHE_FINAL_TTL``
+        Seconds a provider status is reused by ``client.payments.get`` while
+        the payment can still change (default: ``2``) and once it is final
+        (default: ``300``); ``0`` disables.  Concurrent lookups of one
+        payment share a single provider call.  See :attr:`status_cache`.
+    ``MERCHANTS_STATUS_WAIT_TIMEOUT``
+        Longest a ``/status/<payment_id>/wait`` request is held waiting for
+        the payment to change, in seconds (default: ``25``); after it the
+        provider is asked once (through the status cache).
+    ``MERCHANTS_STATUS_STREAM_MAX_SECONDS``
+        Longest a ``/status/<payment_id>/stream`` response stays open, in
+        seconds (default: ``300``); it then ends with a ``timeout`` event.
+    ``MERCHANTS_STATUS_STREAM_MAX_REFRESHES``
+        Provider checks one stream may make after waiting
+        ``MERCHANTS_STATUS_WAIT_TIMEOUT`` without news (default: ``5``).
+    ``MERCHANTS_STATUS_NOTIFY_URL``
+        Redis URL used to wake waiting requests on every worker (default:
+        empty: the ``MERCHANTS_SESSION_STORE_URL`` Redis when one is set,
+        in-process delivery otherwise).  In-process delivery only works
+        with a single worker process; an error is logged at startup when
+        ``WEB_CONCURRENCY`` asks for more.  See :mod:`flask_merchants.notify`.
+    ``MERCHANTS_PROVIDER_MAX_CONCURRENT``
+        Checkout calls in flight per provider in each process; a dict maps
+        provider keys to their own cap, key ``"*"`` for the rest (default:
+        ``4``; ``0`` = unlimited).
+    ``MERCHANTS_BREAKER_FAILURE_RATE`` / ``MERCHANTS_BREAKER_MIN_CALLS`` / ``MERCHANTS_BREAKER_WINDOW``
+        A provider's circuit opens when at least this fraction (default:
+        ``0.5``) of at least this many calls (default: ``5``) in the last
+        this-many seconds (default: ``60``) failed.
+    ``MERCHANTS_BREAKER_OPEN_SECONDS``
+        Seconds an open circuit fails calls at once before letting a probe
+        through (default: ``30``).  See :mod:`flask_merchants.breaker`.
+    ``MERCHANTS_SLOW_CALL_SECONDS``
+        Provider calls slower than this are logged at WARNING on the
+        ``merchants.calls`` logger (default: ``5``); the rest at DEBUG.
+    ``MERCHANTS_METRICS_TOKEN``
+        Bearer token required by the ``/metrics`` view.  Empty (the default)
+        disables the view: it answers 404.  See :attr:`metrics`.
     """
 
-    def __init__(self, app=None, *, provider=None, providers=None, db=None, model=None, models=None, admin=None) -> None:
+    def __init__(
+        self,
+        app=None,
+        *,
+        provider=None,
+        providers=None,
+        db=None,
+        model=None,
+        models=None,
+        admin=None,
+        store: SessionStore | None = None,
+        inbox_model=None,
+        inbox_dispatcher=None,
+    ) -> None:
         self._provider = provider
         self._providers: list = list(providers) if providers is not None else []
         self._db = db
@@ -162,11 +278,38 @@ class FlaskMerchants:
         self._client: merchants.Client | None = None
         # Local cache: provider key -> merchants.Client
         self._clients: dict[str, merchants.Client] = {}
-        # Simple in-memory payment store: {payment_id: dict}
-        # Used when no SQLAlchemy db is provided.
-        self._store: dict[str, dict[str, Any]] = {}
+        # Checkout session store keyed by merchants_id: the only record when
+        # no SQLAlchemy db is provided, a write-through copy otherwise.
+        self._store_override = store
+        self._store: SessionStore = store if store is not None else MemorySessionStore()
         # Registered webhook event handlers; called after each /webhook/<provider> request.
         self._webhook_handlers: list = []
+        # Loads the application object linked to a webhook's payment (WebhookContext.entity).
+        self._webhook_entity_loader: Callable[[WebhookContext], Any] | None = None
+        # payment id -> (model class, primary key); see flask_merchants.routing.
+        self._router = PaymentRouter()
+        # Durable webhook inbox; None processes webhooks inside the request.
+        self._inbox_model = inbox_model
+        self._inbox_dispatcher = inbox_dispatcher
+        self._inbox: WebhookInbox | None = None
+        # Called with each SyncResult whose state changed; see sync_payments().
+        self._sync_handlers: list = []
+        self._sync_engine = PaymentSyncEngine(self)
+        # Provider statuses shared by every client this extension creates.
+        self._status_cache = StatusCache()
+        # Wakes /status/<id>/wait and /stream requests when a payment changes.
+        self._notifier = StatusNotifier()
+        # provider key -> ProviderGuard (circuit breaker + bulkhead), built on first use.
+        self._guards: dict[str, ProviderGuard] = {}
+        self._guards_lock = threading.Lock()
+        self._guard_config: dict[str, Any] = {}
+        # Duration, status, retries and sizes of every provider call, served by /metrics.
+        self._metrics = MetricsRegistry()
+        self._instrumentation = Instrumentation()
+        self._instrumentation.add_listener(MetricsRecorder(self._metrics))
+        self._instrumentation.add_listener(self._log_call)
+        self._slow_call_seconds = 5.0
+        self._metrics_token = ""
 
         if app is not None:
             self.init_app(app)
@@ -185,6 +328,9 @@ class FlaskMerchants:
         model=None,
         models=None,
         admin=None,
+        store: SessionStore | None = None,
+        inbox_model=None,
+        inbox_dispatcher=None,
     ) -> None:
         """Initialise the extension against *app* (Flask or Quart).
 
@@ -224,6 +370,20 @@ class FlaskMerchants:
                 a fallback.  :class:`~flask_merchants.contrib.admin.ProvidersView`
                 is always added.
                 Overrides the value passed to ``__init__``.
+            store: A :class:`~flask_merchants.store.SessionStore` for
+                checkout sessions.  When omitted, one is built from the
+                ``MERCHANTS_SESSION_STORE_*`` config keys.  Overrides the
+                value passed to ``__init__``.
+            inbox_model: A model class mixing in
+                :class:`~flask_merchants.inbox.WebhookInboxMixin`.  When
+                supplied (requires *db*), webhook deliveries are stored and
+                acknowledged immediately, and processed by
+                :class:`~flask_merchants.inbox.WebhookInbox` workers.
+                Overrides the value passed to ``__init__``.
+            inbox_dispatcher: ``fn(entry_id, delay_seconds)`` handing inbox
+                entries to an external queue (e.g. Celery) instead of the
+                in-process thread pool.  Overrides the value passed to
+                ``__init__``.
 
         Any providers supplied via *provider* / *providers* are registered into
         the ``merchants`` global registry so that they become discoverable via
@@ -247,6 +407,12 @@ class FlaskMerchants:
             self._models = list(models)
         if admin is not None:
             self._admin = admin
+        if store is not None:
+            self._store_override = store
+        if inbox_model is not None:
+            self._inbox_model = inbox_model
+        if inbox_dispatcher is not None:
+            self._inbox_dispatcher = inbox_dispatcher
         # Register explicitly-supplied providers into the merchants registry.
         all_providers: list = list(self._providers)
         if self._provider is not None:
@@ -266,9 +432,68 @@ class FlaskMerchants:
         app.config.setdefault("MERCHANTS_PAYMENT_VIEW_NAME", "Payments")
         app.config.setdefault("MERCHANTS_PROVIDER_VIEW_NAME", "Providers")
         app.config.setdefault("MERCHANTS_WEBHOOK_BASE_URL", "")
-
+        app.config.setdefault("MERCHANTS_ROUTING_CACHE_SIZE", 10_000)
+        app.config.setdefault("MERCHANTS_SESSION_STORE_SIZE", 1000)
+        app.config.setdefault("MERCHANTS_SESSION_STORE_TTL", 3600)
+        app.config.setdefault("MERCHANTS_SESSION_STORE_URL", "")
+        app.config.setdefault("MERCHANTS_WEBHOOK_WORKERS", 4)
+        app.config.setdefault("MERCHANTS_WEBHOOK_MAX_ATTEMPTS", 5)
+        app.config.setdefault("MERCHANTS_WEBHOOK_RETRY_BACKOFF", 30)
+        app.config.setdefault("MERCHANTS_WEBHOOK_STALE_AFTER", 600)
+        app.config.setdefault("MERCHANTS_SYNC_WORKERS", 8)
+        app.config.setdefault("MERCHANTS_SYNC_RATE_LIMIT", 5)
+        app.config.setdefault("MERCHANTS_SYNC_CHUNK_SIZE", 100)
+        app.config.setdefault("MERCHANTS_STATUS_CACHE_TTL", 2)
+        app.config.setdefault("MERCHANTS_STATUS_CACHE_FINAL_TTL", 300)
+        app.config.setdefault("MERCHANTS_STATUS_WAIT_TIMEOUT", 25)
+        app.config.setdefault("MERCHANTS_STATUS_STREAM_MAX_SECONDS", 300)
+        app.config.setdefault("MERCHANTS_STATUS_STREAM_MAX_REFRESHES", 5)
+        app.config.setdefault("MERCHANTS_STATUS_NOTIFY_URL", "")
+        app.config.setdefault("MERCHANTS_PROVIDER_MAX_CONCURRENT", 4)
+        app.config.setdefault("MERCHANTS_BREAKER_FAILURE_RATE", 0.5)
+        app.config.setdefault("MERCHANTS_BREAKER_MIN_CALLS", 5)
+        app.config.setdefault("MERCHANTS_BREAKER_WINDOW", 60)
+        app.config.setdefault("MERCHANTS_BREAKER_OPEN_SECONDS", 30)
+        app.config.setdefault("MERCHANTS_SLOW_CALL_SECONDS", 5)
+        app.config.setdefault("MERCHANTS_METRICS_TOKEN", "")
+
+        self._router = PaymentRouter(app.config["MERCHANTS_ROUTING_CACHE_SIZE"])
+        self._store = self._make_store(app.config)
+        self._status_cache.ttl = app.config["MERCHANTS_STATUS_CACHE_TTL"]
+        self._status_cache.final_ttl = app.config["MERCHANTS_STATUS_CACHE_FINAL_TTL"]
+        self._status_wait_timeout = app.config["MERCHANTS_STATUS_WAIT_TIMEOUT"]
+        self._guard_config = {
+            "max_concurrent": app.config["MERCHANTS_PROVIDER_MAX_CONCURRENT"],
+            "failure_rate": app.config["MERCHANTS_BREAKER_FAILURE_RATE"],
+            "min_calls": app.config["MERCHANTS_BREAKER_MIN_CALLS"],
+            "window": app.config["MERCHANTS_BREAKER_WINDOW"],
+            "open_seconds": app.config["MERCHANTS_BREAKER_OPEN_SECONDS"],
+        }
+        self._guards = {}
+        self._slow_call_seconds = app.config["MERCHANTS_SLOW_CALL_SECONDS"]
+        self._metrics_token = app.config["MERCHANTS_METRICS_TOKEN"]
+        notify_url = app.config["MERCHANTS_STATUS_NOTIFY_URL"] or app.config["MERCHANTS_SESSION_STORE_URL"]
+        if notify_url and isinstance(self._notifier.backend, LocalBackend):
+            try:
+                self._notifier.set_backend(RedisBackend(self._notifier.deliver, notify_url))
+            except Exception:  # noqa: BLE001
+                logger.exception("merchants: could not connect the Redis status notifier, using in-process delivery")
+        if isinstance(self._notifier.backend, LocalBackend) and _web_concurrency() > 1:
+            logger.error(
+                "merchants: %d workers share in-process status notifications; a webhook only wakes "
+                "/status waiters on the worker that received it, the rest time out and ask the "
+                "provider.  Set MERCHANTS_STATUS_NOTIFY_URL.",
+                _web_concurrency(),
+            )
         self._webhook_base_url = app.config["MERCHANTS_WEBHOOK_BASE_URL"].rstrip("/")
         self._url_prefix = app.config["MERCHANTS_URL_PREFIX"]
+        self._inbox = self._make_inbox(app)
+        self._sync_engine = PaymentSyncEngine(
+            self,
+            workers=app.config["MERCHANTS_SYNC_WORKERS"],
+            rate_limit=app.config["MERCHANTS_SYNC_RATE_LIMIT"],
+            chunk_size=app.config["MERCHANTS_SYNC_CHUNK_SIZE"],
+        )
 
         if _is_quart_app(app):
             from flask_merchants.quart_views import create_async_blueprint
@@ -295,6 +520,11 @@ class FlaskMerchants:
 
         app.extensions["merchants"] = self
 
+        if not _is_quart_app(app):
+            from flask_merchants.cli import merchants_cli
+
+            app.cli.add_command(merchants_cli)
+
         # Auto-register admin views when an Admin instance was provided.
         if self._admin is not None:
             from flask_merchants.contrib.admin import register_admin_views
@@ -319,6 +549,77 @@ class FlaskMerchants:
             )
         return self._client
 
+    @property
+    def session_store(self) -> SessionStore:
+        """The :class:`~flask_merchants.store.SessionStore` holding checkout sessions.
+
+        Example::
+
+            ext.session_store.stats()
+            # -> {"size": 12, "maxsize": 1000, "hits": 40, "misses": 3, ...}
+        """
+        return self._store
+
+    @property
+    def status_cache(self) -> StatusCache:
+        """The :class:`~merchants.cache.StatusCache` behind ``client.payments.get``.
+
+        Webhooks invalidate the entry of the payment they report on.
+
+        Example::
+
+            ext.status_cache.stats()
+            # -> {"size": 3, "hits": 57, "misses": 4, "coalesced": 9}
+        """
+        return self._status_cache
+
+    @property
+    def status_notifier(self) -> StatusNotifier:
+        """The :class:`~flask_merchants.notify.StatusNotifier` told about every state change.
+
+        Example::
+
+            with ext.status_notifier.subscribe([payment_id]) as sub:
+                payload = sub.wait(timeout=25)
+        """
+        return self._notifier
+
+    @property
+    def instrumentation(self) -> Instrumentation:
+        """The :class:`~merchants.instrument.Instrumentation` of every client this extension creates.
+
+        Example::
+
+            ext.instrumentation.add_listener(lambda event: statsd.timing(event.provider, event.duration))
+        """
+        return self._instrumentation
+
+    @property
+    def metrics(self) -> MetricsRegistry:
+        """The :class:`~merchants.instrument.MetricsRegistry` of provider call metrics.
+
+        Served in the Prometheus text format by ``/metrics`` when
+        ``MERCHANTS_METRICS_TOKEN`` is set; each worker process keeps its own.
+
+        Example::
+
+            ext.metrics.get("merchants_provider_call_duration_seconds").snapshot(
+                provider="khipu", operation="get_payment", outcome="ok"
+            )
+            # -> {"count": 12, "sum": 8.4, "buckets": {0.05: 0, ..., inf: 12}}
+        """
+        return self._metrics
+
+    @property
+    def webhook_inbox(self) -> WebhookInbox | None:
+        """The :class:`~flask_merchants.inbox.WebhookInbox`, or ``None`` without an ``inbox_model``.
+
+        Example::
+
+            ext.webhook_inbox.process_due()  # retry due and abandoned entries
+        """
+        return self._inbox
+
     def list_providers(self) -> list[str]:
         """Return the keys of all providers currently registered in the *merchants* SDK.
 
@@ -389,23 +690,49 @@ class FlaskMerchants:
     def add_webhook_handler(self, handler) -> None:
         """Register a callable invoked after each ``/webhook/<provider>`` request.
 
-        The callable receives a single :class:`~merchants.models.WebhookEvent`
-        argument.  Multiple handlers can be registered; they are called in
-        registration order.  Any exception raised by a handler is silently
-        swallowed so that a failing handler never prevents Khipu (or any other
-        provider) from receiving a ``200`` response.
+        The callable receives a single
+        :class:`~flask_merchants.context.WebhookContext`, built once per
+        delivery and shared by all handlers.  It carries the raw body and
+        headers, the parsed payload, the signature timestamp, the payment row
+        and the linked entity (see :meth:`webhook_entity_loader`), and exposes
+        the attributes of the :class:`~merchants.models.WebhookEvent`, so
+        handlers written for the event keep working.  Multiple handlers can be
+        registered; they are called in registration order.  Any exception
+        raised by a handler is silently swallowed so that a failing handler
+        never prevents Khipu (or any other provider) from receiving a ``200``
+        response.
 
         Example::
 
             @flask_merchants.add_webhook_handler
-            def on_payment(event):
-                if event.state.value == "succeeded":
+            def on_payment(ctx):
+                if ctx.state.value == "succeeded" and ctx.payment is not None:
                     ...
 
         """
         self._webhook_handlers.append(handler)
         return handler  # allow use as a decorator
 
+    def webhook_entity_loader(self, loader: Callable[[WebhookContext], Any]):
+        """Register the function returning the object linked to a webhook's payment.
+
+        The loader receives the :class:`~flask_merchants.context.WebhookContext`
+        and is called at most once per delivery, the first time a handler
+        reads ``ctx.entity``.
+
+        Example::
+
+            @flask_merchants.webhook_entity_loader
+            def load_order(ctx):
+                if ctx.payment is None:
+                    return None
+                return db.session.execute(
+                    db.select(Order).filter_by(code=ctx.payment.merchants_id)
+                ).scalar_one_or_none()
+        """
+        self._webhook_entity_loader = loader
+        return loader
+
     def enable_webhook_notifications(
         self,
         admin_emails_fn: Callable[[], list[str]],
@@ -456,8 +783,6 @@ class FlaskMerchants:
 
     def _webhook_notification_handler(self, event) -> None:
         """Built-in handler that emails admins with raw webhook data."""
-        from flask import request as flask_request
-
         admin_emails_fn = getattr(self, "_webhook_notify_admin_emails_fn", None)
         if admin_emails_fn is None:
             return
@@ -470,21 +795,12 @@ class FlaskMerchants:
         if not admin_emails:
             return
 
-        headers_dict = dict(flask_request.headers)
-        try:
-            headers_json = json.dumps(headers_dict, indent=2, default=str)
-        except (TypeError, ValueError):
-            headers_json = str(headers_dict)
-
-        raw_body = flask_request.get_data(as_text=True)
-        try:
-            body_parsed = json.loads(raw_body)
-            body_json = json.dumps(body_parsed, indent=2, default=str)
-        except (json.JSONDecodeError, TypeError, ValueError):
-            body_json = raw_body
+        ctx = self._webhook_context(event)
+        headers_json = ctx.headers_json
+        body_json = ctx.body_json
 
-        provider = event.provider
-        transaction = event.payment_id or ""
+        provider = ctx.provider
+        transaction = ctx.payment_id or ""
 
         subject = f"[webhook] {provider} — {transaction or 'no-id'}"
         body_text = (
@@ -538,25 +854,88 @@ class FlaskMerchants:
             info["subject"],
         )
 
+    def _receive_webhook(self, provider: str, payload: bytes, headers: dict[str, str], event) -> dict[str, Any]:
+        """Handle a verified delivery and return the JSON body for the provider.
+
+        With a webhook inbox the delivery is stored and queued (duplicates
+        are dropped); otherwise the state update and all handlers run before
+        returning.  Either way handlers for one payment never run
+        concurrently (:func:`~flask_merchants.locking.payment_lock`).
+        """
+        body = {
+            "received": True,
+            "event_id": event.event_id,
+            "event_type": event.event_type,
+            "payment_id": event.payment_id,
+            "state": event.state.value,
+        }
+        if self._inbox is None:
+            ctx = WebhookContext(self, event, payload, headers)
+            with payment_lock(self._db, provider, event.payment_id):
+                if event.payment_id:
+                    self._apply_webhook_state(ctx)
+                self._dispatch_webhook_event(ctx)
+            return body
+
+        entry_id = self._inbox.record(provider, payload, headers, event)
+        if entry_id is not None:
+            self._inbox.submit(entry_id)
+        else:
+            merchants_audit.info(
+                "webhook_duplicate: provider=%r dedup_key=%r",
+                provider,
+                dedup_key(provider, event, payload),
+            )
+        body["duplicate"] = entry_id is None
+        return body
+
+    def _webhook_context(self, event) -> WebhookContext:
+        """Return *event* when it is already a context, else wrap it.
+
+        A bare :class:`~merchants.models.WebhookEvent` takes its body and
+        headers from the current Flask request, if any.
+        """
+        if isinstance(event, WebhookContext):
+            return event
+        from flask import has_request_context, request as flask_request
+
+        if has_request_context():
+            return WebhookContext(self, event, flask_request.get_data(), dict(flask_request.headers))
+        return WebhookContext(self, event, b"", {})
+
+    def _apply_webhook_state(self, ctx: WebhookContext) -> bool:
+        """Store the state reported by a delivery on the payment the context resolved.
+
+        Same effect as :meth:`update_state`, but reuses ``ctx.payment`` so the
+        handlers that follow do not look the payment up again.
+        """
+        if ctx.payment_id:
+            # The provider just reported a change; the next status poll must ask it.
+            self._status_cache.invalidate(ctx.provider, ctx.payment_id)
+        return self._set_state(ctx.payment, ctx.payment_id, ctx.state.value)
+
     def _dispatch_webhook_event(self, event) -> None:
         """Invoke all registered webhook handlers for *event*.
 
-        Errors are caught individually so one failing handler does not stop
-        the others from running.
+        *event* is a :class:`~flask_merchants.context.WebhookContext` (a bare
+        :class:`~merchants.models.WebhookEvent` is wrapped first).  Errors are
+        caught individually so one failing handler does not stop the others
+        from running.
         """
+        ctx = self._webhook_context(event)
         logger.debug(
             "__init__.py: FlaskMerchants._dispatch_webhook_event called with event_type=%r payment_id=%r",
-            event.event_type, event.payment_id,
+            ctx.event_type, ctx.payment_id,
         )
         for handler in self._webhook_handlers:
             try:
-                handler(event)
+                handler(ctx)
             except Exception:  # noqa: BLE001
                 merchants_audit.exception(
                     "webhook_handler_error: handler=%r event_type=%r payment_id=%r",
                     handler,
-                    event.event_type,
-                    event.payment_id,
+                    ctx.event_type,
+                    ctx.payment_id,
                 )
 
     # ------------------------------------------------------------------
@@ -565,7 +944,54 @@ class FlaskMerchants:
 
     def _make_client(self, provider_key: str) -> merchants.Client:
         """Create a :class:`merchants.Client` for the given *provider_key*."""
-        return merchants.Client(provider=provider_key)
+        return merchants.Client(
+            provider=provider_key, status_cache=self._status_cache, instrumentation=self._instrumentation
+        )
+
+    def _log_call(self, event: CallEvent) -> None:
+        log_call(event, slow=self._slow_call_seconds)
+
+    def _metrics_allowed(self, authorization: str | None) -> bool:
+        """Whether an ``Authorization`` header value may read ``/metrics``."""
+        if not self._metrics_token:
+            return False
+        return hmac.compare_digest(authorization or "", f"Bearer {self._metrics_token}")
+
+    def _make_store(self, config) -> SessionStore:
+        """Return the explicit store, or build one from ``MERCHANTS_SESSION_STORE_*``."""
+        if self._store_override is not None:
+            return self._store_override
+        ttl = config["MERCHANTS_SESSION_STORE_TTL"]
+        url = config["MERCHANTS_SESSION_STORE_URL"]
+        if url:
+            try:
+                return RedisSessionStore(url, ttl=ttl)
+            except Exception:  # noqa: BLE001
+                logger.exception("merchants: could not connect the Redis session store, using in-process store")
+        return MemorySessionStore(config["MERCHANTS_SESSION_STORE_SIZE"], ttl)
+
+    def _make_inbox(self, app) -> WebhookInbox | None:
+        """Build the webhook inbox when an ``inbox_model`` was supplied."""
+        if self._inbox is not None:
+            self._inbox.shutdown(wait=False)
+        if self._inbox_model is None:
+            return None
+        if self._db is None:
+            raise RuntimeError("A webhook inbox_model requires db= to be configured.")
+        if _is_quart_app(app):
+            logger.warning("merchants: the webhook inbox is not supported on Quart; processing webhooks inline")
+            return None
+        config = app.config
+        return WebhookInbox(
+            self,
+            app,
+            self._inbox_model,
+            workers=config["MERCHANTS_WEBHOOK_WORKERS"],
+            max_attempts=config["MERCHANTS_WEBHOOK_MAX_ATTEMPTS"],
+            backoff=config["MERCHANTS_WEBHOOK_RETRY_BACKOFF"],
+            stale_after=config["MERCHANTS_WEBHOOK_STALE_AFTER"],
+            dispatcher=self._inbox_dispatcher,
+        )
 
     def _get_model_classes(self) -> list:
         """Return the list of all registered model classes.
@@ -584,6 +1010,46 @@ class FlaskMerchants:
         """Return the *default* model class (first in the list)."""
         return self._get_model_classes()[0]
 
+    def _remember_payment(self, record) -> None:
+        """Add *record*'s ids to the routing index (after it has been flushed)."""
+        from sqlalchemy import inspect as sa_inspect
+
+        self._router.remember(
+            type(record),
+            sa_inspect(record).identity,
+            record.merchants_id,
+            record.transaction_id,
+        )
+
+    def _find_payment(self, payment_id: str):
+        """Return the persisted payment for *payment_id*, or ``None``.
+
+        Resolves the owning model through the routing index first (a single
+        primary-key lookup).  On a miss, searches every registered model by
+        ``merchants_id`` and then by ``transaction_id`` (in registration
+        order) and adds the match to the index.
+        """
+        route = self._router.lookup(payment_id)
+        if route is not None:
+            model_cls, identity = route
+            record = self._db.session.get(model_cls, identity)
+            if record is not None and payment_id in (record.merchants_id, record.transaction_id):
+                return record
+            # Row deleted or id reassigned since it was indexed.
+            self._router.forget(payment_id)
+
+        for column in ("merchants_id", "transaction_id"):
+            for model_cls in self._get_model_classes():
+                record = (
+                    self._db.session.query(model_cls)
+                    .filter_by(**{column: payment_id})
+                    .first()
+                )
+                if record is not None:
+                    self._remember_payment(record)
+                    return record
+        return None
+
     # ------------------------------------------------------------------
     # Payment creation (preferred API)
     # ------------------------------------------------------------------
@@ -662,6 +1128,8 @@ class FlaskMerchants:
         """
         import uuid as _uuid
 
+        from sqlalchemy import inspect as sa_inspect
+
         logger.debug(
             "__init__.py: FlaskMerchants.save_session called with session_id=%s provider=%s",
             session.session_id, session.provider,
@@ -698,36 +1166,25 @@ class FlaskMerchants:
             )
             self._db.session.add(record)
             self._db.session.commit()
+            self._router.remember(cls, sa_inspect(record).identity, merchants_id, session.session_id)
 
-        # Always keep in-memory copy for fast look-up
-        self._store[merchants_id] = data
+        # Always keep a copy in the session store for fast look-up
+        self._store.set(merchants_id, data)
 
     def get_session(self, payment_id: str) -> dict[str, Any] | None:
         """Return stored data for *payment_id*, or ``None``.
 
         Searches by ``merchants_id`` first, then by ``transaction_id``.
-        When multiple models are registered, all of them are searched in
-        registration order and the first match is returned.
+        When multiple models are registered, the routing index resolves the
+        owning model directly; ids it does not know yet are searched in all
+        models in registration order and the first match is returned.
+        Payments not found in the database (or all of them, without one)
+        are looked up in the session store.
         """
         if self._db is not None:
-            for model_cls in self._get_model_classes():
-                record = (
-                    self._db.session.query(model_cls)
-                    .filter_by(merchants_id=payment_id)
-                    .first()
-                )
-                if record is not None:
-                    return record.to_dict()
-            # Fallback: search by transaction_id
-            for model_cls in self._get_model_classes():
-                record = (
-                    self._db.session.query(model_cls)
-                    .filter_by(transaction_id=payment_id)
-                    .first()
-                )
-                if record is not None:
-                    return record.to_dict()
-            return None
+            record = self._find_payment(payment_id)
+            if record is not None:
+                return record.to_dict()
         return self._store.get(payment_id)
 
     def update_state(self, payment_id: str, state: str) -> bool:
@@ -739,48 +1196,52 @@ class FlaskMerchants:
             Prefer ``payment.state = "..."`` with a direct commit, or
             ``payment.refund()`` / ``payment.cancel()`` for common transitions.
 
-        When multiple models are registered, all of them are searched in
-        registration order; the first match is updated.
+        When multiple models are registered, the record is located as in
+        :meth:`get_session`; the first match is updated.
         """
         logger.debug("__init__.py: FlaskMerchants.update_state called with payment_id=%s state=%r", payment_id, state)
-        if self._db is not None:
-            record = None
-            for model_cls in self._get_model_classes():
-                record = (
-                    self._db.session.query(model_cls)
-                    .filter_by(merchants_id=payment_id)
-                    .first()
-                )
-                if record is not None:
-                    break
-            # Fallback: search by transaction_id
-            if record is None:
-                for model_cls in self._get_model_classes():
-                    record = (
-                        self._db.session.query(model_cls)
-                        .filter_by(transaction_id=payment_id)
-                        .first()
-                    )
-                    if record is not None:
-                        break
-            if record is not None:
-                record.state = state
-                self._db.session.commit()
-                mid = record.merchants_id
-                if mid in self._store:
-                    self._store[mid]["state"] = state
-                return True
-            # Not found in any model - fall back to in-memory
-            if payment_id not in self._store:
-                return False
-            self._store[payment_id]["state"] = state
-            return True
+        record = self._find_payment(payment_id) if self._db is not None else None
+        return self._set_state(record, payment_id, state)
 
-        if payment_id not in self._store:
+    def _set_state(self, record, payment_id: str, state: str) -> bool:
+        """Commit *state* on *record*, or update the session store when there is no record.
+
+        A change is announced to the :attr:`status_notifier` after it is stored.
+        """
+        if record is not None:
+            changed = record.state != state
+            record.state = state
+            mid, tid, provider = record.merchants_id, record.transaction_id, record.provider
+            self._db.session.commit()
+            self._store.update(mid, state=state)
+            if changed:
+                self._notifier.publish((payment_id, mid, tid), state, provider)
+            return True
+        # Not found in any model (or no db) - fall back to the session store
+        stored = self._store.get(payment_id)
+        if stored is None or not self._store.update(payment_id, state=state):
             return False
-        self._store[payment_id]["state"] = state
+        if stored.get("state") != state:
+            self._notifier.publish(
+                (payment_id, stored.get("merchants_id"), stored.get("transaction_id")),
+                state,
+                stored.get("provider"),
+            )
         return True
 
+    def _refresh_status(self, payment_id: str, stored: dict[str, Any] | None) -> merchants.PaymentStatus:
+        """Ask the provider for a payment a request waited on, storing a changed state.
+
+        Goes through the status cache, so waiters timing out together cost one
+        provider call.
+        """
+        stored = stored or {}
+        client = self.get_client(stored["provider"]) if stored.get("provider") else self.client
+        status = client.payments.get(stored.get("transaction_id") or payment_id)
+        if stored and status.state.value != stored.get("state"):
+            self.update_state(payment_id, status.state.value)
+        return status
+
     def refund_session(self, payment_id: str) -> bool:
         """Mark *payment_id* as refunded. Returns ``True`` on success.
 
@@ -815,6 +1276,124 @@ class FlaskMerchants:
         stored["state"] = status.state.value
         return stored
 
+    def add_sync_handler(self, handler):
+        """Register a callable invoked for each payment whose state a sync changed.
+
+        The callable receives a :class:`~flask_merchants.sync.SyncResult`
+        after the new state has been committed.  Exceptions are logged and
+        swallowed, like webhook handlers.
+
+        Example::
+
+            @flask_merchants.add_sync_handler
+            def on_sync(result):
+                if result.new_state == "succeeded":
+                    fulfil(result.payment)
+        """
+        self._sync_handlers.append(handler)
+        return handler  # allow use as a decorator
+
+    def sync_payments(self, payments) -> list[SyncResult]:
+        """Fetch the live status of *payments* from their providers and store changes.
+
+        Statuses are fetched concurrently, each from the payment's own
+        provider and rate-limited per provider; changes are committed one
+        chunk at a time.  See :mod:`flask_merchants.sync`.
+
+        Args:
+            payments: Payment model instances.
+
+        Returns:
+            One :class:`~flask_merchants.sync.SyncResult` per payment, in order.
+
+        Raises:
+            RuntimeError: When no ``db`` is configured.
+        """
+        if self._db is None:
+            raise RuntimeError("sync_payments() requires db= to be configured.")
+        return self._sync_engine.sync(payments)
+
+    def find_stuck_payments(
+        self,
+        *,
+        states=STUCK_STATES,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        model_class=None,
+        limit: int | None = None,
+    ) -> list:
+        """Return payments still waiting for their provider, oldest first.
+
+        Args:
+            states: States to look for (default ``pending`` and ``processing``).
+            since: Only payments created at or after this time.
+            until: Only payments created before this time.
+            model_class: Restrict to one registered model.
+            limit: Maximum rows per model.
+
+        Raises:
+            RuntimeError: When no ``db`` is configured.
+
+        Example::
+
+            ext.sync_payments(ext.find_stuck_payments(since=datetime(2026, 1, 1)))
+        """
+        if self._db is None:
+            raise RuntimeError("find_stuck_payments() requires db= to be configured.")
+        return self._sync_engine.find_stuck(
+            states=states, since=since, until=until, model_class=model_class, limit=limit
+        )
+
+    def provider_guard(self, provider_key: str) -> ProviderGuard:
+        """Return the circuit breaker and bulkhead guarding calls to *provider_key*.
+
+        Example::
+
+            with ext.provider_guard("khipu").call():
+                session = ext.get_client("khipu").payments.create_checkout(...)
+        """
+        guard = self._guards.get(provider_key)
+        if guard is not None:
+            return guard
+        with self._guards_lock:
+            if provider_key not in self._guards:
+                config = self._guard_config
+                max_concurrent = config.get("max_concurrent", 4)
+                if isinstance(max_concurrent, dict):
+                    max_concurrent = max_concurrent.get(provider_key, max_concurrent.get("*", 0))
+                self._guards[provider_key] = ProviderGuard(
+                    provider_key,
+                    CircuitBreaker(
+                        failure_rate=config.get("failure_rate", 0.5),
+                        window=config.get("window", 60),
+                        min_calls=config.get("min_calls", 5),
+                        open_seconds=config.get("open_seconds", 30),
+                    ),
+                    Bulkhead(max_concurrent),
+                )
+            return self._guards[provider_key]
+
+    def provider_available(self, provider_key: str) -> bool:
+        """Whether a checkout with *provider_key* would be attempted right now.
+
+        ``False`` while its circuit is open or its bulkhead is full; use it
+        to offer another payment method before creating anything.
+        """
+        return self.provider_guard(provider_key).available()
+
+    def provider_health(self) -> dict[str, dict[str, Any]]:
+        """Return :meth:`ProviderGuard.stats` for every provider called so far.
+
+        Example::
+
+            ext.provider_health()
+            # -> {"khipu": {"breaker": {"state": "open", "calls": 6, "failures": 5, ...},
+            #               "bulkhead": {"in_flight": 0, "max_concurrent": 2, "rejected": 0}}}
+        """
+        with self._guards_lock:
+            guards = list(self._guards.values())
+        return {guard.provider: guard.stats() for guard in guards}
+
     def all_sessions(self, *, model_class=None) -> list[dict[str, Any]]:
         """Return all stored payment sessions.
 
@@ -822,12 +1401,140 @@ class FlaskMerchants:
             model_class: When provided, return records only from that model
                 class.  When omitted, records from **all** registered models
                 are returned combined.
+
+        Without a database the live entries of the session store are
+        returned; expired or evicted checkouts are no longer listed.
+
+        This materialises every payment including its JSON payloads; prefer
+        :meth:`iter_sessions` for anything that may touch many rows.
         """
         if self._db is not None:
-            classes = [model_class] if model_class is not None else self._get_model_classes()
-            result = []
-            for cls in classes:
-                result.extend(r.to_dict() for r in self._db.session.query(cls).all())
-            return result
+            return list(self.iter_sessions(model_class=model_class, include_payloads=True))
         return list(self._store.values())
 
+    def iter_sessions(
+        self,
+        *,
+        model_class=None,
+        state: str | None = None,
+        provider: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        include_payloads: bool = False,
+        batch_size: int = 500,
+    ) -> Iterator[dict[str, Any]]:
+        """Yield stored payment sessions oldest first, one batch at a time.
+
+        Rows are read with keyset pagination on ``(created_at, primary key)``
+        so memory use stays at *batch_size* rows however many payments
+        exist; give the model an index on ``(created_at, id)`` so each page
+        is an index range scan.  Only the :data:`SESSION_SUMMARY_FIELDS` columns are selected;
+        the four JSON columns are loaded only with *include_payloads*.
+
+        Args:
+            model_class: Restrict to one model class (default: all registered
+                models, merged by ``created_at``).
+            state: Only payments in this state.
+            provider: Only payments of this provider key.
+            since: Only payments created at or after this datetime.
+            until: Only payments created before this datetime.
+            include_payloads: Also yield the :data:`SESSION_PAYLOAD_FIELDS`.
+            batch_size: Rows fetched per query.
+
+        Without a database the session store entries are filtered by
+        *state* and *provider*; they carry no ``created_at``, so the date
+        filters do not apply.
+
+        Example::
+
+            for payment in ext.iter_sessions(provider="khipu", state="succeeded"):
+                reconcile(payment["transaction_id"], payment["amount"])
+        """
+        if self._db is None:
+            for data in self._store.values():
+                if state is not None and data.get("state") != state:
+                    continue
+                if provider is not None and data.get("provider") != provider:
+                    continue
+                yield data
+            return
+
+        classes = [model_class] if model_class is not None else self._get_model_classes()
+        streams = [
+            self._iter_model_sessions(cls, index, state, provider, since, until, include_payloads, batch_size)
+            for index, cls in enumerate(classes)
+        ]
+        for _key, data in heapq.merge(*streams, key=lambda item: item[0]):
+            yield data
+
+    def count_sessions_by_provider(self, *, model_class=None) -> dict[str, int]:
+        """Return the number of stored payments per provider key.
+
+        Counted in the database with one ``GROUP BY provider`` query per
+        model class, so no payment rows are loaded.
+
+        Args:
+            model_class: Restrict to one model class (default: all registered
+                models, summed).
+
+        Example::
+
+            ext.count_sessions_by_provider()
+            # -> {"khipu": 1520, "dummy": 3}
+        """
+        counts: dict[str, int] = {}
+        if self._db is None:
+            for data in self._store.values():
+                key = data.get("provider", "")
+                counts[key] = counts.get(key, 0) + 1
+            return counts
+
+        from sqlalchemy import func, select
+
+        classes = [model_class] if model_class is not None else self._get_model_classes()
+        for cls in classes:
+            stmt = select(cls.provider, func.count()).group_by(cls.provider)
+            for key, count in self._db.session.execute(stmt):
+                counts[key] = counts.get(key, 0) + count
+        return counts
+
+    def _iter_model_sessions(self, cls, index, state, provider, since, until, include_payloads, batch_size):
+        """Yield ``(sort key, dict)`` for one model class in keyset-paginated batches."""
+        from decimal import Decimal
+
+        from sqlalchemy import and_, inspect as sa_inspect, or_, select
+
+        pk = sa_inspect(cls).primary_key[0]
+        fields = SESSION_SUMMARY_FIELDS + (SESSION_PAYLOAD_FIELDS if include_payloads else ())
+        stmt = select(pk.label("_pk"), *(getattr(cls, f) for f in fields))
+        if state is not None:
+            stmt = stmt.where(cls.state == state)
+        if provider is not None:
+            stmt = stmt.where(cls.provider == provider)
+        if since is not None:
+            stmt = stmt.where(cls.created_at >= since)
+        if until is not None:
+            stmt = stmt.where(cls.created_at < until)
+        stmt = stmt.order_by(cls.created_at, pk).limit(batch_size)
+
+        last = None
+        while True:
+            page = stmt
+            if last is not None:
+                page = page.where(
+                    or_(cls.created_at > last[0], and_(cls.created_at == last[0], pk > last[1]))
+                )
+            rows = self._db.session.execute(page).all()
+            for row in rows:
+                data = {f: getattr(row, f) for f in fields}
+                data["amount"] = f"{Decimal(row.amount):.2f}"
+                data["created_at"] = row.created_at.isoformat() if row.created_at else None
+                for f in SESSION_PAYLOAD_FIELDS if include_payloads else ():
+                    data[f] = data[f] or {}
+                # Comparable across models: naive/aware datetimes never mix
+                # within one database, and the model index breaks ties.
+                yield (row.created_at or datetime.min, index, row._pk), data
+            if len(rows) < batch_size:
+                return
+            last = (rows[-1].created_at, rows[-1]._pk)
+
@@ -0,0 +1,240 @@
+"""Circuit breaker and bulkhead guarding calls to payment providers.
+
+:meth:`PaymentMixin.create <flask_merchants.models.PaymentMixin.create>` calls
+the provider inside the request that started the checkout.  When a provider
+hangs, every worker ends up waiting on it.  Each provider therefore gets a
+:class:`ProviderGuard` made of two parts:
+
+:class:`Bulkhead`
+    Caps the calls in flight to the provider in this process; a call over the
+    cap fails at once instead of taking another worker.
+
+:class:`CircuitBreaker`
+    Watches the failure rate over a sliding window.  Once it passes the
+    threshold the circuit *opens* and calls fail at once for a cool-down
+    period; after it, one probe call is let through (*half-open*) and its
+    outcome closes or re-opens the circuit.
+
+Both raise :class:`ProviderUnavailable`, which the application can catch to
+offer another payment method.  A :class:`~merchants.providers.UserError` is the
+provider answering (e.g. rejecting an amount) and does not count as a failure.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from merchants.providers import UserError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderUnavailable(Exception):
+    """Raised instead of calling a provider whose circuit is open or bulkhead full.
+
+    Attributes:
+        provider: Provider key.
+        reason: ``"circuit_open"`` or ``"bulkhead_full"``.
+        retry_after: Seconds until the circuit lets a probe through, when known.
+    """
+
+    def __init__(self, provider: str, reason: str, retry_after: float | None = None) -> None:
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Provider {provider!r} unavailable: {reason}")
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker with half-open probing.
+
+    Args:
+        failure_rate: Fraction of failed calls (``0``-``1``) that opens the circuit.
+        window: Seconds of call history considered.
+        min_calls: Calls needed in the window before the rate is trusted.
+        open_seconds: Seconds the circuit stays open before probing.
+        half_open_calls: Probe calls allowed at once while half-open.
+    """
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        window: float = 60.0,
+        min_calls: int = 5,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+    ) -> None:
+        self.failure_rate = failure_rate
+        self.window = window
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self._calls: deque[tuple[float, bool]] = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self.times_opened += 1
+
+    def retry_after(self) -> float | None:
+        """Seconds until the open circuit lets a probe through, or ``None`` when not open."""
+        with self._lock:
+            if self._current_state(time.monotonic()) != OPEN:
+                return None
+            return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Return whether a call may proceed; a half-open probe slot is taken if so."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                # The probe got through: start over with a clean window.
+                self._state = CLOSED
+                self._calls.clear()
+                return
+            self._calls.append((now, False))
+            self._trim(now)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._open(now)
+                return
+            self._calls.append((now, True))
+            self._trim(now)
+            failures = sum(failed for _, failed in self._calls)
+            if (
+                self._state == CLOSED
+                and len(self._calls) >= self.min_calls
+                and failures >= self.failure_rate * len(self._calls)
+            ):
+                self._open(now)
+
+    def stats(self) -> dict[str, Any]:
+        """Return ``state``, window ``calls`` / ``failures``, ``times_opened`` and ``rejected``."""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._trim(now)
+            failures = sum(failed for _, failed in self._calls)
+            return {
+                "state": state,
+                "calls": len(self._calls),
+                "failures": failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+class Bulkhead:
+    """Cap on concurrent calls; calls over it are refused instead of queued.
+
+    Args:
+        max_concurrent: Calls allowed in flight at once (``0`` = unlimited).
+    """
+
+    def __init__(self, max_concurrent: int = 4) -> None:
+        self.max_concurrent = max_concurrent
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.max_concurrent and self.in_flight >= self.max_concurrent:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"in_flight": self.in_flight, "max_concurrent": self.max_concurrent, "rejected": self.rejected}
+
+
+class ProviderGuard:
+    """The :class:`Bulkhead` and :class:`CircuitBreaker` of one provider.
+
+    Example::
+
+        with ext.provider_guard("khipu").call():
+            session = client.payments.create_checkout(...)
+    """
+
+    def __init__(self, provider: str, breaker: CircuitBreaker, bulkhead: Bulkhead) -> None:
+        self.provider = provider
+        self.breaker = breaker
+        self.bulkhead = bulkhead
+
+    def available(self) -> bool:
+        """Whether a call would be let through right now (no slot is taken)."""
+        if self.breaker.state == OPEN:
+            return False
+        limit = self.bulkhead.max_concurrent
+        return not limit or self.bulkhead.in_flight < limit
+
+    @contextmanager
+    def call(self) -> Iterator[None]:
+        """Run the enclosed provider call, or raise :class:`ProviderUnavailable`."""
+        if not self.bulkhead.acquire():
+            raise ProviderUnavailable(self.provider, "bulkhead_full")
+        try:
+            if not self.breaker.allow():
+                raise ProviderUnavailable(self.provider, "circuit_open", self.breaker.retry_after())
+            try:
+                yield
+            except UserError:
+                self.breaker.record_success()
+                raise
+            except BaseException:
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+        finally:
+            self.bulkhead.release()
+
+    def stats(self) -> dict[str, Any]:
+        return {"breaker": self.breaker.stats(), "bulkhead": self.bulkhead.stats()}
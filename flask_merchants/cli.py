@@ -0,0 +1,62 @@
+"""``flask merchants`` command group, registered by :meth:`FlaskMerchants.init_app`.
+
+Example::
+
+    flask merchants webhooks retry        # submit due and abandoned inbox entries
+    flask merchants payments sync --since 2026-01-01
+                                          # reconcile stuck pending/processing payments
+"""
+
+from __future__ import annotations
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from flask_merchants.sync import STUCK_STATES
+
+merchants_cli = AppGroup("merchants", help="flask-merchants maintenance commands.")
+webhooks_cli = AppGroup("webhooks", help="Webhook inbox commands.")
+payments_cli = AppGroup("payments", help="Payment commands.")
+merchants_cli.add_command(webhooks_cli)
+merchants_cli.add_command(payments_cli)
+
+
+def _ext():
+    return current_app.extensions["merchants"]
+
+
+@webhooks_cli.command("retry")
+@click.option("--limit", default=100, show_default=True, help="Maximum entries to submit.")
+def webhooks_retry(limit: int) -> None:
+    """Submit inbox entries whose retry is due or whose worker died."""
+    inbox = _ext().webhook_inbox
+    if inbox is None:
+        raise click.ClickException("No webhook inbox configured (pass inbox_model= to init_app).")
+    count = inbox.process_due(limit=limit)
+    # Let the thread pool finish before the command exits.
+    inbox.shutdown(wait=True)
+    click.echo(f"Submitted {count} webhook inbox entries.")
+
+
+@payments_cli.command("sync")
+@click.option("--since", type=click.DateTime(), default=None, help="Only payments created at or after this time.")
+@click.option(
+    "--state",
+    "states",
+    multiple=True,
+    default=STUCK_STATES,
+    show_default=True,
+    help="State to look for (repeatable).",
+)
+@click.option("--limit", default=500, show_default=True, help="Maximum payments per model.")
+def payments_sync(since, states, limit: int) -> None:
+    """Fetch the provider status of stuck payments and store any change."""
+    ext = _ext()
+    if ext._db is None:
+        raise click.ClickException("Syncing payments requires db= to be configured.")
+    payments = ext.find_stuck_payments(states=states, since=since, limit=limit)
+    results = ext.sync_payments(payments)
+    changed = sum(1 for r in results if r.changed)
+    failed = sum(1 for r in results if r.error is not None)
+    click.echo(f"Checked {len(results)} payments: {changed} changed, {failed} failed.")
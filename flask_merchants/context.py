@@ -0,0 +1,120 @@
+"""Per-delivery context handed to webhook handlers.
+
+A :class:`WebhookContext` is built once for each webhook delivery and passed
+to every handler registered with
+:meth:`~flask_merchants.FlaskMerchants.add_webhook_handler`.  Everything a
+handler typically needs is computed at most once and shared:
+
+* the raw body and headers as received (handlers no longer need
+  ``flask.request``, which does not exist in an inbox worker);
+* the parsed payload, taken from the event the provider already parsed;
+* the timestamp of the provider's signature header;
+* the payment row, resolved once through the routing index;
+* the application entity linked to the payment, loaded by the function
+  registered with :meth:`~flask_merchants.FlaskMerchants.webhook_entity_loader`.
+
+The context also exposes the attributes of the underlying
+:class:`~merchants.models.WebhookEvent` (``provider``, ``state``,
+``payment_id``, ``event_id``, ``event_type``, ``raw``), so handlers written
+for the event keep working unchanged::
+
+    @ext.add_webhook_handler
+    def on_payment(ctx):
+        if ctx.state.value == "succeeded" and ctx.payment is not None:
+            fulfil(ctx.entity)
+"""
+
+from __future__ import annotations
+
+import json
+from functools import cached_property
+from typing import Any
+
+
+class WebhookContext:
+    """Everything known about one webhook delivery.
+
+    Args:
+        ext: The :class:`~flask_merchants.FlaskMerchants` instance.
+        event: The :class:`~merchants.models.WebhookEvent` returned by the
+            provider's ``parse_webhook``.
+        body: The raw request body.
+        headers: The request headers.
+        entry_id: The webhook inbox entry id, when processed from the inbox.
+    """
+
+    def __init__(self, ext, event, body: bytes, headers: dict[str, str], *, entry_id=None) -> None:
+        self._ext = ext
+        self.event = event
+        self.body = body
+        self.headers = dict(headers)
+        self.entry_id = entry_id
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for names not found normally: delegate to the event.
+        if name == "event":
+            raise AttributeError(name)
+        return getattr(self.event, name)
+
+    def __repr__(self) -> str:
+        return f"<WebhookContext {self.event.provider} {self.event.event_type} payment_id={self.event.payment_id!r}>"
+
+    @cached_property
+    def data(self) -> dict[str, Any]:
+        """The parsed payload: the event's ``raw`` dict, or the body decoded as JSON."""
+        if self.event.raw:
+            return self.event.raw
+        try:
+            data = json.loads(self.body)
+        except (TypeError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @cached_property
+    def body_text(self) -> str:
+        """The raw body decoded as UTF-8."""
+        return self.body.decode("utf-8", errors="replace")
+
+    @cached_property
+    def signature_timestamp(self) -> int | None:
+        """The ``t=`` component of the provider's ``*-Signature`` header, or ``None``.
+
+        Khipu (``x-khipu-signature``) and Stripe (``Stripe-Signature``) both
+        sign ``"<t>.<body>"``; when the provider has a webhook secret
+        configured, ``parse_webhook`` has already verified it.  Useful for
+        rejecting replays of old deliveries.
+        """
+        for name, value in self.headers.items():
+            if not name.lower().endswith("signature"):
+                continue
+            for part in str(value).split(","):
+                key, _, val = part.strip().partition("=")
+                if key == "t" and val.isdigit():
+                    return int(val)
+        return None
+
+    @cached_property
+    def payment(self):
+        """The payment row for ``payment_id``, or ``None`` (no database or not found)."""
+        if self._ext._db is None or not self.event.payment_id:
+            return None
+        return self._ext._find_payment(self.event.payment_id)
+
+    @cached_property
+    def entity(self):
+        """The application object linked to :attr:`payment`, from the registered entity loader."""
+        loader = self._ext._webhook_entity_loader
+        return loader(self) if loader is not None else None
+
+    @cached_property
+    def headers_json(self) -> str:
+        """The headers as indented JSON (for notifications and logs)."""
+        return json.dumps(self.headers, indent=2, default=str)
+
+    @cached_property
+    def body_json(self) -> str:
+        """The body as indented JSON, or as text when it is not JSON."""
+        try:
+            return json.dumps(json.loads(self.body), indent=2, default=str)
+        except (TypeError, ValueError):
+            return self.body_text
@@ -312,6 +312,10 @@ class ProvidersView(BaseModelView):
         "auth_masked_value",
         "transport",
         "payment_count",
+        "breaker_state",
+        "breaker_failures",
+        "in_flight",
+        "rejected",
     ]
     column_searchable_list = ["key", "base_url", "auth_type"]
     column_sortable_list = ["key", "payment_count"]
@@ -323,6 +327,10 @@ class ProvidersView(BaseModelView):
         "auth_masked_value": "Auth Value",
         "transport": "Transport",
         "payment_count": "Payments",
+        "breaker_state": "Circuit",
+        "breaker_failures": "Failures",
+        "in_flight": "In Flight",
+        "rejected": "Rejected",
     }
     column_descriptions = {
         "key": "Unique identifier used to reference this provider in the application.",
@@ -332,6 +340,10 @@ class ProvidersView(BaseModelView):
         "auth_masked_value": "Masked authentication token (first 5 and last 1 characters shown).",
         "transport": "HTTP transport class used for provider API communication.",
         "payment_count": "Number of payment sessions recorded for this provider.",
+        "breaker_state": "Circuit breaker state in this worker: closed (calls allowed), open (calls fail at once) or half_open (probing).",
+        "breaker_failures": "Failed checkout calls out of all calls in the breaker's sliding window.",
+        "in_flight": "Checkout calls in progress out of the bulkhead's concurrency cap (0 = unlimited).",
+        "rejected": "Calls refused without contacting the provider (open circuit or full bulkhead).",
     }
 
     # Custom list template - extends admin/model/list.html for consistent UI.
@@ -367,6 +379,10 @@ class ProvidersView(BaseModelView):
             "auth_masked_value",
             "transport",
             "payment_count",
+            "breaker_state",
+            "breaker_failures",
+            "in_flight",
+            "rejected",
         ]
 
     def scaffold_sortable_columns(self) -> dict[str, str]:
@@ -396,11 +412,8 @@ class ProvidersView(BaseModelView):
 
         provider_keys = merchants_sdk.list_providers()
 
-        all_payments = self._ext.all_sessions()
-        payment_counts: dict[str, int] = {}
-        for p in all_payments:
-            pkey = p.get("provider", "")
-            payment_counts[pkey] = payment_counts.get(pkey, 0) + 1
+        payment_counts = self._ext.count_sessions_by_provider()
+        health = self._ext.provider_health()
 
         providers = []
         for key in provider_keys:
@@ -415,6 +428,9 @@ class ProvidersView(BaseModelView):
                 auth_info = _get_auth_info(None)
                 transport = "N/A"
 
+            guard = health.get(key, {})
+            breaker = guard.get("breaker", {})
+            bulkhead = guard.get("bulkhead", {})
             providers.append(
                 {
                     "key": key,
@@ -424,6 +440,10 @@ class ProvidersView(BaseModelView):
                     "auth_masked_value": auth_info["masked_value"],
                     "transport": transport,
                     "payment_count": payment_counts.get(key, 0),
+                    "breaker_state": breaker.get("state", "closed"),
+                    "breaker_failures": f"{breaker.get('failures', 0)}/{breaker.get('calls', 0)}",
+                    "in_flight": f"{bulkhead.get('in_flight', 0)}/{bulkhead.get('max_concurrent', 0)}",
+                    "rejected": breaker.get("rejected", 0) + bulkhead.get("rejected", 0),
                 }
             )
 
@@ -486,7 +506,9 @@ def register_admin_views(
     descriptions, labels, state choices).  When no *db* is configured the
     in-memory :class:`PaymentView` is used as a fallback.
 
-    :class:`ProvidersView` is always registered under ``category="Merchants"``.
+    :class:`ProvidersView` is always registered under ``category="Merchants"``,
+    and a :class:`~flask_merchants.contrib.sqla.WebhookInboxModelView` when a
+    webhook inbox is configured.
 
     Called automatically when you pass ``admin=`` to
     :class:`~flask_merchants.FlaskMerchants`::
@@ -543,3 +565,17 @@ def register_admin_views(
             category="Merchants",
         )
     )
+
+    if ext.webhook_inbox is not None:
+        from flask_merchants.contrib.sqla import WebhookInboxModelView
+
+        admin.add_view(
+            WebhookInboxModelView(
+                ext.webhook_inbox.model,
+                ext._db.session,
+                ext=ext,
+                name="Webhook inbox",
+                endpoint="merchants_webhook_inbox",
+                category="Merchants",
+            )
+        )
@@ -0,0 +1,141 @@
+"""Streaming CSV / NDJSON export of payment records for Flask-Admin views.
+
+Built on :meth:`~flask_merchants.FlaskMerchants.iter_sessions`, so an export
+of a year of payments is written to the client batch by batch instead of
+being assembled in memory.  Typical use is reconciling against a provider's
+settlement report (e.g. Khipu)::
+
+    GET /admin/payment/stream/csv/?provider=khipu&state=succeeded&since=2025-01-01&until=2025-02-01
+
+Query parameters:
+
+``state`` / ``provider``
+    Only payments with this state / provider key.
+``since`` / ``until``
+    ISO dates or datetimes; ``since`` is inclusive, ``until`` exclusive.
+``payloads``
+    ``1`` to include the JSON columns (serialised as JSON in CSV cells).
+
+The export is an :func:`~flask_admin.expose` route on the view, so it is
+protected by the view's own ``is_accessible`` check.  It lives under
+``stream/`` because ``ModelView`` already owns ``export/<type>/`` for its
+built-in (paged, in-memory) export.
+
+Example::
+
+    from flask_merchants.contrib.export import PaymentExportMixin
+    from flask_merchants.contrib.sqla import PaymentModelView
+
+    # PaymentModelView already includes the mixin; for a custom view:
+    class MyPaymentView(PaymentExportMixin, ModelView):
+        def __init__(self, model, session, *, ext, **kwargs):
+            self._ext = ext
+            super().__init__(model, session, **kwargs)
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Iterable, Iterator
+
+from flask import Response, abort, request, stream_with_context
+
+from flask_merchants import SESSION_PAYLOAD_FIELDS, SESSION_SUMMARY_FIELDS
+
+try:
+    from flask_admin import expose
+except ImportError as exc:  # pragma: no cover
+    raise ImportError(
+        "flask-admin is required for flask_merchants.contrib.export. "
+        "Install it with: pip install 'flask-merchants[admin]'"
+    ) from exc
+
+#: Supported export formats and their MIME types.
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def iter_csv(rows: Iterable[dict[str, Any]], fields: Iterable[str]) -> Iterator[str]:
+    """Yield *rows* as CSV text, one header line then one line per row.
+
+    Dict and list values (the JSON payload columns) are written as JSON.
+    """
+    fields = list(fields)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(
+            {k: json.dumps(v, default=str) if isinstance(v, (dict, list)) else v for k, v in row.items()}
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, when there were no rows.
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_ndjson(rows: Iterable[dict[str, Any]]) -> Iterator[str]:
+    """Yield *rows* as newline-delimited JSON."""
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
+
+def _parse_datetime(name: str) -> datetime | None:
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, description=f"Invalid {name!r}: expected an ISO date or datetime.")
+
+
+class PaymentExportMixin:
+    """Add a streaming ``stream/<fmt>/`` endpoint to a payment admin view.
+
+    The view must set ``self._ext`` to the
+    :class:`~flask_merchants.FlaskMerchants` instance and, for SQLAlchemy
+    views, ``self.model`` to the payment model class.
+    """
+
+    #: Rows fetched per database round-trip while exporting.
+    export_batch_size = 500
+
+    @expose("/stream/<fmt>/")
+    def stream_payments(self, fmt: str):
+        """Stream the payments matching the query parameters as *fmt*."""
+        if fmt not in EXPORT_FORMATS:
+            abort(404)
+        ext = getattr(self, "_ext", None)
+        if ext is None:
+            abort(404)
+
+        include_payloads = request.args.get("payloads") == "1"
+        rows = ext.iter_sessions(
+            model_class=getattr(self, "model", None) if ext._db is not None else None,
+            state=request.args.get("state") or None,
+            provider=request.args.get("provider") or None,
+            since=_parse_datetime("since"),
+            until=_parse_datetime("until"),
+            include_payloads=include_payloads,
+            batch_size=self.export_batch_size,
+        )
+        if fmt == "csv":
+            fields = SESSION_SUMMARY_FIELDS + (SESSION_PAYLOAD_FIELDS if include_payloads else ())
+            body = iter_csv(rows, fields)
+        else:
+            body = iter_ndjson(rows)
+
+        filename = f"payments-{datetime.now():%Y%m%d-%H%M%S}.{fmt}"
+        return Response(
+            stream_with_context(body),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
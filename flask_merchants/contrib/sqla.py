@@ -33,7 +33,8 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING, Any
 
-from flask_merchants.contrib.base import PaymentViewMixin
+from flask_merchants.contrib.base import PaymentViewMixin, _STATE_CHOICES
+from flask_merchants.contrib.export import PaymentExportMixin
 
 try:
     from flask_admin.actions import action
@@ -49,7 +50,7 @@ if TYPE_CHECKING:
     from flask_merchants import FlaskMerchants
 
 
-class PaymentModelView(PaymentViewMixin, ModelView):
+class PaymentModelView(PaymentExportMixin, PaymentViewMixin, ModelView):
     """Flask-Admin view for the :class:`~flask_merchants.models.Payment` model.
 
     Provides:
@@ -59,12 +60,14 @@ class PaymentModelView(PaymentViewMixin, ModelView):
       backed by the SQLAlchemy ``@validates`` hook in
       :class:`~flask_merchants.models.PaymentMixin` at the ORM level.
     - Bulk **Refund**, **Cancel**, and **Sync from Provider** actions.
+    - Streaming CSV / NDJSON export at ``stream/<fmt>/``
+      (see :mod:`flask_merchants.contrib.export`).
 
     Args:
         model: The :class:`~flask_merchants.models.Payment` model class.
         session: A SQLAlchemy scoped session (e.g. ``db.session``).
         ext: Optional :class:`~flask_merchants.FlaskMerchants` instance.
-            Required only for the *Sync from Provider* action.
+            Required for the *Sync from Provider* action and the export.
         name: Display name shown in the admin navigation bar.
         endpoint: Internal Flask endpoint prefix (must be unique).
         category: Optional admin category/group name.
@@ -227,7 +230,11 @@ class PaymentModelView(PaymentViewMixin, ModelView):
 
     @action("sync", "Sync from Provider", "Sync selected payments from the payment provider?")
     def action_sync(self, ids: list[str]) -> None:
-        """Fetch live payment status from the provider and update each record."""
+        """Fetch live payment status from each payment's provider and store changes.
+
+        Uses :meth:`~flask_merchants.FlaskMerchants.sync_payments`: statuses
+        are fetched concurrently and committed in chunks.
+        """
         from flask import flash
 
         if self._ext is None:
@@ -235,19 +242,77 @@ class PaymentModelView(PaymentViewMixin, ModelView):
             return
 
         try:
-            count = 0
-            for pk in ids:
-                record = self.get_one(pk)
-                if record is None:
-                    continue
-                try:
-                    status = self._ext.client.payments.get(record.transaction_id)
-                    record.state = status.state.value
-                    count += 1
-                except Exception:  # noqa: BLE001
-                    pass
-            self.session.commit()
-            flash(f"{count} payment(s) synced from provider.", "success")
+            records = [r for r in (self.get_one(pk) for pk in ids) if r is not None]
+            results = self._ext.sync_payments(records)
+            synced = sum(1 for r in results if r.error is None)
+            failed = len(results) - synced
+            msg = f"{synced} payment(s) synced from provider."
+            if failed:
+                msg += f" {failed} payment(s) could not be synced."
+            flash(msg, "success" if not failed else "warning")
         except Exception as exc:  # noqa: BLE001
             self.session.rollback()
             flash(f"Failed to sync payments: {exc}", "danger")
+
+
+class WebhookInboxModelView(ModelView):
+    """Read-only Flask-Admin view of the webhook inbox (:mod:`flask_merchants.inbox`).
+
+    Lists stored deliveries with their processing status, attempts and last
+    error, and provides a bulk **Retry** action that gives ``dead`` or
+    ``retry`` entries a fresh set of attempts.
+
+    Args:
+        model: The inbox model class.
+        session: A SQLAlchemy scoped session (e.g. ``db.session``).
+        ext: The :class:`~flask_merchants.FlaskMerchants` instance whose
+            :attr:`~flask_merchants.FlaskMerchants.webhook_inbox` processes
+            retried entries.
+    """
+
+    column_list = [
+        "created_at",
+        "provider",
+        "event_type",
+        "payment_id",
+        "state",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "last_error",
+    ]
+    column_details_list = column_list + [
+        "dedup_key",
+        "event_id",
+        "handlers_done",
+        "processed_at",
+        "updated_at",
+        "headers",
+        "body",
+    ]
+    column_searchable_list = ["payment_id", "event_id", "dedup_key"]
+    column_filters = ["status", "provider", "event_type"]
+    column_default_sort = ("created_at", True)
+    can_create = False
+    can_edit = False
+    can_view_details = True
+
+    def __init__(self, model, session, *, ext: "FlaskMerchants | None" = None, **kwargs: Any) -> None:
+        self._ext = ext
+        super().__init__(model, session, **kwargs)
+
+    @action("retry", "Retry", "Retry the selected webhook deliveries?")
+    def action_retry(self, ids: list[str]) -> None:
+        """Requeue the selected ``dead`` / ``retry`` entries."""
+        from flask import flash
+
+        inbox = self._ext.webhook_inbox if self._ext is not None else None
+        if inbox is None:
+            flash("Webhook inbox not configured; cannot retry.", "danger")
+            return
+        count = 0
+        for pk in ids:
+            entry = self.get_one(pk)
+            if entry is not None and inbox.requeue(entry.id):
+                count += 1
+        flash(f"{count} webhook delivery(ies) queued for retry.", "success")
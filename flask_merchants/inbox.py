@@ -0,0 +1,444 @@
+"""Durable webhook inbox: acknowledge deliveries fast, process them in the background.
+
+Without an inbox, ``/webhook/<provider>`` runs :meth:`~flask_merchants.FlaskMerchants.update_state`
+and every registered webhook handler inside the provider's HTTP request, so a
+slow handler (e.g. one sending email) delays the ``200`` and makes the
+provider retry.  With an inbox the view only verifies and parses the payload,
+stores it together with a deduplication key, and answers immediately.  The
+event is then processed by a worker:
+
+* an in-process thread pool (``MERCHANTS_WEBHOOK_WORKERS`` threads), or
+* any *dispatcher* callable, typically a task queue::
+
+      @celery.task
+      def process_webhook(entry_id):
+          ext.webhook_inbox.process(entry_id)
+
+      ext.init_app(
+          app, db=db, models=[Pagos], inbox_model=WebhookEntry,
+          inbox_dispatcher=lambda entry_id, delay: process_webhook.apply_async((entry_id,), countdown=delay),
+      )
+
+Bring your own table by mixing in :class:`WebhookInboxMixin` (the primary key
+must be called ``id``)::
+
+    class WebhookEntry(WebhookInboxMixin, db.Model):
+        __tablename__ = "webhook_inbox"
+        id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+Entry lifecycle (``status``):
+
+``received`` → ``processing`` → ``done``
+    The normal path.
+``processing`` → ``retry`` → ``processing`` …
+    A handler raised.  Handlers that already succeeded are recorded in
+    ``handlers_done`` and are not run again; the entry is retried after an
+    exponential backoff (``MERCHANTS_WEBHOOK_RETRY_BACKOFF`` seconds, doubled
+    per attempt).
+``retry`` → ``dead``
+    ``MERCHANTS_WEBHOOK_MAX_ATTEMPTS`` attempts failed.  Dead entries are
+    kept for inspection and can be requeued from the admin
+    (:class:`~flask_merchants.contrib.sqla.WebhookInboxModelView`).
+
+The unique ``dedup_key`` (see :func:`dedup_key`) makes the inbox the
+deduplication ledger: a redelivered notification is dropped by the insert and
+never reaches the handlers.  Entries for the same payment are processed one
+at a time (:func:`~flask_merchants.locking.payment_lock`); different payments
+are processed in parallel.
+
+Retries scheduled in-process are lost if the worker restarts; call
+:meth:`WebhookInbox.process_due` periodically (cron, beat, the
+``flask merchants webhooks retry`` command) to pick them up, together with
+entries left in ``processing`` by a crashed worker.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from sqlalchemy import DateTime, Integer, JSON, String, Text, func, or_, text, update
+from sqlalchemy.orm import Mapped, mapped_column
+
+from flask_merchants.context import WebhookContext
+from flask_merchants.locking import payment_lock
+
+logger = logging.getLogger(__name__)
+
+RECEIVED = "received"
+PROCESSING = "processing"
+RETRY = "retry"
+DONE = "done"
+DEAD = "dead"
+
+#: Ordered list of (value, label) pairs for the inbox ``status`` field.
+STATUS_CHOICES = [
+    (RECEIVED, "Received"),
+    (PROCESSING, "Processing"),
+    (RETRY, "Retry"),
+    (DONE, "Done"),
+    (DEAD, "Dead"),
+]
+
+# Pseudo-handler name recorded once update_state() has been applied.
+_UPDATE_STATE = "update_state"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def dedup_key(provider: str, event, payload: bytes) -> str:
+    """Return the key identifying one notification, however often it is delivered.
+
+    * ``provider:event:<event_id>`` when the provider sends a real event id;
+    * ``provider:payment:<payment_id>:<state>`` otherwise (Khipu reports the
+      payment id as the event id, and notifies the same payment once per
+      state change, so the id alone would swallow the ``succeeded`` update);
+    * ``provider:sha256:<body hash>`` when there is not even a payment id.
+    """
+    if event.event_id and event.event_id != event.payment_id:
+        return f"{provider}:event:{event.event_id}"
+    if event.payment_id:
+        return f"{provider}:payment:{event.payment_id}:{event.state.value}"
+    return f"{provider}:sha256:{hashlib.sha256(payload).hexdigest()}"
+
+
+def handler_name(index: int, handler) -> str:
+    """Stable name for the *index*-th registered handler, used in ``handlers_done``."""
+    name = getattr(handler, "__qualname__", None) or type(handler).__qualname__
+    return f"{index}:{getattr(handler, '__module__', '')}.{name}"
+
+
+class WebhookInboxMixin:
+    """SQLAlchemy declarative mixin with the columns of a webhook inbox entry.
+
+    ``body`` and ``headers`` keep the delivery exactly as received;
+    ``event`` is the parsed :class:`~merchants.models.WebhookEvent` so the
+    worker does not need to verify and parse the payload again.
+    """
+
+    provider: Mapped[str] = mapped_column(String(64), index=True)
+    dedup_key: Mapped[str] = mapped_column(String(255), unique=True)
+    event_id: Mapped[str | None] = mapped_column(String(255))
+    event_type: Mapped[str | None] = mapped_column(String(128))
+    payment_id: Mapped[str | None] = mapped_column(String(128), index=True)
+    state: Mapped[str | None] = mapped_column(String(32))
+    event: Mapped[dict] = mapped_column(JSON, default=dict, server_default=text("'{}'"))
+    headers: Mapped[dict] = mapped_column(JSON, default=dict, server_default=text("'{}'"))
+    body: Mapped[str] = mapped_column(Text, default="")
+    status: Mapped[str] = mapped_column(String(16), default=RECEIVED, server_default=RECEIVED, index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    handlers_done: Mapped[list] = mapped_column(JSON, default=list, server_default=text("'[]'"))
+    last_error: Mapped[str | None] = mapped_column(Text)
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), index=True)
+    processed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+
+    def to_event(self):
+        """Rebuild the :class:`~merchants.models.WebhookEvent` stored in ``event``."""
+        from merchants.models import WebhookEvent
+
+        return WebhookEvent.model_validate(self.event)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.dedup_key} status={self.status} attempts={self.attempts}>"
+
+
+class WebhookInbox:
+    """Stores webhook deliveries and runs the extension's handlers on them.
+
+    Created by :meth:`~flask_merchants.FlaskMerchants.init_app` when an
+    ``inbox_model`` is given; available as ``ext.webhook_inbox``.
+
+    Args:
+        ext: The :class:`~flask_merchants.FlaskMerchants` instance.
+        app: The Flask application (workers push its context).
+        model: The inbox model class (mixing in :class:`WebhookInboxMixin`).
+        workers: Size of the in-process thread pool.  ``0`` processes each
+            entry inline, right after it is stored (useful in tests).
+        max_attempts: Attempts before an entry is marked ``dead``.
+        backoff: Seconds before the first retry; doubled on each attempt.
+        stale_after: Seconds after which an entry still ``processing`` is
+            considered abandoned by a crashed worker.
+        dispatcher: ``dispatcher(entry_id, delay_seconds)`` to hand entries
+            to an external queue instead of the thread pool.
+    """
+
+    def __init__(
+        self,
+        ext,
+        app,
+        model,
+        *,
+        workers: int = 4,
+        max_attempts: int = 5,
+        backoff: float = 30,
+        stale_after: float = 600,
+        dispatcher: Callable[[Any, float], Any] | None = None,
+    ) -> None:
+        self._ext = ext
+        self._app = app
+        self.model = model
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.stale_after = stale_after
+        self.dispatcher = dispatcher
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def _db(self):
+        return self._ext._db
+
+    # ------------------------------------------------------------------
+    # Receiving
+    # ------------------------------------------------------------------
+
+    def record(self, provider: str, payload: bytes, headers: dict[str, str], event):
+        """Persist a verified delivery.  Returns the new entry id, or ``None`` for a duplicate.
+
+        The unique ``dedup_key`` makes the inbox the deduplication ledger:
+        the row is written with a single ``INSERT ... ON CONFLICT DO
+        NOTHING`` (PostgreSQL, SQLite; other databases catch the integrity
+        error), so a duplicate costs one index lookup and never reaches the
+        handlers, however many deliveries race.
+        """
+        values = dict(
+            provider=provider,
+            dedup_key=dedup_key(provider, event, payload),
+            event_id=event.event_id,
+            event_type=event.event_type,
+            payment_id=event.payment_id,
+            state=event.state.value,
+            event=event.model_dump(mode="json"),
+            headers=dict(headers),
+            body=payload.decode("utf-8", errors="replace"),
+            status=RECEIVED,
+            attempts=0,
+            handlers_done=[],
+        )
+        entry_id = self._insert_unless_duplicate(values)
+        self._db.session.commit()
+        return entry_id
+
+    def _insert_unless_duplicate(self, values: dict[str, Any]):
+        from sqlalchemy import insert
+        from sqlalchemy.exc import IntegrityError
+
+        session = self._db.session
+        table = self.model.__table__
+        dialect = session.get_bind().dialect
+        if dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        elif dialect.name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            try:
+                return session.execute(insert(table).values(**values)).inserted_primary_key[0]
+            except IntegrityError:
+                session.rollback()
+                return None
+
+        stmt = upsert(table).values(**values).on_conflict_do_nothing(index_elements=["dedup_key"])
+        if dialect.insert_returning:
+            return session.execute(stmt.returning(table.c.id)).scalar_one_or_none()
+        result = session.execute(stmt)
+        return result.inserted_primary_key[0] if result.rowcount == 1 else None
+
+    def submit(self, entry_id, delay: float = 0) -> None:
+        """Schedule *entry_id* for processing after *delay* seconds."""
+        if self.dispatcher is not None:
+            self.dispatcher(entry_id, delay)
+            return
+        if self.workers <= 0:
+            if not delay:
+                self.process(entry_id)
+            # Inline mode has no timer; process_due() picks the retry up.
+            return
+        if delay:
+            timer = threading.Timer(delay, self.submit, args=(entry_id,))
+            timer.daemon = True
+            timer.start()
+            return
+        self._get_executor().submit(self._process_in_context, entry_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the in-process thread pool (it is recreated on the next submit)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="merchants-webhook")
+            return self._executor
+
+    def _process_in_context(self, entry_id) -> None:
+        try:
+            with self._app.app_context():
+                self.process(entry_id)
+        except Exception:  # noqa: BLE001
+            logger.exception("webhook_inbox: worker crashed processing entry %r", entry_id)
+
+    # ------------------------------------------------------------------
+    # Processing
+    # ------------------------------------------------------------------
+
+    def process(self, entry_id) -> str | None:
+        """Run ``update_state`` and the pending handlers for one entry.
+
+        Returns the entry's resulting status, or ``None`` when the entry
+        could not be claimed (unknown, already done or being processed by
+        another worker).
+        """
+        from flask_merchants import merchants_audit
+
+        if not self._claim(entry_id):
+            return None
+        session = self._db.session
+        entry = session.get(self.model, entry_id, populate_existing=True)
+        body = entry.body.encode("utf-8")
+        ctx = WebhookContext(self._ext, entry.to_event(), body, entry.headers or {}, entry_id=entry_id)
+        provider, key, attempts = entry.provider, entry.dedup_key, entry.attempts
+        done: list[str] = list(entry.handlers_done or [])
+
+        # Handlers get the stored body and headers from the context; the
+        # request context is rebuilt only for older handlers that still read
+        # flask.request.  Deliveries for the same payment are serialised;
+        # see locking.py.
+        try:
+            with payment_lock(self._db, provider, ctx.payment_id), self._app.test_request_context(
+                f"{self._ext._url_prefix}/webhook/{provider}",
+                method="POST",
+                data=body,
+                headers=ctx.headers,
+            ):
+                errors = self._run_handlers(ctx, done, attempts)
+        except TimeoutError as exc:
+            errors = [repr(exc)]
+
+        now = _utcnow()
+        if not errors:
+            self._finish(entry_id, status=DONE, handlers_done=done, last_error=None, processed_at=now)
+            return DONE
+        if attempts >= self.max_attempts:
+            self._finish(entry_id, status=DEAD, handlers_done=done, last_error="\n".join(errors))
+            merchants_audit.error(
+                "webhook_dead_letter: provider=%r dedup_key=%r attempts=%d",
+                provider,
+                key,
+                attempts,
+            )
+            return DEAD
+        delay = self.backoff * 2 ** (attempts - 1)
+        self._finish(
+            entry_id,
+            status=RETRY,
+            handlers_done=done,
+            last_error="\n".join(errors),
+            next_attempt_at=now + timedelta(seconds=delay),
+        )
+        self.submit(entry_id, delay)
+        return RETRY
+
+    def _run_handlers(self, ctx: WebhookContext, done: list[str], attempts: int) -> list[str]:
+        """Apply the state update, then each handler not yet in *done*.  Returns the errors."""
+        from flask_merchants import merchants_audit
+
+        session = self._db.session
+        if ctx.payment_id and _UPDATE_STATE not in done:
+            try:
+                self._ext._apply_webhook_state(ctx)
+                done.append(_UPDATE_STATE)
+            except Exception as exc:  # noqa: BLE001
+                session.rollback()
+                return [f"{_UPDATE_STATE}: {exc!r}"]
+        errors = []
+        for index, handler in enumerate(list(self._ext._webhook_handlers)):
+            name = handler_name(index, handler)
+            if name in done:
+                continue
+            try:
+                handler(ctx)
+                done.append(name)
+            except Exception as exc:  # noqa: BLE001
+                session.rollback()
+                merchants_audit.exception(
+                    "webhook_handler_error: handler=%r event_type=%r payment_id=%r attempt=%d",
+                    handler,
+                    ctx.event_type,
+                    ctx.payment_id,
+                    attempts,
+                )
+                errors.append(f"{name}: {exc!r}")
+        return errors
+
+    def process_due(self, limit: int = 100) -> int:
+        """Submit entries whose retry is due or whose worker died.  Returns the count."""
+        now = _utcnow()
+        model = self.model
+        stale = now - timedelta(seconds=self.stale_after)
+        ids = self._db.session.execute(
+            self._db.select(model.id)
+            .where(
+                or_(
+                    model.status == RECEIVED,
+                    (model.status == RETRY) & (model.next_attempt_at <= now),
+                    (model.status == PROCESSING) & (model.updated_at <= stale),
+                )
+            )
+            .order_by(model.id)
+            .limit(limit)
+        ).scalars().all()
+        if ids:
+            # Abandoned "processing" entries become claimable again.
+            self._db.session.execute(
+                update(model).where(model.id.in_(ids), model.status == PROCESSING).values(status=RETRY)
+            )
+            self._db.session.commit()
+        for entry_id in ids:
+            self.submit(entry_id)
+        return len(ids)
+
+    def requeue(self, entry_id) -> bool:
+        """Give a ``dead`` or ``retry`` entry a fresh set of attempts and submit it."""
+        model = self.model
+        result = self._db.session.execute(
+            update(model)
+            .where(model.id == entry_id, model.status.in_((DEAD, RETRY)))
+            .values(status=RETRY, attempts=0, next_attempt_at=None)
+        )
+        self._db.session.commit()
+        if result.rowcount != 1:
+            return False
+        self.submit(entry_id)
+        return True
+
+    def _claim(self, entry_id) -> bool:
+        """Atomically move an entry to ``processing``; ``False`` if someone else has it."""
+        model = self.model
+        result = self._db.session.execute(
+            update(model)
+            .where(model.id == entry_id, model.status.in_((RECEIVED, RETRY)))
+            .values(status=PROCESSING, attempts=model.attempts + 1, updated_at=_utcnow())
+        )
+        self._db.session.commit()
+        return result.rowcount == 1
+
+    def _finish(self, entry_id, **values) -> None:
+        model = self.model
+        self._db.session.execute(update(model).where(model.id == entry_id).values(updated_at=_utcnow(), **values))
+        self._db.session.commit()
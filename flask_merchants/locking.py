@@ -0,0 +1,101 @@
+"""Per-payment serialisation of webhook processing.
+
+Two deliveries for the same payment (e.g. Khipu's ``pending`` and
+``conciliated`` notifications, or one delivery retried while the first is
+still running) must not run their handlers at the same time: handlers read
+the payment, decide, and write, so interleaving them can apply a credit
+twice.  Deliveries for *different* payments may run in parallel.
+
+:func:`payment_lock` always serialises threads of the current process with
+one lock per payment.  On PostgreSQL (``pg_advisory_lock``) and MySQL /
+MariaDB (``GET_LOCK``) it additionally takes a session-level database lock on
+a dedicated connection, so workers in other processes are serialised too.
+Session-level locks survive the commits handlers make; they are released
+when the block exits.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import func, select
+
+
+class KeyedLocks:
+    """One :class:`threading.Lock` per key, discarded when nobody holds or waits for it."""
+
+    def __init__(self) -> None:
+        self._guard = threading.Lock()
+        self._locks: dict[str, list] = {}  # key -> [lock, users]
+
+    @contextmanager
+    def hold(self, key: str) -> Iterator[None]:
+        with self._guard:
+            slot = self._locks.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._guard:
+                slot[1] -= 1
+                if not slot[1]:
+                    del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+_local_locks = KeyedLocks()
+
+
+def _advisory_id(key: str) -> int:
+    """Map *key* to the signed 64-bit integer ``pg_advisory_lock`` expects."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+@contextmanager
+def payment_lock(db, provider: str, payment_id: str | None, *, timeout: int = 30) -> Iterator[None]:
+    """Hold the lock for *payment_id* of *provider* while the block runs.
+
+    Args:
+        db: The Flask-SQLAlchemy instance, or ``None`` for in-process locking
+            only.
+        provider: Provider key (ids are only unique per provider).
+        payment_id: The provider's payment id.  Without one there is nothing
+            to serialise on and the block runs unlocked.
+        timeout: Seconds to wait for the MySQL lock before giving up
+            (PostgreSQL waits indefinitely).
+
+    Raises:
+        TimeoutError: The MySQL lock could not be acquired in *timeout*.
+    """
+    if not payment_id:
+        yield
+        return
+    key = f"merchants:{provider}:{payment_id}"
+    with _local_locks.hold(key):
+        dialect = db.engine.dialect.name if db is not None else None
+        if dialect == "postgresql":
+            lock_id = _advisory_id(key)
+            with db.engine.connect() as conn:
+                conn.execute(select(func.pg_advisory_lock(lock_id)))
+                try:
+                    yield
+                finally:
+                    conn.execute(select(func.pg_advisory_unlock(lock_id)))
+        elif dialect in ("mysql", "mariadb"):
+            # MySQL lock names are limited to 64 characters.
+            name = hashlib.sha1(key.encode()).hexdigest()
+            with db.engine.connect() as conn:
+                if conn.execute(select(func.get_lock(name, timeout))).scalar() != 1:
+                    raise TimeoutError(f"Could not lock payment {payment_id!r} within {timeout}s")
+                try:
+                    yield
+                finally:
+                    conn.execute(select(func.release_lock(name)))
+        else:
+            yield
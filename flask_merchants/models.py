@@ -47,6 +47,8 @@ import merchants as _merchants_registry
 from sqlalchemy import DateTime, JSON, Numeric, String, func, inspect, text
 from sqlalchemy.orm import Mapped, mapped_column, validates
 
+from flask_merchants.breaker import ProviderUnavailable
+
 logger = logging.getLogger(__name__)
 
 
@@ -232,6 +234,12 @@ class PaymentMixin:
         If the provider call fails, a record with ``state="failed"`` is still
         created so no payment attempt goes untracked.
 
+        The call is guarded by the provider's circuit breaker and bulkhead
+        (:meth:`FlaskMerchants.provider_guard`): while the provider is failing
+        or already has its cap of calls in flight, no call is made, nothing
+        is persisted and :class:`~flask_merchants.breaker.ProviderUnavailable`
+        is raised at once.
+
         Args:
             amount: Payment amount.
             currency: ISO-4217 currency code (e.g. ``"CLP"``, ``"USD"``).
@@ -255,6 +263,8 @@ class PaymentMixin:
 
         Raises:
             KeyError: If the provider slug is not registered.
+            ProviderUnavailable: If the provider's circuit is open or its
+                bulkhead is full.
             Any provider exception is caught, recorded, and the failed
             payment is persisted.  The original exception is re-raised.
         """
@@ -293,14 +303,15 @@ class PaymentMixin:
 
         try:
             client = ext.get_client(provider)
-            session = client.payments.create_checkout(
-                amount=amount,
-                currency=currency,
-                success_url=success_url,
-                cancel_url=cancel_url,
-                metadata={"order_id": local_merchants_id},
-                **provider_extra,
-            )
+            with ext.provider_guard(provider).call():
+                session = client.payments.create_checkout(
+                    amount=amount,
+                    currency=currency,
+                    success_url=success_url,
+                    cancel_url=cancel_url,
+                    metadata={"order_id": local_merchants_id},
+                    **provider_extra,
+                )
 
             response_raw = session.raw if isinstance(session.raw, dict) else {}
             # Include redirect_url in response_payload so it can be
@@ -321,6 +332,9 @@ class PaymentMixin:
                 response_payload=response_raw,
             )
 
+        except ProviderUnavailable as exc:
+            logger.warning("Payment creation skipped for provider=%r amount=%s: %s", provider, amount, exc)
+            raise
         except Exception as exc:
             # Provider call failed — persist a failed record
             logger.error(
@@ -341,10 +355,12 @@ class PaymentMixin:
             )
             ext._db.session.add(record)
             ext._db.session.commit()
+            ext._remember_payment(record)
             raise
 
         ext._db.session.add(record)
         ext._db.session.commit()
+        ext._remember_payment(record)
 
         logger.info(
             "Payment created: merchants_id=%s transaction_id=%s provider=%s amount=%s state=%s",
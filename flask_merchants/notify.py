@@ -0,0 +1,214 @@
+"""Payment status notifications - wake requests waiting for a payment to change.
+
+:class:`StatusNotifier` is published to by :meth:`FlaskMerchants.update_state
+<flask_merchants.FlaskMerchants.update_state>`, by every webhook state update
+and by provider syncs.  The ``/status/<payment_id>/wait`` (long-poll) and
+``/status/<payment_id>/stream`` (Server-Sent Events) views subscribe to it, so
+a browser waiting on a payment is answered when the webhook arrives instead of
+polling the provider.
+
+The broker is in-process by default.  Set ``MERCHANTS_STATUS_NOTIFY_URL`` to
+a Redis URL to fan notifications out across workers through pub/sub (the
+webhook may reach a different worker than the waiting browser), or pass any
+object with ``publish(payload)`` and ``close()`` to
+:meth:`StatusNotifier.set_backend`; it must hand messages from other workers
+to :meth:`StatusNotifier.deliver`.
+
+:class:`LocalBackend` and :class:`RedisBackend` carry any JSON payload to a
+``deliver`` callback, so other in-process brokers (e.g. the POS delivery
+feed) reuse them with their own channel.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import queue
+import threading
+from typing import Any, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+#: States after which a payment is not expected to change again.
+FINAL_STATES = frozenset({"succeeded", "failed", "cancelled", "refunded"})
+
+
+class LocalBackend:
+    """Hand published payloads straight to *deliver* in this process."""
+
+    def __init__(self, deliver: Callable[[dict[str, Any]], None]) -> None:
+        self._deliver = deliver
+
+    def publish(self, payload: dict[str, Any]) -> None:
+        self._deliver(payload)
+
+    def close(self) -> None:
+        pass
+
+
+class RedisBackend:
+    """Fan payloads out through a Redis pub/sub *channel* shared by all workers.
+
+    Every worker's subscriber thread hands what it receives to its own
+    *deliver*, including the payloads it published itself.
+    """
+
+    def __init__(
+        self, deliver: Callable[[dict[str, Any]], None], url: str, channel: str = "merchants:status"
+    ) -> None:
+        import redis
+
+        self._deliver = deliver
+        self._channel = channel
+        self._redis = redis.Redis.from_url(url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{channel: self._on_message})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _on_message(self, message) -> None:
+        try:
+            self._deliver(json.loads(message["data"]))
+        except (TypeError, ValueError):
+            logger.warning("merchants: invalid pub/sub message on %s", self._channel)
+
+    def publish(self, payload: dict[str, Any]) -> None:
+        self._redis.publish(self._channel, json.dumps(payload))
+
+    def close(self) -> None:
+        self._thread.stop()
+        self._pubsub.close()
+
+
+class Subscription:
+    """Notifications for a set of payment ids, from :meth:`StatusNotifier.subscribe`.
+
+    Use as a context manager, or call :meth:`close` when done.  Subscribe
+    *before* reading the current state so a change in between is not lost.
+    """
+
+    def __init__(self, notifier: StatusNotifier, ids: frozenset[str]) -> None:
+        self.ids = ids
+        self._notifier = notifier
+        self._queue: queue.SimpleQueue[dict[str, Any]] = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._waker: Callable[[], None] | None = None
+
+    def __enter__(self) -> Subscription:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _put(self, payload: dict[str, Any]) -> None:
+        self._queue.put(payload)
+        with self._lock:
+            waker = self._waker
+        if waker is not None:
+            waker()
+
+    def wait(self, timeout: float | None = None) -> dict[str, Any] | None:
+        """Block until a notification arrives; ``None`` after *timeout* seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def wait_async(self, timeout: float | None = None) -> dict[str, Any] | None:
+        """Like :meth:`wait`, without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        arrived = asyncio.Event()
+        with self._lock:
+            self._waker = lambda: loop.call_soon_threadsafe(arrived.set)
+        try:
+            while True:
+                try:
+                    return self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    await asyncio.wait_for(arrived.wait(), timeout)
+                except TimeoutError:
+                    return None
+                arrived.clear()
+        finally:
+            with self._lock:
+                self._waker = None
+
+    def close(self) -> None:
+        self._notifier._unsubscribe(self)
+
+
+class StatusNotifier:
+    """In-process broker of payment state changes with a pluggable backend.
+
+    Example::
+
+        with ext.status_notifier.subscribe(["pay_1"]) as sub:
+            payload = sub.wait(timeout=25)
+        # -> {"ids": ["pay_1", "mid-..."], "state": "succeeded", "provider": "khipu"}
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscriptions: dict[str, set[Subscription]] = {}
+        self.backend = LocalBackend(self.deliver)
+        self.published = 0
+        self.delivered = 0
+
+    def set_backend(self, backend) -> None:
+        """Replace the backend (closing the previous one)."""
+        old, self.backend = self.backend, backend
+        old.close()
+
+    def close(self) -> None:
+        """Stop the backend and return to in-process delivery."""
+        self.set_backend(LocalBackend(self.deliver))
+
+    def publish(self, ids: Iterable[str | None], state: str, provider: str | None = None) -> None:
+        """Announce that the payment known by *ids* is now in *state*.
+
+        Never raises: a broken backend must not fail the state update that
+        triggered it.
+        """
+        payload = {"ids": sorted({i for i in ids if i}), "state": state, "provider": provider}
+        if not payload["ids"]:
+            return
+        self.published += 1
+        try:
+            self.backend.publish(payload)
+        except Exception:  # noqa: BLE001
+            logger.exception("merchants: could not publish status notification for %s", payload["ids"])
+
+    def deliver(self, payload: dict[str, Any]) -> None:
+        """Hand *payload* to the local subscriptions of its ids (called by backends)."""
+        with self._lock:
+            targets = set()
+            for payment_id in payload.get("ids", ()):
+                targets.update(self._subscriptions.get(payment_id, ()))
+        for sub in targets:
+            sub._put(payload)
+        self.delivered += len(targets)
+
+    def subscribe(self, ids: Iterable[str | None]) -> Subscription:
+        """Return a :class:`Subscription` to changes of the payment known by *ids*."""
+        sub = Subscription(self, frozenset(i for i in ids if i))
+        with self._lock:
+            for payment_id in sub.ids:
+                self._subscriptions.setdefault(payment_id, set()).add(sub)
+        return sub
+
+    def _unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            for payment_id in sub.ids:
+                subs = self._subscriptions.get(payment_id)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subscriptions[payment_id]
+
+    def stats(self) -> dict[str, int]:
+        """Return ``waiting`` (subscribed payment ids), ``published`` and ``delivered`` counters."""
+        with self._lock:
+            waiting = len(self._subscriptions)
+        return {"waiting": waiting, "published": self.published, "delivered": self.delivered}
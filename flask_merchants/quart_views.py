@@ -7,15 +7,25 @@ view functions and awaits Quart's coroutine-based request helpers
 
 It is selected automatically by :meth:`~flask_merchants.FlaskMerchants.init_app`
 when the application is a :class:`quart.Quart` instance.
+
+Provider calls go through the async provider API (``acreate_checkout``,
+``aget_payment``, ``aparse_webhook``), and the synchronous database helpers
+run in a worker thread, so a slow provider never blocks the event loop and
+one worker serves many checkouts at once.
 """
 
 from __future__ import annotations
 
+import asyncio
 import json
+import time
 from typing import TYPE_CHECKING
 
 import merchants
 
+from flask_merchants.context import WebhookContext
+from flask_merchants.notify import FINAL_STATES
+
 if TYPE_CHECKING:
     from flask_merchants import FlaskMerchants
 
@@ -23,7 +33,7 @@ if TYPE_CHECKING:
 def create_async_blueprint(ext: "FlaskMerchants"):
     """Return a Quart Blueprint pre-configured with the extension instance."""
     try:
-        from quart import Blueprint, jsonify, redirect, request, url_for
+        from quart import Blueprint, Response, current_app, jsonify, redirect, request, url_for
     except ImportError as exc:  # pragma: no cover
         raise ImportError(
             "quart is required for flask_merchants.quart_views. "
@@ -32,6 +42,12 @@ def create_async_blueprint(ext: "FlaskMerchants"):
 
     bp = Blueprint("merchants", __name__, template_folder="templates")
 
+    def _process_webhook(ctx: WebhookContext) -> None:
+        """Store the delivered state and run the handlers (blocking; run in a thread)."""
+        if ctx.payment_id:
+            ext._apply_webhook_state(ctx)
+        ext._dispatch_webhook_event(ctx)
+
     # ------------------------------------------------------------------
     # Checkout - initiate a payment
     # ------------------------------------------------------------------
@@ -69,7 +85,7 @@ def create_async_blueprint(ext: "FlaskMerchants"):
         cancel_url = url_for("merchants.cancel", _external=True)
 
         try:
-            session = client.payments.create_checkout(
+            session = await client.payments.acreate_checkout(
                 amount=amount,
                 currency=currency,
                 success_url=success_url,
@@ -88,7 +104,7 @@ def create_async_blueprint(ext: "FlaskMerchants"):
         }
         if provider_key:
             req_payload["provider"] = provider_key
-        ext.save_session(session, request_payload=req_payload)
+        await asyncio.to_thread(ext.save_session, session, request_payload=req_payload)
 
         if json_data is not None:
             return jsonify(
@@ -108,6 +124,18 @@ def create_async_blueprint(ext: "FlaskMerchants"):
         """Return the list of registered payment provider keys."""
         return jsonify({"providers": ext.list_providers()})
 
+    @bp.route("/metrics", methods=["GET"])
+    async def metrics():
+        """Provider call metrics in the Prometheus text format (this worker only).
+
+        Disabled (404) unless ``MERCHANTS_METRICS_TOKEN`` is set.
+        """
+        if not ext._metrics_token:
+            return jsonify({"error": "Not found"}), 404
+        if not ext._metrics_allowed(request.headers.get("Authorization")):
+            return jsonify({"error": "unauthorized"}), 401
+        return Response(ext.metrics.render(), mimetype="text/plain; version=0.0.4")
+
     # ------------------------------------------------------------------
     # Success / cancel landing pages
     # ------------------------------------------------------------------
@@ -116,7 +144,7 @@ def create_async_blueprint(ext: "FlaskMerchants"):
     async def success():
         """Landing page after a successful payment."""
         payment_id = request.args.get("payment_id", "")
-        stored = ext.get_session(payment_id) if payment_id else None
+        stored = await asyncio.to_thread(ext.get_session, payment_id) if payment_id else None
         return jsonify(
             {
                 "status": "success",
@@ -129,7 +157,7 @@ def create_async_blueprint(ext: "FlaskMerchants"):
     async def cancel():
         """Landing page after a cancelled payment."""
         payment_id = request.args.get("payment_id", "")
-        stored = ext.get_session(payment_id) if payment_id else None
+        stored = await asyncio.to_thread(ext.get_session, payment_id) if payment_id else None
         return jsonify(
             {
                 "status": "cancelled",
@@ -146,11 +174,11 @@ def create_async_blueprint(ext: "FlaskMerchants"):
     async def payment_status(payment_id: str):
         """Return the live payment status from the provider."""
         try:
-            status = ext.client.payments.get(payment_id)
+            status = await ext.client.payments.aget(payment_id)
         except merchants.UserError as exc_:
             return jsonify({"error": str(exc_)}), 400
 
-        ext.update_state(payment_id, status.state.value)
+        await asyncio.to_thread(ext.update_state, payment_id, status.state.value)
 
         return jsonify(
             {
@@ -162,6 +190,49 @@ def create_async_blueprint(ext: "FlaskMerchants"):
             }
         )
 
+    @bp.route("/status/<payment_id>/wait")
+    async def payment_status_wait(payment_id: str):
+        """Hold the request until the payment leaves the state the caller knows.
+
+        Same contract as the Flask view; waiting costs no thread.
+        """
+        limit = float(current_app.config.get("MERCHANTS_STATUS_WAIT_TIMEOUT", 25))
+        try:
+            timeout = max(0.0, min(float(request.args["timeout"]), limit))
+        except (KeyError, ValueError):
+            timeout = limit
+        known = request.args.get("state") or None
+        with ext.status_notifier.subscribe([payment_id]) as sub:
+            stored = await asyncio.to_thread(ext.get_session, payment_id)
+            if stored is None:
+                return jsonify({"error": "Payment not found"}), 404
+            state = stored["state"]
+            known = known or state
+            if state != known or state in FINAL_STATES:
+                return _wait_response(payment_id, state, known, "store")
+            deadline = time.monotonic() + timeout
+            while (remaining := deadline - time.monotonic()) > 0:
+                payload = await sub.wait_async(remaining)
+                if payload is not None and payload["state"] != known:
+                    return _wait_response(payment_id, payload["state"], known, "notification")
+
+        try:
+            status = await asyncio.to_thread(ext._refresh_status, payment_id, stored)
+        except Exception:  # noqa: BLE001
+            return _wait_response(payment_id, known, known, "timeout")
+        return _wait_response(payment_id, status.state.value, known, "provider")
+
+    def _wait_response(payment_id: str, state: str | None, known: str | None, source: str):
+        return jsonify(
+            {
+                "payment_id": payment_id,
+                "state": state,
+                "changed": state != known,
+                "is_final": state in FINAL_STATES,
+                "source": source,
+            }
+        )
+
     # ------------------------------------------------------------------
     # Webhook
     # ------------------------------------------------------------------
@@ -173,12 +244,12 @@ def create_async_blueprint(ext: "FlaskMerchants"):
         headers: dict[str, str] = dict(request.headers)
 
         try:
-            event = ext.client._provider.parse_webhook(payload, headers)
+            event = await ext.client._provider.aparse_webhook(payload, headers)
         except Exception:  # noqa: BLE001
             return jsonify({"error": "malformed payload"}), 400
 
-        ext.update_state(event.payment_id, event.state.value)
-        ext._dispatch_webhook_event(event)
+        ctx = WebhookContext(ext, event, payload, headers)
+        await asyncio.to_thread(_process_webhook, ctx)
 
         return jsonify(
             {
@@ -213,14 +284,12 @@ def create_async_blueprint(ext: "FlaskMerchants"):
         headers: dict[str, str] = dict(request.headers)
 
         try:
-            event = client._provider.parse_webhook(payload, headers)
+            event = await client._provider.aparse_webhook(payload, headers)
         except Exception:  # noqa: BLE001
             return jsonify({"error": "malformed payload"}), 400
 
-        if event.payment_id:
-            ext.update_state(event.payment_id, event.state.value)
-
-        ext._dispatch_webhook_event(event)
+        ctx = WebhookContext(ext, event, payload, headers)
+        await asyncio.to_thread(_process_webhook, ctx)
 
         return jsonify(
             {
@@ -0,0 +1,67 @@
+"""Payment routing index for multi-model lookups.
+
+:class:`FlaskMerchants` can persist payments in several model classes.  Without
+an index, resolving a ``merchants_id`` or ``transaction_id`` means querying every
+registered model twice (once per column).  :class:`PaymentRouter` remembers
+which model class and primary key own each id, so a lookup becomes a single
+``session.get()`` (often served from the identity map without any query).
+
+The index is a bounded LRU kept in process memory.  It is filled when
+payments are created and when a lookup falls back to scanning the models
+(legacy rows created before the index, or by another process), so it never
+has to be complete to be correct.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any
+
+
+class PaymentRouter:
+    """Thread-safe LRU mapping ``payment id -> (model class, identity)``.
+
+    Args:
+        maxsize: Maximum number of ids kept.  Each payment usually takes two
+            entries (its ``merchants_id`` and its ``transaction_id``).
+    """
+
+    def __init__(self, maxsize: int = 10_000) -> None:
+        self.maxsize = maxsize
+        self._routes: OrderedDict[str, tuple[type, tuple[Any, ...]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def remember(self, model_cls: type, identity: tuple[Any, ...], *payment_ids: str | None) -> None:
+        """Route each of *payment_ids* to the row *identity* of *model_cls*."""
+        if self.maxsize <= 0 or identity is None:
+            return
+        with self._lock:
+            for payment_id in payment_ids:
+                if not payment_id:
+                    continue
+                self._routes[payment_id] = (model_cls, identity)
+                self._routes.move_to_end(payment_id)
+            while len(self._routes) > self.maxsize:
+                self._routes.popitem(last=False)
+
+    def lookup(self, payment_id: str) -> tuple[type, tuple[Any, ...]] | None:
+        """Return ``(model class, identity)`` for *payment_id*, or ``None``."""
+        with self._lock:
+            route = self._routes.get(payment_id)
+            if route is not None:
+                self._routes.move_to_end(payment_id)
+            return route
+
+    def forget(self, payment_id: str) -> None:
+        """Drop the route for *payment_id* (e.g. the row was deleted)."""
+        with self._lock:
+            self._routes.pop(payment_id, None)
+
+    def clear(self) -> None:
+        """Drop every route."""
+        with self._lock:
+            self._routes.clear()
@@ -0,0 +1,235 @@
+"""Session stores - where :class:`~flask_merchants.FlaskMerchants` keeps checkout data.
+
+Without a database the store is the only record of a checkout; with one it is
+a write-through copy used when a payment id is not found in any model.  Two
+implementations are provided:
+
+:class:`MemorySessionStore`
+    Per-process LRU bounded by size and age, with hit/miss statistics.  Old
+    checkouts are evicted instead of accumulating for the life of the worker.
+
+:class:`RedisSessionStore`
+    Shared by every worker through Redis, so a state change made by the
+    worker that received a webhook is seen by the one serving the status
+    page.  Entries expire after the configured TTL.
+
+Any subclass of :class:`SessionStore` can be passed to
+``FlaskMerchants(store=...)``.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any
+
+
+class SessionStore(ABC):
+    """Base class for checkout session stores.
+
+    Stored values are plain JSON-serialisable dicts keyed by ``merchants_id``.
+    Subclasses implement :meth:`get`, :meth:`set`, :meth:`delete` and
+    :meth:`values`; stores shared between workers should also override
+    :meth:`update`, whose default read-modify-write is not atomic.
+    """
+
+    @abstractmethod
+    def get(self, payment_id: str) -> dict[str, Any] | None:
+        """Return a copy of the data stored for *payment_id*, or ``None``."""
+
+    @abstractmethod
+    def set(self, payment_id: str, data: dict[str, Any]) -> None:
+        """Store *data* under *payment_id*, replacing any previous value."""
+
+    def update(self, payment_id: str, **fields: Any) -> bool:
+        """Merge *fields* into an existing entry.  Returns ``False`` if absent."""
+        data = self.get(payment_id)
+        if data is None:
+            return False
+        data.update(fields)
+        self.set(payment_id, data)
+        return True
+
+    @abstractmethod
+    def delete(self, payment_id: str) -> None:
+        """Remove *payment_id* if present."""
+
+    @abstractmethod
+    def values(self) -> list[dict[str, Any]]:
+        """Return copies of all live entries."""
+
+    def stats(self) -> dict[str, int]:
+        """Return implementation-specific counters (at least ``size``)."""
+        return {"size": len(self.values())}
+
+
+class MemorySessionStore(SessionStore):
+    """In-process LRU store with a maximum size and entry age.
+
+    Args:
+        maxsize: Maximum number of entries; the least recently used entry
+            is evicted when a new one would exceed it.
+        ttl: Seconds after which an entry expires (``0`` or ``None`` keeps
+            entries until they are evicted by size).
+    """
+
+    def __init__(self, maxsize: int = 1000, ttl: float | None = 3600) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl or None
+        self._data: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, payment_id: str) -> bool:
+        with self._lock:
+            return self._live(payment_id) is not None
+
+    def get(self, payment_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            data = self._live(payment_id)
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(payment_id)
+            return dict(data)
+
+    def set(self, payment_id: str, data: dict[str, Any]) -> None:
+        with self._lock:
+            self._data[payment_id] = (time.monotonic(), dict(data))
+            self._data.move_to_end(payment_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, payment_id: str, **fields: Any) -> bool:
+        # Updating keeps the entry's original age: the TTL bounds how long a
+        # checkout is remembered, not how long since it last changed.
+        with self._lock:
+            data = self._live(payment_id)
+            if data is None:
+                return False
+            data.update(fields)
+            self._data.move_to_end(payment_id)
+            return True
+
+    def delete(self, payment_id: str) -> None:
+        with self._lock:
+            self._data.pop(payment_id, None)
+
+    def values(self) -> list[dict[str, Any]]:
+        with self._lock:
+            self._purge_expired()
+            return [dict(data) for _, data in self._data.values()]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            self._purge_expired()
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _live(self, payment_id: str) -> dict[str, Any] | None:
+        """Return the entry for *payment_id* unless it has expired (lock held)."""
+        entry = self._data.get(payment_id)
+        if entry is None:
+            return None
+        stored_at, data = entry
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            del self._data[payment_id]
+            self.expirations += 1
+            return None
+        return data
+
+    def _purge_expired(self) -> None:
+        if self.ttl is None:
+            return
+        limit = time.monotonic() - self.ttl
+        # Entries are not reordered by age, so every one has to be checked.
+        for payment_id in [k for k, (stored_at, _) in self._data.items() if stored_at < limit]:
+            del self._data[payment_id]
+            self.expirations += 1
+
+
+class RedisSessionStore(SessionStore):
+    """Store shared by all workers through Redis.
+
+    Args:
+        url: Redis connection URL (ignored when *client* is given).
+        ttl: Seconds each entry lives (``0`` or ``None`` for no expiry).
+        prefix: Key prefix for the stored entries.
+        client: An existing ``redis.Redis`` instance.
+    """
+
+    def __init__(
+        self,
+        url: str | None = None,
+        *,
+        ttl: int | None = 3600,
+        prefix: str = "merchants:session:",
+        client=None,
+    ) -> None:
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self._redis = client
+        self.ttl = int(ttl) if ttl else None
+        self.prefix = prefix
+
+    def get(self, payment_id: str) -> dict[str, Any] | None:
+        raw = self._redis.get(self.prefix + payment_id)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, payment_id: str, data: dict[str, Any]) -> None:
+        self._redis.set(self.prefix + payment_id, json.dumps(data, default=str), ex=self.ttl)
+
+    def update(self, payment_id: str, **fields: Any) -> bool:
+        # WATCH/MULTI: if another worker writes the entry between our read and
+        # write, the transaction is discarded and the merge retried on the new
+        # value, so concurrent updates of different fields are never lost.
+        from redis.exceptions import WatchError
+
+        key = self.prefix + payment_id
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    if raw is None:
+                        return False
+                    data = json.loads(raw)
+                    data.update(fields)
+                    pipe.multi()
+                    # KEEPTTL so updates do not extend the entry's lifetime.
+                    pipe.set(key, json.dumps(data, default=str), keepttl=True)
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    def delete(self, payment_id: str) -> None:
+        self._redis.delete(self.prefix + payment_id)
+
+    def values(self) -> list[dict[str, Any]]:
+        keys = list(self._redis.scan_iter(match=self.prefix + "*"))
+        if not keys:
+            return []
+        return [json.loads(raw) for raw in self._redis.mget(keys) if raw is not None]
+
+    def stats(self) -> dict[str, int]:
+        return {"size": sum(1 for _ in self._redis.scan_iter(match=self.prefix + "*"))}
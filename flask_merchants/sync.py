@@ -0,0 +1,303 @@
+"""Bulk reconciliation of stored payments with their providers.
+
+:class:`PaymentSyncEngine` fetches the live status of many payments at once:
+
+* each payment is asked of **its own** provider (``payment.provider``), not
+  the extension's default client;
+* the provider calls run concurrently in a bounded thread pool
+  (``MERCHANTS_SYNC_WORKERS``), with requests interleaved across providers
+  so one slow provider does not hold up the others;
+* each provider is throttled by a :class:`RateLimiter`
+  (``MERCHANTS_SYNC_RATE_LIMIT`` requests per second);
+* state changes are written back in the calling thread, one transaction per
+  ``MERCHANTS_SYNC_CHUNK_SIZE`` payments.  Each write is conditional on the
+  payment still being in the state it was read in, so a webhook (or another
+  sync) that moved it in the meantime wins and the result is marked
+  ``superseded``;
+* the handlers registered with
+  :meth:`~flask_merchants.FlaskMerchants.add_sync_handler` run for every
+  payment whose state this sync changed, under the same
+  :func:`~flask_merchants.locking.payment_lock` as the webhook handlers.
+
+Worker threads only talk to providers; they never touch the SQLAlchemy
+session.  It is used by the admin **Sync from Provider** action and by the
+``flask merchants payments sync`` sweeper::
+
+    results = ext.sync_payments(ext.find_stuck_payments(since=yesterday))
+    changed = [r for r in results if r.changed]
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import zip_longest
+from typing import Any, Iterable
+
+from sqlalchemy import inspect as sa_inspect, update
+
+logger = logging.getLogger(__name__)
+
+#: States a payment can be stuck in while waiting for its provider.
+STUCK_STATES = ("pending", "processing")
+
+
+class RateLimiter:
+    """Spaces calls at least ``1 / rate`` seconds apart, across threads.
+
+    Args:
+        rate: Calls per second; ``0`` or ``None`` disables the limit.
+    """
+
+    def __init__(self, rate: float | None) -> None:
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until the caller may make its call."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+@dataclass
+class SyncResult:
+    """Outcome of syncing one payment.
+
+    Attributes:
+        payment: The payment row.
+        old_state: State before the sync.
+        new_state: State reported by the provider, or ``None`` on error.
+        error: The provider or database error, if any.
+        superseded: The payment left *old_state* before the new state could
+            be stored (e.g. a webhook got there first); nothing was written.
+    """
+
+    payment: Any
+    old_state: str
+    new_state: str | None = None
+    error: str | None = None
+    superseded: bool = False
+
+    @property
+    def changed(self) -> bool:
+        """``True`` when the provider reported a different state and it was stored."""
+        return (
+            self.error is None
+            and not self.superseded
+            and self.new_state is not None
+            and self.new_state != self.old_state
+        )
+
+
+class PaymentSyncEngine:
+    """Fetches provider statuses concurrently and applies them in chunks.
+
+    Created by :meth:`~flask_merchants.FlaskMerchants.init_app`; use it
+    through :meth:`~flask_merchants.FlaskMerchants.sync_payments`.
+
+    Args:
+        ext: The :class:`~flask_merchants.FlaskMerchants` instance.
+        workers: Maximum concurrent provider calls.
+        rate_limit: Requests per second per provider; a ``dict`` maps
+            provider keys to their own limit (key ``"*"`` for the rest).
+            ``0`` disables throttling.
+        chunk_size: Payments written per transaction.
+    """
+
+    def __init__(self, ext, *, workers: int = 8, rate_limit: float | dict = 5, chunk_size: int = 100) -> None:
+        self._ext = ext
+        self.workers = max(1, workers)
+        self.rate_limit = rate_limit
+        self.chunk_size = max(1, chunk_size)
+        self._limiters: dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, provider: str) -> RateLimiter:
+        """Return the shared :class:`RateLimiter` for *provider*."""
+        with self._lock:
+            limiter = self._limiters.get(provider)
+            if limiter is None:
+                rate = self.rate_limit
+                if isinstance(rate, dict):
+                    rate = rate.get(provider, rate.get("*", 0))
+                limiter = self._limiters[provider] = RateLimiter(rate)
+            return limiter
+
+    def sync(self, payments: Iterable) -> list[SyncResult]:
+        """Sync *payments* with their providers.  Returns one result per payment, in order."""
+        payments = list(payments)
+        results = [SyncResult(payment=p, old_state=p.state) for p in payments]
+        if not results:
+            return results
+
+        # Group by provider, then interleave the groups so every provider's
+        # requests are spread over the whole run.
+        groups: dict[str, list[int]] = {}
+        for index, payment in enumerate(payments):
+            groups.setdefault(payment.provider, []).append(index)
+        clients = {}
+        for provider, indexes in groups.items():
+            try:
+                clients[provider] = self._ext.get_client(provider)
+            except KeyError as exc:
+                for index in indexes:
+                    results[index].error = repr(exc)
+        order = [i for batch in zip_longest(*groups.values()) for i in batch if i is not None]
+        jobs = [
+            (i, payments[i].provider, clients[payments[i].provider], payments[i].transaction_id)
+            for i in order
+            if payments[i].provider in clients
+        ]
+
+        if jobs:
+            with ThreadPoolExecutor(
+                max_workers=min(self.workers, len(jobs)), thread_name_prefix="merchants-sync"
+            ) as pool:
+                for index, state, error in pool.map(self._fetch, jobs):
+                    results[index].new_state = state
+                    results[index].error = error
+
+        for start in range(0, len(results), self.chunk_size):
+            self._apply(results[start : start + self.chunk_size])
+        return results
+
+    def _fetch(self, job: tuple) -> tuple[int, str | None, str | None]:
+        """Ask the payment's provider for its status (runs in a worker thread)."""
+        index, provider, client, transaction_id = job
+        try:
+            self.limiter(provider).acquire()
+            status = client.payments.get(transaction_id)
+        except Exception as exc:  # noqa: BLE001
+            return index, None, repr(exc)
+        return index, status.state.value, None
+
+    def _apply(self, chunk: list[SyncResult]) -> None:
+        """Store the changed states of *chunk* in one transaction, then run the sync handlers.
+
+        Every ``UPDATE`` only matches while the row is still in ``old_state``;
+        results whose row had already moved on are marked ``superseded``.
+        """
+        from flask_merchants import merchants_audit
+        from flask_merchants.locking import payment_lock
+
+        changed = [r for r in chunk if r.changed]
+        for result in chunk:
+            if result.error is not None:
+                merchants_audit.warning(
+                    "sync_error: merchants_id=%r provider=%r error=%s",
+                    result.payment.merchants_id,
+                    result.payment.provider,
+                    result.error,
+                )
+        if not changed:
+            return
+
+        db = self._ext._db
+        session = db.session
+        try:
+            for result in changed:
+                model = type(result.payment)
+                mapper = sa_inspect(model)
+                identity = mapper.primary_key_from_instance(result.payment)
+                stmt = (
+                    update(model)
+                    .where(*[column == value for column, value in zip(mapper.primary_key, identity)])
+                    .where(model.state == result.old_state)
+                    .values(state=result.new_state)
+                    .execution_options(synchronize_session=False)
+                )
+                result.superseded = session.execute(stmt).rowcount != 1
+            session.commit()
+        except Exception as exc:  # noqa: BLE001
+            session.rollback()
+            for result in changed:
+                result.superseded = False
+                result.error = repr(exc)
+            merchants_audit.exception("sync_commit_error: payments=%d", len(changed))
+            return
+
+        for result in changed:
+            payment = result.payment
+            if result.superseded:
+                merchants_audit.info(
+                    "payment_sync_superseded: merchants_id=%s provider=%s %s -> %s, now %s",
+                    payment.merchants_id,
+                    payment.provider,
+                    result.old_state,
+                    result.new_state,
+                    payment.state,
+                )
+                continue
+            with payment_lock(db, payment.provider, payment.transaction_id):
+                # Re-read under the lock: a webhook handler may have run since the commit.
+                session.refresh(payment)
+                self._ext._store.update(payment.merchants_id, state=payment.state)
+                self._ext._notifier.publish(
+                    (payment.merchants_id, payment.transaction_id), payment.state, payment.provider
+                )
+                merchants_audit.info(
+                    "payment_synced: merchants_id=%s provider=%s %s -> %s",
+                    payment.merchants_id,
+                    payment.provider,
+                    result.old_state,
+                    result.new_state,
+                )
+                if payment.state != result.new_state:
+                    # Moved on again before the lock was ours; its handlers own it now.
+                    result.superseded = True
+                    continue
+                for handler in self._ext._sync_handlers:
+                    try:
+                        handler(result)
+                    except Exception:  # noqa: BLE001
+                        session.rollback()
+                        merchants_audit.exception(
+                            "sync_handler_error: handler=%r merchants_id=%r",
+                            handler,
+                            payment.merchants_id,
+                        )
+
+    def find_stuck(
+        self,
+        *,
+        states: Iterable[str] = STUCK_STATES,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        model_class=None,
+        limit: int | None = None,
+    ) -> list:
+        """Return payment rows in *states* created in ``[since, until)``, oldest first.
+
+        Args:
+            states: States to look for (default ``pending`` and ``processing``).
+            since: Only payments created at or after this time.
+            until: Only payments created before this time (e.g. to skip
+                checkouts the customer may still be completing).
+            model_class: Restrict to one registered model.
+            limit: Maximum rows per model.
+        """
+        db = self._ext._db
+        states = list(states)
+        models = [model_class] if model_class is not None else self._ext._get_model_classes()
+        found = []
+        for model in models:
+            query = db.select(model).where(model.state.in_(states)).order_by(model.created_at)
+            if since is not None:
+                query = query.where(model.created_at >= since)
+            if until is not None:
+                query = query.where(model.created_at < until)
+            if limit is not None:
+                query = query.limit(limit)
+            found.extend(db.session.execute(query).scalars())
+        return found
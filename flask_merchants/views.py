@@ -4,10 +4,13 @@ from __future__ import annotations
 
 import json
 import logging
+import time
 from typing import TYPE_CHECKING
 
 import merchants
-from flask import Blueprint, jsonify, redirect, request, url_for
+from flask import Blueprint, Response, current_app, jsonify, redirect, request, url_for
+
+from flask_merchants.notify import FINAL_STATES
 
 logger = logging.getLogger(__name__)
 
@@ -101,6 +104,18 @@ def create_blueprint(ext: "FlaskMerchants") -> Blueprint:
         """Return the list of registered payment provider keys."""
         return jsonify({"providers": ext.list_providers()})
 
+    @bp.route("/metrics", methods=["GET"])
+    def metrics():
+        """Provider call metrics in the Prometheus text format (this worker only).
+
+        Disabled (404) unless ``MERCHANTS_METRICS_TOKEN`` is set.
+        """
+        if not ext._metrics_token:
+            return jsonify({"error": "Not found"}), 404
+        if not ext._metrics_allowed(request.headers.get("Authorization")):
+            return jsonify({"error": "unauthorized"}), 401
+        return Response(ext.metrics.render(), mimetype="text/plain; version=0.0.4")
+
     # ------------------------------------------------------------------
     # Success / cancel landing pages
     # ------------------------------------------------------------------
@@ -155,6 +170,117 @@ def create_blueprint(ext: "FlaskMerchants") -> Blueprint:
             }
         )
 
+    @bp.route("/status/<payment_id>/wait")
+    def payment_status_wait(payment_id: str):
+        """Hold the request until the payment leaves the state the caller knows.
+
+        Query parameters:
+
+        * ``state`` - the state the page shows; defaults to the stored one.
+        * ``timeout`` - seconds to wait, capped by ``MERCHANTS_STATUS_WAIT_TIMEOUT``.
+
+        Woken by webhooks and state updates through
+        :attr:`~flask_merchants.FlaskMerchants.status_notifier`; the provider
+        is asked (through the status cache) only when the wait times out.
+        Unknown payment ids get a 404 without waiting.
+        """
+        timeout = _wait_timeout(request.args.get("timeout"))
+        known = request.args.get("state") or None
+        with ext.status_notifier.subscribe([payment_id]) as sub:
+            # Read after subscribing so a change committed in between is not missed.
+            stored = ext.get_session(payment_id)
+            if stored is None:
+                return jsonify({"error": "Payment not found"}), 404
+            state = stored["state"]
+            known = known or state
+            if state != known or state in FINAL_STATES:
+                return _wait_response(payment_id, state, known, "store")
+            if ext._db is not None:
+                # Give the pooled connection back while the request sleeps.
+                ext._db.session.close()
+            deadline = time.monotonic() + timeout
+            while (remaining := deadline - time.monotonic()) > 0:
+                payload = sub.wait(remaining)
+                if payload is not None and payload["state"] != known:
+                    return _wait_response(payment_id, payload["state"], known, "notification")
+
+        try:
+            status = ext._refresh_status(payment_id, stored)
+        except Exception:  # noqa: BLE001
+            logger.warning("merchants: status check for %s after waiting failed", payment_id, exc_info=True)
+            return _wait_response(payment_id, known, known, "timeout")
+        return _wait_response(payment_id, status.state.value, known, "provider")
+
+    @bp.route("/status/<payment_id>/stream")
+    def payment_status_stream(payment_id: str):
+        """Server-Sent Events stream with one ``status`` event per state change.
+
+        Sends the current state first and ends after a final state.  Like
+        :func:`payment_status_wait`, the provider is only asked after
+        ``MERCHANTS_STATUS_WAIT_TIMEOUT`` seconds without a notification, at
+        most ``MERCHANTS_STATUS_STREAM_MAX_REFRESHES`` times.  After
+        ``MERCHANTS_STATUS_STREAM_MAX_SECONDS`` the stream ends with a
+        ``timeout`` event; clients should close their ``EventSource`` on it
+        (or on a final state) instead of letting it reconnect.  Unknown
+        payment ids get a 404.
+        """
+        timeout = _wait_timeout(None)
+        max_seconds = float(current_app.config.get("MERCHANTS_STATUS_STREAM_MAX_SECONDS", 300))
+        max_refreshes = int(current_app.config.get("MERCHANTS_STATUS_STREAM_MAX_REFRESHES", 5))
+        sub = ext.status_notifier.subscribe([payment_id])
+        # Read after subscribing so a change committed in between is not missed.
+        stored = ext.get_session(payment_id)
+        if stored is None:
+            sub.close()
+            return jsonify({"error": "Payment not found"}), 404
+        if ext._db is not None:
+            # Give the pooled connection back while the stream is open.
+            ext._db.session.close()
+        app = current_app._get_current_object()
+
+        def generate():
+            state = stored["state"]
+            refreshes = 0
+            deadline = time.monotonic() + max_seconds
+            yield "retry: 3000\n\n"
+            yield _status_event(payment_id, state)
+            while state not in FINAL_STATES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    yield _status_event(payment_id, state, event="timeout")
+                    return
+                payload = sub.wait(min(timeout, remaining))
+                new_state = state
+                if payload is not None:
+                    new_state = payload["state"]
+                elif refreshes < max_refreshes and deadline > time.monotonic():
+                    refreshes += 1
+                    try:
+                        with app.app_context():
+                            new_state = ext._refresh_status(payment_id, stored).state.value
+                    except Exception:  # noqa: BLE001
+                        logger.warning("merchants: status check for %s failed", payment_id, exc_info=True)
+                if new_state == state:
+                    yield ": keepalive\n\n"
+                    continue
+                state = stored["state"] = new_state
+                yield _status_event(payment_id, state)
+
+        response = Response(
+            generate(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        response.call_on_close(sub.close)
+        return response
+
+    def _wait_timeout(requested: str | None) -> float:
+        limit = float(current_app.config.get("MERCHANTS_STATUS_WAIT_TIMEOUT", 25))
+        try:
+            return max(0.0, min(float(requested), limit)) if requested else limit
+        except ValueError:
+            return limit
+
     # ------------------------------------------------------------------
     # Webhook
     # ------------------------------------------------------------------
@@ -171,18 +297,7 @@ def create_blueprint(ext: "FlaskMerchants") -> Blueprint:
         except Exception:  # noqa: BLE001
             return jsonify({"error": "malformed payload"}), 400
 
-        ext.update_state(event.payment_id, event.state.value)
-        ext._dispatch_webhook_event(event)
-
-        return jsonify(
-            {
-                "received": True,
-                "event_id": event.event_id,
-                "event_type": event.event_type,
-                "payment_id": event.payment_id,
-                "state": event.state.value,
-            }
-        )
+        return jsonify(ext._receive_webhook(ext.client._provider.key, payload, headers, event))
 
     # CSRF exemption for both webhook views is handled by FlaskMerchants.init_app
     # which calls csrf_ext.exempt() on these view functions after blueprint
@@ -203,6 +318,10 @@ def create_blueprint(ext: "FlaskMerchants") -> Blueprint:
             flask_merchants.get_webhook_url("khipu")
 
         This requires ``MERCHANTS_WEBHOOK_BASE_URL`` to be set in the app config.
+
+        With a webhook inbox configured the verified delivery is stored and
+        acknowledged here, and the handlers run in a background worker (see
+        :mod:`flask_merchants.inbox`).
         """
         logger.debug("views.py: webhook_provider called with provider=%r", provider)
         try:
@@ -227,19 +346,24 @@ def create_blueprint(ext: "FlaskMerchants") -> Blueprint:
         except Exception:  # noqa: BLE001
             return jsonify({"error": "malformed payload"}), 400
 
-        if event.payment_id:
-            ext.update_state(event.payment_id, event.state.value)
+        return jsonify(ext._receive_webhook(provider, payload, headers, event))
 
-        ext._dispatch_webhook_event(event)
+    return bp
 
-        return jsonify(
-            {
-                "received": True,
-                "event_id": event.event_id,
-                "event_type": event.event_type,
-                "payment_id": event.payment_id,
-                "state": event.state.value,
-            }
-        )
 
-    return bp
+def _wait_response(payment_id: str, state: str | None, known: str | None, source: str):
+    """JSON body of ``/status/<payment_id>/wait``; *source* tells what answered it."""
+    return jsonify(
+        {
+            "payment_id": payment_id,
+            "state": state,
+            "changed": state != known,
+            "is_final": state in FINAL_STATES,
+            "source": source,
+        }
+    )
+
+
+def _status_event(payment_id: str, state: str, event: str = "status") -> str:
+    data = json.dumps({"payment_id": payment_id, "state": state, "is_final": state in FINAL_STATES})
+    return f"event: {event}\ndata: {data}\n\n"
@@ -3,7 +3,10 @@ from __future__ import annotations
 
 from merchants.amount import from_minor_units, to_decimal_string, to_minor_units
 from merchants.auth import ApiKeyAuth, AuthStrategy, TokenAuth
+from merchants.cache import StatusCache
+from merchants.cassette import CassetteMiss, RecordingTransport, ReplayTransport
 from merchants.client import Client, PaymentsResource
+from merchants.instrument import CallEvent, Instrumentation, MetricsRecorder, MetricsRegistry, log_call
 from merchants.models import (
     CheckoutSession,
     PaymentState,
@@ -21,10 +24,19 @@ from merchants.providers import (
     register_provider,
 )
 from merchants.transport import (
+    AsyncTransport,
     HttpResponse,
+    HttpxAsyncTransport,
+    RequestTiming,
     RequestsTransport,
+    RetryPolicy,
+    ThreadedAsyncTransport,
     Transport,
     TransportError,
+    default_async_transport,
+    default_transport,
+    observe_requests,
+    set_default_transport,
 )
 from merchants.version import __version__
 from merchants.webhooks import WebhookVerificationError, parse_event, verify_signature
@@ -33,6 +45,13 @@ __all__ = [
     # Client
     "Client",
     "PaymentsResource",
+    "StatusCache",
+    # Instrumentation
+    "CallEvent",
+    "Instrumentation",
+    "MetricsRecorder",
+    "MetricsRegistry",
+    "log_call",
     # Auth
     "ApiKeyAuth",
     "AuthStrategy",
@@ -52,10 +71,22 @@ __all__ = [
     "normalise_state",
     "register_provider",
     # Transport
+    "AsyncTransport",
+    "CassetteMiss",
     "HttpResponse",
+    "HttpxAsyncTransport",
+    "RecordingTransport",
+    "ReplayTransport",
+    "RequestTiming",
     "RequestsTransport",
+    "RetryPolicy",
+    "ThreadedAsyncTransport",
     "Transport",
     "TransportError",
+    "default_async_transport",
+    "default_transport",
+    "observe_requests",
+    "set_default_transport",
     # Amount
     "from_minor_units",
     "to_decimal_string",
@@ -0,0 +1,252 @@
+"""Webhook load replay - the engine behind ``merchants bench webhooks``.
+
+Replays a corpus of recorded webhook bodies against a webhook endpoint, either
+a running server (``url``) or a WSGI app through Flask's test client, signing
+each delivery with the Khipu ``x-khipu-signature`` scheme
+(``t=<unix_ms>,s=base64(HMAC-SHA256(secret, "<t>.<body>"))``).
+
+A share of the deliveries is sent twice, concurrently with the rest, to check
+that the receiver processes every notification exactly once.  The receiver
+reports a dropped re-delivery with ``"duplicate": true`` in its JSON body, as
+the flask-merchants webhook inbox does.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+#: Top-level fields rewritten to make copies of a payload distinct notifications.
+ID_FIELDS = ("notification_token", "event_id", "id", "payment_id")
+
+
+def khipu_signature(secret: str | bytes, payload: bytes, timestamp: str | None = None) -> str:
+    """Return an ``x-khipu-signature`` header value for *payload*.
+
+    The inverse of :func:`merchants.webhooks.verify_khipu_signature`.
+    """
+    if isinstance(secret, str):
+        secret = secret.encode()
+    timestamp = timestamp or str(int(time.time() * 1000))
+    digest = hmac.new(secret, f"{timestamp}.".encode() + payload, hashlib.sha256).digest()
+    return f"t={timestamp},s={base64.b64encode(digest).decode()}"
+
+
+def load_corpus(path: str | Path) -> list[bytes]:
+    """Load recorded webhook bodies, byte for byte.
+
+    *path* is a directory (every ``*.json`` file is one body), a ``.jsonl``
+    file (one body per line) or a single body file.
+    """
+    path = Path(path)
+    if path.is_dir():
+        return [p.read_bytes() for p in sorted(path.glob("*.json"))]
+    if path.suffix == ".jsonl":
+        return [line for line in path.read_bytes().splitlines() if line.strip()]
+    return [path.read_bytes()]
+
+
+def make_copy(payload: bytes, n: int) -> bytes:
+    """Return *payload* as a distinct notification: id fields get a ``-<n>`` suffix.
+
+    Copy ``0`` (and bodies that are not a JSON object) are returned unchanged.
+    """
+    if n == 0:
+        return payload
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return payload
+    if not isinstance(data, dict):
+        return payload
+    for name in ID_FIELDS:
+        if data.get(name):
+            data[name] = f"{data[name]}-{n}"
+    return json.dumps(data).encode()
+
+
+@dataclass
+class Delivery:
+    """One request of a run.  Deliveries sharing a ``group`` carry the same notification."""
+
+    group: int
+    body: bytes
+    status: int | None = None
+    elapsed: float = 0.0
+    duplicate: bool | None = None
+    error: str | None = None
+
+
+def plan(
+    corpus: list[bytes], *, copies: int = 1, duplicates: float = 0.1, seed: int | None = None
+) -> list[Delivery]:
+    """Return the deliveries of a run in sending order.
+
+    Every corpus body is sent *copies* times as distinct notifications; a
+    *duplicates* fraction of those is sent a second time.  The order is
+    shuffled so re-deliveries race their originals.
+    """
+    rnd = random.Random(seed)
+    bodies = [make_copy(body, n) for n in range(copies) for body in corpus]
+    deliveries = [Delivery(group, body) for group, body in enumerate(bodies)]
+    for group in rnd.sample(range(len(bodies)), round(len(bodies) * duplicates)):
+        deliveries.append(Delivery(group, bodies[group]))
+    rnd.shuffle(deliveries)
+    return deliveries
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of *values* (``0.0`` when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))  # ceil
+    return ordered[int(rank) - 1]
+
+
+@dataclass
+class BenchReport:
+    """Outcome of :func:`run`."""
+
+    deliveries: list[Delivery]
+    concurrency: int
+    wall_time: float
+    groups: int = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.groups = len({d.group for d in self.deliveries})
+
+    @property
+    def latencies(self) -> list[float]:
+        return [d.elapsed for d in self.deliveries if d.error is None]
+
+    @property
+    def errors(self) -> int:
+        return sum(d.error is not None for d in self.deliveries)
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / len(self.deliveries) if self.deliveries else 0.0
+
+    def duplicate_check(self) -> dict[str, int]:
+        """Count notifications processed ``once``, ``twice_or_more``, ``never`` or ``unreported``.
+
+        A notification is *processed* by each successful delivery not flagged
+        ``duplicate``; it is *unreported* when a response lacked the flag.
+        """
+        by_group: dict[int, list[Delivery]] = {}
+        for d in self.deliveries:
+            by_group.setdefault(d.group, []).append(d)
+        counts = {"once": 0, "twice_or_more": 0, "never": 0, "unreported": 0}
+        for group in by_group.values():
+            answered = [d for d in group if d.error is None]
+            if any(d.duplicate is None for d in answered):
+                counts["unreported"] += 1
+                continue
+            processed = sum(not d.duplicate for d in answered)
+            if processed == 1:
+                counts["once"] += 1
+            elif processed > 1:
+                counts["twice_or_more"] += 1
+            elif len(answered) == len(group):
+                counts["never"] += 1
+        return counts
+
+    def as_dict(self) -> dict[str, Any]:
+        latencies = self.latencies
+        return {
+            "deliveries": len(self.deliveries),
+            "notifications": self.groups,
+            "concurrency": self.concurrency,
+            "wall_time": round(self.wall_time, 3),
+            "throughput": round(len(self.deliveries) / self.wall_time, 1) if self.wall_time else 0.0,
+            "latency_ms": {
+                name: round(percentile(latencies, pct) * 1000, 1)
+                for name, pct in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+            },
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 4),
+            "duplicates": self.duplicate_check(),
+        }
+
+
+Sender = Callable[[bytes, dict[str, str]], tuple[int, bytes]]
+
+
+def url_sender(url: str, *, timeout: float = 10.0, pool_size: int = 10) -> Sender:
+    """Return a sender POSTing to *url* over a pooled :mod:`requests` session."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def send(body: bytes, headers: dict[str, str]) -> tuple[int, bytes]:
+        resp = session.post(url, data=body, headers=headers, timeout=timeout)
+        return resp.status_code, resp.content
+
+    return send
+
+
+def app_sender(app: Any, path: str) -> Sender:
+    """Return a sender POSTing to *path* of a Flask *app* through its test client (one per thread)."""
+    local = threading.local()
+
+    def send(body: bytes, headers: dict[str, str]) -> tuple[int, bytes]:
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        resp = client.post(path, data=body, headers=headers)
+        return resp.status_code, resp.get_data()
+
+    return send
+
+
+def run(
+    deliveries: list[Delivery],
+    send: Sender,
+    *,
+    concurrency: int = 8,
+    secret: str | None = None,
+    signature_header: str = "x-khipu-signature",
+) -> BenchReport:
+    """Send *deliveries* with *concurrency* threads and return the report.
+
+    Each delivery is signed just before sending when *secret* is set.
+    """
+
+    def _deliver(d: Delivery) -> None:
+        headers = {"Content-Type": "application/json"}
+        if secret:
+            headers[signature_header] = khipu_signature(secret, d.body)
+        started = time.perf_counter()
+        try:
+            d.status, content = send(d.body, headers)
+        except Exception as exc:  # noqa: BLE001
+            d.error = repr(exc)
+            return
+        finally:
+            d.elapsed = time.perf_counter() - started
+        if d.status >= 400:
+            d.error = f"HTTP {d.status}"
+            return
+        try:
+            flag = json.loads(content).get("duplicate")
+        except (ValueError, AttributeError):
+            flag = None
+        d.duplicate = None if flag is None else bool(flag)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(_deliver, deliveries))
+    return BenchReport(deliveries, concurrency, time.perf_counter() - started)
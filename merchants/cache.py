@@ -0,0 +1,147 @@
+"""Short-lived cache for provider payment status lookups."""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from merchants.models import PaymentStatus
+
+_Key = tuple[str, str]
+
+
+class _Call:
+    """A lookup in flight; callers for the same key wait on it."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: PaymentStatus | None = None
+        self.error: BaseException | None = None
+
+
+class StatusCache:
+    """Cache of :class:`~merchants.models.PaymentStatus` keyed by ``(provider, payment_id)``.
+
+    * Statuses that can still change are kept *ttl* seconds; final ones
+      (:attr:`~merchants.models.PaymentStatus.is_final`) *final_ttl* seconds.
+    * Concurrent lookups of the same key share one provider call: the first
+      caller fetches, the others wait for its result (or its exception).
+    * At most *maxsize* entries are kept, least recently used first out.
+
+    Pass one to :class:`~merchants.Client` to cache ``client.payments.get``.
+
+    Args:
+        ttl: Seconds a non-final status is served from cache (``0`` disables).
+        final_ttl: Seconds a final status is served from cache (``0`` disables).
+        maxsize: Maximum number of cached statuses.
+
+    Example::
+
+        cache = StatusCache(ttl=2, final_ttl=300)
+        client = Client(provider="khipu", status_cache=cache)
+        client.payments.get("pay_1")  # provider call
+        client.payments.get("pay_1")  # cached
+    """
+
+    def __init__(self, ttl: float = 2.0, final_ttl: float = 300.0, maxsize: int = 10_000) -> None:
+        self.ttl = ttl
+        self.final_ttl = final_ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict[_Key, tuple[float, PaymentStatus]] = OrderedDict()
+        self._inflight: dict[_Key, _Call] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _live(self, key: _Key) -> PaymentStatus | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def get(self, provider: str, payment_id: str) -> PaymentStatus | None:
+        """Return the cached status, or ``None`` if absent or expired."""
+        with self._lock:
+            status = self._live((provider, payment_id))
+            if status is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return status
+
+    def set(self, provider: str, payment_id: str, status: PaymentStatus) -> None:
+        """Cache *status* for the TTL matching its state."""
+        ttl = self.final_ttl if status.is_final else self.ttl
+        key = (provider, payment_id)
+        with self._lock:
+            if not ttl or ttl <= 0:
+                self._entries.pop(key, None)
+                return
+            self._entries[key] = (time.monotonic() + ttl, status)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, provider: str, payment_id: str) -> None:
+        """Drop the cached status so the next lookup asks the provider."""
+        with self._lock:
+            self._entries.pop((provider, payment_id), None)
+
+    def clear(self) -> None:
+        """Drop every cached status."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_fetch(self, provider: str, payment_id: str, fetch: Callable[[], PaymentStatus]) -> PaymentStatus:
+        """Return the cached status or call *fetch*, sharing the call with concurrent callers."""
+        key = (provider, payment_id)
+        with self._lock:
+            status = self._live(key)
+            if status is not None:
+                self.hits += 1
+                return status
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result  # type: ignore[return-value]
+
+        try:
+            call.result = fetch()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        else:
+            self.set(provider, payment_id, call.result)
+            return call.result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> dict[str, int]:
+        """Return ``size``, ``hits``, ``misses`` and ``coalesced`` counters."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
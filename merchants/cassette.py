@@ -0,0 +1,240 @@
+"""Record and replay provider HTTP traffic.
+
+:class:`RecordingTransport` wraps a real :class:`~merchants.transport.Transport`
+and appends every exchange to a *cassette*, a JSON Lines file with one
+exchange per line::
+
+    {"method": "POST", "url": "https://api.stripe.com/v1/checkout/sessions", "params": null,
+     "json": {...}, "status": 200, "headers": {"Content-Type": "application/json"},
+     "body": {...}, "elapsed": 0.412}
+
+Request headers are not recorded (they carry credentials), and only the
+response headers in :data:`RESPONSE_HEADERS` are kept.
+
+:class:`ReplayTransport` answers from a cassette without touching the network,
+at the recorded latencies or at injected ones, and can fail a share of the
+requests, so provider code paths can be benchmarked and regression-tested
+offline::
+
+    provider = StripeProvider("sk_test_x", transport=ReplayTransport("stripe.jsonl", error_rate=0.05))
+
+Wrap it in :class:`~merchants.transport.ThreadedAsyncTransport` to replay the
+``a*`` provider methods.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from merchants.transport import (
+    HttpResponse,
+    RequestTiming,
+    Timeout,
+    Transport,
+    TransportError,
+    default_transport,
+    notify_observers,
+)
+
+logger = logging.getLogger(__name__)
+
+#: Response headers kept in a cassette.
+RESPONSE_HEADERS = ("Content-Type", "Retry-After", "Location")
+
+
+class CassetteMiss(LookupError):
+    """Raised by :class:`ReplayTransport` for a request the cassette has no exchange for."""
+
+
+def load_cassette(path: str | Path) -> list[dict[str, Any]]:
+    """Return the exchanges recorded in the cassette at *path*."""
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def _key(method: str, url: str, params: dict[str, str] | None, body: Any, match_body: bool) -> tuple:
+    params_key = tuple(sorted((params or {}).items()))
+    body_key = json.dumps(body, sort_keys=True, default=str) if match_body else None
+    return method.upper(), url, params_key, body_key
+
+
+def _size(body: Any) -> int:
+    if body is None:
+        return 0
+    return len(body.encode() if isinstance(body, str) else json.dumps(body).encode())
+
+
+class RecordingTransport(Transport):
+    """Send through *transport* and append every exchange to the cassette at *path*.
+
+    Network errors are recorded too (as ``{"error": "..."}``) and re-raised.
+
+    Args:
+        path: Cassette file; created if missing, appended to otherwise.
+        transport: Defaults to the shared :func:`~merchants.transport.default_transport`.
+    """
+
+    def __init__(self, path: str | Path, transport: Transport | None = None) -> None:
+        self.path = Path(path)
+        self._transport = transport
+        self._lock = threading.Lock()
+
+    @property
+    def transport(self) -> Transport:
+        return self._transport or default_transport()
+
+    def _write(self, exchange: dict[str, Any]) -> None:
+        line = json.dumps(exchange, default=str, separators=(",", ":"))
+        with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+
+    def send(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: dict[str, str] | None = None,
+        json: Any = None,
+        params: dict[str, str] | None = None,
+        timeout: Timeout = None,
+    ) -> HttpResponse:
+        exchange: dict[str, Any] = {"method": method.upper(), "url": url, "params": params, "json": json}
+        started = time.perf_counter()
+        try:
+            resp = self.transport.send(method, url, headers=headers, json=json, params=params, timeout=timeout)
+        except TransportError as exc:
+            exchange.update(error=str(exc), elapsed=round(time.perf_counter() - started, 4))
+            self._write(exchange)
+            raise
+        exchange.update(
+            status=resp.status_code,
+            headers={k: v for k, v in resp.headers.items() if k.title() in RESPONSE_HEADERS},
+            body=resp.body,
+            elapsed=round(time.perf_counter() - started, 4),
+        )
+        self._write(exchange)
+        return resp
+
+
+class ReplayTransport(Transport):
+    """Answer requests from a cassette written by :class:`RecordingTransport`.
+
+    A request is matched on method, URL, query params and (unless
+    *match_body* is false) JSON body.  When the same request was recorded
+    several times the recordings are replayed in order, starting over once
+    exhausted.
+
+    Args:
+        cassette: Cassette path or a list of exchanges.
+        latency: Seconds to wait before answering: ``None`` for the recorded
+            time, a number, or a ``(low, high)`` range drawn uniformly.
+        error_rate: Share of requests (``0``-``1``) that fail on purpose.
+        error_status: Status of the injected failures; ``None`` raises
+            :class:`~merchants.transport.TransportError` instead.
+        match_body: Whether the JSON body is part of the match.
+        seed: Seed for the injected latency and errors.
+
+    Raises:
+        CassetteMiss: From :meth:`send`, when nothing was recorded for the request.
+    """
+
+    def __init__(
+        self,
+        cassette: str | Path | list[dict[str, Any]],
+        *,
+        latency: float | tuple[float, float] | None = None,
+        error_rate: float = 0.0,
+        error_status: int | None = None,
+        match_body: bool = True,
+        seed: int | None = None,
+    ) -> None:
+        exchanges = cassette if isinstance(cassette, list) else load_cassette(cassette)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.match_body = match_body
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._exchanges: dict[tuple, list[dict[str, Any]]] = {}
+        self._next: dict[tuple, int] = {}
+        self._hooks: list[Callable[[RequestTiming], Any]] = []
+        self.calls = 0
+        self.injected_errors = 0
+        for exchange in exchanges:
+            key = _key(exchange["method"], exchange["url"], exchange.get("params"), exchange.get("json"), match_body)
+            self._exchanges.setdefault(key, []).append(exchange)
+
+    def add_hook(self, hook: Callable[[RequestTiming], Any]) -> Callable[[RequestTiming], Any]:
+        """Call *hook* with a :class:`~merchants.transport.RequestTiming` after every request."""
+        self._hooks.append(hook)
+        return hook
+
+    def _pick(self, key: tuple) -> tuple[dict[str, Any], float, bool]:
+        with self._lock:
+            recorded = self._exchanges.get(key)
+            if not recorded:
+                raise CassetteMiss(f"No recorded exchange for {key[0]} {key[1]}")
+            index = self._next.get(key, 0)
+            self._next[key] = (index + 1) % len(recorded)
+            exchange = recorded[index]
+            if self.latency is None:
+                delay = float(exchange.get("elapsed") or 0.0)
+            elif isinstance(self.latency, tuple):
+                delay = self._random.uniform(*self.latency)
+            else:
+                delay = float(self.latency)
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+            self.calls += 1
+            self.injected_errors += fail
+        return exchange, delay, fail
+
+    def send(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: dict[str, str] | None = None,
+        json: Any = None,
+        params: dict[str, str] | None = None,
+        timeout: Timeout = None,
+    ) -> HttpResponse:
+        exchange, delay, fail = self._pick(_key(method, url, params, json, self.match_body))
+        if delay:
+            time.sleep(delay)
+
+        status = None
+        error = exchange.get("error")
+        if fail and self.error_status is None:
+            error = "injected transport error"
+        elif fail:
+            status = self.error_status
+        elif error is None:
+            status = exchange["status"]
+
+        body = exchange.get("body") if status is not None and not fail else None
+        timing = RequestTiming(
+            method.upper(),
+            url,
+            status,
+            delay,
+            1,
+            error,
+            request_bytes=_size(json),
+            response_bytes=_size(body) if status is not None else None,
+        )
+        for hook in self._hooks:
+            try:
+                hook(timing)
+            except Exception:  # noqa: BLE001
+                logger.exception("transport hook %r failed", hook)
+        notify_observers(timing)
+        if status is None:
+            raise TransportError(error)
+        if fail:
+            return HttpResponse(status, {}, {"error": {"message": "injected error"}})
+        return HttpResponse(status, dict(exchange.get("headers") or {}), body)
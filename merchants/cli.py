@@ -14,6 +14,8 @@ Then run::
         --success-url https://example.com/ok --cancel-url https://example.com/cancel
     merchants payments get <payment_id> --provider dummy
     merchants payments webhook --file payload.json --provider dummy
+    merchants bench webhooks --corpus webhooks/ --url http://localhost:5000/merchants/webhook/khipu \\
+        --secret $KHIPU_WEBHOOK_SECRET --concurrency 16 --copies 50
 """
 from __future__ import annotations
 
@@ -40,6 +42,13 @@ payments_app = typer.Typer(
 )
 app.add_typer(payments_app, name="payments")
 
+bench_app = typer.Typer(
+    name="bench",
+    help="Load-test a running integration with recorded traffic.",
+    no_args_is_help=True,
+)
+app.add_typer(bench_app, name="bench")
+
 
 # ---------------------------------------------------------------------------
 # Provider resolution helper
@@ -420,5 +429,128 @@ def payments_webhook(
     typer.echo(f"Verified    : {'yes' if verified else 'no (no secret provided)'}")
 
 
+# ---------------------------------------------------------------------------
+# bench
+# ---------------------------------------------------------------------------
+
+def _load_app(spec: str):
+    """Import a Flask app from ``module:attr``; a factory is called without arguments."""
+    import importlib
+
+    module_name, _, attr = spec.partition(":")
+    try:
+        target = getattr(importlib.import_module(module_name), attr or "app")
+    except (ImportError, AttributeError) as exc:
+        typer.echo(f"Cannot load app {spec!r}: {exc}", err=True)
+        raise typer.Exit(1)
+    if not hasattr(target, "test_client") and callable(target):
+        target = target()
+    return target
+
+
+@bench_app.command("webhooks")
+def bench_webhooks(
+    corpus: Path = typer.Option(
+        ...,
+        "--corpus",
+        "-c",
+        help="Recorded webhook bodies: a directory of *.json files or a .jsonl file.",
+    ),
+    url: str | None = typer.Option(
+        None,
+        "--url",
+        help="Webhook URL of a running app, e.g. http://localhost:5000/merchants/webhook/khipu.",
+    ),
+    app_spec: str | None = typer.Option(
+        None,
+        "--app",
+        help="Flask app (or factory) as 'module:attr', driven through its test client instead of --url.",
+        metavar="MODULE:ATTR",
+    ),
+    provider_key: str = typer.Option(
+        "khipu",
+        "--provider",
+        "-p",
+        help="Provider key of the webhook route when using --app.",
+        metavar="KEY",
+    ),
+    secret: str | None = typer.Option(
+        None,
+        "--secret",
+        envvar="KHIPU_WEBHOOK_SECRET",
+        help="Sign every delivery with this secret (x-khipu-signature scheme).",
+    ),
+    signature_header: str = typer.Option(
+        "x-khipu-signature",
+        "--signature-header",
+        help="Header carrying the signature.",
+    ),
+    concurrency: int = typer.Option(8, "--concurrency", "-n", min=1, help="Deliveries in flight at once."),
+    copies: int = typer.Option(
+        1, "--copies", min=1, help="Send each body this many times as distinct notifications (ids suffixed)."
+    ),
+    duplicates: float = typer.Option(
+        0.1, "--duplicates", min=0.0, max=1.0, help="Fraction of notifications re-delivered to test deduplication."
+    ),
+    timeout: float = typer.Option(10.0, "--timeout", help="Per-request timeout in seconds (--url only)."),
+    seed: int | None = typer.Option(None, "--seed", help="Seed for the delivery order and re-delivery choice."),
+    output: str = typer.Option(
+        "text",
+        "--output",
+        "-o",
+        help="Output format: 'text' or 'json'.",
+        metavar="FORMAT",
+    ),
+) -> None:
+    """Replay recorded webhooks concurrently and report latency, errors and duplicate handling.
+
+    Exits with code 1 when a notification was processed more than once.
+    """
+    from merchants import bench
+
+    if (url is None) == (app_spec is None):
+        typer.echo("Pass exactly one of --url or --app.", err=True)
+        raise typer.Exit(1)
+    try:
+        bodies = bench.load_corpus(corpus)
+    except OSError as exc:
+        typer.echo(f"Cannot read corpus: {exc}", err=True)
+        raise typer.Exit(1)
+    if not bodies:
+        typer.echo(f"No webhook bodies found in {corpus}.", err=True)
+        raise typer.Exit(1)
+
+    if url is not None:
+        send = bench.url_sender(url, timeout=timeout, pool_size=concurrency)
+    else:
+        send = bench.app_sender(_load_app(app_spec), f"/merchants/webhook/{provider_key}")
+
+    deliveries = bench.plan(bodies, copies=copies, duplicates=duplicates, seed=seed)
+    report = bench.run(
+        deliveries, send, concurrency=concurrency, secret=secret, signature_header=signature_header
+    ).as_dict()
+
+    if output == "json":
+        typer.echo(json.dumps(report, indent=2))
+    else:
+        latency = report["latency_ms"]
+        dupes = report["duplicates"]
+        typer.echo(f"Deliveries  : {report['deliveries']} ({report['notifications']} notifications)")
+        typer.echo(f"Concurrency : {report['concurrency']}")
+        typer.echo(f"Wall time   : {report['wall_time']:.2f}s ({report['throughput']} req/s)")
+        typer.echo(
+            f"Latency     : p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+            f"p99 {latency['p99']} ms, max {latency['max']} ms"
+        )
+        typer.echo(f"Errors      : {report['errors']} ({report['error_rate']:.2%})")
+        typer.echo(
+            f"Processed   : once {dupes['once']}, twice or more {dupes['twice_or_more']}, "
+            f"never {dupes['never']}, not reported {dupes['unreported']}"
+        )
+
+    if report["duplicates"]["twice_or_more"]:
+        raise typer.Exit(1)
+
+
 if __name__ == "__main__":
     app()
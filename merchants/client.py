@@ -1,23 +1,40 @@
 """Main Client entry point for the merchants SDK."""
 from __future__ import annotations
 
+import asyncio
+from contextlib import AbstractContextManager, nullcontext
 from decimal import Decimal
 from typing import Any
 
 from merchants.auth import AuthStrategy
+from merchants.cache import StatusCache
+from merchants.instrument import Instrumentation
 from merchants.models import CheckoutSession, PaymentStatus
 from merchants.providers import Provider, get_provider
-from merchants.transport import HttpResponse, RequestsTransport, Transport
+from merchants.transport import HttpResponse, Timeout, Transport, default_transport
 
 
 class PaymentsResource:
     """Resource object exposed as ``client.payments``.
 
-    Provides hosted-checkout creation and payment status retrieval.
+    Provides hosted-checkout creation and payment status retrieval.  With a
+    :class:`~merchants.cache.StatusCache`, :meth:`get` and :meth:`aget`
+    answer repeated lookups from it and share concurrent ones.  With an
+    :class:`~merchants.instrument.Instrumentation`, every provider call (not
+    cache hits) is timed and reported.
     """
 
-    def __init__(self, provider: Provider) -> None:
+    def __init__(
+        self,
+        provider: Provider,
+        cache: StatusCache | None = None,
+        instrumentation: Instrumentation | None = None,
+    ) -> None:
         self._provider = provider
+        self._cache = cache
+        self._instrumentation = instrumentation
+        # payment id -> aget() lookup in flight, awaited by concurrent callers.
+        self._pending: dict[str, asyncio.Task[PaymentStatus]] = {}
 
     def create_checkout(
         self,
@@ -45,14 +62,15 @@ class PaymentsResource:
         Raises:
             :class:`~merchants.providers.UserError`: If the provider rejects the request.
         """
-        return self._provider.create_checkout(
-            Decimal(str(amount)),
-            currency,
-            success_url,
-            cancel_url,
-            metadata,
-            **kwargs,
-        )
+        with self._call("create_checkout"):
+            return self._provider.create_checkout(
+                Decimal(str(amount)),
+                currency,
+                success_url,
+                cancel_url,
+                metadata,
+                **kwargs,
+            )
 
     def get(self, payment_id: str) -> PaymentStatus:
         """Retrieve and normalise the status of a payment.
@@ -63,7 +81,66 @@ class PaymentsResource:
         Returns:
             :class:`~merchants.models.PaymentStatus`.
         """
-        return self._provider.get_payment(payment_id)
+        if self._cache is None:
+            return self._fetch(payment_id)
+        return self._cache.get_or_fetch(self._provider.key, payment_id, lambda: self._fetch(payment_id))
+
+    def _call(self, operation: str) -> AbstractContextManager[None]:
+        if self._instrumentation is None:
+            return nullcontext()
+        return self._instrumentation.call(self._provider.key, operation)
+
+    def _fetch(self, payment_id: str) -> PaymentStatus:
+        with self._call("get_payment"):
+            return self._provider.get_payment(payment_id)
+
+    async def acreate_checkout(
+        self,
+        amount: Decimal | int | float | str,
+        currency: str,
+        success_url: str,
+        cancel_url: str,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> CheckoutSession:
+        """Async :meth:`create_checkout` (does not block the event loop)."""
+        with self._call("create_checkout"):
+            return await self._provider.acreate_checkout(
+                Decimal(str(amount)),
+                currency,
+                success_url,
+                cancel_url,
+                metadata,
+                **kwargs,
+            )
+
+    async def aget(self, payment_id: str) -> PaymentStatus:
+        """Async :meth:`get` (does not block the event loop)."""
+        if self._cache is None:
+            return await self._afetch_status(payment_id)
+        status = self._cache.get(self._provider.key, payment_id)
+        if status is not None:
+            return status
+        task = self._pending.get(payment_id)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._afetch(payment_id))
+            self._pending[payment_id] = task
+            task.add_done_callback(lambda done: self._forget(payment_id, done))
+        # Shielded: a caller that gives up does not cancel the others' lookup.
+        return await asyncio.shield(task)
+
+    async def _afetch_status(self, payment_id: str) -> PaymentStatus:
+        with self._call("get_payment"):
+            return await self._provider.aget_payment(payment_id)
+
+    async def _afetch(self, payment_id: str) -> PaymentStatus:
+        status = await self._afetch_status(payment_id)
+        self._cache.set(self._provider.key, payment_id, status)  # type: ignore[union-attr]
+        return status
+
+    def _forget(self, payment_id: str, task: asyncio.Task[PaymentStatus]) -> None:
+        if self._pending.get(payment_id) is task:
+            del self._pending[payment_id]
 
 
 class Client:
@@ -75,8 +152,12 @@ class Client:
         auth: Optional :class:`~merchants.auth.AuthStrategy` to apply to
             low-level requests made via :meth:`request`.
         transport: Optional custom :class:`~merchants.transport.Transport`.
-            Defaults to :class:`~merchants.transport.RequestsTransport`.
+            Defaults to the shared :func:`~merchants.transport.default_transport`.
         base_url: Optional base URL used by :meth:`request`.
+        status_cache: Optional :class:`~merchants.cache.StatusCache` for
+            ``payments.get``; may be shared by clients of several providers.
+        instrumentation: Optional :class:`~merchants.instrument.Instrumentation`
+            told about every provider call and :meth:`request`.
 
     Example::
 
@@ -99,12 +180,14 @@ class Client:
         auth: AuthStrategy | None = None,
         transport: Transport | None = None,
         base_url: str = "",
+        status_cache: StatusCache | None = None,
+        instrumentation: Instrumentation | None = None,
     ) -> None:
         self._provider = get_provider(provider)
         self._auth = auth
-        self._transport = transport or RequestsTransport()
+        self._transport = transport or default_transport()
         self._base_url = base_url.rstrip("/")
-        self.payments = PaymentsResource(self._provider)
+        self.payments = PaymentsResource(self._provider, status_cache, instrumentation)
 
     def request(
         self,
@@ -114,7 +197,7 @@ class Client:
         json: Any = None,
         params: dict[str, str] | None = None,
         headers: dict[str, str] | None = None,
-        timeout: float = 30.0,
+        timeout: Timeout = None,
     ) -> HttpResponse:
         """Low-level HTTP escape hatch for provider-specific calls.
 
@@ -128,11 +211,12 @@ class Client:
             hdrs = self._auth.apply(hdrs)
 
         url = f"{self._base_url}{path}" if self._base_url else path
-        return self._transport.send(
-            method,
-            url,
-            headers=hdrs,
-            json=json,
-            params=params,
-            timeout=timeout,
-        )
+        with self.payments._call("request"):
+            return self._transport.send(
+                method,
+                url,
+                headers=hdrs,
+                json=json,
+                params=params,
+                timeout=timeout,
+            )
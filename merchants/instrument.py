@@ -0,0 +1,329 @@
+"""Timing and metrics for provider calls.
+
+Give a :class:`~merchants.client.Client` an :class:`Instrumentation` and every
+``payments.create_checkout`` / ``payments.get`` (and their async variants) and
+``Client.request`` emits a :class:`CallEvent` - duration, outcome, HTTP status,
+retries and payload sizes - to its listeners::
+
+    registry = MetricsRegistry()
+    instrumentation = Instrumentation()
+    instrumentation.add_listener(log_call)
+    instrumentation.add_listener(MetricsRecorder(registry))
+    client = Client(provider="khipu", instrumentation=instrumentation)
+
+    registry.render()  # Prometheus text format
+
+Status, retries and sizes come from the transport requests made during the
+call (see :func:`~merchants.transport.observe_requests`); they are ``None``
+for providers whose SDK does its own HTTP, such as Khipu.  Metrics live in the
+process: each worker has its own registry.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Iterator
+
+from merchants.providers import UserError
+from merchants.transport import RequestTiming, observe_requests
+
+logger = logging.getLogger(__name__)
+call_logger = logging.getLogger("merchants.calls")
+
+#: Default histogram buckets for call durations, in seconds.
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+#: Default histogram buckets for payload sizes, in bytes.
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144)
+
+
+@dataclass(frozen=True)
+class CallEvent:
+    """One provider call, as seen by :class:`Instrumentation` listeners.
+
+    Attributes:
+        provider: Provider key.
+        operation: ``"create_checkout"``, ``"get_payment"`` or ``"request"``.
+        duration: Seconds spent in the call, retries included.
+        outcome: ``"ok"``, ``"rejected"`` (the provider refused it, a
+            :class:`~merchants.providers.UserError`) or ``"error"``.
+        status_code: HTTP status of the last attempt, when known.
+        retries: Attempts after the first, when known.
+        request_bytes: Request body size, when known.
+        response_bytes: Response body size of the last attempt, when known.
+        error: Exception class name, when the call raised.
+    """
+
+    provider: str
+    operation: str
+    duration: float
+    outcome: str
+    status_code: int | None = None
+    retries: int | None = None
+    request_bytes: int | None = None
+    response_bytes: int | None = None
+    error: str | None = None
+
+
+class Instrumentation:
+    """Times provider calls and hands a :class:`CallEvent` to each listener.
+
+    Listener errors are logged, never raised into the call.
+    """
+
+    def __init__(self) -> None:
+        self._listeners: list[Callable[[CallEvent], Any]] = []
+
+    def add_listener(self, listener: Callable[[CallEvent], Any]) -> Callable[[CallEvent], Any]:
+        """Call *listener* with the :class:`CallEvent` of every call."""
+        self._listeners.append(listener)
+        return listener
+
+    def emit(self, event: CallEvent) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:  # noqa: BLE001
+                logger.exception("instrumentation listener %r failed", listener)
+
+    @contextmanager
+    def call(self, provider: str, operation: str) -> Iterator[None]:
+        """Time the enclosed provider call and emit its :class:`CallEvent`."""
+        attempts: list[RequestTiming] = []
+        outcome, error = "ok", None
+        started = time.perf_counter()
+        try:
+            with observe_requests(attempts.append):
+                yield
+        except UserError as exc:
+            outcome, error = "rejected", type(exc).__name__
+            raise
+        except BaseException as exc:
+            outcome, error = "error", type(exc).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            last = attempts[-1] if attempts else None
+            sent = next((a.request_bytes for a in attempts if a.request_bytes is not None), None)
+            self.emit(
+                CallEvent(
+                    provider=provider,
+                    operation=operation,
+                    duration=duration,
+                    outcome=outcome,
+                    status_code=last.status_code if last else None,
+                    retries=len(attempts) - 1 if attempts else None,
+                    request_bytes=sent,
+                    response_bytes=last.response_bytes if last else None,
+                    error=error,
+                )
+            )
+
+
+def log_call(event: CallEvent, *, slow: float = 5.0) -> None:
+    """Listener writing *event* to the ``merchants.calls`` logger as ``key=value`` pairs.
+
+    Calls that failed or took longer than *slow* seconds are logged at
+    WARNING, the rest at DEBUG.  The fields are also attached to the record
+    as ``record.merchants_call`` for structured handlers.
+    """
+    level = logging.WARNING if event.outcome == "error" or event.duration >= slow else logging.DEBUG
+    if not call_logger.isEnabledFor(level):
+        return
+    fields = asdict(event)
+    fields["duration"] = round(event.duration, 4)
+    call_logger.log(
+        level,
+        "provider call %s",
+        " ".join(f"{k}={v}" for k, v in fields.items() if v is not None),
+        extra={"merchants_call": fields},
+    )
+
+
+# ---------------------------------------------------------------------------
+# Metrics registry
+# ---------------------------------------------------------------------------
+
+
+def _labels_text(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    """Monotonic counter per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(tuple(str(labels[n]) for n in self.labels), 0.0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels_text(self.labels, key)} {value:g}" for key, value in values]
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set (Prometheus semantics)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DURATION_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: dict[tuple[str, ...], list[Any]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[n]) for n in self.labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, **labels: str) -> dict[str, Any]:
+        """Return ``count``, ``sum`` and cumulative ``buckets`` (upper bound -> count) of one series."""
+        with self._lock:
+            series = self._series.get(tuple(str(labels[n]) for n in self.labels))
+            if series is None:
+                counts, total, count = [0] * (len(self.buckets) + 1), 0.0, 0
+            else:
+                counts, total, count = list(series[0]), series[1], series[2]
+        cumulative, running = {}, 0
+        for bound, n in zip((*self.buckets, float("inf")), counts):
+            running += n
+            cumulative[bound] = running
+        return {"count": count, "sum": total, "buckets": cumulative}
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            series = {key: (list(s[0]), s[1], s[2]) for key, s in sorted(self._series.items())}
+        lines = []
+        for key, (counts, total, count) in series.items():
+            running = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                running += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _labels_text(self.labels, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {running}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labels, key)} {total:g}")
+            lines.append(f"{self.name}_count{_labels_text(self.labels, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """In-process registry of :class:`Counter` and :class:`Histogram` metrics.
+
+    :meth:`render` returns the Prometheus text exposition format served by
+    the ``flask_merchants`` ``/metrics`` view.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: dict[str, Counter | Histogram] = {}
+
+    def _get(self, cls, name: str, *args) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name!r} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        """Return the counter *name*, creating it on first use."""
+        return self._get(Counter, name, help, labels)
+
+    def histogram(
+        self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DURATION_BUCKETS
+    ) -> Histogram:
+        """Return the histogram *name*, creating it on first use."""
+        return self._get(Histogram, name, help, labels, buckets)
+
+    def get(self, name: str) -> Counter | Histogram | None:
+        with self._lock:
+            return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsRecorder:
+    """Listener recording :class:`CallEvent` s into a :class:`MetricsRegistry`.
+
+    Metrics (all labelled by ``provider`` and ``operation``):
+
+    * ``merchants_provider_call_duration_seconds`` - histogram, also by ``outcome``.
+    * ``merchants_provider_call_retries_total`` - counter of retried attempts.
+    * ``merchants_provider_call_payload_bytes`` - histogram, by ``direction``
+      (``request`` / ``response``).
+    """
+
+    def __init__(self, registry: MetricsRegistry, buckets: tuple[float, ...] = DURATION_BUCKETS) -> None:
+        labels = ("provider", "operation")
+        self.duration = registry.histogram(
+            "merchants_provider_call_duration_seconds",
+            "Duration of payment provider calls.",
+            (*labels, "outcome"),
+            buckets,
+        )
+        self.retries = registry.counter(
+            "merchants_provider_call_retries_total", "Retried attempts of payment provider calls.", labels
+        )
+        self.payload = registry.histogram(
+            "merchants_provider_call_payload_bytes",
+            "Body size of payment provider requests and responses.",
+            (*labels, "direction"),
+            SIZE_BUCKETS,
+        )
+
+    def __call__(self, event: CallEvent) -> None:
+        labels = {"provider": event.provider, "operation": event.operation}
+        self.duration.observe(event.duration, outcome=event.outcome, **labels)
+        if event.retries:
+            self.retries.inc(event.retries, **labels)
+        if event.request_bytes is not None:
+            self.payload.observe(event.request_bytes, direction="request", **labels)
+        if event.response_bytes is not None:
+            self.payload.observe(event.response_bytes, direction="response", **labels)
@@ -1,6 +1,7 @@
 """Pluggable provider integrations."""
 from __future__ import annotations
 
+import asyncio
 from abc import ABC, abstractmethod
 from decimal import Decimal
 from typing import Any
@@ -132,6 +133,32 @@ class Provider(ABC):
             :class:`~merchants.models.WebhookEvent`.
         """
 
+    # Async API.  The defaults run the blocking methods in a worker thread so
+    # an event loop is never blocked; providers with an async HTTP client
+    # (see merchants.transport.AsyncTransport) override them natively.
+
+    async def acreate_checkout(
+        self,
+        amount: Decimal,
+        currency: str,
+        success_url: str,
+        cancel_url: str,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> CheckoutSession:
+        """Async :meth:`create_checkout`."""
+        return await asyncio.to_thread(
+            self.create_checkout, amount, currency, success_url, cancel_url, metadata, **kwargs
+        )
+
+    async def aget_payment(self, payment_id: str) -> PaymentStatus:
+        """Async :meth:`get_payment`."""
+        return await asyncio.to_thread(self.get_payment, payment_id)
+
+    async def aparse_webhook(self, payload: bytes, headers: dict[str, str]) -> WebhookEvent:
+        """Async :meth:`parse_webhook`."""
+        return await asyncio.to_thread(self.parse_webhook, payload, headers)
+
 
 # ---------------------------------------------------------------------------
 # Provider registry
@@ -7,7 +7,14 @@ from typing import Any
 from merchants.amount import to_decimal_string
 from merchants.models import CheckoutSession, PaymentState, PaymentStatus, WebhookEvent
 from merchants.providers import Provider, UserError, normalise_state
-from merchants.transport import RequestsTransport, Transport
+from merchants.transport import (
+    AsyncTransport,
+    HttpResponse,
+    ThreadedAsyncTransport,
+    Transport,
+    default_async_transport,
+    default_transport,
+)
 
 
 class GenericProvider(Provider):
@@ -21,6 +28,10 @@ class GenericProvider(Provider):
         payment_url_template: URL template with ``{payment_id}`` placeholder
             for fetching payment status.
         transport: Optional custom :class:`~merchants.transport.Transport`.
+        async_transport: Optional :class:`~merchants.transport.AsyncTransport`
+            for the ``a*`` methods; defaults to *transport* run in a thread
+            (:class:`~merchants.transport.ThreadedAsyncTransport`) when one is
+            given, else :func:`~merchants.transport.default_async_transport`.
     """
 
     key = "generic"
@@ -37,21 +48,24 @@ class GenericProvider(Provider):
         *,
         transport: Transport | None = None,
         extra_headers: dict[str, str] | None = None,
+        async_transport: AsyncTransport | None = None,
     ) -> None:
         self._checkout_url = checkout_url
         self._payment_url_template = payment_url_template
-        self._transport = transport or RequestsTransport()
+        self._transport = transport or default_transport()
+        if async_transport is None and transport is not None:
+            async_transport = ThreadedAsyncTransport(self._transport)
+        self._async_transport = async_transport
         self._extra_headers = extra_headers or {}
 
-    def create_checkout(
+    def _checkout_request(
         self,
         amount: Decimal,
         currency: str,
         success_url: str,
         cancel_url: str,
-        metadata: dict[str, Any] | None = None,
-        **kwargs: Any,
-    ) -> CheckoutSession:
+        metadata: dict[str, Any] | None,
+    ) -> tuple[str, str, dict[str, Any]]:
         payload: dict[str, Any] = {
             "amount": to_decimal_string(amount),
             "currency": currency.upper(),
@@ -59,12 +73,11 @@ class GenericProvider(Provider):
             "cancel_url": cancel_url,
             "metadata": metadata or {},
         }
-        resp = self._transport.send(
-            "POST",
-            self._checkout_url,
-            headers=self._extra_headers,
-            json=payload,
-        )
+        return "POST", self._checkout_url, {"headers": self._extra_headers, "json": payload}
+
+    def _checkout_session(
+        self, resp: HttpResponse, amount: Decimal, currency: str, metadata: dict[str, Any] | None
+    ) -> CheckoutSession:
         if not resp.ok:
             raise UserError(f"Provider returned {resp.status_code}", code=str(resp.status_code))
 
@@ -79,9 +92,44 @@ class GenericProvider(Provider):
             raw=body,
         )
 
+    def create_checkout(
+        self,
+        amount: Decimal,
+        currency: str,
+        success_url: str,
+        cancel_url: str,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> CheckoutSession:
+        method, url, options = self._checkout_request(amount, currency, success_url, cancel_url, metadata)
+        return self._checkout_session(self._transport.send(method, url, **options), amount, currency, metadata)
+
+    async def acreate_checkout(
+        self,
+        amount: Decimal,
+        currency: str,
+        success_url: str,
+        cancel_url: str,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> CheckoutSession:
+        method, url, options = self._checkout_request(amount, currency, success_url, cancel_url, metadata)
+        transport = self._async_transport or default_async_transport()
+        resp = await transport.send(method, url, **options)
+        return self._checkout_session(resp, amount, currency, metadata)
+
     def get_payment(self, payment_id: str) -> PaymentStatus:
         url = self._payment_url_template.format(payment_id=payment_id)
         resp = self._transport.send("GET", url, headers=self._extra_headers)
+        return self._payment_status(payment_id, resp)
+
+    async def aget_payment(self, payment_id: str) -> PaymentStatus:
+        url = self._payment_url_template.format(payment_id=payment_id)
+        transport = self._async_transport or default_async_transport()
+        resp = await transport.send("GET", url, headers=self._extra_headers)
+        return self._payment_status(payment_id, resp)
+
+    def _payment_status(self, payment_id: str, resp: HttpResponse) -> PaymentStatus:
         body: dict[str, Any] = resp.body if isinstance(resp.body, dict) else {}
         raw_state = str(body.get("status", "unknown"))
         return PaymentStatus(
@@ -107,3 +155,7 @@ class GenericProvider(Provider):
             provider=self.key,
             raw=data,
         )
+
+    async def aparse_webhook(self, payload: bytes, headers: dict[str, str]) -> WebhookEvent:
+        # Parsing is local; no need for a worker thread.
+        return self.parse_webhook(payload, headers)
@@ -8,7 +8,14 @@ from typing import Any
 from merchants.amount import to_decimal_string
 from merchants.models import CheckoutSession, PaymentStatus, WebhookEvent
 from merchants.providers import Provider, UserError, normalise_state
-from merchants.transport import RequestsTransport, Transport
+from merchants.transport import (
+    AsyncTransport,
+    HttpResponse,
+    ThreadedAsyncTransport,
+    Transport,
+    default_async_transport,
+    default_transport,
+)
 
 
 class PayPalProvider(Provider):
@@ -27,6 +34,10 @@ class PayPalProvider(Provider):
         access_token: OAuth access token.
         base_url: Override for testing; defaults to ``"https://api-m.paypal.com"``.
         transport: Optional custom transport.
+        async_transport: Optional :class:`~merchants.transport.AsyncTransport`
+            for the ``a*`` methods; defaults to *transport* run in a thread
+            (:class:`~merchants.transport.ThreadedAsyncTransport`) when one is
+            given, else :func:`~merchants.transport.default_async_transport`.
     """
 
     key = "paypal"
@@ -42,10 +53,14 @@ class PayPalProvider(Provider):
         base_url: str = "https://api-m.paypal.com",
         *,
         transport: Transport | None = None,
+        async_transport: AsyncTransport | None = None,
     ) -> None:
         self._access_token = access_token
         self._base_url = base_url.rstrip("/")
-        self._transport = transport or RequestsTransport()
+        self._transport = transport or default_transport()
+        if async_transport is None and transport is not None:
+            async_transport = ThreadedAsyncTransport(self._transport)
+        self._async_transport = async_transport
 
     def _headers(self) -> dict[str, str]:
         return {
@@ -53,15 +68,14 @@ class PayPalProvider(Provider):
             "Content-Type": "application/json",
         }
 
-    def create_checkout(
+    def _checkout_request(
         self,
         amount: Decimal,
         currency: str,
         success_url: str,
         cancel_url: str,
-        metadata: dict[str, Any] | None = None,
-        **kwargs: Any,
-    ) -> CheckoutSession:
+        metadata: dict[str, Any] | None,
+    ) -> tuple[str, str, dict[str, Any]]:
         payload: dict[str, Any] = {
             "intent": "CAPTURE",
             "purchase_units": [
@@ -77,12 +91,11 @@ class PayPalProvider(Provider):
                 "cancel_url": cancel_url,
             },
         }
-        resp = self._transport.send(
-            "POST",
-            f"{self._base_url}/v2/checkout/orders",
-            headers=self._headers(),
-            json=payload,
-        )
+        return "POST", f"{self._base_url}/v2/checkout/orders", {"headers": self._headers(), "json": payload}
+
+    def _checkout_session(
+        self, resp: HttpResponse, amount: Decimal, currency: str, metadata: dict[str, Any] | None
+    ) -> CheckoutSession:
         if not resp.ok:
             body_msg = resp.body.get("message", "") if isinstance(resp.body, dict) else ""
             raise UserError(body_msg or f"PayPal error {resp.status_code}", code=str(resp.status_code))
@@ -104,12 +117,45 @@ class PayPalProvider(Provider):
             raw=body,
         )
 
+    def create_checkout(
+        self,
+        amount: Decimal,
+        currency: str,
+        success_url: str,
+        cancel_url: str,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> CheckoutSession:
+        method, url, options = self._checkout_request(amount, currency, success_url, cancel_url, metadata)
+        return self._checkout_session(self._transport.send(method, url, **options), amount, currency, metadata)
+
+    async def acreate_checkout(
+        self,
+        amount: Decimal,
+        currency: str,
+        success_url: str,
+        cancel_url: str,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> CheckoutSession:
+        method, url, options = self._checkout_request(amount, currency, success_url, cancel_url, metadata)
+        transport = self._async_transport or default_async_transport()
+        resp = await transport.send(method, url, **options)
+        return self._checkout_session(resp, amount, currency, metadata)
+
+    def _payment_url(self, payment_id: str) -> str:
+        return f"{self._base_url}/v2/checkout/orders/{payment_id}"
+
     def get_payment(self, payment_id: str) -> PaymentStatus:
-        resp = self._transport.send(
-            "GET",
-            f"{self._base_url}/v2/checkout/orders/{payment_id}",
-            headers=self._headers(),
-        )
+        resp = self._transport.send("GET", self._payment_url(payment_id), headers=self._headers())
+        return self._payment_status(payment_id, resp)
+
+    async def aget_payment(self, payment_id: str) -> PaymentStatus:
+        transport = self._async_transport or default_async_transport()
+        resp = await transport.send("GET", self._payment_url(payment_id), headers=self._headers())
+        return self._payment_status(payment_id, resp)
+
+    def _payment_status(self, payment_id: str, resp: HttpResponse) -> PaymentStatus:
         body: dict[str, Any] = resp.body if isinstance(resp.body, dict) else {}
         raw_state = str(body.get("status", "unknown"))
         pu = body.get("purchase_units", [{}])
@@ -143,3 +189,7 @@ class PayPalProvider(Provider):
             provider=self.key,
             raw=data,
         )
+
+    async def aparse_webhook(self, payload: bytes, headers: dict[str, str]) -> WebhookEvent:
+        # Parsing is local; no need for a worker thread.
+        return self.parse_webhook(payload, headers)
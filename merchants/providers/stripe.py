@@ -8,7 +8,14 @@ from typing import Any
 from merchants.amount import from_minor_units, to_minor_units
 from merchants.models import CheckoutSession, PaymentStatus, WebhookEvent
 from merchants.providers import Provider, UserError, normalise_state
-from merchants.transport import RequestsTransport, Transport
+from merchants.transport import (
+    AsyncTransport,
+    HttpResponse,
+    ThreadedAsyncTransport,
+    Transport,
+    default_async_transport,
+    default_transport,
+)
 
 # Stripe uses 2 decimal places for most currencies (0 for JPY, etc.)
 _ZERO_DECIMAL_CURRENCIES = {"jpy", "bif", "clp", "gnf", "mga", "pyg", "rwf", "ugx", "vnd", "xaf", "xof"}
@@ -30,6 +37,10 @@ class StripeProvider(Provider):
         api_key: Stripe secret key (``sk_test_…``).
         base_url: Override for testing; defaults to ``"https://api.stripe.com"``.
         transport: Optional custom transport.
+        async_transport: Optional :class:`~merchants.transport.AsyncTransport`
+            for the ``a*`` methods; defaults to *transport* run in a thread
+            (:class:`~merchants.transport.ThreadedAsyncTransport`) when one is
+            given, else :func:`~merchants.transport.default_async_transport`.
     """
 
     key = "stripe"
@@ -47,10 +58,14 @@ class StripeProvider(Provider):
         base_url: str = "https://api.stripe.com",
         *,
         transport: Transport | None = None,
+        async_transport: AsyncTransport | None = None,
     ) -> None:
         self._api_key = api_key
         self._base_url = base_url.rstrip("/")
-        self._transport = transport or RequestsTransport()
+        self._transport = transport or default_transport()
+        if async_transport is None and transport is not None:
+            async_transport = ThreadedAsyncTransport(self._transport)
+        self._async_transport = async_transport
 
     def _headers(self) -> dict[str, str]:
         return {"Authorization": f"Bearer {self._api_key}"}
@@ -58,15 +73,14 @@ class StripeProvider(Provider):
     def _currency_decimals(self, currency: str) -> int:
         return 0 if currency.lower() in _ZERO_DECIMAL_CURRENCIES else 2
 
-    def create_checkout(
+    def _checkout_request(
         self,
         amount: Decimal,
         currency: str,
         success_url: str,
         cancel_url: str,
-        metadata: dict[str, Any] | None = None,
-        **kwargs: Any,
-    ) -> CheckoutSession:
+        metadata: dict[str, Any] | None,
+    ) -> tuple[str, str, dict[str, Any]]:
         decimals = self._currency_decimals(currency)
         unit_amount = to_minor_units(amount, decimals=decimals)
         payload: dict[str, Any] = {
@@ -86,12 +100,11 @@ class StripeProvider(Provider):
             "cancel_url": cancel_url,
             "metadata": metadata or {},
         }
-        resp = self._transport.send(
-            "POST",
-            f"{self._base_url}/v1/checkout/sessions",
-            headers=self._headers(),
-            json=payload,
-        )
+        return "POST", f"{self._base_url}/v1/checkout/sessions", {"headers": self._headers(), "json": payload}
+
+    def _checkout_session(
+        self, resp: HttpResponse, amount: Decimal, currency: str, metadata: dict[str, Any] | None
+    ) -> CheckoutSession:
         if not resp.ok:
             body_msg = resp.body.get("error", {}).get("message", "") if isinstance(resp.body, dict) else ""
             raise UserError(body_msg or f"Stripe error {resp.status_code}", code=str(resp.status_code))
@@ -107,12 +120,45 @@ class StripeProvider(Provider):
             raw=body,
         )
 
+    def create_checkout(
+        self,
+        amount: Decimal,
+        currency: str,
+        success_url: str,
+        cancel_url: str,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> CheckoutSession:
+        method, url, options = self._checkout_request(amount, currency, success_url, cancel_url, metadata)
+        return self._checkout_session(self._transport.send(method, url, **options), amount, currency, metadata)
+
+    async def acreate_checkout(
+        self,
+        amount: Decimal,
+        currency: str,
+        success_url: str,
+        cancel_url: str,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> CheckoutSession:
+        method, url, options = self._checkout_request(amount, currency, success_url, cancel_url, metadata)
+        transport = self._async_transport or default_async_transport()
+        resp = await transport.send(method, url, **options)
+        return self._checkout_session(resp, amount, currency, metadata)
+
+    def _payment_url(self, payment_id: str) -> str:
+        return f"{self._base_url}/v1/payment_intents/{payment_id}"
+
     def get_payment(self, payment_id: str) -> PaymentStatus:
-        resp = self._transport.send(
-            "GET",
-            f"{self._base_url}/v1/payment_intents/{payment_id}",
-            headers=self._headers(),
-        )
+        resp = self._transport.send("GET", self._payment_url(payment_id), headers=self._headers())
+        return self._payment_status(payment_id, resp)
+
+    async def aget_payment(self, payment_id: str) -> PaymentStatus:
+        transport = self._async_transport or default_async_transport()
+        resp = await transport.send("GET", self._payment_url(payment_id), headers=self._headers())
+        return self._payment_status(payment_id, resp)
+
+    def _payment_status(self, payment_id: str, resp: HttpResponse) -> PaymentStatus:
         body: dict[str, Any] = resp.body if isinstance(resp.body, dict) else {}
         raw_state = str(body.get("status", "unknown"))
         currency = str(body.get("currency", ""))
@@ -145,3 +191,7 @@ class StripeProvider(Provider):
             provider=self.key,
             raw=data,
         )
+
+    async def aparse_webhook(self, payload: bytes, headers: dict[str, str]) -> WebhookEvent:
+        # Parsing is local; no need for a worker thread.
+        return self.parse_webhook(payload, headers)
@@ -1,10 +1,29 @@
 """Pluggable HTTP transport layer."""
 from __future__ import annotations
 
+import asyncio
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+import weakref
 from abc import ABC, abstractmethod
-from typing import Any
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+#: ``timeout`` accepted by :meth:`Transport.send`: seconds, ``(connect, read)``
+#: or ``None`` for the transport's default.
+Timeout = float | tuple[float, float] | None
 
 
 class TransportError(Exception):
@@ -39,7 +58,7 @@ class Transport(ABC):
         headers: dict[str, str] | None = None,
         json: Any = None,
         params: dict[str, str] | None = None,
-        timeout: float = 30.0,
+        timeout: Timeout = None,
     ) -> HttpResponse:
         """Send an HTTP request and return an :class:`HttpResponse`.
 
@@ -48,14 +67,217 @@ class Transport(ABC):
         """
 
 
+class RetryPolicy:
+    """When and how long to wait before retrying a request.
+
+    Idempotent requests (``GET``, ``HEAD``, ``OPTIONS``, ``PUT``, ``DELETE``,
+    and ``POST`` carrying an ``Idempotency-Key`` header) are retried up to
+    *max_retries* times on connection errors, timeouts and *retry_statuses*,
+    after a jittered exponential backoff or the server's ``Retry-After``.
+
+    Args:
+        max_retries: Retries after the first attempt.
+        backoff: Base of the exponential backoff, in seconds.
+        backoff_max: Longest wait between attempts; a ``Retry-After`` above
+            it is not waited for.
+        retry_statuses: Response codes worth retrying.
+    """
+
+    IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"})
+
+    def __init__(
+        self,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        backoff_max: float = 10.0,
+        retry_statuses: tuple[int, ...] = (429, 502, 503, 504),
+    ) -> None:
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+
+    def retryable(self, method: str, headers: dict[str, str] | None) -> bool:
+        """Whether a request may be sent twice without side effects."""
+        if method in self.IDEMPOTENT_METHODS:
+            return True
+        return method == "POST" and any(k.lower() == "idempotency-key" for k in headers or {})
+
+    def delay(self, attempt: int, retry_after: str | None = None) -> float | None:
+        """Seconds to wait before retrying after *attempt*, or ``None`` to give up."""
+        if attempt > self.max_retries:
+            return None
+        if retry_after:
+            seconds = _parse_retry_after(retry_after)
+            if seconds is not None:
+                return seconds if seconds <= self.backoff_max else None
+        # Full jitter: spreads retries of many clients hit by the same outage.
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (attempt - 1)))
+
+
+@dataclass(frozen=True)
+class RequestTiming:
+    """One HTTP attempt, reported to the transport's hooks.
+
+    Attributes:
+        method: HTTP method.
+        url: Request URL (without query string).
+        status_code: Response status, or ``None`` when the attempt failed.
+        elapsed: Seconds spent on the attempt.
+        attempt: 1 for the first try, 2 for the first retry, ...
+        error: The network error, when the attempt failed.
+        request_bytes: Size of the request body sent, when known.
+        response_bytes: Size of the response body received, when known.
+    """
+
+    method: str
+    url: str
+    status_code: int | None
+    elapsed: float
+    attempt: int
+    error: str | None = None
+    request_bytes: int | None = None
+    response_bytes: int | None = None
+
+
+# Observers added by observe_requests() in the current context (thread / task).
+_observers: ContextVar[tuple[Callable[[RequestTiming], Any], ...]] = ContextVar("merchants_observers", default=())
+
+
+@contextmanager
+def observe_requests(observer: Callable[[RequestTiming], Any]) -> Iterator[None]:
+    """Call *observer* with every attempt a transport makes inside the block.
+
+    Unlike :meth:`RequestsTransport.add_hook` this follows the caller, not
+    the transport: it sees the requests of whichever provider is called in
+    the block (including from :class:`ThreadedAsyncTransport` threads).
+    :class:`~merchants.instrument.Instrumentation` uses it to attach retries,
+    status and payload sizes to a provider call.
+    """
+    token = _observers.set(_observers.get() + (observer,))
+    try:
+        yield
+    finally:
+        _observers.reset(token)
+
+
+def notify_observers(timing: RequestTiming) -> None:
+    """Hand *timing* to the observers of the current context (for transport implementations)."""
+    for observer in _observers.get():
+        try:
+            observer(timing)
+        except Exception:  # noqa: BLE001
+            logger.exception("request observer %r failed", observer)
+
+
 class RequestsTransport(Transport):
-    """Default transport backed by :mod:`requests`.
+    """Production transport backed by :mod:`requests`.
+
+    * Connections are pooled: one :class:`requests.Session` whose
+      :class:`~requests.adapters.HTTPAdapter` keeps up to *pool_maxsize*
+      connections per host; :meth:`tune` gives a host its own pool size and
+      timeout.
+    * Connect and read timeouts are separate (*connect_timeout*,
+      *read_timeout*).
+    * Idempotent requests are retried following a :class:`RetryPolicy`;
+      other requests are retried only when the connection could not be
+      opened (nothing was sent).
+    * A whole :meth:`send`, retries and backoff included, ends within
+      *deadline* seconds: each attempt's timeouts are cut to the time left,
+      and a retry is skipped when the budget cannot cover it (a read timeout
+      is only retried with a full read timeout left).
+    * Every attempt is reported to the hooks added with :meth:`add_hook`.
+
+    Providers share one instance per process, returned by
+    :func:`default_transport`.
+
+    Args:
+        session: Session to use instead of a new one.
+        pool_maxsize: Connections kept per host.
+        pool_connections: Hosts whose pools are cached.
+        connect_timeout: Seconds to open a connection.
+        read_timeout: Seconds to wait for response data.
+        deadline: Seconds a :meth:`send` may take in total; ``None`` for no
+            limit.
+        max_retries, backoff, backoff_max, retry_statuses: See
+            :class:`RetryPolicy`.
 
-    A single :class:`requests.Session` is reused for connection pooling.
+    Example::
+
+        transport = RequestsTransport(max_retries=3, read_timeout=10)
+        transport.tune("api.stripe.com", pool_maxsize=32, timeout=(2, 20))
+        transport.add_hook(lambda t: metrics.observe(t.url, t.elapsed))
+        provider = StripeProvider(api_key, transport=transport)
     """
 
-    def __init__(self, session: requests.Session | None = None) -> None:
+    def __init__(
+        self,
+        session: requests.Session | None = None,
+        *,
+        pool_maxsize: int = 10,
+        pool_connections: int = 10,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        deadline: float | None = 45.0,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        backoff_max: float = 10.0,
+        retry_statuses: tuple[int, ...] = (429, 502, 503, 504),
+    ) -> None:
         self._session = session or requests.Session()
+        self.pool_maxsize = pool_maxsize
+        self.pool_connections = pool_connections
+        self.timeout = (connect_timeout, read_timeout)
+        self.deadline = deadline
+        self.retry = RetryPolicy(max_retries, backoff, backoff_max, retry_statuses)
+        self._host_timeouts: dict[str, tuple[float, float]] = {}
+        self._hooks: list[Callable[[RequestTiming], Any]] = []
+        adapter = self._adapter(pool_maxsize)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def _adapter(self, pool_maxsize: int) -> HTTPAdapter:
+        # Retries are handled by send() so hooks see every attempt.
+        return HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+
+    def tune(self, host: str, *, pool_maxsize: int | None = None, timeout: Timeout = None) -> None:
+        """Give *host* its own connection pool size and/or default timeout.
+
+        Args:
+            host: Host name, e.g. ``"api.stripe.com"``.
+            pool_maxsize: Connections kept for this host.
+            timeout: Seconds or ``(connect, read)`` for requests to this host.
+        """
+        if pool_maxsize is not None:
+            adapter = self._adapter(pool_maxsize)
+            self._session.mount(f"https://{host}/", adapter)
+            self._session.mount(f"http://{host}/", adapter)
+        if timeout is not None:
+            self._host_timeouts[host] = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+
+    def add_hook(self, hook: Callable[[RequestTiming], Any]) -> Callable[[RequestTiming], Any]:
+        """Call *hook* with a :class:`RequestTiming` after every attempt."""
+        self._hooks.append(hook)
+        return hook
+
+    def close(self) -> None:
+        """Close pooled connections."""
+        self._session.close()
+
+    def _report(self, timing: RequestTiming) -> None:
+        for hook in self._hooks:
+            try:
+                hook(timing)
+            except Exception:  # noqa: BLE001
+                logger.exception("transport hook %r failed", hook)
+        notify_observers(timing)
+
+    @staticmethod
+    def _affordable(delay: float | None, deadline: float | None, needed: float = 0.0) -> bool:
+        """Whether waiting *delay* and then *needed* seconds still ends before *deadline*."""
+        if delay is None:
+            return False
+        return deadline is None or time.monotonic() + delay + needed < deadline
 
     def send(
         self,
@@ -65,19 +287,62 @@ class RequestsTransport(Transport):
         headers: dict[str, str] | None = None,
         json: Any = None,
         params: dict[str, str] | None = None,
-        timeout: float = 30.0,
+        timeout: Timeout = None,
     ) -> HttpResponse:
-        try:
-            resp = self._session.request(
-                method,
-                url,
-                headers=headers,
-                json=json,
-                params=params,
-                timeout=timeout,
+        method = method.upper()
+        parts = urlsplit(url)
+        if timeout is None:
+            timeout = self._host_timeouts.get(parts.hostname or "", self.timeout)
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        deadline = time.monotonic() + self.deadline if self.deadline is not None else None
+        bare_url = f"{parts.scheme}://{parts.netloc}{parts.path}"
+        retryable = self.retry.retryable(method, headers)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                timeout = (min(connect_timeout, remaining), min(read_timeout, remaining))
+            started = time.perf_counter()
+            try:
+                resp = self._session.request(
+                    method,
+                    url,
+                    headers=headers,
+                    json=json,
+                    params=params,
+                    timeout=timeout,
+                )
+            except requests.RequestException as exc:
+                self._report(RequestTiming(method, bare_url, None, time.perf_counter() - started, attempt, repr(exc)))
+                # A connect failure never reached the server, so any method may retry.
+                may_retry = retryable or isinstance(exc, requests.ConnectTimeout)
+                delay = self.retry.delay(attempt) if may_retry else None
+                needed = read_timeout if isinstance(exc, requests.ReadTimeout) else 0.0
+                if not self._affordable(delay, deadline, needed):
+                    raise TransportError(str(exc)) from exc
+                time.sleep(delay)
+                continue
+
+            self._report(
+                RequestTiming(
+                    method,
+                    bare_url,
+                    resp.status_code,
+                    time.perf_counter() - started,
+                    attempt,
+                    request_bytes=_body_size(resp.request.body),
+                    response_bytes=len(resp.content),
+                )
             )
-        except requests.RequestException as exc:
-            raise TransportError(str(exc)) from exc
+            if retryable and resp.status_code in self.retry.retry_statuses:
+                delay = self.retry.delay(attempt, resp.headers.get("Retry-After"))
+                if self._affordable(delay, deadline):
+                    resp.close()
+                    time.sleep(delay)
+                    continue
+            break
 
         try:
             body = resp.json()
@@ -89,3 +354,251 @@ class RequestsTransport(Transport):
             headers=dict(resp.headers),
             body=body,
         )
+
+
+def _body_size(body: str | bytes | None) -> int:
+    if body is None:
+        return 0
+    return len(body.encode() if isinstance(body, str) else body)
+
+
+def _parse_retry_after(value: str) -> float | None:
+    """Seconds from a ``Retry-After`` header (delta-seconds or HTTP date)."""
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+_default_transport: Transport | None = None
+_default_pid: int | None = None
+_default_lock = threading.Lock()
+
+
+def default_transport() -> Transport:
+    """Return the process-wide transport shared by all providers and clients.
+
+    Created on first use (a :class:`RequestsTransport` with default
+    settings) and recreated in a forked child, whose inherited sockets must
+    not be shared with the parent.
+    """
+    global _default_transport, _default_pid
+    with _default_lock:
+        if _default_transport is None or _default_pid != os.getpid():
+            _default_transport = RequestsTransport()
+            _default_pid = os.getpid()
+        return _default_transport
+
+
+def set_default_transport(transport: Transport | None) -> None:
+    """Replace the shared transport (``None`` recreates it on next use).
+
+    Call before building providers, e.g. at application start::
+
+        set_default_transport(RequestsTransport(max_retries=3, pool_maxsize=32))
+    """
+    global _default_transport, _default_pid
+    with _default_lock:
+        _default_transport = transport
+        _default_pid = os.getpid() if transport is not None else None
+
+
+# ---------------------------------------------------------------------------
+# Async transports
+# ---------------------------------------------------------------------------
+
+
+class AsyncTransport(ABC):
+    """Base class for transports used by the ``a*`` provider methods.
+
+    Same contract as :class:`Transport`, but :meth:`send` is a coroutine so
+    an event loop (e.g. a Quart worker) keeps serving other requests while
+    the provider answers.
+    """
+
+    @abstractmethod
+    async def send(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: dict[str, str] | None = None,
+        json: Any = None,
+        params: dict[str, str] | None = None,
+        timeout: Timeout = None,
+    ) -> HttpResponse:
+        """Send an HTTP request and return an :class:`HttpResponse`.
+
+        Raises:
+            TransportError: On network or connection failure.
+        """
+
+    async def aclose(self) -> None:
+        """Release pooled connections."""
+
+
+class ThreadedAsyncTransport(AsyncTransport):
+    """Stdlib fallback: runs a blocking :class:`Transport` in a worker thread.
+
+    Keeps the event loop free without an async HTTP library, and keeps the
+    pooling, retries and hooks of the wrapped transport.
+
+    Args:
+        transport: Defaults to the shared :func:`default_transport`.
+    """
+
+    def __init__(self, transport: Transport | None = None) -> None:
+        self._transport = transport
+
+    @property
+    def transport(self) -> Transport:
+        return self._transport or default_transport()
+
+    async def send(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: dict[str, str] | None = None,
+        json: Any = None,
+        params: dict[str, str] | None = None,
+        timeout: Timeout = None,
+    ) -> HttpResponse:
+        return await asyncio.to_thread(
+            self.transport.send,
+            method,
+            url,
+            headers=headers,
+            json=json,
+            params=params,
+            timeout=timeout,
+        )
+
+
+class HttpxAsyncTransport(AsyncTransport):
+    """Native async transport backed by :class:`httpx.AsyncClient`.
+
+    Requires ``httpx``.  Connections are pooled per client; retries follow
+    the same :class:`RetryPolicy` as :class:`RequestsTransport`.
+
+    Args:
+        client: Client to use instead of a new one.
+        max_connections: Pool size (all hosts).
+        connect_timeout: Seconds to open a connection.
+        read_timeout: Seconds to wait for response data.
+        max_retries, backoff, backoff_max, retry_statuses: See
+            :class:`RetryPolicy`.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        *,
+        max_connections: int = 100,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        backoff_max: float = 10.0,
+        retry_statuses: tuple[int, ...] = (429, 502, 503, 504),
+    ) -> None:
+        try:
+            import httpx
+        except ImportError as exc:  # pragma: no cover
+            raise ImportError("httpx is required for HttpxAsyncTransport. Install it with: pip install httpx") from exc
+        self._httpx = httpx
+        self._client = client or httpx.AsyncClient(limits=httpx.Limits(max_connections=max_connections))
+        self.timeout = (connect_timeout, read_timeout)
+        self.retry = RetryPolicy(max_retries, backoff, backoff_max, retry_statuses)
+
+    async def send(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: dict[str, str] | None = None,
+        json: Any = None,
+        params: dict[str, str] | None = None,
+        timeout: Timeout = None,
+    ) -> HttpResponse:
+        httpx = self._httpx
+        method = method.upper()
+        if timeout is None:
+            timeout = self.timeout
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        retryable = self.retry.retryable(method, headers)
+        attempt = 0
+        bare_url = str(httpx.URL(url).copy_with(query=None))
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            try:
+                resp = await self._client.request(
+                    method,
+                    url,
+                    headers=headers,
+                    json=json,
+                    params=params,
+                    timeout=httpx.Timeout(read, connect=connect),
+                )
+            except httpx.HTTPError as exc:
+                notify_observers(RequestTiming(method, bare_url, None, time.perf_counter() - started, attempt, repr(exc)))
+                may_retry = retryable or isinstance(exc, httpx.ConnectError)
+                delay = self.retry.delay(attempt) if may_retry else None
+                if delay is None:
+                    raise TransportError(str(exc)) from exc
+                await asyncio.sleep(delay)
+                continue
+            notify_observers(
+                RequestTiming(
+                    method,
+                    bare_url,
+                    resp.status_code,
+                    time.perf_counter() - started,
+                    attempt,
+                    request_bytes=len(resp.request.content),
+                    response_bytes=len(resp.content),
+                )
+            )
+            if retryable and resp.status_code in self.retry.retry_statuses:
+                delay = self.retry.delay(attempt, resp.headers.get("Retry-After"))
+                if delay is not None:
+                    await asyncio.sleep(delay)
+                    continue
+            break
+
+        try:
+            body = resp.json()
+        except ValueError:
+            body = resp.text
+        return HttpResponse(status_code=resp.status_code, headers=dict(resp.headers), body=body)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+def default_async_transport() -> AsyncTransport:
+    """Return the async transport used when a provider was given none.
+
+    :class:`HttpxAsyncTransport` when ``httpx`` is installed (one per event
+    loop, since its connections belong to the loop), otherwise a
+    :class:`ThreadedAsyncTransport` over :func:`default_transport`.
+    """
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        return _threaded_async_transport
+    loop = asyncio.get_running_loop()
+    with _default_lock:
+        transport = _async_transports.get(loop)
+        if transport is None:
+            transport = _async_transports[loop] = HttpxAsyncTransport()
+        return transport
+
+
+_threaded_async_transport = ThreadedAsyncTransport()
+_async_transports: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
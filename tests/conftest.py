@@ -13,6 +13,25 @@ from flask import Flask
 from app.database import db as _db
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmark", action="store_true", default=False, help="also run the tests marked benchmark"
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: timing comparison, skipped unless --benchmark is given")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="benchmark: run with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
 @pytest.fixture(scope="session")
 def app():
     """Session-scoped Flask app with SQLite in-memory database."""
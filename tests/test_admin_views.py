@@ -146,6 +146,12 @@ class TestProvidersViewBuildList:
             def all_sessions(self):
                 return []
 
+            def count_sessions_by_provider(self, **filters):
+                return {}
+
+            def provider_health(self):
+                return {}
+
         view = object.__new__(ProvidersView)
         view._ext = _StubExt()
 
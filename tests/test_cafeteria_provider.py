@@ -87,6 +87,30 @@ class TestCafeteriaProviderCreateCheckout:
         assert "display_code" in session.metadata
         assert len(session.metadata["display_code"]) == 6
 
+    def test_display_code_skips_codes_in_use(self, monkeypatch):
+        from app.providers import cafeteria
+        codes = iter(["AAAAAA", "BBBBBB", "CCCCCC"])
+        monkeypatch.setattr(cafeteria, "_rand_code", lambda length=8: next(codes))
+        provider = CafeteriaProvider(display_code_exists=lambda code: code in {"AAAAAA", "BBBBBB"})
+        session = provider.create_checkout(
+            amount=Decimal("1000"),
+            currency="CLP",
+            success_url="https://example.com/ok",
+            cancel_url="https://example.com/cancel",
+            codigo="cafe_MYCODE12",
+        )
+        assert session.metadata["display_code"] == "CCCCCC"
+
+    def test_display_code_gives_up_when_always_taken(self):
+        provider = CafeteriaProvider(display_code_exists=lambda code: True)
+        with pytest.raises(RuntimeError):
+            provider.create_checkout(
+                amount=Decimal("1000"),
+                currency="CLP",
+                success_url="https://example.com/ok",
+                cancel_url="https://example.com/cancel",
+            )
+
     def test_custom_codigo_used_as_session_id(self):
         provider = make_provider()
         session = provider.create_checkout(
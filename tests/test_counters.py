@@ -0,0 +1,210 @@
+"""Tests for DashboardCounters (app/counters.py)."""
+
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.counters import ABONOS_PENDIENTES, clave_casino, dashboard_counters
+from app.database import db
+from app.pos.crud import PosController
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def counters(app, db_session):
+    """The module-level counters with their session hooks registered for the test."""
+    dashboard_counters.init_app(app)
+    yield dashboard_counters
+    dashboard_counters.close()
+
+
+def _create_orden_casino(db_session, alumno, estado):
+    from app.model import OrdenCasino
+    orden = OrdenCasino()
+    orden.pedido_codigo = f"test-{uuid.uuid4()}"
+    orden.alumno_id = alumno.id
+    orden.menu_slug = "menu-test"
+    orden.menu_descripcion = "Menú de Prueba"
+    orden.menu_precio = Decimal("4000")
+    orden.fecha = date.today()
+    orden.estado = estado
+    db_session.add(orden)
+    db_session.commit()
+    return orden
+
+
+def _contador(db_session, clave):
+    from app.model import ContadorDashboard
+    return db_session.execute(db.select(ContadorDashboard).filter_by(clave=clave)).scalar_one()
+
+
+# ---------------------------------------------------------------------------
+# Reading and recounting
+# ---------------------------------------------------------------------------
+
+class TestDashboardCountersRecuento:
+    def test_first_read_recounts_and_stores(self, db_session, sample_apoderado, counters):
+        valores = counters.valores()
+        assert valores["alumnos_total"] == 1
+        assert valores["alumnos_activos"] == 1
+        assert valores["ordenes_pendientes"] == 0
+        assert _contador(db_session, "alumnos.total").recontado is not None
+
+    def test_later_reads_use_stored_rows(self, db_session, sample_apoderado, counters):
+        from sqlalchemy import event
+
+        counters.valores()
+        statements = []
+
+        def _count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", _count)
+        try:
+            counters.valores()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", _count)
+        assert len(statements) == 1
+
+    def test_stale_counters_are_recounted(self, db_session, sample_apoderado, counters):
+        counters.valores()
+        contador = _contador(db_session, "alumnos.total")
+        contador.valor = 99
+        contador.recontado = datetime.now() - timedelta(seconds=counters.recuento_segundos + 1)
+        db_session.commit()
+        assert counters.valores()["alumnos_total"] == 1
+
+    def test_recount_leaves_callers_session_alone(self, db_session, sample_apoderado, counters, monkeypatch):
+        alumno = sample_apoderado.alumnos[0]
+        monkeypatch.setattr(counters, "recuento_segundos", 0)
+        alumno.nombre = "Sin guardar"
+
+        assert counters.valores()["alumnos_total"] == 1
+
+        db_session.rollback()
+        assert alumno.nombre == "Juan González"
+
+    def test_without_hooks_counts_directly(self, db_session, sample_apoderado):
+        from app.counters import DashboardCounters
+        assert DashboardCounters().valores()["alumnos_total"] == 1
+
+
+# ---------------------------------------------------------------------------
+# Incremental maintenance
+# ---------------------------------------------------------------------------
+
+class TestDashboardCountersIncremental:
+    def test_new_orden_and_delivery(self, db_session, sample_apoderado, counters):
+        from app.model import EstadoAlmuerzo
+        counters.valores()
+        orden = _create_orden_casino(db_session, sample_apoderado.alumnos[0], EstadoAlmuerzo.PENDIENTE)
+        assert counters.valores()["ordenes_pendientes"] == 1
+
+        PosController().entregar_almuerzo(orden.id)
+
+        valores = counters.valores()
+        assert valores["ordenes_pendientes"] == 0
+        assert valores["ordenes_entregadas"] == 1
+
+    def test_bulk_delivery_adjusts_without_invalidating(self, db_session, sample_apoderado, counters):
+        from app.model import EstadoAlmuerzo
+        orden = _create_orden_casino(db_session, sample_apoderado.alumnos[0], EstadoAlmuerzo.PENDIENTE)
+        counters.valores()
+
+        PosController().entregar_almuerzos([(orden.id, None)])
+
+        contador = _contador(db_session, clave_casino(EstadoAlmuerzo.ENTREGADO, date.today()))
+        assert contador.valor == 1
+        assert contador.recontado is not None
+
+    def test_other_bulk_statements_invalidate(self, db_session, sample_apoderado, counters):
+        from app.model import Alumno
+        counters.valores()
+        db_session.execute(db.update(Alumno).values(activo=False))
+        db_session.commit()
+        assert _contador(db_session, "alumnos.activos").recontado is None
+        assert counters.valores()["alumnos_activos"] == 0
+
+    def test_bulk_statements_only_invalidate_their_model(self, db_session, sample_apoderado, counters):
+        from app.model import EstadoAlmuerzo, Payment
+        counters.valores()
+        db_session.execute(db.update(Payment).values(state="failed"))
+        db_session.commit()
+        assert _contador(db_session, ABONOS_PENDIENTES).recontado is None
+        assert _contador(db_session, "alumnos.total").recontado is not None
+        assert _contador(db_session, clave_casino(EstadoAlmuerzo.PENDIENTE, date.today())).recontado is not None
+
+    def test_deltas_are_written_after_commit(self, db_session, sample_apoderado, counters):
+        from app.model import EstadoAlmuerzo, OrdenCasino
+        counters.valores()
+        clave = clave_casino(EstadoAlmuerzo.PENDIENTE, date.today())
+        db_session.add(
+            OrdenCasino(
+                pedido_codigo="diferido",
+                alumno_id=sample_apoderado.alumnos[0].id,
+                menu_slug="menu-test",
+                fecha=date.today(),
+                estado=EstadoAlmuerzo.PENDIENTE,
+            )
+        )
+        db_session.flush()
+        assert _contador(db_session, clave).valor == 0
+
+        db_session.commit()
+        assert _contador(db_session, clave).valor == 1
+
+    def test_tag_and_activo_changes(self, db_session, sample_apoderado, counters):
+        alumno = sample_apoderado.alumnos[0]
+        counters.valores()
+        alumno.tag = "aabbccdd"
+        db_session.commit()
+        assert counters.valores()["alumnos_con_tag"] == 1
+
+        alumno.activo = False
+        db_session.commit()
+        valores = counters.valores()
+        assert valores["alumnos_activos"] == 0
+        assert valores["alumnos_con_tag"] == 0
+        assert valores["alumnos_total"] == 1
+
+    def test_rollback_leaves_counters_unchanged(self, db_session, sample_apoderado, counters):
+        from app.model import EstadoAlmuerzo, OrdenCasino
+        counters.valores()
+        orden = OrdenCasino(
+            pedido_codigo="rollback",
+            alumno_id=sample_apoderado.alumnos[0].id,
+            menu_slug="menu-test",
+            fecha=date.today(),
+            estado=EstadoAlmuerzo.PENDIENTE,
+        )
+        db_session.add(orden)
+        db_session.flush()
+        db_session.rollback()
+        assert counters.valores()["ordenes_pendientes"] == 0
+
+    def test_pending_abonos_follow_payment_state(self, db_session, sample_apoderado, counters):
+        from app.apoderado.controller import ApoderadoController
+        from app.model import Payment
+        counters.valores()
+
+        abono = ApoderadoController().create_abono(sample_apoderado, Decimal("8000"), "cafeteria")
+        pago = Payment()
+        pago.merchants_id = abono.codigo
+        pago.transaction_id = abono.codigo
+        pago.provider = "cafeteria"
+        pago.state = "processing"
+        pago.amount = 8000
+        pago.currency = "CLP"
+        db_session.add(pago)
+        db_session.commit()
+        assert _contador(db_session, ABONOS_PENDIENTES).recontado is None
+        assert counters.valores()["abonos_pendientes"] == 1
+
+        pago.state = "succeeded"
+        db_session.commit()
+        assert counters.valores()["abonos_pendientes"] == 0
@@ -0,0 +1,143 @@
+"""Tests for the webhook load-replay bench (merchants/bench.py, ``merchants bench webhooks``)."""
+
+import json
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Integer
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from flask_merchants import FlaskMerchants
+from flask_merchants.inbox import WebhookInboxMixin
+from flask_merchants.models import PaymentMixin
+from merchants import bench
+from merchants.providers.dummy import DummyProvider
+from merchants.webhooks import verify_khipu_signature
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+class Pagos(PaymentMixin, db.Model):
+    __tablename__ = "bench_pagos"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+class Entradas(WebhookInboxMixin, db.Model):
+    __tablename__ = "bench_entradas"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+CORPUS = [
+    {"event_id": "evt_1", "payment_id": "pay_1", "event_type": "payment.succeeded"},
+    {"event_id": "evt_2", "payment_id": "pay_2", "event_type": "payment.succeeded"},
+    {"event_id": "evt_3", "payment_id": "pay_3", "event_type": "payment.succeeded"},
+]
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def inbox_app(tmp_path):
+    """Flask app deduplicating webhooks through its inbox (processed inline)."""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY="test-secret",
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'bench.db'}",
+        MERCHANTS_WEBHOOK_WORKERS=0,
+    )
+    db.init_app(app)
+    ext = FlaskMerchants()
+    ext.init_app(app, db=db, models=[Pagos], providers=[DummyProvider()], inbox_model=Entradas)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture()
+def corpus_dir(tmp_path):
+    path = tmp_path / "corpus"
+    path.mkdir()
+    for n, payload in enumerate(CORPUS):
+        (path / f"{n}.json").write_text(json.dumps(payload))
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Building blocks
+# ---------------------------------------------------------------------------
+
+class TestBenchHelpers:
+    def test_signature_verifies(self):
+        body = b'{"notification_token": "abc"}'
+        header = bench.khipu_signature("s3cr3t", body, timestamp="1711965600393")
+        assert verify_khipu_signature(body, "s3cr3t", header) == "1711965600393"
+
+    def test_load_corpus_keeps_bytes(self, tmp_path, corpus_dir):
+        jsonl = tmp_path / "corpus.jsonl"
+        jsonl.write_bytes(b'{"id": 1}\n\n{ "id" : 2 }\n')
+        assert bench.load_corpus(jsonl) == [b'{"id": 1}', b'{ "id" : 2 }']
+        assert len(bench.load_corpus(corpus_dir)) == 3
+
+    def test_copies_get_distinct_ids(self):
+        body = json.dumps(CORPUS[0]).encode()
+        assert bench.make_copy(body, 0) is body
+        assert json.loads(bench.make_copy(body, 2))["event_id"] == "evt_1-2"
+        assert json.loads(bench.make_copy(body, 2))["payment_id"] == "pay_1-2"
+        assert bench.make_copy(b"not json", 2) == b"not json"
+
+    def test_plan_redelivers_a_fraction(self):
+        deliveries = bench.plan([b"{}"] * 5, copies=2, duplicates=0.5, seed=1)
+        assert len(deliveries) == 15
+        assert len({d.group for d in deliveries}) == 10
+
+    def test_percentile_nearest_rank(self):
+        values = [float(n) for n in range(1, 101)]
+        assert bench.percentile(values, 50) == 50
+        assert bench.percentile(values, 99) == 99
+        assert bench.percentile([3.0], 95) == 3
+        assert bench.percentile([], 50) == 0
+
+
+# ---------------------------------------------------------------------------
+# Runs
+# ---------------------------------------------------------------------------
+
+class TestBenchRun:
+    def test_inbox_processes_each_notification_once(self, inbox_app):
+        deliveries = bench.plan(
+            [json.dumps(p).encode() for p in CORPUS], copies=4, duplicates=0.5, seed=7
+        )
+        report = bench.run(deliveries, bench.app_sender(inbox_app, "/merchants/webhook/dummy"), concurrency=4)
+        result = report.as_dict()
+
+        assert result["deliveries"] == 18
+        assert result["errors"] == 0
+        assert result["duplicates"] == {"once": 12, "twice_or_more": 0, "never": 0, "unreported": 0}
+        assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"]
+
+    def test_double_processing_is_detected(self):
+        def _send(body, headers):
+            return 200, b'{"duplicate": false}'
+
+        report = bench.run([bench.Delivery(0, b"{}"), bench.Delivery(0, b"{}")], _send)
+        assert report.duplicate_check()["twice_or_more"] == 1
+
+    def test_errors_counted(self):
+        def _send(body, headers):
+            raise ConnectionError("refused")
+
+        report = bench.run([bench.Delivery(0, b"{}")], _send)
+        assert report.error_rate == 1.0
+        assert report.duplicate_check()["never"] == 0
+
@@ -0,0 +1,219 @@
+"""Tests for the provider circuit breaker and bulkhead (flask_merchants/breaker.py)."""
+
+import threading
+import time
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Integer
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from flask_merchants import FlaskMerchants, ProviderUnavailable
+from flask_merchants.breaker import CLOSED, HALF_OPEN, OPEN, Bulkhead, CircuitBreaker, ProviderGuard
+from flask_merchants.contrib.admin import ProvidersView
+from flask_merchants.models import PaymentMixin
+from merchants.providers import UserError
+from merchants.providers.dummy import DummyProvider
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+class Pagos(PaymentMixin, db.Model):
+    __tablename__ = "breaker_pagos"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+class CaidoProvider(DummyProvider):
+    """Provider whose checkouts fail while ``down`` is set."""
+
+    key = "breaker_caido"
+
+    def __init__(self):
+        super().__init__()
+        self.down = True
+        self.calls = 0
+
+    def create_checkout(self, *args, **kwargs):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("read timed out")
+        return super().create_checkout(*args, **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def merchants_app():
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY="test-secret",
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        MERCHANTS_BREAKER_MIN_CALLS=3,
+        MERCHANTS_BREAKER_OPEN_SECONDS=60,
+    )
+    db.init_app(app)
+    provider = CaidoProvider()
+    ext = FlaskMerchants()
+    ext.init_app(app, db=db, models=[Pagos], providers=[DummyProvider(), provider])
+    with app.app_context():
+        db.create_all()
+        yield app, ext, provider
+        db.session.remove()
+        db.drop_all()
+
+
+def _create(provider="breaker_caido"):
+    return Pagos.create(
+        amount="1000",
+        currency="CLP",
+        provider=provider,
+        success_url="https://example.com/ok",
+        cancel_url="https://example.com/ko",
+    )
+
+
+def _fail(guard, exc=ConnectionError):
+    with pytest.raises(exc):
+        with guard.call():
+            raise exc("boom")
+
+
+# ---------------------------------------------------------------------------
+# CircuitBreaker / Bulkhead
+# ---------------------------------------------------------------------------
+
+class TestCircuitBreaker:
+    def test_opens_at_failure_rate_after_min_calls(self):
+        breaker = CircuitBreaker(failure_rate=0.5, min_calls=4)
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        assert breaker.state == CLOSED  # only 3 calls
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert not breaker.allow()
+        assert breaker.stats()["rejected"] == 1
+
+    def test_old_calls_leave_the_window(self):
+        breaker = CircuitBreaker(min_calls=2, window=0.05)
+        breaker.record_failure()
+        time.sleep(0.08)
+        breaker.record_failure()
+        assert breaker.state == CLOSED
+        assert breaker.stats()["calls"] == 1
+
+    def test_half_open_probe_closes_or_reopens(self):
+        breaker = CircuitBreaker(min_calls=1, open_seconds=0.05)
+        breaker.record_failure()
+        time.sleep(0.08)
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()  # one probe at a time
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.retry_after() > 0
+
+        time.sleep(0.08)
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CLOSED
+        assert breaker.stats()["times_opened"] == 2
+
+
+class TestProviderGuard:
+    def test_user_errors_do_not_trip(self):
+        guard = ProviderGuard("p", CircuitBreaker(min_calls=1), Bulkhead(0))
+        _fail(guard, UserError)
+        assert guard.breaker.state == CLOSED
+        _fail(guard)
+        assert guard.breaker.state == OPEN
+        with pytest.raises(ProviderUnavailable) as info:
+            with guard.call():
+                pass
+        assert info.value.reason == "circuit_open"
+        assert info.value.retry_after > 0
+
+    def test_bulkhead_caps_calls_in_flight(self):
+        guard = ProviderGuard("p", CircuitBreaker(), Bulkhead(2))
+        inside = threading.Barrier(3)
+        leave = threading.Event()
+
+        def _call():
+            with guard.call():
+                inside.wait()
+                leave.wait()
+
+        threads = [threading.Thread(target=_call) for _ in range(2)]
+        for t in threads:
+            t.start()
+        inside.wait()
+        assert not guard.available()
+        with pytest.raises(ProviderUnavailable) as info:
+            with guard.call():
+                pass
+        leave.set()
+        for t in threads:
+            t.join()
+
+        assert info.value.reason == "bulkhead_full"
+        assert guard.stats()["bulkhead"] == {"in_flight": 0, "max_concurrent": 2, "rejected": 1}
+        assert guard.available()
+
+
+# ---------------------------------------------------------------------------
+# PaymentMixin.create and the admin view
+# ---------------------------------------------------------------------------
+
+class TestCreateGuarded:
+    def test_open_circuit_fails_fast_without_a_record(self, merchants_app):
+        _app, ext, provider = merchants_app
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                _create()
+        assert db.session.query(Pagos).filter_by(state="failed").count() == 3
+        assert not ext.provider_available(provider.key)
+
+        with pytest.raises(ProviderUnavailable):
+            _create()
+        assert provider.calls == 3
+        assert db.session.query(Pagos).count() == 3
+
+    def test_other_providers_unaffected(self, merchants_app):
+        _app, ext, _provider = merchants_app
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                _create()
+        assert _create("dummy").state == "pending"
+        assert ext.provider_available("dummy")
+
+    def test_per_provider_concurrency_config(self):
+        app = Flask(__name__)
+        app.config["MERCHANTS_PROVIDER_MAX_CONCURRENT"] = {"khipu": 2, "*": 0}
+        ext = FlaskMerchants(app, provider=DummyProvider())
+        assert ext.provider_guard("khipu").bulkhead.max_concurrent == 2
+        assert ext.provider_guard("dummy").bulkhead.max_concurrent == 0
+
+    def test_providers_view_shows_breaker(self, merchants_app):
+        _app, ext, provider = merchants_app
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                _create()
+        with pytest.raises(ProviderUnavailable):
+            _create()
+
+        view = object.__new__(ProvidersView)
+        view._ext = ext
+        row = next(r for r in view._build_providers_list() if r["key"] == provider.key)
+        assert row["breaker_state"] == "open"
+        assert row["breaker_failures"] == "3/3"
+        assert row["in_flight"] == "0/4"
+        assert row["rejected"] == 1
@@ -0,0 +1,358 @@
+"""Tests for the durable webhook inbox (flask_merchants/inbox.py)."""
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Integer, event as sa_event
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from flask_merchants import FlaskMerchants
+from flask_merchants.inbox import WebhookInboxMixin, dedup_key
+from flask_merchants.locking import KeyedLocks, payment_lock
+from flask_merchants.models import PaymentMixin
+from merchants.models import PaymentState, WebhookEvent
+from merchants.providers.dummy import DummyProvider
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+class Pagos(PaymentMixin, db.Model):
+    __tablename__ = "inbox_pagos"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+class Entradas(WebhookInboxMixin, db.Model):
+    __tablename__ = "inbox_entradas"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+def _make_app(uri, **config):
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY="test-secret",
+        SQLALCHEMY_DATABASE_URI=uri,
+        MERCHANTS_WEBHOOK_MAX_ATTEMPTS=3,
+    )
+    app.config.update({"MERCHANTS_WEBHOOK_WORKERS": 0, **config})
+    db.init_app(app)
+    ext = FlaskMerchants()
+    ext.init_app(app, db=db, models=[Pagos], providers=[DummyProvider()], inbox_model=Entradas)
+    return app, ext
+
+
+@pytest.fixture()
+def merchants_app():
+    """Flask app whose inbox processes entries inline (no threads)."""
+    app, ext = _make_app("sqlite:///:memory:")
+    with app.app_context():
+        db.create_all()
+        _payment()
+        yield app, ext
+        db.session.remove()
+        db.drop_all()
+
+
+def _payment(transaction_id="pay_1"):
+    db.session.add(
+        Pagos(
+            merchants_id=f"mid-{transaction_id}",
+            transaction_id=transaction_id,
+            provider="dummy",
+            amount=Decimal("1000"),
+            currency="CLP",
+            state="pending",
+        )
+    )
+    db.session.commit()
+
+
+def _deliver(app, event_id="evt_1", payment_id="pay_1"):
+    body = json.dumps({"event_id": event_id, "payment_id": payment_id, "event_type": "payment.succeeded"})
+    return app.test_client().post("/merchants/webhook/dummy", data=body, content_type="application/json")
+
+
+def _entries():
+    return db.session.execute(db.select(Entradas).order_by(Entradas.id)).scalars().all()
+
+
+def _state(transaction_id="pay_1"):
+    return db.session.execute(db.select(Pagos.state).filter_by(transaction_id=transaction_id)).scalar_one()
+
+
+def _make_due(entry):
+    db.session.execute(
+        db.update(Entradas)
+        .where(Entradas.id == entry.id)
+        .values(next_attempt_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    )
+    db.session.commit()
+
+
+# ---------------------------------------------------------------------------
+# Deduplication keys and payment locks
+# ---------------------------------------------------------------------------
+
+def _event(event_id, payment_id, state=PaymentState.SUCCEEDED):
+    return WebhookEvent(event_id=event_id, event_type="payment.notification", payment_id=payment_id, state=state)
+
+
+class TestDedupKey:
+    def test_real_event_id(self):
+        assert dedup_key("stripe", _event("evt_9", "pi_1"), b"{}") == "stripe:event:evt_9"
+
+    def test_payment_id_as_event_id_keeps_state_changes(self):
+        # KhipuProvider.parse_webhook reports the payment id as the event id.
+        pending = dedup_key("khipu", _event("kp_1", "kp_1", PaymentState.PENDING), b"a")
+        succeeded = dedup_key("khipu", _event("kp_1", "kp_1"), b"b")
+        assert pending == "khipu:payment:kp_1:pending"
+        assert succeeded == "khipu:payment:kp_1:succeeded"
+        assert dedup_key("khipu", _event("kp_1", "kp_1"), b"c") == succeeded
+
+    def test_body_hash_without_ids(self):
+        key = dedup_key("dummy", _event(None, None), b"payload")
+        assert key.startswith("dummy:sha256:")
+        assert key != dedup_key("dummy", _event(None, None), b"other")
+
+
+class TestPaymentLock:
+    def _race(self, payment_ids):
+        """Run one thread per id inside payment_lock; return the peak concurrency."""
+        inside, peak, guard = [0], [0], threading.Lock()
+
+        def _worker(payment_id):
+            with payment_lock(None, "dummy", payment_id):
+                with guard:
+                    inside[0] += 1
+                    peak[0] = max(peak[0], inside[0])
+                time.sleep(0.05)
+                with guard:
+                    inside[0] -= 1
+
+        threads = [threading.Thread(target=_worker, args=(p,)) for p in payment_ids]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return peak[0]
+
+    def test_same_payment_is_serialised(self):
+        assert self._race(["pay_1"] * 4) == 1
+
+    def test_different_payments_run_in_parallel(self):
+        assert self._race(["pay_1", "pay_2", "pay_3"]) == 3
+
+    def test_locks_are_discarded(self):
+        locks = KeyedLocks()
+        with locks.hold("a"):
+            assert len(locks) == 1
+        assert len(locks) == 0
+
+
+# ---------------------------------------------------------------------------
+# Receiving
+# ---------------------------------------------------------------------------
+
+class TestWebhookInboxReceive:
+    def test_delivery_is_stored_and_processed(self, merchants_app):
+        app, ext = merchants_app
+        seen = []
+        ext.add_webhook_handler(lambda event: seen.append(event.payment_id))
+
+        resp = _deliver(app)
+
+        assert resp.status_code == 200
+        assert resp.get_json()["duplicate"] is False
+        (entry,) = _entries()
+        assert (entry.status, entry.attempts, entry.dedup_key) == ("done", 1, "dummy:event:evt_1")
+        assert entry.handlers_done[0] == "update_state"
+        assert entry.to_event().payment_id == "pay_1"
+        assert seen == ["pay_1"]
+        assert _state() == "succeeded"
+
+    def test_redelivery_is_acknowledged_once(self, merchants_app):
+        app, ext = merchants_app
+        seen = []
+        ext.add_webhook_handler(lambda event: seen.append(event.event_id))
+
+        _deliver(app)
+        resp = _deliver(app)
+
+        assert resp.status_code == 200
+        assert resp.get_json()["duplicate"] is True
+        assert len(_entries()) == 1
+        assert seen == ["evt_1"]
+
+    def test_duplicate_costs_one_insert(self, merchants_app):
+        app, ext = merchants_app
+        _deliver(app)
+        statements = []
+
+        def _record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sa_event.listen(db.engine, "before_cursor_execute", _record)
+        resp = _deliver(app)
+        sa_event.remove(db.engine, "before_cursor_execute", _record)
+
+        assert resp.get_json()["duplicate"] is True
+        inbox_statements = [q for q in statements if "inbox_entradas" in q]
+        assert len(inbox_statements) == 1
+        assert inbox_statements[0].startswith("INSERT")
+
+    def test_malformed_payload_is_not_stored(self, merchants_app):
+        app, ext = merchants_app
+
+        def _boom(payload, headers):
+            raise ValueError("bad signature")
+
+        ext.get_client("dummy")._provider.parse_webhook = _boom
+        try:
+            resp = app.test_client().post("/merchants/webhook/dummy", data=b"{}")
+        finally:
+            del ext.get_client("dummy")._provider.parse_webhook
+        assert resp.status_code == 400
+        assert _entries() == []
+
+    def test_handlers_see_the_stored_request(self, merchants_app):
+        app, ext = merchants_app
+        sent = []
+        ext.enable_webhook_notifications(admin_emails_fn=lambda: ["admin@test.cl"], send_fn=sent.append)
+
+        _deliver(app)
+
+        (info,) = sent
+        assert info["transaction"] == "pay_1"
+        assert "evt_1" in info["body_json"]
+        assert "Content-Type" in info["headers_json"]
+
+
+# ---------------------------------------------------------------------------
+# Retries and dead letters
+# ---------------------------------------------------------------------------
+
+class TestWebhookInboxRetry:
+    def test_failed_handler_is_retried_alone(self, merchants_app):
+        app, ext = merchants_app
+        calls = {"ok": 0, "flaky": 0}
+
+        def ok(event):
+            calls["ok"] += 1
+
+        def flaky(event):
+            calls["flaky"] += 1
+            if calls["flaky"] == 1:
+                raise RuntimeError("smtp timeout")
+
+        ext.add_webhook_handler(ok)
+        ext.add_webhook_handler(flaky)
+
+        _deliver(app)
+        (entry,) = _entries()
+        assert entry.status == "retry"
+        assert "smtp timeout" in entry.last_error
+        assert entry.next_attempt_at is not None
+
+        assert ext.webhook_inbox.process_due() == 0  # backoff not elapsed
+        _make_due(entry)
+        assert ext.webhook_inbox.process_due() == 1
+
+        db.session.refresh(entry)
+        assert (entry.status, entry.attempts) == ("done", 2)
+        assert calls == {"ok": 1, "flaky": 2}
+
+    def test_dead_after_max_attempts_and_requeue(self, merchants_app):
+        app, ext = merchants_app
+        failing = {"on": True}
+
+        def handler(event):
+            if failing["on"]:
+                raise RuntimeError("down")
+
+        ext.add_webhook_handler(handler)
+
+        _deliver(app)
+        (entry,) = _entries()
+        for _ in range(2):
+            _make_due(entry)
+            ext.webhook_inbox.process_due()
+        db.session.refresh(entry)
+        assert (entry.status, entry.attempts) == ("dead", 3)
+        assert ext.webhook_inbox.process_due() == 0
+
+        failing["on"] = False
+        assert ext.webhook_inbox.requeue(entry.id) is True
+        db.session.refresh(entry)
+        assert (entry.status, entry.attempts) == ("done", 1)
+        assert ext.webhook_inbox.requeue(entry.id) is False
+
+    def test_abandoned_processing_entry_is_reclaimed(self, merchants_app):
+        app, ext = merchants_app
+        _deliver(app)
+        (entry,) = _entries()
+        db.session.execute(
+            db.update(Entradas)
+            .where(Entradas.id == entry.id)
+            .values(status="processing", updated_at=datetime.now(timezone.utc) - timedelta(hours=1))
+        )
+        db.session.commit()
+
+        result = app.test_cli_runner().invoke(args=["merchants", "webhooks", "retry"])
+
+        assert "Submitted 1" in result.output
+        db.session.refresh(entry)
+        assert entry.status == "done"
+
+    def test_inbox_requires_db(self):
+        app = Flask(__name__)
+        with pytest.raises(RuntimeError):
+            FlaskMerchants().init_app(app, providers=[DummyProvider()], inbox_model=Entradas)
+
+
+# ---------------------------------------------------------------------------
+# Thread pool
+# ---------------------------------------------------------------------------
+
+class TestWebhookInboxWorkers:
+    def test_response_does_not_wait_for_handlers(self, tmp_path):
+        app, ext = _make_app(f"sqlite:///{tmp_path / 'inbox.db'}", MERCHANTS_WEBHOOK_WORKERS=2)
+        release = threading.Event()
+        handled = []
+
+        def slow(event):
+            release.wait(5)
+            handled.append(event.event_id)
+
+        ext.add_webhook_handler(slow)
+        with app.app_context():
+            db.create_all()
+            _payment()
+
+        inicio = time.perf_counter()
+        resp = _deliver(app)
+        elapsed = time.perf_counter() - inicio
+        release.set()
+        ext.webhook_inbox.shutdown(wait=True)
+
+        assert resp.status_code == 200
+        assert elapsed < 2
+        assert handled == ["evt_1"]
+        with app.app_context():
+            assert [e.status for e in _entries()] == ["done"]
+            assert _state() == "succeeded"
+            db.engine.dispose()
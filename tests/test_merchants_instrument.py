@@ -0,0 +1,214 @@
+"""Tests for provider call instrumentation (merchants/instrument.py) and the /metrics view."""
+
+import asyncio
+import logging
+
+import pytest
+from flask import Flask
+
+from flask_merchants import FlaskMerchants
+from merchants import Client, StatusCache
+from merchants.cassette import ReplayTransport
+from merchants.instrument import Instrumentation, MetricsRecorder, MetricsRegistry, log_call
+from merchants.providers.dummy import DummyProvider
+from merchants.providers.generic import GenericProvider
+from merchants.transport import HttpResponse, RequestTiming, Transport, notify_observers
+
+CHECKOUT = {
+    "method": "POST",
+    "url": "https://x/checkout",
+    "json": None,
+    "status": 201,
+    "body": {"id": "p1", "url": "https://x/pay/p1"},
+    "elapsed": 0,
+}
+PAYMENT = {"method": "GET", "url": "https://x/pay/p1", "status": 200, "body": {"status": "paid"}, "elapsed": 0}
+
+
+class _RetryingTransport(Transport):
+    """Reports a failed attempt and a 503 before answering 200."""
+
+    def send(self, method, url, *, headers=None, json=None, params=None, timeout=None):
+        notify_observers(RequestTiming(method, url, None, 0.01, 1, "ConnectionError()"))
+        notify_observers(RequestTiming(method, url, 503, 0.01, 2, request_bytes=10, response_bytes=5))
+        notify_observers(RequestTiming(method, url, 200, 0.01, 3, request_bytes=10, response_bytes=40))
+        return HttpResponse(200, {}, {"status": "pending"})
+
+
+class _RejectingProvider(DummyProvider):
+    key = "instrument_rechazo"
+
+    def create_checkout(self, *args, **kwargs):
+        from merchants.providers import UserError
+
+        raise UserError("amount too low")
+
+    def get_payment(self, payment_id):
+        raise ConnectionError("read timed out")
+
+
+class _Recorder(list):
+    """The events emitted by its own ``instrumentation``."""
+
+    def __init__(self):
+        super().__init__()
+        self.instrumentation = Instrumentation()
+        self.instrumentation.add_listener(self.append)
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def recorded():
+    return _Recorder()
+
+
+def _generic(transport):
+    return GenericProvider("https://x/checkout", "https://x/pay/{payment_id}", transport=transport)
+
+
+# ---------------------------------------------------------------------------
+# Client instrumentation
+# ---------------------------------------------------------------------------
+
+class TestClientInstrumentation:
+    def test_events_carry_status_and_sizes(self, recorded):
+        replay = ReplayTransport([CHECKOUT, PAYMENT], latency=0, match_body=False)
+        client = Client(_generic(replay), instrumentation=recorded.instrumentation)
+
+        client.payments.create_checkout("10", "USD", "https://ok", "https://ko")
+        client.payments.get("p1")
+
+        checkout, status = recorded
+        assert (checkout.provider, checkout.operation, checkout.outcome) == ("generic", "create_checkout", "ok")
+        assert (checkout.status_code, checkout.retries) == (201, 0)
+        assert checkout.request_bytes > 0 and checkout.response_bytes > 0
+        assert (status.operation, status.status_code) == ("get_payment", 200)
+
+    def test_retries_and_last_status(self, recorded):
+        client = Client(_generic(_RetryingTransport()), instrumentation=recorded.instrumentation)
+        client.payments.get("p1")
+        (event,) = recorded
+        assert (event.retries, event.status_code, event.request_bytes, event.response_bytes) == (2, 200, 10, 40)
+
+    def test_outcomes(self, recorded):
+        client = Client(_RejectingProvider(), instrumentation=recorded.instrumentation)
+        with pytest.raises(Exception):
+            client.payments.create_checkout("10", "USD", "https://ok", "https://ko")
+        with pytest.raises(ConnectionError):
+            client.payments.get("p1")
+
+        assert [(e.outcome, e.error) for e in recorded] == [
+            ("rejected", "UserError"),
+            ("error", "ConnectionError"),
+        ]
+        assert all(e.status_code is None and e.retries is None for e in recorded)
+
+    def test_cache_hits_are_not_provider_calls(self, recorded):
+        client = Client(DummyProvider(), status_cache=StatusCache(), instrumentation=recorded.instrumentation)
+        client.payments.get("p1")
+        client.payments.get("p1")
+        assert len(recorded) == 1
+
+    def test_async_calls(self, recorded):
+        client = Client(DummyProvider(), instrumentation=recorded.instrumentation)
+
+        async def _run():
+            await client.payments.acreate_checkout("10", "USD", "https://ok", "https://ko")
+            await client.payments.aget("p1")
+
+        asyncio.run(_run())
+        assert [e.operation for e in recorded] == ["create_checkout", "get_payment"]
+
+    def test_failing_listener_is_ignored(self, recorded):
+        recorded.instrumentation.add_listener(lambda event: 1 / 0)
+        client = Client(DummyProvider(), instrumentation=recorded.instrumentation)
+        assert client.payments.get("p1").payment_id == "p1"
+
+
+# ---------------------------------------------------------------------------
+# Metrics registry and logging
+# ---------------------------------------------------------------------------
+
+class TestMetrics:
+    def test_recorder_fills_histograms(self, recorded):
+        registry = MetricsRegistry()
+        recorded.instrumentation.add_listener(MetricsRecorder(registry, buckets=(0.5, 10)))
+        client = Client(_generic(_RetryingTransport()), instrumentation=recorded.instrumentation)
+        client.payments.get("p1")
+        client.payments.get("p1")
+
+        duration = registry.get("merchants_provider_call_duration_seconds")
+        snapshot = duration.snapshot(provider="generic", operation="get_payment", outcome="ok")
+        assert snapshot["count"] == 2
+        assert snapshot["buckets"] == {0.5: 2, 10: 2, float("inf"): 2}
+        assert registry.get("merchants_provider_call_retries_total").value(
+            provider="generic", operation="get_payment"
+        ) == 4
+
+    def test_render_prometheus_text(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("demo_seconds", "Demo.", ("provider",), buckets=(1, 5))
+        histogram.observe(0.5, provider="khipu")
+        histogram.observe(7, provider="khipu")
+        registry.counter("demo_total", "Demo count.", ("path",)).inc(path='a"b')
+
+        text = registry.render()
+        assert "# TYPE demo_seconds histogram" in text
+        assert 'demo_seconds_bucket{provider="khipu",le="1"} 1' in text
+        assert 'demo_seconds_bucket{provider="khipu",le="5"} 1' in text
+        assert 'demo_seconds_bucket{provider="khipu",le="+Inf"} 2' in text
+        assert 'demo_seconds_count{provider="khipu"} 2' in text
+        assert 'demo_total{path="a\\"b"} 1' in text
+        with pytest.raises(ValueError):
+            registry.counter("demo_seconds", "Clash.")
+
+    def test_slow_calls_logged_at_warning(self, caplog, recorded):
+        slow = lambda event: log_call(event, slow=0)  # noqa: E731
+        recorded.instrumentation.add_listener(slow)
+        with caplog.at_level(logging.DEBUG, logger="merchants.calls"):
+            Client(DummyProvider(), instrumentation=recorded.instrumentation).payments.get("p1")
+
+        (record,) = caplog.records
+        assert record.levelno == logging.WARNING
+        assert "provider=dummy operation=get_payment" in record.getMessage()
+        assert record.merchants_call["outcome"] == "ok"
+
+
+# ---------------------------------------------------------------------------
+# FlaskMerchants /metrics
+# ---------------------------------------------------------------------------
+
+class TestMetricsView:
+    def _app(self, **config):
+        app = Flask(__name__)
+        app.config.update(TESTING=True, SECRET_KEY="test-secret", **config)
+        ext = FlaskMerchants(app, provider=DummyProvider())
+        return app, ext
+
+    def test_scrape_after_calls(self):
+        app, ext = self._app(MERCHANTS_METRICS_TOKEN="s3cr3t")
+        client = app.test_client()
+        client.post("/merchants/checkout", json={"amount": "10.00", "currency": "USD"})
+
+        resp = client.get("/merchants/metrics", headers={"Authorization": "Bearer s3cr3t"})
+        assert resp.status_code == 200
+        assert resp.mimetype == "text/plain"
+        assert (
+            'merchants_provider_call_duration_seconds_count{provider="dummy",operation="create_checkout",outcome="ok"} 1'
+            in resp.get_data(as_text=True)
+        )
+        assert ext.get_client("dummy").payments._instrumentation is ext.instrumentation
+
+    def test_disabled_without_token(self):
+        app, _ext = self._app()
+        assert app.test_client().get("/merchants/metrics").status_code == 404
+
+    def test_token_required_when_set(self):
+        app, _ext = self._app(MERCHANTS_METRICS_TOKEN="s3cr3t")
+        client = app.test_client()
+        assert client.get("/merchants/metrics").status_code == 401
+        assert client.get("/merchants/metrics", headers={"Authorization": "Bearer nope"}).status_code == 401
+        assert client.get("/merchants/metrics", headers={"Authorization": "Bearer s3cr3t"}).status_code == 200
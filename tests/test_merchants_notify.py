@@ -0,0 +1,241 @@
+"""Tests for payment status notifications (flask_merchants/notify.py) and the wait/stream views."""
+
+import asyncio
+import json
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Integer
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from flask_merchants import FlaskMerchants
+from flask_merchants.models import PaymentMixin
+from flask_merchants.notify import StatusNotifier
+from merchants.models import PaymentState
+from merchants.providers.dummy import DummyProvider
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+class Pagos(PaymentMixin, db.Model):
+    __tablename__ = "notify_pagos"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+class ContadorProvider(DummyProvider):
+    """Provider counting get_payment calls."""
+
+    key = "notify_contador"
+
+    def __init__(self):
+        super().__init__(always_state=PaymentState.FAILED)
+        self.calls = 0
+
+    def get_payment(self, payment_id):
+        self.calls += 1
+        return super().get_payment(payment_id)
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def merchants_app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY="test-secret",
+        # A file database: the waiting request and the updater use separate connections.
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'notify.db'}",
+        MERCHANTS_STATUS_WAIT_TIMEOUT=5,
+    )
+    db.init_app(app)
+    provider = ContadorProvider()
+    ext = FlaskMerchants()
+    ext.init_app(app, db=db, models=[Pagos], provider=provider)
+    with app.app_context():
+        db.create_all()
+        db.session.add(
+            Pagos(
+                merchants_id="mid-1",
+                transaction_id="tx-1",
+                provider=provider.key,
+                amount=Decimal("1000"),
+                currency="CLP",
+                state="pending",
+            )
+        )
+        db.session.commit()
+        db.session.remove()
+    yield app, ext, provider
+    with app.app_context():
+        db.drop_all()
+
+
+def _later(app, fn, delay=0.1):
+    """Run *fn* in an app context on another thread after *delay* seconds."""
+
+    def _run():
+        time.sleep(delay)
+        with app.app_context():
+            fn()
+
+    thread = threading.Thread(target=_run)
+    thread.start()
+    return thread
+
+
+# ---------------------------------------------------------------------------
+# StatusNotifier
+# ---------------------------------------------------------------------------
+
+class TestStatusNotifier:
+    def test_publish_wakes_matching_subscriptions(self):
+        notifier = StatusNotifier()
+        with notifier.subscribe(["a"]) as sub_a, notifier.subscribe(["b"]) as sub_b:
+            notifier.publish(["a", "x"], "succeeded", "khipu")
+            assert sub_a.wait(1) == {"ids": ["a", "x"], "state": "succeeded", "provider": "khipu"}
+            assert sub_b.wait(0.01) is None
+        assert notifier.stats()["waiting"] == 0
+
+    def test_wait_async(self):
+        notifier = StatusNotifier()
+
+        async def _run():
+            with notifier.subscribe(["a"]) as sub:
+                threading.Timer(0.05, notifier.publish, (["a"], "failed")).start()
+                return await sub.wait_async(2)
+
+        assert asyncio.run(_run())["state"] == "failed"
+
+    def test_broken_backend_does_not_raise(self):
+        class _Roto:
+            def publish(self, payload):
+                raise ConnectionError("redis down")
+
+            def close(self):
+                pass
+
+        notifier = StatusNotifier()
+        notifier.set_backend(_Roto())
+        notifier.publish(["a"], "failed")
+
+    def test_multi_worker_without_redis_logs_error(self, monkeypatch, caplog):
+        monkeypatch.setenv("WEB_CONCURRENCY", "4")
+        app = Flask(__name__)
+        app.config.update(TESTING=True, SECRET_KEY="test-secret")
+        with caplog.at_level("ERROR", logger="flask_merchants"):
+            FlaskMerchants(app, provider=DummyProvider())
+        assert "MERCHANTS_STATUS_NOTIFY_URL" in caplog.text
+
+
+# ---------------------------------------------------------------------------
+# State updates publish
+# ---------------------------------------------------------------------------
+
+class TestPublishing:
+    def test_update_state_publishes_changes_only(self, merchants_app):
+        app, ext, _provider = merchants_app
+        with app.app_context(), ext.status_notifier.subscribe(["tx-1"]) as sub:
+            ext.update_state("mid-1", "pending")
+            assert sub.wait(0.01) is None
+            ext.update_state("mid-1", "succeeded")
+            assert sub.wait(0.01) == {"ids": ["mid-1", "tx-1"], "state": "succeeded", "provider": "notify_contador"}
+
+
+# ---------------------------------------------------------------------------
+# /status/<payment_id>/wait and /stream
+# ---------------------------------------------------------------------------
+
+class TestWaitView:
+    def test_update_wakes_waiter_without_provider_call(self, merchants_app):
+        app, ext, provider = merchants_app
+        thread = _later(app, lambda: ext.update_state("tx-1", "succeeded"))
+
+        inicio = time.monotonic()
+        resp = app.test_client().get("/merchants/status/mid-1/wait?state=pending")
+        thread.join()
+
+        assert resp.get_json() == {
+            "payment_id": "mid-1",
+            "state": "succeeded",
+            "changed": True,
+            "is_final": True,
+            "source": "notification",
+        }
+        assert time.monotonic() - inicio < 2
+        assert provider.calls == 0
+
+    def test_webhook_wakes_waiter(self, merchants_app):
+        app, _ext, provider = merchants_app
+        client = app.test_client()
+        body = json.dumps({"payment_id": "tx-1"})
+        thread = _later(app, lambda: client.post(f"/merchants/webhook/{provider.key}", data=body))
+
+        resp = client.get("/merchants/status/tx-1/wait")
+        thread.join()
+
+        assert (resp.get_json()["state"], resp.get_json()["source"]) == ("succeeded", "notification")
+        assert provider.calls == 0
+
+    def test_known_state_already_changed(self, merchants_app):
+        app, _ext, provider = merchants_app
+        resp = app.test_client().get("/merchants/status/mid-1/wait?state=processing")
+        assert (resp.get_json()["state"], resp.get_json()["source"]) == ("pending", "store")
+        assert provider.calls == 0
+
+    def test_timeout_asks_provider_once(self, merchants_app):
+        app, ext, provider = merchants_app
+        resp = app.test_client().get("/merchants/status/mid-1/wait?timeout=0.05")
+
+        assert resp.get_json()["source"] == "provider"
+        assert resp.get_json()["state"] == "failed"
+        assert provider.calls == 1
+        with app.app_context():
+            assert ext.get_session("mid-1")["state"] == "failed"
+
+    def test_stream_sends_changes_until_final(self, merchants_app):
+        app, ext, provider = merchants_app
+        thread = _later(app, lambda: ext.update_state("mid-1", "succeeded"))
+
+        resp = app.test_client().get("/merchants/status/mid-1/stream")
+        thread.join()
+
+        events = [json.loads(line[6:]) for line in resp.get_data(as_text=True).splitlines() if line.startswith("data: ")]
+        assert [e["state"] for e in events] == ["pending", "succeeded"]
+        assert resp.mimetype == "text/event-stream"
+        assert provider.calls == 0
+
+    def test_unknown_payment_is_404(self, merchants_app):
+        app, ext, provider = merchants_app
+        client = app.test_client()
+        assert client.get("/merchants/status/nope/wait?timeout=5").status_code == 404
+        assert client.get("/merchants/status/nope/stream").status_code == 404
+        assert provider.calls == 0
+        assert ext.status_notifier.stats()["waiting"] == 0
+
+    def test_stream_is_bounded(self, merchants_app):
+        app, ext, provider = merchants_app
+        ext.status_cache.ttl = 0
+        app.config.update(
+            MERCHANTS_STATUS_WAIT_TIMEOUT=0.01,
+            MERCHANTS_STATUS_STREAM_MAX_SECONDS=0.2,
+            MERCHANTS_STATUS_STREAM_MAX_REFRESHES=2,
+        )
+        provider._always_state = PaymentState.PENDING
+
+        resp = app.test_client().get("/merchants/status/mid-1/stream")
+        events = [line for line in resp.get_data(as_text=True).splitlines() if line.startswith("event: ")]
+
+        assert events == ["event: status", "event: timeout"]
+        assert provider.calls == 2
@@ -0,0 +1,180 @@
+"""Tests for the FlaskMerchants payment routing index (flask_merchants/routing.py)."""
+
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Integer, event
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+import merchants
+from flask_merchants import FlaskMerchants
+from flask_merchants.models import PaymentMixin
+from flask_merchants.routing import PaymentRouter
+from merchants.providers.dummy import DummyProvider
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+class Pagos(PaymentMixin, db.Model):
+    __tablename__ = "routing_pagos"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+class Paiements(PaymentMixin, db.Model):
+    __tablename__ = "routing_paiements"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def merchants_app():
+    """Flask app with two payment models registered in FlaskMerchants."""
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SECRET_KEY="test-secret", SQLALCHEMY_DATABASE_URI="sqlite:///:memory:")
+    db.init_app(app)
+    ext = FlaskMerchants()
+    ext.init_app(app, db=db, models=[Pagos, Paiements], providers=[DummyProvider()])
+    with app.app_context():
+        db.create_all()
+        yield app, ext
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture()
+def queries(merchants_app):
+    """List collecting the SQL statements executed while the test runs."""
+    statements = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _record)
+    yield statements
+    event.remove(db.engine, "before_cursor_execute", _record)
+
+
+def _checkout(session_id="dummy_sess_1"):
+    return merchants.CheckoutSession(
+        session_id=session_id,
+        redirect_url="https://dummy.example/pay",
+        provider="dummy",
+        amount=Decimal("1000"),
+        currency="CLP",
+        raw={},
+    )
+
+
+def _legacy_row(model_cls, merchants_id, transaction_id):
+    """Insert a payment behind the extension's back, as older code did."""
+    db.session.execute(
+        model_cls.__table__.insert().values(
+            merchants_id=merchants_id,
+            transaction_id=transaction_id,
+            provider="dummy",
+            amount=Decimal("500"),
+            currency="CLP",
+            state="pending",
+        )
+    )
+    db.session.commit()
+
+
+# ---------------------------------------------------------------------------
+# PaymentRouter
+# ---------------------------------------------------------------------------
+
+class TestPaymentRouter:
+    def test_evicts_least_recently_used(self):
+        router = PaymentRouter(maxsize=2)
+        router.remember(Pagos, (1,), "a")
+        router.remember(Pagos, (2,), "b")
+        router.lookup("a")
+        router.remember(Pagos, (3,), "c")
+        assert router.lookup("b") is None
+        assert router.lookup("a") == (Pagos, (1,))
+        assert len(router) == 2
+
+    def test_zero_size_disables(self):
+        router = PaymentRouter(maxsize=0)
+        router.remember(Pagos, (1,), "a")
+        assert router.lookup("a") is None
+
+
+# ---------------------------------------------------------------------------
+# FlaskMerchants lookups
+# ---------------------------------------------------------------------------
+
+class TestFlaskMerchantsRouting:
+    def test_save_session_routes_both_ids(self, merchants_app, queries):
+        _app, ext = merchants_app
+        ext.save_session(_checkout(), model_class=Paiements)
+        merchants_id = db.session.execute(db.select(Paiements.merchants_id)).scalar_one()
+        db.session.expunge_all()
+        queries.clear()
+
+        assert ext.get_session(merchants_id)["transaction_id"] == "dummy_sess_1"
+        assert ext.get_session("dummy_sess_1")["merchants_id"] == merchants_id
+        # One primary-key load per lookup instead of a scan of both models.
+        assert len(queries) == 2
+        assert all(q.rstrip().endswith("routing_paiements.id = ?") for q in queries)
+
+    def test_update_state_uses_route(self, merchants_app, queries):
+        _app, ext = merchants_app
+        ext.save_session(_checkout(), model_class=Paiements)
+        db.session.expunge_all()
+        queries.clear()
+
+        assert ext.update_state("dummy_sess_1", "succeeded") is True
+        assert [q.split()[0] for q in queries] == ["SELECT", "UPDATE"]
+        assert db.session.execute(db.select(Paiements.state)).scalar_one() == "succeeded"
+
+    def test_legacy_rows_are_scanned_then_backfilled(self, merchants_app, queries):
+        _app, ext = merchants_app
+        _legacy_row(Paiements, "legacy-mid", "legacy-tid")
+        queries.clear()
+
+        assert ext.get_session("legacy-tid")["merchants_id"] == "legacy-mid"
+        assert len(queries) == 4  # merchants_id then transaction_id, in both models
+
+        db.session.expunge_all()
+        queries.clear()
+        assert ext.get_session("legacy-mid")["transaction_id"] == "legacy-tid"
+        assert len(queries) == 1
+
+    def test_stale_route_falls_back_to_scan(self, merchants_app):
+        _app, ext = merchants_app
+        ext.save_session(_checkout("gone"), model_class=Pagos)
+        db.session.execute(Pagos.__table__.delete())
+        db.session.commit()
+        _legacy_row(Paiements, "other-mid", "gone")
+
+        assert ext.get_session("gone")["merchants_id"] == "other-mid"
+        assert ext._router.lookup("gone")[0] is Paiements
+
+    def test_unknown_id_returns_none(self, merchants_app):
+        _app, ext = merchants_app
+        assert ext.get_session("missing") is None
+        assert ext.update_state("missing", "failed") is False
+
+    def test_create_routes_payment(self, merchants_app):
+        _app, ext = merchants_app
+        payment = Paiements.create(
+            amount=1000,
+            currency="CLP",
+            provider="dummy",
+            success_url="https://example.com/ok",
+            cancel_url="https://example.com/cancel",
+        )
+        assert ext._router.lookup(payment.merchants_id) == (Paiements, (payment.id,))
+        assert ext._router.lookup(payment.transaction_id) == (Paiements, (payment.id,))
@@ -0,0 +1,211 @@
+"""Tests for FlaskMerchants.iter_sessions, session counts and the streaming payment export."""
+
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask_admin import Admin
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Integer, event
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from flask_merchants import FlaskMerchants
+from flask_merchants.contrib.sqla import PaymentModelView
+from flask_merchants.models import PaymentMixin
+from merchants.providers.dummy import DummyProvider
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+class Pagos(PaymentMixin, db.Model):
+    __tablename__ = "export_pagos"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+class Paiements(PaymentMixin, db.Model):
+    __tablename__ = "export_paiements"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+T0 = datetime(2025, 1, 1, 12, 0, 0)
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def merchants_app():
+    """Flask app with two payment models and an admin export view."""
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SECRET_KEY="test-secret", SQLALCHEMY_DATABASE_URI="sqlite:///:memory:")
+    db.init_app(app)
+    ext = FlaskMerchants()
+    ext.init_app(app, db=db, models=[Pagos, Paiements], providers=[DummyProvider()])
+    admin = Admin(app)
+    admin.add_view(PaymentModelView(Pagos, db.session, ext=ext, endpoint="export_pagos"))
+    with app.app_context():
+        db.create_all()
+        yield app, ext
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture()
+def queries(merchants_app):
+    """List collecting the SQL statements executed while the test runs."""
+    statements = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _record)
+    yield statements
+    event.remove(db.engine, "before_cursor_execute", _record)
+
+
+def _payment(model_cls, n, *, minutes=0, state="pending", provider="dummy"):
+    db.session.add(
+        model_cls(
+            merchants_id=f"mid-{model_cls.__tablename__}-{n}",
+            transaction_id=f"tid-{n}",
+            provider=provider,
+            amount=Decimal(1000 + n),
+            currency="CLP",
+            state=state,
+            response_payload={"n": n},
+            created_at=T0 + timedelta(minutes=minutes),
+        )
+    )
+
+
+# ---------------------------------------------------------------------------
+# iter_sessions
+# ---------------------------------------------------------------------------
+
+class TestIterSessions:
+    def test_keyset_pages_cover_ties_exactly_once(self, merchants_app, queries):
+        _app, ext = merchants_app
+        # Seven rows sharing three timestamps, so page boundaries fall inside ties.
+        for n in range(7):
+            _payment(Pagos, n, minutes=n // 3)
+        db.session.commit()
+        queries.clear()
+
+        rows = list(ext.iter_sessions(model_class=Pagos, batch_size=2))
+
+        assert [r["transaction_id"] for r in rows] == [f"tid-{n}" for n in range(7)]
+        assert len(queries) == 4
+        assert rows[0]["amount"] == "1000.00"
+        assert rows[0]["created_at"] == T0.isoformat()
+
+    def test_json_columns_only_when_requested(self, merchants_app, queries):
+        _app, ext = merchants_app
+        _payment(Pagos, 1)
+        db.session.commit()
+        queries.clear()
+
+        (row,) = ext.iter_sessions(model_class=Pagos)
+        assert "response_payload" not in row
+        assert "response_payload" not in queries[0]
+
+        (row,) = ext.iter_sessions(model_class=Pagos, include_payloads=True)
+        assert row["response_payload"] == {"n": 1}
+        assert row["extra_args"] == {}
+
+    def test_filters(self, merchants_app):
+        _app, ext = merchants_app
+        _payment(Pagos, 1, minutes=0, state="succeeded", provider="khipu")
+        _payment(Pagos, 2, minutes=10, state="succeeded", provider="dummy")
+        _payment(Pagos, 3, minutes=20, state="failed", provider="khipu")
+        _payment(Pagos, 4, minutes=30, state="succeeded", provider="khipu")
+        db.session.commit()
+
+        def ids(**filters):
+            return [r["transaction_id"] for r in ext.iter_sessions(**filters)]
+
+        assert ids(state="succeeded", provider="khipu") == ["tid-1", "tid-4"]
+        assert ids(since=T0 + timedelta(minutes=10), until=T0 + timedelta(minutes=30)) == ["tid-2", "tid-3"]
+
+    def test_models_are_merged_by_created_at(self, merchants_app):
+        _app, ext = merchants_app
+        _payment(Pagos, 1, minutes=0)
+        _payment(Paiements, 2, minutes=5)
+        _payment(Pagos, 3, minutes=10)
+        _payment(Paiements, 4, minutes=10)
+        db.session.commit()
+
+        rows = list(ext.iter_sessions(batch_size=1))
+        assert [r["transaction_id"] for r in rows] == ["tid-1", "tid-2", "tid-3", "tid-4"]
+        assert len(ext.all_sessions()) == 4
+
+    def test_counts_by_provider_in_sql(self, merchants_app, queries):
+        _app, ext = merchants_app
+        _payment(Pagos, 1, provider="khipu")
+        _payment(Pagos, 2, provider="khipu")
+        _payment(Paiements, 3, provider="khipu")
+        _payment(Paiements, 4, provider="dummy")
+        db.session.commit()
+        queries.clear()
+
+        assert ext.count_sessions_by_provider() == {"khipu": 3, "dummy": 1}
+        assert ext.count_sessions_by_provider(model_class=Paiements) == {"khipu": 1, "dummy": 1}
+        assert len(queries) == 3
+        assert all("GROUP BY" in q for q in queries)
+
+
+# ---------------------------------------------------------------------------
+# Export endpoint
+# ---------------------------------------------------------------------------
+
+class TestPaymentExport:
+    def test_csv_export(self, merchants_app):
+        app, _ext = merchants_app
+        _payment(Pagos, 1, state="succeeded", provider="khipu")
+        _payment(Pagos, 2, state="failed", provider="khipu")
+        _payment(Paiements, 3, state="succeeded", provider="khipu")
+        db.session.commit()
+
+        resp = app.test_client().get("/admin/export_pagos/stream/csv/?state=succeeded")
+
+        assert resp.status_code == 200
+        assert resp.mimetype == "text/csv"
+        assert "attachment" in resp.headers["Content-Disposition"]
+        rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+        assert [(r["transaction_id"], r["amount"]) for r in rows] == [("tid-1", "1001.00")]
+        assert "response_payload" not in rows[0]
+
+    def test_ndjson_export_with_payloads(self, merchants_app):
+        app, _ext = merchants_app
+        _payment(Pagos, 1, minutes=0)
+        _payment(Pagos, 2, minutes=60)
+        db.session.commit()
+
+        resp = app.test_client().get(
+            "/admin/export_pagos/stream/ndjson/?payloads=1&since=2025-01-01T12:30:00"
+        )
+
+        lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+        assert [(r["transaction_id"], r["response_payload"]) for r in lines] == [("tid-2", {"n": 2})]
+
+    def test_empty_csv_has_header(self, merchants_app):
+        app, _ext = merchants_app
+        resp = app.test_client().get("/admin/export_pagos/stream/csv/")
+        assert resp.get_data(as_text=True).strip() == ",".join(
+            ["merchants_id", "transaction_id", "provider", "amount", "currency", "state", "email", "created_at"]
+        )
+
+    def test_rejects_bad_format_and_dates(self, merchants_app):
+        app, _ext = merchants_app
+        client = app.test_client()
+        assert client.get("/admin/export_pagos/stream/xlsx/").status_code == 404
+        assert client.get("/admin/export_pagos/stream/csv/?since=yesterday").status_code == 400
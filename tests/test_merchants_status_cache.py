@@ -0,0 +1,179 @@
+"""Tests for the provider status cache (merchants/cache.py) and its use by FlaskMerchants."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from flask_merchants import FlaskMerchants
+from merchants import Client, StatusCache
+from merchants.models import PaymentState, WebhookEvent
+from merchants.providers.dummy import DummyProvider
+
+
+class ContadorProvider(DummyProvider):
+    """Provider counting get_payment calls, each taking *delay* seconds."""
+
+    key = "cache_contador"
+
+    def __init__(self, state=PaymentState.PENDING, delay=0.0):
+        super().__init__(always_state=state)
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+        self._guard = threading.Lock()
+
+    def get_payment(self, payment_id):
+        with self._guard:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("provider down")
+        return super().get_payment(payment_id)
+
+
+# ---------------------------------------------------------------------------
+# StatusCache
+# ---------------------------------------------------------------------------
+
+class TestStatusCache:
+    def test_repeated_lookups_are_cached(self):
+        provider = ContadorProvider()
+        client = Client(provider, status_cache=StatusCache(ttl=60))
+
+        first = client.payments.get("p1")
+        assert client.payments.get("p1") is first
+        client.payments.get("p2")
+        assert provider.calls == 2
+
+    def test_non_final_status_expires_quickly(self):
+        provider = ContadorProvider()
+        client = Client(provider, status_cache=StatusCache(ttl=0.05, final_ttl=60))
+
+        client.payments.get("p1")
+        time.sleep(0.08)
+        client.payments.get("p1")
+        assert provider.calls == 2
+
+    def test_final_status_uses_final_ttl(self):
+        provider = ContadorProvider(state=PaymentState.SUCCEEDED)
+        client = Client(provider, status_cache=StatusCache(ttl=0.01, final_ttl=60))
+
+        client.payments.get("p1")
+        time.sleep(0.03)
+        client.payments.get("p1")
+        assert provider.calls == 1
+
+    def test_zero_ttl_disables(self):
+        provider = ContadorProvider()
+        client = Client(provider, status_cache=StatusCache(ttl=0))
+        client.payments.get("p1")
+        client.payments.get("p1")
+        assert provider.calls == 2
+
+    def test_concurrent_lookups_share_one_call(self):
+        provider = ContadorProvider(delay=0.1)
+        cache = StatusCache()
+        client = Client(provider, status_cache=cache)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(client.payments.get("p1"))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert provider.calls == 1
+        assert len({id(r) for r in results}) == 1
+        assert cache.stats()["coalesced"] == 7
+
+    def test_errors_are_shared_and_not_cached(self):
+        provider = ContadorProvider(delay=0.05)
+        provider.fail = True
+        client = Client(provider, status_cache=StatusCache())
+        errors = []
+
+        def _get():
+            try:
+                client.payments.get("p1")
+            except ConnectionError as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=_get) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(errors) == 4 and provider.calls == 1
+
+        provider.fail = False
+        assert client.payments.get("p1").state is PaymentState.PENDING
+        assert provider.calls == 2
+
+    def test_keyed_by_provider(self):
+        cache = StatusCache()
+        uno, otro = ContadorProvider(), DummyProvider(always_state=PaymentState.FAILED)
+        assert Client(uno, status_cache=cache).payments.get("p1").state is PaymentState.PENDING
+        assert Client(otro, status_cache=cache).payments.get("p1").state is PaymentState.FAILED
+
+    def test_lru_bound(self):
+        provider = ContadorProvider()
+        cache = StatusCache(maxsize=2)
+        client = Client(provider, status_cache=cache)
+        for pid in ("p1", "p2", "p3"):
+            client.payments.get(pid)
+        assert len(cache) == 2
+        assert cache.get(provider.key, "p1") is None
+
+    def test_async_lookups_are_coalesced(self):
+        provider = ContadorProvider(delay=0.05)
+        client = Client(provider, status_cache=StatusCache())
+
+        async def _run():
+            return await asyncio.gather(*(client.payments.aget("p1") for _ in range(5)))
+
+        statuses = asyncio.run(_run())
+        assert provider.calls == 1
+        assert len({id(s) for s in statuses}) == 1
+        assert client.payments.get("p1") is statuses[0]
+
+
+# ---------------------------------------------------------------------------
+# FlaskMerchants
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def merchants_app():
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SECRET_KEY="test-secret", MERCHANTS_STATUS_CACHE_TTL=60)
+    provider = ContadorProvider()
+    ext = FlaskMerchants(app, provider=provider)
+    return app, ext, provider
+
+
+class TestExtensionCache:
+    def test_status_endpoint_polls_are_cached(self, merchants_app):
+        app, ext, provider = merchants_app
+        client = app.test_client()
+        for _ in range(3):
+            assert client.get("/merchants/status/p1").status_code == 200
+        assert provider.calls == 1
+        assert ext.status_cache.ttl == 60
+
+    def test_clients_share_the_cache(self, merchants_app):
+        _app, ext, provider = merchants_app
+        ext.client.payments.get("p1")
+        ext.get_client(provider.key).payments.get("p1")
+        assert provider.calls == 1
+
+    def test_webhook_invalidates(self, merchants_app):
+        app, ext, provider = merchants_app
+        ext.client.payments.get("p1")
+        event = WebhookEvent(
+            event_type="payment.succeeded", payment_id="p1", state=PaymentState.SUCCEEDED, provider=provider.key
+        )
+        with app.test_request_context():
+            ext._apply_webhook_state(ext._webhook_context(event))
+        ext.client.payments.get("p1")
+        assert provider.calls == 2
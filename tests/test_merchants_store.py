@@ -0,0 +1,231 @@
+"""Tests for the FlaskMerchants checkout session stores (flask_merchants/store.py)."""
+
+import fnmatch
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+
+import merchants
+from flask_merchants import FlaskMerchants
+from flask_merchants.store import MemorySessionStore, RedisSessionStore
+from merchants.providers.dummy import DummyProvider
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr("flask_merchants.store.time.monotonic", c)
+    return c
+
+
+class _FakeRedis:
+    """The handful of redis-py commands RedisSessionStore uses, without a server."""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+        self.versions = {}
+        self.on_watch = None  # called after WATCH, to simulate a concurrent writer
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, keepttl=False):
+        self.data[key] = value.encode()
+        self.versions[key] = self.versions.get(key, 0) + 1
+        if not keepttl:
+            self.expiry[key] = ex
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [k for k in self.data if fnmatch.fnmatch(k, match)]
+
+    def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    """WATCH/MULTI/EXEC over :class:`_FakeRedis`: EXEC fails if a watched key changed."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.watched = {}
+        self.queued = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.watched, self.queued = {}, []
+
+    def watch(self, key):
+        self.watched = {key: self.redis.versions.get(key, 0)}
+        if self.redis.on_watch is not None:
+            self.redis.on_watch()
+
+    def get(self, key):
+        return self.redis.get(key)
+
+    def multi(self):
+        self.queued = []
+
+    def set(self, *args, **kwargs):
+        self.queued.append((args, kwargs))
+
+    def execute(self):
+        from redis.exceptions import WatchError
+
+        queued, self.queued = self.queued, []
+        if any(self.redis.versions.get(k, 0) != v for k, v in self.watched.items()):
+            raise WatchError("watched key changed")
+        for args, kwargs in queued:
+            self.redis.set(*args, **kwargs)
+
+
+def _ext(**config):
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SECRET_KEY="test-secret", **config)
+    ext = FlaskMerchants()
+    ext.init_app(app, providers=[DummyProvider()])
+    return ext
+
+
+def _checkout(session_id):
+    return merchants.CheckoutSession(
+        session_id=session_id,
+        redirect_url="https://dummy.example/pay",
+        provider="dummy",
+        amount=Decimal("1000"),
+        currency="CLP",
+        raw={},
+    )
+
+
+# ---------------------------------------------------------------------------
+# MemorySessionStore
+# ---------------------------------------------------------------------------
+
+class TestMemorySessionStore:
+    def test_evicts_least_recently_used(self, clock):
+        store = MemorySessionStore(maxsize=2)
+        store.set("a", {"state": "pending"})
+        store.set("b", {"state": "pending"})
+        store.get("a")
+        store.set("c", {"state": "pending"})
+
+        assert store.get("b") is None
+        assert [d["state"] for d in store.values()] == ["pending", "pending"]
+        assert store.stats()["evictions"] == 1
+
+    def test_entries_expire_after_ttl(self, clock):
+        store = MemorySessionStore(ttl=60)
+        store.set("a", {"state": "pending"})
+        clock.now += 30
+        assert store.update("a", state="succeeded") is True
+        clock.now += 31
+        assert store.get("a") is None
+        assert store.update("a", state="failed") is False
+        assert store.stats()["expirations"] == 1
+
+    def test_values_skip_expired_entries(self, clock):
+        store = MemorySessionStore(ttl=60)
+        store.set("old", {"id": "old"})
+        clock.now += 61
+        store.set("new", {"id": "new"})
+        assert store.values() == [{"id": "new"}]
+        assert len(store) == 1
+
+    def test_returns_copies_and_counts_hits(self, clock):
+        store = MemorySessionStore()
+        store.set("a", {"state": "pending"})
+        store.get("a")["state"] = "tampered"
+        assert store.get("a") == {"state": "pending"}
+        store.get("missing")
+        stats = store.stats()
+        assert (stats["hits"], stats["misses"], stats["size"]) == (2, 1, 1)
+
+
+# ---------------------------------------------------------------------------
+# RedisSessionStore
+# ---------------------------------------------------------------------------
+
+class TestRedisSessionStore:
+    def test_round_trip_and_update_keeps_ttl(self):
+        client = _FakeRedis()
+        store = RedisSessionStore(client=client, ttl=120)
+        store.set("a", {"state": "pending", "amount": "10.00"})
+        assert client.expiry["merchants:session:a"] == 120
+
+        assert store.update("a", state="succeeded") is True
+        assert store.get("a") == {"state": "succeeded", "amount": "10.00"}
+        assert client.expiry["merchants:session:a"] == 120
+        assert store.update("missing", state="failed") is False
+
+    def test_update_retries_after_a_concurrent_write(self):
+        client = _FakeRedis()
+        store = RedisSessionStore(client=client)
+        store.set("a", {"state": "pending", "notified": False})
+        writes = [lambda: store.set("a", {"state": "pending", "notified": True})]
+        client.on_watch = lambda: writes and writes.pop()()
+
+        assert store.update("a", state="succeeded") is True
+        assert store.get("a") == {"state": "succeeded", "notified": True}
+
+    def test_values_and_delete(self):
+        store = RedisSessionStore(client=_FakeRedis())
+        store.set("a", {"id": "a"})
+        store.set("b", {"id": "b"})
+        store.delete("a")
+        assert store.values() == [{"id": "b"}]
+        assert store.stats() == {"size": 1}
+
+
+# ---------------------------------------------------------------------------
+# FlaskMerchants integration
+# ---------------------------------------------------------------------------
+
+class TestFlaskMerchantsSessionStore:
+    def test_store_built_from_config(self):
+        ext = _ext(MERCHANTS_SESSION_STORE_SIZE=5, MERCHANTS_SESSION_STORE_TTL=10)
+        assert isinstance(ext.session_store, MemorySessionStore)
+        assert (ext.session_store.maxsize, ext.session_store.ttl) == (5, 10)
+
+    def test_explicit_store_wins(self):
+        store = RedisSessionStore(client=_FakeRedis())
+        app = Flask(__name__)
+        ext = FlaskMerchants(store=store)
+        ext.init_app(app, providers=[DummyProvider()])
+        ext.save_session(_checkout("sess_1"))
+        assert ext.session_store is store
+        assert len(store.values()) == 1
+
+    def test_session_lifecycle_without_db_is_bounded(self):
+        ext = _ext(MERCHANTS_SESSION_STORE_SIZE=2)
+        for i in range(3):
+            ext.save_session(_checkout(f"sess_{i}"))
+
+        sessions = ext.all_sessions()
+        assert [s["transaction_id"] for s in sessions] == ["sess_1", "sess_2"]
+        merchants_id = sessions[0]["merchants_id"]
+
+        assert ext.update_state(merchants_id, "succeeded") is True
+        assert ext.get_session(merchants_id)["state"] == "succeeded"
+        assert ext.update_state("evicted-or-unknown", "failed") is False
@@ -0,0 +1,254 @@
+"""Tests for the concurrent provider sync engine (flask_merchants/sync.py)."""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Integer, event as sa_event
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from flask_merchants import FlaskMerchants
+from flask_merchants.models import PaymentMixin
+from flask_merchants.sync import RateLimiter
+from merchants.models import PaymentState
+from merchants.providers.dummy import DummyProvider
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+class Pagos(PaymentMixin, db.Model):
+    __tablename__ = "sync_pagos"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+class LentoProvider(DummyProvider):
+    """Slow provider recording how many calls run at once."""
+
+    key = "sync_lento"
+
+    def __init__(self, delay=0.05, **kwargs):
+        super().__init__(always_state=PaymentState.FAILED, **kwargs)
+        self.delay = delay
+        self.calls = []
+        self.inside = 0
+        self.peak = 0
+        self._guard = threading.Lock()
+
+    def get_payment(self, payment_id):
+        with self._guard:
+            self.calls.append(payment_id)
+            self.inside += 1
+            self.peak = max(self.peak, self.inside)
+        try:
+            if payment_id.startswith("boom"):
+                raise ConnectionError("provider down")
+            time.sleep(self.delay)
+            return super().get_payment(payment_id)
+        finally:
+            with self._guard:
+                self.inside -= 1
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def merchants_app():
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY="test-secret",
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        MERCHANTS_SYNC_WORKERS=4,
+        MERCHANTS_SYNC_RATE_LIMIT=0,
+        MERCHANTS_SYNC_CHUNK_SIZE=2,
+    )
+    db.init_app(app)
+    lento = LentoProvider()
+    ext = FlaskMerchants()
+    ext.init_app(
+        app,
+        db=db,
+        models=[Pagos],
+        providers=[DummyProvider(always_state=PaymentState.SUCCEEDED), lento],
+    )
+    with app.app_context():
+        db.create_all()
+        yield app, ext, lento
+        db.session.remove()
+        db.drop_all()
+
+
+def _payment(transaction_id, provider="sync_lento", state="pending", created_at=None):
+    pago = Pagos(
+        merchants_id=f"mid-{transaction_id}",
+        transaction_id=transaction_id,
+        provider=provider,
+        amount=Decimal("1000"),
+        currency="CLP",
+        state=state,
+    )
+    if created_at is not None:
+        pago.created_at = created_at
+    db.session.add(pago)
+    db.session.commit()
+    return pago
+
+
+def _states():
+    return dict(db.session.execute(db.select(Pagos.transaction_id, Pagos.state)).all())
+
+
+# ---------------------------------------------------------------------------
+# RateLimiter
+# ---------------------------------------------------------------------------
+
+class TestRateLimiter:
+    def test_spaces_calls(self):
+        limiter = RateLimiter(50)
+        inicio = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        assert time.monotonic() - inicio >= 4 / 50 - 0.005
+
+    def test_zero_is_unlimited(self):
+        limiter = RateLimiter(0)
+        inicio = time.monotonic()
+        for _ in range(100):
+            limiter.acquire()
+        assert time.monotonic() - inicio < 0.05
+
+
+# ---------------------------------------------------------------------------
+# sync_payments
+# ---------------------------------------------------------------------------
+
+class TestSyncPayments:
+    def test_uses_each_payments_provider(self, merchants_app):
+        _app, ext, lento = merchants_app
+        pagos = [_payment("d1", provider="dummy"), _payment("l1")]
+
+        results = ext.sync_payments(pagos)
+
+        assert [(r.old_state, r.new_state, r.changed) for r in results] == [
+            ("pending", "succeeded", True),
+            ("pending", "failed", True),
+        ]
+        assert lento.calls == ["l1"]
+        assert _states() == {"d1": "succeeded", "l1": "failed"}
+
+    def test_calls_run_concurrently(self, merchants_app):
+        _app, ext, lento = merchants_app
+        pagos = [_payment(f"l{i}") for i in range(8)]
+
+        inicio = time.perf_counter()
+        ext.sync_payments(pagos)
+        elapsed = time.perf_counter() - inicio
+
+        assert 1 < lento.peak <= 4
+        assert elapsed < 8 * lento.delay
+
+    def test_one_transaction_per_chunk(self, merchants_app):
+        _app, ext, _lento = merchants_app
+        pagos = [_payment(f"l{i}") for i in range(5)]
+        commits = []
+
+        def _record(session):
+            commits.append(session)
+
+        sa_event.listen(db.session, "after_commit", _record)
+        try:
+            ext.sync_payments(pagos)
+        finally:
+            sa_event.remove(db.session, "after_commit", _record)
+        assert len(commits) == 3  # chunk size 2
+
+    def test_errors_leave_state_untouched(self, merchants_app):
+        _app, ext, _lento = merchants_app
+        pagos = [_payment("boom1"), _payment("x1", provider="no_such_provider"), _payment("l1")]
+
+        results = ext.sync_payments(pagos)
+
+        assert "provider down" in results[0].error
+        assert results[1].error is not None
+        assert results[2].changed
+        assert _states() == {"boom1": "pending", "x1": "pending", "l1": "failed"}
+
+    def test_handlers_run_for_changes_only(self, merchants_app):
+        _app, ext, _lento = merchants_app
+        seen = []
+        ext.add_sync_handler(lambda result: seen.append(result.payment.transaction_id))
+        pagos = [_payment("l1"), _payment("l2", state="failed")]
+
+        results = ext.sync_payments(pagos)
+
+        assert [r.changed for r in results] == [True, False]
+        assert seen == ["l1"]
+
+    def test_state_moved_meanwhile_is_superseded(self, merchants_app):
+        app, ext, lento = merchants_app
+        seen = []
+        ext.add_sync_handler(lambda result: seen.append(result.payment.transaction_id))
+        pagos = [_payment("l1"), _payment("l2")]
+        fetch = lento.get_payment
+
+        def _webhook_first(payment_id):
+            # A webhook stores l1's final state while the provider call is in flight.
+            if payment_id == "l1":
+                with app.app_context():
+                    db.session.execute(db.update(Pagos).where(Pagos.transaction_id == "l1").values(state="succeeded"))
+                    db.session.commit()
+            return fetch(payment_id)
+
+        lento.get_payment = _webhook_first
+        results = ext.sync_payments(pagos)
+
+        assert [(r.superseded, r.changed) for r in results] == [(True, False), (False, True)]
+        assert seen == ["l2"]
+        assert _states() == {"l1": "succeeded", "l2": "failed"}
+
+    def test_requires_db(self):
+        ext = FlaskMerchants(Flask(__name__), providers=[DummyProvider()])
+        with pytest.raises(RuntimeError):
+            ext.sync_payments([])
+
+
+# ---------------------------------------------------------------------------
+# Stuck payments and the CLI sweeper
+# ---------------------------------------------------------------------------
+
+class TestSweeper:
+    def test_find_stuck_payments(self, merchants_app):
+        _app, ext, _lento = merchants_app
+        old = datetime(2026, 1, 1)
+        _payment("viejo", created_at=old)
+        _payment("nuevo", state="processing", created_at=old + timedelta(days=30))
+        _payment("listo", state="succeeded", created_at=old + timedelta(days=30))
+
+        stuck = ext.find_stuck_payments()
+        assert [p.transaction_id for p in stuck] == ["viejo", "nuevo"]
+        recent = ext.find_stuck_payments(since=old + timedelta(days=1))
+        assert [p.transaction_id for p in recent] == ["nuevo"]
+
+    def test_cli_syncs_stuck_payments(self, merchants_app):
+        app, _ext, lento = merchants_app
+        _payment("l1")
+        _payment("l2", state="processing")
+        _payment("l3", state="succeeded")
+
+        result = app.test_cli_runner().invoke(args=["merchants", "payments", "sync", "--state", "pending"])
+
+        assert result.exit_code == 0, result.output
+        assert "Checked 1 payments: 1 changed, 0 failed." in result.output
+        assert lento.calls == ["l1"]
+        assert _states() == {"l1": "failed", "l2": "processing", "l3": "succeeded"}
@@ -0,0 +1,339 @@
+"""Tests for the HTTP transports (merchants/transport.py) and the async provider API."""
+
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from merchants import Client
+from merchants.cassette import CassetteMiss, RecordingTransport, ReplayTransport, load_cassette
+from merchants.models import PaymentState
+from merchants.providers.dummy import DummyProvider
+from merchants.providers.generic import GenericProvider
+from merchants.providers.stripe import StripeProvider
+from merchants.transport import (
+    AsyncTransport,
+    HttpResponse,
+    RequestsTransport,
+    ThreadedAsyncTransport,
+    TransportError,
+    _parse_retry_after,
+    default_async_transport,
+    default_transport,
+    set_default_transport,
+)
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    """Answers from the server's ``script``: a list of (status, headers) per request."""
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.server.requests.append((self.command, self.path))
+        status, headers = self.server.script.pop(0) if self.server.script else (200, {})
+        body = json.dumps({"status": "paid", "attempt": len(self.server.requests)}).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.requests = []
+    httpd.script = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _transport(**kwargs):
+    kwargs.setdefault("backoff", 0.001)
+    return RequestsTransport(**kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Retries
+# ---------------------------------------------------------------------------
+
+class TestRetries:
+    def test_get_is_retried_on_503(self, server):
+        server.script = [(503, {}), (503, {})]
+        resp = _transport(max_retries=2).send("GET", f"{server.url}/pay/1")
+        assert resp.status_code == 200
+        assert resp.body["attempt"] == 3
+
+    def test_gives_up_after_max_retries(self, server):
+        server.script = [(503, {})] * 5
+        resp = _transport(max_retries=1).send("GET", f"{server.url}/pay/1")
+        assert resp.status_code == 503
+        assert len(server.requests) == 2
+
+    def test_post_is_not_retried(self, server):
+        server.script = [(503, {})]
+        resp = _transport().send("POST", f"{server.url}/checkout", json={})
+        assert resp.status_code == 503
+        assert len(server.requests) == 1
+
+    def test_post_with_idempotency_key_is_retried(self, server):
+        server.script = [(502, {})]
+        resp = _transport().send("POST", f"{server.url}/checkout", json={}, headers={"Idempotency-Key": "k1"})
+        assert resp.status_code == 200
+        assert len(server.requests) == 2
+
+    def test_long_retry_after_is_not_waited(self, server):
+        server.script = [(429, {"Retry-After": "120"})]
+        resp = _transport(backoff_max=1).send("GET", f"{server.url}/pay/1")
+        assert resp.status_code == 429
+        assert len(server.requests) == 1
+
+    def test_short_retry_after_is_honoured(self, server):
+        server.script = [(429, {"Retry-After": "0"})]
+        resp = _transport().send("GET", f"{server.url}/pay/1")
+        assert resp.status_code == 200
+
+    def test_retry_after_past_the_deadline_is_not_waited(self, server):
+        server.script = [(503, {"Retry-After": "1"})]
+        resp = _transport(deadline=0.5).send("GET", f"{server.url}/pay/1")
+        assert resp.status_code == 503
+        assert len(server.requests) == 1
+
+    def test_read_timeout_is_not_retried_past_the_deadline(self):
+        silent = socket.socket()
+        silent.bind(("127.0.0.1", 0))
+        silent.listen()  # accepts connections, never answers
+        transport = _transport(read_timeout=0.2, deadline=0.3)
+        timings = []
+        transport.add_hook(timings.append)
+        try:
+            inicio = time.perf_counter()
+            with pytest.raises(TransportError):
+                transport.send("GET", f"http://127.0.0.1:{silent.getsockname()[1]}/pay/1")
+            assert time.perf_counter() - inicio < 0.6
+            assert len(timings) == 1
+        finally:
+            silent.close()
+
+    def test_connection_error_raises_transport_error(self):
+        with pytest.raises(TransportError):
+            _transport(max_retries=1).send("GET", "http://127.0.0.1:9/unreachable")
+
+    def test_parse_retry_after(self):
+        assert _parse_retry_after("7") == 7.0
+        assert _parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+        assert _parse_retry_after("soon") is None
+
+
+# ---------------------------------------------------------------------------
+# Timing hooks, timeouts and the shared instance
+# ---------------------------------------------------------------------------
+
+class TestTransportHooks:
+    def test_hooks_see_every_attempt(self, server):
+        server.script = [(503, {})]
+        transport = _transport()
+        timings = []
+        transport.add_hook(timings.append)
+        transport.add_hook(lambda t: 1 / 0)  # a failing hook is ignored
+
+        transport.send("GET", f"{server.url}/pay/1?expand=true")
+
+        assert [(t.status_code, t.attempt) for t in timings] == [(503, 1), (200, 2)]
+        assert timings[0].url == f"{server.url}/pay/1"
+        assert all(t.elapsed >= 0 for t in timings)
+
+    def test_tune_sets_host_timeout(self):
+        transport = _transport(connect_timeout=1, read_timeout=2)
+        transport.tune("api.example.com", pool_maxsize=32, timeout=(3, 4))
+        assert transport._host_timeouts == {"api.example.com": (3, 4)}
+        adapter = transport._session.get_adapter("https://api.example.com/v1")
+        assert adapter._pool_maxsize == 32
+        assert transport._session.get_adapter("https://other.example.com/")._pool_maxsize == 10
+
+
+class TestDefaultTransport:
+    def test_providers_share_one_transport(self):
+        set_default_transport(None)
+        try:
+            stripe = StripeProvider("sk_test")
+            generic = GenericProvider("https://x/checkout", "https://x/pay/{payment_id}")
+            assert stripe._transport is generic._transport is default_transport()
+        finally:
+            set_default_transport(None)
+
+    def test_explicit_transport_wins(self):
+        transport = _transport()
+        assert StripeProvider("sk_test", transport=transport)._transport is transport
+
+
+# ---------------------------------------------------------------------------
+# Async transports and the async provider API
+# ---------------------------------------------------------------------------
+
+class _FakeAsyncTransport(AsyncTransport):
+    """Answers every request after *delay* seconds without blocking the loop."""
+
+    def __init__(self, body, delay=0.0):
+        self.body = body
+        self.delay = delay
+        self.requests = []
+
+    async def send(self, method, url, *, headers=None, json=None, params=None, timeout=None):
+        self.requests.append((method, url, json))
+        await asyncio.sleep(self.delay)
+        return HttpResponse(200, {}, self.body)
+
+
+class TestAsyncProviders:
+    def test_threaded_transport_keeps_retries(self, server):
+        server.script = [(503, {})]
+        transport = ThreadedAsyncTransport(_transport())
+        resp = asyncio.run(transport.send("GET", f"{server.url}/pay/1"))
+        assert resp.status_code == 200
+        assert len(server.requests) == 2
+
+    def test_native_async_checkout_and_status(self):
+        transport = _FakeAsyncTransport({"id": "cs_1", "url": "https://pay/cs_1", "status": "succeeded"})
+        stripe = StripeProvider("sk_test", async_transport=transport)
+
+        async def _run():
+            session = await stripe.acreate_checkout(10, "usd", "https://ok", "https://ko")
+            status = await stripe.aget_payment("pi_1")
+            return session, status
+
+        session, status = asyncio.run(_run())
+        assert (session.session_id, session.redirect_url) == ("cs_1", "https://pay/cs_1")
+        assert status.state is PaymentState.SUCCEEDED
+        assert transport.requests[0][2]["line_items"][0]["price_data"]["unit_amount"] == 1000
+        assert transport.requests[1][:2] == ("GET", "https://api.stripe.com/v1/payment_intents/pi_1")
+
+    def test_injected_transport_serves_async_calls(self, server):
+        generic = GenericProvider(
+            f"{server.url}/checkout", f"{server.url}/pay/{{payment_id}}", transport=_transport(max_retries=0)
+        )
+        assert isinstance(generic._async_transport, ThreadedAsyncTransport)
+        asyncio.run(generic.aget_payment("p1"))
+        assert server.requests == [("GET", "/pay/p1")]
+
+    def test_concurrent_calls_share_the_loop(self):
+        transport = _FakeAsyncTransport({"status": "pending"}, delay=0.05)
+        client = Client(GenericProvider("https://x/checkout", "https://x/pay/{payment_id}", async_transport=transport))
+
+        async def _run():
+            return await asyncio.gather(*(client.payments.aget(f"p{i}") for i in range(10)))
+
+        inicio = time.perf_counter()
+        statuses = asyncio.run(_run())
+        assert len(statuses) == 10
+        assert time.perf_counter() - inicio < 10 * 0.05
+
+    def test_blocking_provider_runs_in_a_thread(self):
+        callers = []
+
+        class _Blocking(DummyProvider):
+            key = "transport_blocking"
+
+            def get_payment(self, payment_id):
+                callers.append(threading.get_ident())
+                return super().get_payment(payment_id)
+
+        status = asyncio.run(_Blocking(always_state=PaymentState.FAILED).aget_payment("p1"))
+        assert status.state is PaymentState.FAILED
+        assert callers and callers[0] != threading.get_ident()
+
+    def test_default_async_transport_without_httpx(self, monkeypatch):
+        monkeypatch.setitem(sys.modules, "httpx", None)  # import fails as if not installed
+
+        async def _default():
+            return default_async_transport()
+
+        assert isinstance(asyncio.run(_default()), ThreadedAsyncTransport)
+
+
+# ---------------------------------------------------------------------------
+# Record / replay
+# ---------------------------------------------------------------------------
+
+class TestCassette:
+    def _record(self, server, tmp_path):
+        path = tmp_path / "generic.jsonl"
+        generic = GenericProvider(
+            f"{server.url}/checkout",
+            f"{server.url}/pay/{{payment_id}}",
+            transport=RecordingTransport(path, _transport(max_retries=0)),
+            extra_headers={"Authorization": "Bearer secret"},
+        )
+        generic.create_checkout(Decimal("9.99"), "USD", "https://ok", "https://ko", {"order": "1"})
+        generic.get_payment("p1")
+        generic.get_payment("p1")
+        return path
+
+    def test_records_compact_exchanges(self, server, tmp_path):
+        exchanges = load_cassette(self._record(server, tmp_path))
+        assert [(e["method"], e["status"]) for e in exchanges] == [("POST", 200), ("GET", 200), ("GET", 200)]
+        assert exchanges[0]["json"]["amount"] == "9.99"
+        assert exchanges[1]["headers"] == {"Content-Type": "application/json"}
+        assert "secret" not in (tmp_path / "generic.jsonl").read_text()
+
+    def test_replays_offline_in_recorded_order(self, server, tmp_path):
+        path = self._record(server, tmp_path)
+        transport = ReplayTransport(path, latency=0)
+        generic = GenericProvider(f"{server.url}/checkout", f"{server.url}/pay/{{payment_id}}", transport=transport)
+        seen = len(server.requests)
+
+        session = generic.create_checkout(Decimal("9.99"), "USD", "https://ok", "https://ko", {"order": "1"})
+        attempts = [generic.get_payment("p1").raw["attempt"] for _ in range(3)]
+
+        assert session.provider == "generic"
+        assert attempts == [2, 3, 2]  # recordings cycle
+        assert len(server.requests) == seen
+        with pytest.raises(CassetteMiss):
+            generic.get_payment("p2")
+
+    def test_injected_latency_and_errors(self):
+        exchange = {"method": "GET", "url": "https://x/pay/1", "status": 200, "body": {"status": "paid"}, "elapsed": 5}
+        timings = []
+        transport = ReplayTransport([exchange], latency=(0.01, 0.02), error_rate=0.5, seed=3)
+        transport.add_hook(timings.append)
+
+        failures = 0
+        for _ in range(20):
+            try:
+                transport.send("GET", "https://x/pay/1")
+            except TransportError:
+                failures += 1
+
+        assert failures == transport.injected_errors
+        assert 3 < failures < 17
+        assert all(0.01 <= t.elapsed <= 0.02 for t in timings)
+        resp = ReplayTransport([exchange], latency=0, error_rate=1, error_status=503).send("GET", "https://x/pay/1")
+        assert resp.status_code == 503
+
+    def test_recorded_network_errors_replay(self):
+        exchange = {"method": "GET", "url": "https://x/pay/1", "error": "read timed out", "elapsed": 0}
+        with pytest.raises(TransportError, match="read timed out"):
+            ReplayTransport([exchange]).send("GET", "https://x/pay/1")
@@ -0,0 +1,182 @@
+"""Tests for the per-delivery WebhookContext (flask_merchants/context.py)."""
+
+import json
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Integer
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from flask_merchants import FlaskMerchants
+from flask_merchants.context import WebhookContext
+from flask_merchants.inbox import WebhookInboxMixin
+from flask_merchants.models import PaymentMixin
+from merchants.models import PaymentState, WebhookEvent
+from merchants.providers.dummy import DummyProvider
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+class Pagos(PaymentMixin, db.Model):
+    __tablename__ = "context_pagos"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+class Entradas(WebhookInboxMixin, db.Model):
+    __tablename__ = "context_entradas"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+def _make_app(**init_kwargs):
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY="test-secret",
+        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
+        MERCHANTS_WEBHOOK_WORKERS=0,
+    )
+    db.init_app(app)
+    ext = FlaskMerchants()
+    ext.init_app(app, db=db, models=[Pagos], providers=[DummyProvider()], **init_kwargs)
+    return app, ext
+
+
+@pytest.fixture(params=["inline", "inbox"])
+def merchants_app(request):
+    """App processing webhooks inside the request, or through an inline inbox."""
+    kwargs = {"inbox_model": Entradas} if request.param == "inbox" else {}
+    app, ext = _make_app(**kwargs)
+    with app.app_context():
+        db.create_all()
+        db.session.add(
+            Pagos(
+                merchants_id="mid-1",
+                transaction_id="pay_1",
+                provider="dummy",
+                amount=Decimal("1000"),
+                currency="CLP",
+                state="pending",
+            )
+        )
+        db.session.commit()
+        yield app, ext
+        db.session.remove()
+        db.drop_all()
+
+
+def _deliver(app, headers=None):
+    body = json.dumps({"event_id": "evt_1", "payment_id": "pay_1", "event_type": "payment.succeeded"})
+    return app.test_client().post(
+        "/merchants/webhook/dummy", data=body, content_type="application/json", headers=headers or {}
+    )
+
+
+def _event(**overrides):
+    fields = dict(
+        event_id="evt_1",
+        event_type="payment.succeeded",
+        payment_id="pay_1",
+        state=PaymentState.SUCCEEDED,
+        provider="dummy",
+    )
+    fields.update(overrides)
+    return WebhookEvent(**fields)
+
+
+# ---------------------------------------------------------------------------
+# WebhookContext
+# ---------------------------------------------------------------------------
+
+class TestWebhookContext:
+    def test_exposes_event_attributes(self):
+        ctx = WebhookContext(FlaskMerchants(), _event(), b"{}", {})
+        assert (ctx.event_id, ctx.payment_id, ctx.provider) == ("evt_1", "pay_1", "dummy")
+        assert ctx.state is PaymentState.SUCCEEDED
+        with pytest.raises(AttributeError):
+            ctx.not_an_attribute
+
+    def test_data_falls_back_to_body(self):
+        ctx = WebhookContext(FlaskMerchants(), _event(), b'{"status": "paid"}', {})
+        assert ctx.data == {"status": "paid"}
+        assert WebhookContext(FlaskMerchants(), _event(raw={"a": 1}), b"{}", {}).data == {"a": 1}
+        assert WebhookContext(FlaskMerchants(), _event(), b"not json", {}).data == {}
+
+    def test_signature_timestamp(self):
+        ext = FlaskMerchants()
+        signed = WebhookContext(ext, _event(), b"{}", {"x-khipu-signature": "t=1711965600393,s=abc"})
+        assert signed.signature_timestamp == 1711965600393
+        assert WebhookContext(ext, _event(), b"{}", {"Content-Type": "application/json"}).signature_timestamp is None
+
+    def test_no_payment_without_db(self):
+        ctx = WebhookContext(FlaskMerchants(), _event(), b"{}", {})
+        assert ctx.payment is None
+        assert ctx.entity is None
+
+
+# ---------------------------------------------------------------------------
+# Delivery to handlers
+# ---------------------------------------------------------------------------
+
+class TestWebhookContextDelivery:
+    def test_handlers_share_one_context(self, merchants_app):
+        app, ext = merchants_app
+        seen = []
+        ext.add_webhook_handler(seen.append)
+        ext.add_webhook_handler(seen.append)
+
+        resp = _deliver(app, headers={"X-Test-Signature": "t=42,s=x"})
+
+        assert resp.status_code == 200
+        first, second = seen
+        assert first is second
+        assert isinstance(first, WebhookContext)
+        assert json.loads(first.body)["event_id"] == "evt_1"
+        assert first.headers["X-Test-Signature"] == "t=42,s=x"
+        assert first.signature_timestamp == 42
+
+    def test_payment_and_entity_are_loaded_once(self, merchants_app):
+        app, ext = merchants_app
+        lookups, loads, seen = [], [], []
+        find_payment = ext._find_payment
+
+        def _counting_find(payment_id):
+            lookups.append(payment_id)
+            return find_payment(payment_id)
+
+        ext._find_payment = _counting_find
+
+        @ext.webhook_entity_loader
+        def _load(ctx):
+            loads.append(ctx.payment.merchants_id)
+            return {"order": ctx.payment.merchants_id}
+
+        for _ in range(2):
+            ext.add_webhook_handler(lambda ctx: seen.append((ctx.payment.state, ctx.entity)))
+
+        _deliver(app)
+
+        assert lookups == ["pay_1"]
+        assert loads == ["mid-1"]
+        assert seen == [("succeeded", {"order": "mid-1"})] * 2
+
+    def test_unknown_payment(self, merchants_app):
+        app, ext = merchants_app
+        seen = []
+        ext.webhook_entity_loader(lambda ctx: ctx.payment)
+        ext.add_webhook_handler(lambda ctx: seen.append((ctx.payment, ctx.entity)))
+
+        body = json.dumps({"event_id": "evt_2", "payment_id": "missing"})
+        app.test_client().post("/merchants/webhook/dummy", data=body, content_type="application/json")
+
+        assert seen == [(None, None)]
@@ -164,6 +164,130 @@ class TestGetAlumnoConOrden:
         assert result["orden"] is None
 
 
+# ---------------------------------------------------------------------------
+# get_scan_plan
+# ---------------------------------------------------------------------------
+
+class TestGetScanPlan:
+    def _make_menu(self, db_session, slug="menu-test", precio=Decimal("4000")):
+        from app.model import MenuDiario, OpcionMenuDia, Plato, TipoCurso
+        menu = MenuDiario()
+        menu.dia = date.today()
+        menu.slug = slug
+        menu.descripcion = "Menú Scan Test"
+        menu.precio = precio
+        menu.activo = True
+        menu.fuera_stock = False
+        menu.es_permanente = False
+        for orden, (tipo, nombre) in enumerate(
+            [(TipoCurso.ENTRADA, "Ensalada"), (TipoCurso.FONDO, "Cazuela"), (TipoCurso.POSTRE, "Fruta")]
+        ):
+            plato = Plato()
+            plato.nombre = nombre
+            opcion = OpcionMenuDia()
+            opcion.plato = plato
+            opcion.tipo_curso = tipo
+            opcion.orden = orden
+            menu.opciones.append(opcion)
+        db_session.add(menu)
+        db_session.commit()
+        return menu
+
+    def _count_queries(self, db_session, fn):
+        from sqlalchemy import event
+        engine = db_session.get_bind()
+        statements = []
+
+        def _before(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        db_session.expunge_all()
+        event.listen(engine, "before_cursor_execute", _before)
+        try:
+            result = fn()
+        finally:
+            event.remove(engine, "before_cursor_execute", _before)
+        return result, statements
+
+    def test_returns_not_found_for_unknown_tag(self, db_session, sample_apoderado):
+        plan = make_ctrl().get_scan_plan("FFFFFFFF")
+        assert plan["alumno"] is None
+        assert plan["orden"] is None
+        assert plan["ya_entregado"] is False
+        assert plan["menus_disponibles"] == []
+
+    def test_resolves_pending_orden_with_courses(self, db_session, sample_apoderado):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        alumno.tag = "aa11bb22"
+        db_session.commit()
+        self._make_menu(db_session)
+        orden = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        plan = make_ctrl().get_scan_plan("AA11BB22")
+        assert plan["alumno"].id == alumno.id
+        assert plan["orden"].id == orden.id
+        assert plan["ya_entregado"] is False
+        assert plan["courses"] == {"entradas": ["Ensalada"], "fondos": ["Cazuela"], "postres": ["Fruta"]}
+
+    def test_detects_ya_entregado(self, db_session, sample_apoderado):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        alumno.tag = "cc33dd44"
+        db_session.commit()
+        _create_orden_casino(db_session, alumno, EstadoAlmuerzo.ENTREGADO)
+        plan = make_ctrl().get_scan_plan("CC33DD44")
+        assert plan["ya_entregado"] is True
+        assert plan["orden"] is None
+        assert plan["menus_disponibles"] == []
+
+    def test_lists_only_menus_covered_by_saldo(self, db_session, sample_apoderado):
+        sample_apoderado.saldo_cuenta = 4500
+        alumno = sample_apoderado.alumnos[0]
+        alumno.tag = "ee55ff66"
+        db_session.commit()
+        self._make_menu(db_session, slug="menu-barato", precio=Decimal("4000"))
+        self._make_menu(db_session, slug="menu-caro", precio=Decimal("5000"))
+        plan = make_ctrl().get_scan_plan("ee55ff66")
+        assert plan["saldo"] == 4500
+        assert [m.slug for m in plan["menus_disponibles"]] == ["menu-barato"]
+
+    def test_by_id_matches_by_tag(self, db_session, sample_apoderado):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        orden = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        plan = make_ctrl().get_scan_plan_by_id(alumno.id)
+        assert plan["orden"].id == orden.id
+
+    def test_pending_orden_scan_uses_single_query(self, db_session, sample_apoderado):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        alumno.tag = "11223344"
+        db_session.commit()
+        self._make_menu(db_session)
+        _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+
+        def _scan():
+            plan = make_ctrl().get_scan_plan("11223344")
+            # Touch everything the reader serialises; none of it may lazy load.
+            plan["alumno"].apoderado.saldo_cuenta
+            plan["orden"].menu_descripcion
+            return plan
+
+        plan, statements = self._count_queries(db_session, _scan)
+        assert plan["courses"]["fondos"] == ["Cazuela"]
+        assert len(statements) == 1
+
+    def test_credit_scan_stays_within_budget(self, db_session, sample_apoderado):
+        sample_apoderado.saldo_cuenta = 10000
+        alumno = sample_apoderado.alumnos[0]
+        alumno.tag = "55667788"
+        db_session.commit()
+        self._make_menu(db_session)
+        plan, statements = self._count_queries(db_session, lambda: make_ctrl().get_scan_plan("55667788"))
+        assert len(plan["menus_disponibles"]) == 1
+        assert len(statements) <= 2
+
+
 # ---------------------------------------------------------------------------
 # get_alumno_con_orden_by_id
 # ---------------------------------------------------------------------------
@@ -221,6 +345,29 @@ class TestGetAbonoByCodigo:
         assert pago is None
         assert display_code == ""
 
+    def test_finds_abono_by_display_code(self, db_session, sample_apoderado):
+        from app.apoderado.controller import ApoderadoController
+        from app.model import Payment
+        created = ApoderadoController().create_abono(sample_apoderado, Decimal("5000"), "cafeteria")
+        pago = Payment(
+            merchants_id=created.codigo,
+            transaction_id=created.codigo,
+            provider="cafeteria",
+            state="processing",
+            amount=5000,
+            currency="CLP",
+            response_payload={"display_code": "AB12CD"},
+        )
+        db_session.add(pago)
+        db_session.commit()
+        assert pago.display_code == "AB12CD"
+        assert Payment.display_code_exists("ab12cd")
+
+        abono, found, display_code = make_ctrl().get_abono_by_codigo("ab12cd")
+        assert abono.id == created.id
+        assert found.id == pago.id
+        assert display_code == "AB12CD"
+
 
 # ---------------------------------------------------------------------------
 # get_pedido_with_payment
@@ -271,6 +418,136 @@ class TestEntregarAlmuerzo:
         assert result is None
 
 
+# ---------------------------------------------------------------------------
+# entregar_almuerzos
+# ---------------------------------------------------------------------------
+
+class TestEntregarAlmuerzos:
+    def test_delivers_batch_with_client_timestamps(self, db_session, sample_apoderado):
+        from datetime import datetime, timedelta
+        from app.model import EstadoAlmuerzo, OrdenCasino
+        alumno = sample_apoderado.alumnos[0]
+        o1 = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        o2 = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        tap = datetime.now().replace(microsecond=0) - timedelta(minutes=3)
+        resultados = make_ctrl().entregar_almuerzos([(o1.id, tap), (o2.id, None)])
+        assert [r["resultado"] for r in resultados] == ["entregado", "entregado"]
+        db_session.expire_all()
+        assert db_session.get(OrdenCasino, o1.id).estado == EstadoAlmuerzo.ENTREGADO
+        assert db_session.get(OrdenCasino, o1.id).fecha_entrega == tap
+        assert db_session.get(OrdenCasino, o2.id).fecha_entrega is not None
+
+    def test_reports_per_id_outcomes(self, db_session, sample_apoderado):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        pendiente = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        entregada = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.ENTREGADO)
+        cancelada = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.CANCELADO)
+        resultados = make_ctrl().entregar_almuerzos(
+            [(pendiente.id, None), (entregada.id, None), (cancelada.id, None), (999999, None), (pendiente.id, None)]
+        )
+        assert [r["resultado"] for r in resultados] == [
+            "entregado",
+            "ya_entregado",
+            "cancelado",
+            "no_encontrado",
+            "ya_entregado",
+        ]
+
+    def test_replayed_batch_does_not_redeliver(self, db_session, sample_apoderado):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        orden = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        make_ctrl().entregar_almuerzos([(orden.id, None)])
+        resultados = make_ctrl().entregar_almuerzos([(orden.id, None)])
+        assert resultados == [{"orden_id": orden.id, "resultado": "ya_entregado"}]
+
+    def test_future_timestamp_is_clamped(self, db_session, sample_apoderado):
+        from datetime import datetime, timedelta
+        from app.model import EstadoAlmuerzo, OrdenCasino
+        alumno = sample_apoderado.alumnos[0]
+        orden = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        make_ctrl().entregar_almuerzos([(orden.id, datetime.now() + timedelta(days=1))])
+        db_session.expire_all()
+        assert db_session.get(OrdenCasino, orden.id).fecha_entrega <= datetime.now()
+
+    def test_empty_batch_returns_empty_list(self, db_session, app):
+        assert make_ctrl().entregar_almuerzos([]) == []
+
+
+# ---------------------------------------------------------------------------
+# sincronizar_lecturas
+# ---------------------------------------------------------------------------
+
+class TestSincronizarLecturas:
+    def _make_menu(self, db_session, precio=Decimal("4000")):
+        from app.model import MenuDiario
+        menu = MenuDiario()
+        menu.dia = date.today()
+        menu.slug = f"menu-sync-{uuid.uuid4().hex[:8]}"
+        menu.descripcion = "Menú Sync Test"
+        menu.precio = precio
+        menu.activo = True
+        menu.fuera_stock = False
+        menu.es_permanente = False
+        db_session.add(menu)
+        db_session.commit()
+        return menu
+
+    def _scan(self, **kwargs):
+        return {"scan_id": uuid.uuid4().hex, "ts": None, **kwargs}
+
+    def test_delivers_pending_orden_by_serial(self, db_session, sample_apoderado):
+        from app.model import EstadoAlmuerzo, LecturaPos
+        alumno = sample_apoderado.alumnos[0]
+        alumno.tag = "aa11bb22"
+        db_session.commit()
+        orden = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        scan = self._scan(serial="AA11BB22")
+        resultados = make_ctrl().sincronizar_lecturas([scan], lector="lector-1")
+        assert resultados == [{"scan_id": scan["scan_id"], "resultado": "entregado", "orden_id": orden.id}]
+        assert orden.estado == EstadoAlmuerzo.ENTREGADO
+        lectura = db_session.query(LecturaPos).one()
+        assert lectura.lector == "lector-1"
+
+    def test_second_tap_in_batch_is_ya_entregado(self, db_session, sample_apoderado):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        orden = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        resultados = make_ctrl().sincronizar_lecturas(
+            [self._scan(orden_id=orden.id), self._scan(alumno_id=alumno.id)]
+        )
+        assert [r["resultado"] for r in resultados] == ["entregado", "ya_entregado"]
+
+    def test_replayed_scan_id_returns_stored_outcome(self, db_session, sample_apoderado):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        orden = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        scan = self._scan(orden_id=orden.id)
+        primero = make_ctrl().sincronizar_lecturas([scan])
+        segundo = make_ctrl().sincronizar_lecturas([scan])
+        assert primero == segundo
+        assert segundo[0]["resultado"] == "entregado"
+
+    def test_redeems_credit_when_no_orden(self, db_session, sample_apoderado):
+        sample_apoderado.saldo_cuenta = 5000
+        db_session.commit()
+        alumno = sample_apoderado.alumnos[0]
+        menu = self._make_menu(db_session)
+        resultados = make_ctrl().sincronizar_lecturas(
+            [self._scan(alumno_id=alumno.id, menu_slug=menu.slug), self._scan(alumno_id=alumno.id, menu_slug=menu.slug)]
+        )
+        assert [r["resultado"] for r in resultados] == ["canjeado", "ya_entregado"]
+        assert sample_apoderado.saldo_cuenta == 1000
+
+    def test_reports_missing_alumno_and_orden(self, db_session, sample_apoderado):
+        alumno = sample_apoderado.alumnos[0]
+        resultados = make_ctrl().sincronizar_lecturas(
+            [self._scan(serial="ffffffff"), self._scan(alumno_id=alumno.id)]
+        )
+        assert [r["resultado"] for r in resultados] == ["no_encontrado", "sin_orden"]
+
+
 # ---------------------------------------------------------------------------
 # crear_orden_kiosko
 # ---------------------------------------------------------------------------
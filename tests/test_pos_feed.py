@@ -0,0 +1,143 @@
+"""Tests for DeliveryFeed (app/pos/feed.py)."""
+
+import json
+import uuid
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app.pos.crud import PosController
+from app.pos.feed import DeliveryFeed, delivery_feed
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def feed(app, db_session):
+    """The module-level feed with its session hooks registered for the test."""
+    delivery_feed.init_app(app)
+    q = delivery_feed.subscribe()
+    yield q
+    delivery_feed.unsubscribe(q)
+    delivery_feed.close()
+
+
+def _create_orden_casino(db_session, alumno, estado):
+    from app.model import OrdenCasino
+    orden = OrdenCasino()
+    orden.pedido_codigo = f"test-{uuid.uuid4()}"
+    orden.alumno_id = alumno.id
+    orden.menu_slug = "menu-test"
+    orden.menu_descripcion = "Menú de Prueba"
+    orden.menu_precio = Decimal("4000")
+    orden.fecha = date.today()
+    orden.estado = estado
+    db_session.add(orden)
+    db_session.commit()
+    return orden
+
+
+def _drain(q):
+    eventos = []
+    while not q.empty():
+        eventos.append(q.get_nowait())
+    return eventos
+
+
+# ---------------------------------------------------------------------------
+# Broker
+# ---------------------------------------------------------------------------
+
+class TestDeliveryFeedBroker:
+    def test_publish_reaches_every_subscriber(self):
+        feed = DeliveryFeed()
+        a, b = feed.subscribe(), feed.subscribe()
+        feed.publish({"orden_id": 1})
+        assert a.get_nowait() == {"orden_id": 1}
+        assert b.get_nowait() == {"orden_id": 1}
+
+    def test_slow_subscriber_drops_oldest(self):
+        feed = DeliveryFeed(max_queue=2)
+        q = feed.subscribe()
+        for i in range(3):
+            feed.publish({"orden_id": i})
+        assert [e["orden_id"] for e in _drain(q)] == [1, 2]
+
+    def test_stream_formats_server_sent_events(self):
+        feed = DeliveryFeed()
+        stream = feed.stream(heartbeat=0.01)
+        assert next(stream).startswith("retry:")
+        assert next(stream) == ": keepalive\n\n"
+        feed.publish({"orden_id": 7})
+        chunk = next(stream)
+        assert chunk.startswith(f"id: {feed._token}-1\nevent: entrega\n")
+        assert json.loads(chunk.split("data: ", 1)[1]) == {"orden_id": 7}
+        stream.close()
+        assert not feed._subscribers and not feed._streams
+
+    def test_stream_ends_after_max_seconds(self):
+        feed = DeliveryFeed()
+        chunks = list(feed.stream(heartbeat=0.01, max_seconds=0.05))
+        assert chunks[0].startswith("retry:")
+        assert set(chunks[1:]) == {": keepalive\n\n"}
+
+    def test_stream_resumes_from_last_event_id(self):
+        feed = DeliveryFeed()
+        for i in range(3):
+            feed.publish({"orden_id": i})
+        stream = feed.stream(heartbeat=0.01, last_event_id=f"{feed._token}-1")
+        next(stream)
+        assert [json.loads(next(stream).split("data: ", 1)[1])["orden_id"] for _ in range(2)] == [1, 2]
+        stream.close()
+
+        # Ids from another worker (or before a restart) start from now.
+        stream = feed.stream(heartbeat=0.01, last_event_id="otro-1")
+        next(stream)
+        assert next(stream) == ": keepalive\n\n"
+        stream.close()
+
+
+# ---------------------------------------------------------------------------
+# Session hooks
+# ---------------------------------------------------------------------------
+
+class TestDeliveryFeedEvents:
+    def test_delivery_publishes_after_commit(self, db_session, sample_apoderado, feed):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        orden = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        assert _drain(feed) == []
+
+        PosController().entregar_almuerzo(orden.id)
+
+        (evento,) = _drain(feed)
+        assert evento["orden_id"] == orden.id
+        assert evento["alumno_nombre"] == alumno.nombre
+        assert evento["desde"] == "pendiente"
+
+    def test_order_created_delivered_has_no_previous_state(self, db_session, sample_apoderado, feed):
+        from app.model import EstadoAlmuerzo
+        _create_orden_casino(db_session, sample_apoderado.alumnos[0], EstadoAlmuerzo.ENTREGADO)
+        (evento,) = _drain(feed)
+        assert evento["desde"] is None
+
+    def test_rollback_publishes_nothing(self, db_session, sample_apoderado, feed):
+        from app.model import EstadoAlmuerzo
+        orden = _create_orden_casino(db_session, sample_apoderado.alumnos[0], EstadoAlmuerzo.PENDIENTE)
+        orden.estado = EstadoAlmuerzo.ENTREGADO
+        db_session.flush()
+        db_session.rollback()
+        assert _drain(feed) == []
+
+    def test_bulk_delivery_publishes_each_orden(self, db_session, sample_apoderado, feed):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        o1 = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        o2 = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+
+        PosController().entregar_almuerzos([(o1.id, None), (o2.id, None)])
+
+        assert sorted(e["orden_id"] for e in _drain(feed)) == sorted([o1.id, o2.id])
@@ -0,0 +1,190 @@
+"""Tests for ServiceRoster (app/pos/roster.py) and its PosController integration."""
+
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.pos.crud import PosController
+from app.pos import roster as roster_module
+from app.pos.roster import ServiceRoster
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def roster(app, db_session):
+    r = ServiceRoster(check_interval=0)
+    r.init_app(app)
+    yield r
+    r.close()
+
+
+def _create_orden_casino(db_session, alumno, estado, fecha=None):
+    from app.model import OrdenCasino
+    orden = OrdenCasino()
+    orden.pedido_codigo = f"test-{uuid.uuid4()}"
+    orden.alumno_id = alumno.id
+    orden.menu_slug = "menu-test"
+    orden.menu_descripcion = "Menú de Prueba"
+    orden.menu_precio = Decimal("4000")
+    orden.fecha = fecha or date.today()
+    orden.estado = estado
+    db_session.add(orden)
+    db_session.commit()
+    return orden
+
+
+def _generation():
+    return roster_module._generations.get()
+
+
+# ---------------------------------------------------------------------------
+# Lookups
+# ---------------------------------------------------------------------------
+
+class TestServiceRosterLookups:
+    def test_lookup_by_tag_returns_pending_orden(self, db_session, sample_apoderado, roster):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        alumno.tag = "aa11bb22"
+        db_session.commit()
+        orden = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        roster.load()
+        result = PosController(roster=roster).get_alumno_con_orden("AA11BB22")
+        assert result["alumno"].id == alumno.id
+        assert result["orden"].id == orden.id
+        assert result["ya_entregado"] is False
+        assert roster.hits == 1
+
+    def test_unknown_tag_falls_back_to_database(self, db_session, sample_apoderado, roster):
+        roster.load()
+        result = PosController(roster=roster).get_alumno_con_orden("FFFFFFFF")
+        assert result["alumno"] is None
+        assert roster.misses == 1
+
+    def test_other_dates_are_not_served(self, db_session, sample_apoderado, roster):
+        roster.load()
+        ayer = date.today() - timedelta(days=1)
+        assert roster.get_by_id(sample_apoderado.alumnos[0].id, ayer) is None
+
+    def test_pendientes_match_database(self, db_session, sample_apoderado, roster):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        roster.load()
+        pendientes = PosController(roster=roster).get_alumnos_con_almuerzo_pendiente()
+        assert [a.id for a in pendientes] == [alumno.id]
+
+    def test_scan_plan_served_from_roster(self, db_session, sample_apoderado, roster):
+        from app.model import EstadoAlmuerzo
+        sample_apoderado.saldo_cuenta = 3000
+        alumno = sample_apoderado.alumnos[0]
+        alumno.tag = "aa11bb22"
+        db_session.commit()
+        orden = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        roster.load()
+
+        plan = PosController(roster=roster).get_scan_plan("AA11BB22")
+        assert (plan["alumno"].id, plan["orden"].id, plan["saldo"]) == (alumno.id, orden.id, 3000)
+        assert plan["menus_disponibles"] == []
+        assert PosController(roster=roster).get_scan_plan_by_id(alumno.id)["orden"].id == orden.id
+        assert roster.hits == 2
+
+    def test_warm_keeps_a_current_roster(self, db_session, sample_apoderado, roster):
+        roster.load()
+        loaded_at = roster.loaded_at
+        roster.warm()
+        assert roster.loaded_at == loaded_at
+
+    def test_stats_report_hit_rate(self, db_session, sample_apoderado, roster):
+        roster.load()
+        roster.get_by_id(sample_apoderado.alumnos[0].id)
+        roster.get_by_tag("00000000")
+        stats = roster.stats()
+        assert stats["fecha"] == date.today().isoformat()
+        assert stats["alumnos"] == 1
+        assert stats["hit_rate"] == 0.5
+
+
+# ---------------------------------------------------------------------------
+# Invalidation
+# ---------------------------------------------------------------------------
+
+class TestServiceRosterInvalidation:
+    def test_delivery_is_applied_incrementally(self, db_session, sample_apoderado, roster):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        orden = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        roster.load()
+        generation = roster.generation
+
+        PosController().entregar_almuerzo(orden.id)
+
+        assert roster.generation == generation + 1
+        assert _generation() == generation + 1
+        result = roster.get_by_id(alumno.id)
+        assert result["orden"] is None
+        assert result["ya_entregado"] is True
+
+    def test_tag_edit_updates_index(self, db_session, sample_apoderado, roster):
+        alumno = sample_apoderado.alumnos[0]
+        roster.load()
+        alumno.tag = "CAFEBABE"
+        db_session.commit()
+        assert roster.get_by_tag("cafebabe")["alumno"].id == alumno.id
+
+    def test_other_dates_do_not_bump_generation(self, db_session, sample_apoderado, roster):
+        from app.model import EstadoAlmuerzo
+        roster.load()
+        generation = _generation()
+
+        _create_orden_casino(
+            db_session, sample_apoderado.alumnos[0], EstadoAlmuerzo.PENDIENTE, date.today() + timedelta(days=1)
+        )
+
+        assert _generation() == generation
+        assert roster.generation == generation
+
+    def test_foreign_generation_triggers_reload(self, db_session, sample_apoderado, roster):
+        from app.model import EstadoAlmuerzo, OrdenCasino
+        alumno = sample_apoderado.alumnos[0]
+        roster.load()
+        # Simulate another worker: Core statements bypass this session's
+        # flush hooks, so only the generation check can notice the change.
+        db_session.execute(
+            OrdenCasino.__table__.insert().values(
+                pedido_codigo="otro-worker",
+                alumno_id=alumno.id,
+                menu_slug="menu-test",
+                fecha=date.today(),
+                estado=EstadoAlmuerzo.PENDIENTE,
+            )
+        )
+        db_session.commit()
+        roster_module._generations.incr()
+
+        result = roster.get_by_id(alumno.id)
+        assert roster.generation == _generation()
+        assert result["orden"] is not None
+
+    def test_multi_worker_without_redis_logs_error(self, app, monkeypatch, caplog):
+        monkeypatch.setenv("WEB_CONCURRENCY", "4")
+        r = ServiceRoster()
+        with caplog.at_level("ERROR", logger="app.pos.roster"):
+            r.init_app(app)
+        r.close()
+        assert "POS_ROSTER_REDIS_URL" in caplog.text
+
+    def test_bulk_delivery_reloads_roster(self, db_session, sample_apoderado, roster):
+        from app.model import EstadoAlmuerzo
+        alumno = sample_apoderado.alumnos[0]
+        orden = _create_orden_casino(db_session, alumno, EstadoAlmuerzo.PENDIENTE)
+        roster.load()
+
+        PosController().entregar_almuerzos([(orden.id, None)])
+
+        assert roster.get_by_id(alumno.id)["ya_entregado"] is True
@@ -0,0 +1,167 @@
+"""Tests for AlumnoSearchIndex (app/pos/search.py) and the roster-backed kiosk search."""
+
+import random
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from app.database import db
+from app.pos.crud import PosController
+from app.pos.roster import ServiceRoster
+from app.pos.search import AlumnoSearchIndex, normalizar, tokenizar
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def roster(app, db_session):
+    r = ServiceRoster(check_interval=0)
+    r.init_app(app)
+    yield r
+    r.close()
+
+
+def _index(*alumnos):
+    index = AlumnoSearchIndex()
+    for alumno_id, nombre, curso in alumnos:
+        index.put(alumno_id, nombre, curso)
+    return index
+
+
+def _seed_alumnos(db_session, apoderado, n):
+    """Insert *n* alumnos with realistic Spanish names in one statement."""
+    from app.model import Alumno
+    rng = random.Random(7)
+    nombres = ["José", "María", "Sofía", "Tomás", "Agustín", "Martín", "Valentina", "Benjamín", "Ignacio", "Isidora"]
+    apellidos = ["González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva", "Martínez", "Sepúlveda"]
+    now = datetime.now()
+    filas = [
+        {
+            "slug": f"alumno-{i}",
+            "nombre": f"{rng.choice(nombres)} {rng.choice(apellidos)} {rng.choice(apellidos)}",
+            "curso": f"{rng.randint(1, 8)}{rng.choice('ABC')}",
+            "activo": True,
+            "apoderado_id": apoderado.id,
+            "tag_compartido": False,
+            "created": now,
+            "updated": now,
+        }
+        for i in range(n)
+    ]
+    db_session.execute(Alumno.__table__.insert(), filas)
+    db_session.commit()
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+class TestAlumnoSearchIndex:
+    def test_normalizar_strips_accents_and_case(self):
+        assert normalizar("JOSÉ Muñoz") == "jose munoz"
+        assert tokenizar("Sofía  Pérez-Soto") == ["sofia", "perez", "soto"]
+
+    def test_accent_insensitive_prefix_match(self):
+        index = _index((1, "José Pérez", "5A"), (2, "Josefa Díaz", "3B"))
+        assert index.search("jose") == [2, 1]
+        assert index.search("Jos") == [2, 1]
+        assert index.search("perez") == [1]
+
+    def test_every_token_must_match(self):
+        index = _index((1, "José Pérez", "5A"), (2, "José Díaz", "3B"))
+        assert index.search("jose di") == [2]
+        assert index.search("jose 5a") == [1]
+        assert index.search("jose xyz") == []
+
+    def test_results_ranked_by_curso_then_nombre(self):
+        index = _index((1, "Ana Soto", "8A"), (2, "Ana Rojas", "1B"), (3, "Ana Díaz", "1B"))
+        assert index.search("ana") == [3, 2, 1]
+        assert index.search("ana", limit=1) == [3]
+
+    def test_put_reindexes_and_remove_drops(self):
+        index = _index((1, "José Pérez", "5A"))
+        index.put(1, "Pedro Pérez", "5A")
+        assert index.search("jose") == []
+        assert index.search("pedro") == [1]
+        index.remove(1)
+        assert index.search("perez") == []
+        assert len(index) == 0
+
+    def test_blank_query_returns_nothing(self):
+        assert _index((1, "José Pérez", "5A")).search("  ") == []
+
+
+# ---------------------------------------------------------------------------
+# Roster integration
+# ---------------------------------------------------------------------------
+
+class TestBuscarAlumnosRoster:
+    def test_controller_uses_roster_index(self, db_session, sample_apoderado, roster):
+        roster.load()
+        alumnos = PosController(roster=roster).buscar_alumnos("gonzalez")
+        assert [a.id for a in alumnos] == [sample_apoderado.alumnos[0].id]
+
+    def test_edits_are_applied_to_index(self, db_session, sample_apoderado, roster):
+        alumno = sample_apoderado.alumnos[0]
+        roster.load()
+        alumno.nombre = "Tomás Muñoz"
+        db_session.commit()
+        assert roster.buscar("gonzalez") == []
+        assert [a.id for a in roster.buscar("tomas munoz")] == [alumno.id]
+
+        alumno.activo = False
+        db_session.commit()
+        assert roster.buscar("tomas") == []
+
+
+# ---------------------------------------------------------------------------
+# Large roster
+# ---------------------------------------------------------------------------
+
+class TestBuscarAlumnosLargeRoster:
+    QUERIES = ["jo", "jose", "maria gon", "sep", "5a", "benjamin diaz", "is", "martinez s"]
+
+    def test_index_answers_without_sql_on_5000_alumnos(self, db_session, sample_apoderado, roster):
+        _seed_alumnos(db_session, sample_apoderado, 5000)
+        roster.load()
+        sql = PosController()
+        statements = []
+
+        def _record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", _record)
+        try:
+            for q in self.QUERIES:
+                roster._search.search(q)
+            assert statements == []
+            for q in self.QUERIES:
+                sql.buscar_alumnos(q)
+            assert len(statements) == len(self.QUERIES)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", _record)
+
+        assert roster.buscar("jose")
+        assert not sql.buscar_alumnos("jose")  # SQL LIKE misses "José"
+
+    @pytest.mark.benchmark
+    def test_benchmark_index_vs_sql_on_5000_alumnos(self, db_session, sample_apoderado, roster):
+        """Time both search paths; run with ``pytest --benchmark -s``."""
+        _seed_alumnos(db_session, sample_apoderado, 5000)
+        roster.load()
+        sql = PosController()
+
+        def _mean_ms(fn, rounds=5):
+            inicio = time.perf_counter()
+            for _ in range(rounds):
+                for q in self.QUERIES:
+                    fn(q)
+            return (time.perf_counter() - inicio) * 1000 / (rounds * len(self.QUERIES))
+
+        index_ms = _mean_ms(roster._search.search)
+        sql_ms = _mean_ms(sql.buscar_alumnos)
+        print(f"\nbuscar_alumnos on 5000 alumnos: index {index_ms:.3f} ms, SQL {sql_ms:.3f} ms")
@@ -0,0 +1,135 @@
+"""Tests for the saldo ledger (app/saldo.py)."""
+
+from decimal import Decimal
+
+from app import saldo as saldo_ledger
+from app.database import db
+from app.pos.crud import PosController
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _movimientos(db_session, apoderado):
+    from app.model import MovimientoSaldo
+    return (
+        db_session.execute(
+            db.select(MovimientoSaldo).filter_by(apoderado_id=apoderado.id).order_by(MovimientoSaldo.id)
+        )
+        .scalars()
+        .all()
+    )
+
+
+def _saldo_en_bd(db_session, apoderado):
+    from app.model import Apoderado
+    return db_session.execute(
+        db.select(Apoderado.__table__.c.saldo_cuenta).where(Apoderado.__table__.c.id == apoderado.id)
+    ).scalar_one()
+
+
+# ---------------------------------------------------------------------------
+# acreditar / debitar
+# ---------------------------------------------------------------------------
+
+class TestSaldoLedger:
+    def test_acreditar_updates_balance_and_records_entry(self, db_session, sample_apoderado):
+        from app.model import TipoMovimientoSaldo
+        sample_apoderado.saldo_cuenta = None
+        db_session.commit()
+
+        movimiento = saldo_ledger.acreditar(sample_apoderado, 5000, TipoMovimientoSaldo.ABONO)
+        db_session.commit()
+
+        assert movimiento.monto == 5000
+        assert movimiento.saldo_resultante == 5000
+        assert sample_apoderado.saldo_cuenta == 5000
+        assert [m.tipo for m in _movimientos(db_session, sample_apoderado)] == [TipoMovimientoSaldo.ABONO]
+
+    def test_debitar_rejects_overdraft(self, db_session, sample_apoderado):
+        from app.model import TipoMovimientoSaldo
+        sample_apoderado.saldo_cuenta = 1000
+        db_session.commit()
+
+        assert saldo_ledger.debitar(sample_apoderado, 1500, TipoMovimientoSaldo.CANJE) is None
+        db_session.commit()
+
+        assert _saldo_en_bd(db_session, sample_apoderado) == 1000
+        assert _movimientos(db_session, sample_apoderado) == []
+
+    def test_debitar_uses_database_balance_not_stale_instance(self, db_session, sample_apoderado):
+        from app.model import Apoderado, TipoMovimientoSaldo
+        sample_apoderado.saldo_cuenta = 5000
+        db_session.commit()
+        sample_apoderado.saldo_cuenta  # load the attribute
+        # Another worker spends part of the balance behind this session's back.
+        db_session.execute(
+            db.update(Apoderado.__table__)
+            .where(Apoderado.__table__.c.id == sample_apoderado.id)
+            .values(saldo_cuenta=1000)
+        )
+
+        assert saldo_ledger.debitar(sample_apoderado, 4000, TipoMovimientoSaldo.CANJE) is None
+        movimiento = saldo_ledger.debitar(sample_apoderado, 600, TipoMovimientoSaldo.CANJE)
+        db_session.commit()
+
+        assert movimiento.saldo_resultante == 400
+        assert _saldo_en_bd(db_session, sample_apoderado) == 400
+
+    def test_historial_newest_first(self, db_session, sample_apoderado):
+        from app.model import TipoMovimientoSaldo
+        sample_apoderado.saldo_cuenta = 0
+        db_session.commit()
+        saldo_ledger.acreditar(sample_apoderado, 3000, TipoMovimientoSaldo.ABONO)
+        saldo_ledger.debitar(sample_apoderado, 1000, TipoMovimientoSaldo.CANJE)
+        db_session.commit()
+
+        historial = saldo_ledger.historial(sample_apoderado.id)
+        assert [(m.monto, m.saldo_resultante) for m in historial] == [(-1000, 2000), (3000, 3000)]
+
+
+# ---------------------------------------------------------------------------
+# Controller integration
+# ---------------------------------------------------------------------------
+
+class TestSaldoLedgerController:
+    def test_canje_records_entry_linked_to_orden(self, db_session, sample_apoderado):
+        from datetime import date
+        from app.model import MenuDiario, TipoMovimientoSaldo
+        sample_apoderado.saldo_cuenta = 5000
+        menu = MenuDiario(slug="menu-ledger", descripcion="Menú", dia=date.today(), precio=Decimal("3500"), activo=True)
+        db_session.add(menu)
+        db_session.commit()
+
+        orden = PosController().canjear_con_credito(sample_apoderado.alumnos[0], menu)
+
+        (movimiento,) = _movimientos(db_session, sample_apoderado)
+        assert movimiento.tipo == TipoMovimientoSaldo.CANJE
+        assert movimiento.monto == -3500
+        assert movimiento.orden_id == orden.id
+        assert movimiento.pedido.codigo == orden.pedido_codigo
+        assert sample_apoderado.saldo_cuenta == 1500
+
+    def test_approve_abono_records_entry_linked_to_abono(self, db_session, sample_apoderado):
+        from app.apoderado.controller import ApoderadoController
+        from app.model import Payment, TipoMovimientoSaldo
+        abono = ApoderadoController().create_abono(sample_apoderado, Decimal("8000"), "cafeteria")
+        pago = Payment(
+            merchants_id=abono.codigo,
+            transaction_id=abono.codigo,
+            provider="cafeteria",
+            state="processing",
+            amount=8000,
+            currency="CLP",
+        )
+        db_session.add(pago)
+        db_session.commit()
+
+        assert PosController().approve_abono(abono, pago) is True
+
+        (movimiento,) = _movimientos(db_session, sample_apoderado)
+        assert movimiento.tipo == TipoMovimientoSaldo.ABONO
+        assert movimiento.abono_id == abono.id
+        assert pago.payment_object["saldo_antes"] == 0
+        assert pago.payment_object["saldo_despues"] == 8000
@@ -0,0 +1,320 @@
+"""Tests for MenuDiario stock reservation (app/stock.py)."""
+
+import logging
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+
+from app import stock
+from app.database import db
+from app.pos.crud import PosController
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+@pytest.fixture()
+def control_stock(app):
+    app.config["MENU_CONTROL_STOCK"] = True
+    yield
+    app.config.pop("MENU_CONTROL_STOCK")
+
+
+def _menu(db_session, slug="menu-stock", unidades=3, precio=3500):
+    from app.model import MenuDiario
+    menu = MenuDiario(
+        slug=slug,
+        descripcion="Menú con stock",
+        dia=date.today(),
+        precio=Decimal(precio),
+        activo=True,
+        stock=unidades,
+        fuera_stock=False,
+    )
+    db_session.add(menu)
+    db_session.commit()
+    return menu
+
+
+def _items(menu, alumnos):
+    return [{"slug": menu.slug, "date": date.today().isoformat(), "alumnos": [{"id": a.id} for a in alumnos]}]
+
+
+def _reservas(db_session):
+    from app.model import ReservaStock
+    return db_session.execute(db.select(ReservaStock).order_by(ReservaStock.id)).scalars().all()
+
+
+def _estado_menu(db_session, menu):
+    from app.model import MenuDiario
+    tabla = MenuDiario.__table__
+    return db_session.execute(db.select(tabla.c.stock, tabla.c.fuera_stock).where(tabla.c.id == menu.id)).one()
+
+
+# ---------------------------------------------------------------------------
+# consumir
+# ---------------------------------------------------------------------------
+
+class TestConsumir:
+    def test_decrements_and_flips_fuera_stock_at_zero(self, db_session, control_stock):
+        menu = _menu(db_session, unidades=2)
+        stock.consumir(menu)
+        db_session.commit()
+        assert tuple(_estado_menu(db_session, menu)) == (1, False)
+
+        stock.consumir(menu)
+        db_session.commit()
+        assert tuple(_estado_menu(db_session, menu)) == (0, True)
+        assert menu not in PosController().get_menus_hoy()
+
+        with pytest.raises(stock.SinStock):
+            stock.consumir(menu)
+
+    def test_partial_shortage_does_not_flip(self, db_session, control_stock):
+        menu = _menu(db_session, unidades=2)
+        with pytest.raises(stock.SinStock):
+            stock.consumir(menu, 3)
+        db_session.commit()
+        assert tuple(_estado_menu(db_session, menu)) == (2, False)
+
+    def test_disabled_by_default(self, db_session):
+        menu = _menu(db_session, unidades=1)
+        assert stock.consumir(menu) is None
+        assert stock.consumir(menu) is None
+        db_session.commit()
+        assert _estado_menu(db_session, menu).stock == 1
+
+
+# ---------------------------------------------------------------------------
+# reservar / confirmar / liberar
+# ---------------------------------------------------------------------------
+
+class TestReservas:
+    def test_reservar_is_all_or_nothing(self, db_session, sample_apoderado, control_stock):
+        alumno = sample_apoderado.alumnos[0]
+        con_stock = _menu(db_session, "menu-a", unidades=5)
+        agotado = _menu(db_session, "menu-b", unidades=0)
+
+        with pytest.raises(stock.SinStock) as exc:
+            stock.reservar(_items(con_stock, [alumno]) + _items(agotado, [alumno]))
+        db_session.commit()
+
+        assert exc.value.slug == "menu-b"
+        assert _estado_menu(db_session, con_stock).stock == 5
+        assert _reservas(db_session) == []
+
+    def test_crea_orden_reserves_and_payment_confirms(self, db_session, sample_apoderado, control_stock):
+        from app.apoderado.controller import ApoderadoController
+        from app.model import EstadoReserva, Pedido
+        menu = _menu(db_session, unidades=3)
+        ctrl = ApoderadoController()
+
+        codigo = ctrl.crea_orden(_items(menu, sample_apoderado.alumnos))
+        (reserva,) = _reservas(db_session)
+        assert reserva.estado == EstadoReserva.RESERVADA
+        assert reserva.pedido.codigo == codigo
+        assert _estado_menu(db_session, menu).stock == 2
+
+        pedido = db_session.execute(db.select(Pedido).filter_by(codigo=codigo)).scalar_one()
+        ctrl.process_payment_completion(pedido)
+        db_session.refresh(reserva)
+        assert reserva.estado == EstadoReserva.CONFIRMADA
+        assert _estado_menu(db_session, menu).stock == 2
+
+    def test_crea_orden_rejects_sold_out_menu(self, db_session, sample_apoderado, control_stock):
+        from app.apoderado.controller import ApoderadoController
+        from app.model import Pedido
+        menu = _menu(db_session, unidades=0)
+        with pytest.raises(stock.SinStock):
+            ApoderadoController().crea_orden(_items(menu, sample_apoderado.alumnos))
+        assert db_session.execute(db.select(Pedido)).first() is None
+        assert _estado_menu(db_session, menu).fuera_stock is True
+
+    def test_liberar_returns_units(self, db_session, sample_apoderado, control_stock):
+        from app.apoderado.controller import ApoderadoController
+        from app.model import EstadoReserva, Pedido
+        menu = _menu(db_session, unidades=1)
+        codigo = ApoderadoController().crea_orden(_items(menu, sample_apoderado.alumnos))
+        assert tuple(_estado_menu(db_session, menu)) == (0, True)
+
+        pedido = db_session.execute(db.select(Pedido).filter_by(codigo=codigo)).scalar_one()
+        assert stock.liberar(pedido) == 1
+        assert stock.liberar(pedido) == 0
+        db_session.commit()
+
+        assert tuple(_estado_menu(db_session, menu)) == (1, False)
+        assert [r.estado for r in _reservas(db_session)] == [EstadoReserva.LIBERADA]
+
+    def test_expired_reservation_is_reused_and_late_payment_oversells(
+        self, db_session, sample_apoderado, control_stock, caplog
+    ):
+        from app.model import EstadoReserva, Pedido
+        menu = _menu(db_session, unidades=1)
+        items = _items(menu, sample_apoderado.alumnos)
+        abandonado = Pedido(extra_attrs=items, precio_total=Decimal(0))
+        db_session.add(abandonado)
+        (vieja,) = stock.reservar(items, abandonado)
+        db_session.commit()
+        vieja.created = vieja.created - timedelta(hours=1)
+        db_session.commit()
+
+        (nueva,) = stock.reservar(items)
+        db_session.commit()
+        db_session.refresh(vieja)
+        assert vieja.estado == EstadoReserva.LIBERADA
+        assert nueva.estado == EstadoReserva.RESERVADA
+
+        with caplog.at_level(logging.WARNING, logger="app.stock"):
+            stock.confirmar(abandonado)
+        assert "stock_sobrevendido" in caplog.text
+
+
+# ---------------------------------------------------------------------------
+# POS integration
+# ---------------------------------------------------------------------------
+
+class TestStockPos:
+    def test_kiosk_sale_links_reservation(self, db_session, sample_apoderado, control_stock):
+        from app.model import EstadoReserva
+        menu = _menu(db_session, unidades=1)
+        orden = PosController().crear_orden_kiosko(sample_apoderado.alumnos[0], menu)
+
+        (reserva,) = _reservas(db_session)
+        assert reserva.estado == EstadoReserva.CONFIRMADA
+        assert reserva.pedido.codigo == orden.pedido_codigo
+        with pytest.raises(stock.SinStock):
+            PosController().crear_orden_kiosko(sample_apoderado.alumnos[0], menu)
+
+    def test_canje_without_stock_keeps_saldo(self, db_session, sample_apoderado, control_stock):
+        sample_apoderado.saldo_cuenta = 10000
+        menu = _menu(db_session, unidades=0)
+        with pytest.raises(stock.SinStock):
+            PosController().canjear_con_credito(sample_apoderado.alumnos[0], menu)
+        db_session.rollback()
+        assert sample_apoderado.saldo_cuenta == 10000
+
+    def test_canje_without_saldo_returns_stock(self, db_session, sample_apoderado, control_stock):
+        from app.model import EstadoReserva
+        menu = _menu(db_session, unidades=1)
+        assert PosController().canjear_con_credito(sample_apoderado.alumnos[0], menu) is None
+        db_session.commit()
+        assert tuple(_estado_menu(db_session, menu)) == (1, False)
+        assert [r.estado for r in _reservas(db_session)] == [EstadoReserva.LIBERADA]
+
+
+# ---------------------------------------------------------------------------
+# Fragments
+# ---------------------------------------------------------------------------
+
+class TestFragmentos:
+    def test_fragmented_menu_sells_exactly_its_units(self, db_session, control_stock):
+        from app.model import MenuStockFragmento
+        menu = _menu(db_session, unidades=10)
+        stock.fragmentar(menu, 4)
+        db_session.commit()
+        disponibles = db_session.execute(
+            db.select(MenuStockFragmento.disponible).filter_by(menu_id=menu.id).order_by(MenuStockFragmento.fragmento)
+        ).scalars().all()
+        assert disponibles == [3, 3, 2, 2]
+        assert stock.disponible(menu) == 10
+
+        reservas = [stock.consumir(menu) for _ in range(10)]
+        db_session.commit()
+        with pytest.raises(stock.SinStock):
+            stock.consumir(menu)
+        db_session.commit()
+        assert stock.disponible(menu) == 0
+        assert _estado_menu(db_session, menu).fuera_stock is True
+
+        stock.anular(reservas[0])
+        db_session.commit()
+        assert stock.disponible(menu) == 1
+        assert _estado_menu(db_session, menu).fuera_stock is False
+
+    def test_restock_on_menu_row_is_used_after_fragments(self, db_session, control_stock):
+        menu = _menu(db_session, unidades=1)
+        stock.fragmentar(menu, 2)
+        menu.stock = 1
+        db_session.commit()
+        stock.consumir(menu)
+        stock.consumir(menu)
+        db_session.commit()
+        assert stock.disponible(menu) == 0
+
+        stock.fragmentar(menu, 0)
+        db_session.commit()
+        assert menu.stock_fragmentos == 0
+        assert _estado_menu(db_session, menu).fuera_stock is True
+
+
+# ---------------------------------------------------------------------------
+# Concurrency
+# ---------------------------------------------------------------------------
+
+class TestStockConcurrencia:
+    HILOS = 8
+    INTENTOS = 25
+
+    @pytest.fixture()
+    def bench_app(self, tmp_path):
+        """A second app on a file database so each thread gets its own connection."""
+        bench = Flask(__name__)
+        bench.config.update(
+            SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'stock.db'}",
+            SQLALCHEMY_ENGINE_OPTIONS={"connect_args": {"timeout": 30}},
+            MENU_CONTROL_STOCK=True,
+        )
+        db.init_app(bench)
+        with bench.app_context():
+            db.create_all()
+        yield bench
+        with bench.app_context():
+            db.engine.dispose()
+
+    def _vender(self, bench, menu_id, unidades):
+        """Race HILOS threads for *unidades* units; return (vendidas, segundos)."""
+        from app.model import MenuDiario
+        vendidas = []
+
+        def _hilo():
+            with bench.app_context():
+                menu = db.session.get(MenuDiario, menu_id)
+                for _ in range(self.INTENTOS):
+                    try:
+                        stock.consumir(menu)
+                        db.session.commit()
+                        vendidas.append(1)
+                    except stock.SinStock:
+                        db.session.commit()
+
+        hilos = [threading.Thread(target=_hilo) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return len(vendidas)
+
+    @pytest.mark.parametrize("fragmentos", [0, 4])
+    def test_concurrent_sales_never_oversell(self, bench_app, fragmentos):
+        from app.model import MenuDiario, ReservaStock
+        unidades = self.HILOS * self.INTENTOS // 2
+        with bench_app.app_context():
+            menu = MenuDiario(slug="menu-bench", dia=date.today(), precio=Decimal(3500), stock=unidades)
+            db.session.add(menu)
+            db.session.flush()
+            stock.fragmentar(menu, fragmentos)
+            db.session.commit()
+            menu_id = menu.id
+
+        vendidas = self._vender(bench_app, menu_id, unidades)
+
+        with bench_app.app_context():
+            menu = db.session.get(MenuDiario, menu_id)
+            assert vendidas == unidades
+            assert stock.disponible(menu) == 0
+            assert menu.fuera_stock is True
+            assert db.session.execute(db.select(db.func.sum(ReservaStock.cantidad))).scalar_one() == unidades
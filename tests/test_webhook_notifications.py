@@ -267,4 +267,6 @@ class TestDispatchTriggersNotification:
         ):
             ext._dispatch_webhook_event(webhook_event)
 
-        other_handler.assert_called_once_with(webhook_event)
+        other_handler.assert_called_once()
+        (ctx,), _kwargs = other_handler.call_args
+        assert ctx.event is webhook_event